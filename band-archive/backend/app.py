@@ -2,10 +2,9 @@ import os
 
 from flask import Flask
 from flask_cors import CORS
-from flask_migrate import Migrate
 from dotenv import load_dotenv
 
-from extensions import db
+from database import init_db, init_request_sessions, release_startup_connections
 from errors import register_error_handlers
 from routes.songs import songs_bp
 from routes.practice_logs import practice_logs_bp
@@ -13,28 +12,27 @@ from routes.dashboard import dashboard_bp
 from routes.suggestions import suggestions_bp
 from routes.members import members_bp
 from routes.personal_logs import personal_logs_bp as member_personal_logs_bp
+from routes.upload_sessions import upload_sessions_bp
+from routes.sync import sync_bp
+from routes.archive import archive_bp
+from routes.batch import batch_bp
 from config import DevelopmentConfig
+from pagination import NEXT_CURSOR_HEADER
+from search import init_search_index
+from media_jobs import init_media_jobs
+from stats_cache import init_stats_cache
+from serialization import init_json
+from compression import init_compression
+from archive import init_archive
+from storage import init_storage
+from storage_gc import init_storage_gc
+from metrics import init_metrics
+from schema import check_schema, init_schema
 
 load_dotenv()
 
-
-def _run_migrations(app):
-    """기존 테이블에 누락된 컬럼을 추가하는 스타트업 마이그레이션."""
-    import sqlite3
-    db_uri = app.config['SQLALCHEMY_DATABASE_URI']
-    if not db_uri.startswith('sqlite'):
-        return
-    db_path = db_uri.replace('sqlite:///', '')
-    try:
-        conn = sqlite3.connect(db_path)
-        columns = [row[1] for row in conn.execute('PRAGMA table_info(media)').fetchall()]
-        if 'original_filename' not in columns:
-            conn.execute('ALTER TABLE media ADD COLUMN original_filename VARCHAR(200)')
-            conn.commit()
-            app.logger.info('Migration: added original_filename column to media table')
-        conn.close()
-    except Exception as e:
-        app.logger.warning(f'Startup migration failed: {e}')
+# Response headers the browser frontend is allowed to read.
+EXPOSED_HEADERS = [NEXT_CURSOR_HEADER, 'X-Content-SHA256', 'ETag']
 
 
 def create_app(config_class=None):
@@ -46,18 +44,25 @@ def create_app(config_class=None):
         config_class = getattr(module, class_name)
     app = Flask(__name__)
     app.config.from_object(config_class)
+    init_json(app)
     if app.debug:
-        CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+        CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True,
+             expose_headers=EXPOSED_HEADERS)
     else:
         allowed_origins = [
             origin.strip()
             for origin in os.getenv('CORS_ALLOWED_ORIGINS', '').split(',')
             if origin.strip()
         ]
-        CORS(app, resources={r"/*": {"origins": allowed_origins}}, supports_credentials=True)
+        CORS(app, resources={r"/*": {"origins": allowed_origins}}, supports_credentials=True,
+             expose_headers=EXPOSED_HEADERS)
 
-    db.init_app(app)
-    Migrate(app, db)
+    init_db(app)
+    init_storage(app)
+    # First, so its hooks wrap everything registered after it (metrics.py).
+    init_metrics(app)
+    init_request_sessions(app)
+    init_schema(app)
     register_error_handlers(app)
     app.register_blueprint(songs_bp)
     app.register_blueprint(practice_logs_bp)
@@ -65,11 +70,22 @@ def create_app(config_class=None):
     app.register_blueprint(suggestions_bp)
     app.register_blueprint(members_bp)
     app.register_blueprint(member_personal_logs_bp)
+    app.register_blueprint(upload_sessions_bp)
+    app.register_blueprint(sync_bp)
+    if app.config['ARCHIVE_ENDPOINTS_ENABLED']:
+        app.register_blueprint(archive_bp)
+    app.register_blueprint(batch_bp)
+    init_media_jobs(app)
+    init_stats_cache(app)
+    init_compression(app)
+    init_archive(app)
+    init_storage_gc(app)
 
     with app.app_context():
-        db.create_all()
-        _run_migrations(app)
+        if check_schema(app):
+            init_search_index(app)
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    release_startup_connections(app)
 
     return app
 
@@ -0,0 +1,409 @@
+"""Export and import the whole archive as one streamed tar bundle.
+
+Layout, in stream order::
+
+    manifest.json                 format and version, checked before anything is read
+    files/<sha256>                content-addressed uploads (blob_store.py)
+    uploads/[personal_logs/]name  uploads stored before the blob store existed
+    data/<table>/<n>.jsonl        rows, ROWS_PER_MEMBER per member, parents first
+    totals.json                   row and file counts, to detect a truncated bundle
+
+``export_archive()`` is a generator of tar bytes: rows are read with
+``yield_per`` and files in READ_BLOCK_SIZE blocks, so memory does not grow
+with the archive. Tar headers are written here rather than by ``tarfile``,
+whose ``addfile`` would buffer a whole media file in the output stream.
+Rows are bounded by the highest ids seen when the export starts, so rows
+created meanwhile cannot reference parents missing from the bundle.
+
+``import_archive(fileobj)`` reads the stream sequentially, so a bundle can
+be imported straight from a request body. Files whose checksum is already
+stored are skipped; the others are staged in temp files and only moved
+into the store, under the blob-store lock, right before the rows commit,
+so the import does not block other uploads while it streams. Rows are appended with new ids (foreign keys are
+remapped), inserted in batches of IMPORT_BATCH_SIZE in one transaction.
+Derived thumbnails, previews and waveforms are not exported; the media
+jobs rebuild them after the import.
+"""
+import json
+import os
+import tarfile
+import time
+from datetime import datetime, timezone
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import DateTime, func, insert, select, union
+
+from blob_store import (
+    REFERENCE_COLUMNS,
+    add_references,
+    blob_hash,
+    blob_exists,
+    blob_stat,
+    hold_blob_lock,
+    stage_stream,
+    store_file,
+)
+from errors import ValidationError
+from extensions import db
+from media_jobs import DERIVED_COLUMNS, enqueue_missing_jobs
+from models import Media, Member, PersonalLog, PracticeLog, Song, SongSuggestion
+from routes.personal_logs import PERSONAL_LOGS_SUBDIR
+from stats_cache import get_stats_cache
+from storage import get_storage, is_safe_key
+
+ARCHIVE_FORMAT = 'band-archive'
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+TOTALS_NAME = 'totals.json'
+ROWS_PER_MEMBER = 1000
+IMPORT_BATCH_SIZE = 500
+
+# Parents before children, with the foreign keys to remap on import.
+ARCHIVE_MODELS = (
+    (Member, {}),
+    (Song, {}),
+    (SongSuggestion, {}),
+    (Media, {'song_id': Song}),
+    (PracticeLog, {'song_id': Song}),
+    (PersonalLog, {'member_id': Member}),
+)
+
+# Columns holding legacy (non content-addressed) file names, by folder under UPLOAD_FOLDER.
+LEGACY_FILE_COLUMNS = {
+    '': (Media.filename, Song.sheet_music, PracticeLog.recording),
+    PERSONAL_LOGS_SUBDIR: (PersonalLog.filename,),
+}
+
+_TAR_BLOCK = 512
+
+
+def archive_columns(model):
+    derived = DERIVED_COLUMNS.get(model, ())
+    return [c for c in model.__table__.columns if c.computed is None and c.key not in derived]
+
+
+# ── Export ──
+
+def _member(name, size, chunks, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    written = 0
+    for chunk in chunks:
+        written += len(chunk)
+        yield chunk
+    if written != size:
+        raise RuntimeError(f'{name} changed size while it was exported')
+    yield b'\0' * (-size % _TAR_BLOCK)
+
+
+def _json_member(name, data, mtime):
+    body = json.dumps(data, indent=2, sort_keys=True).encode()
+    return _member(name, len(body), [body], mtime)
+
+
+def _file_member(name, storage, stored):
+    return _member(name, stored.size, storage.get_range(stored.key, 0, stored.size), int(stored.mtime))
+
+
+def _stored_blobs():
+    for model, attribute in REFERENCE_COLUMNS:
+        column = getattr(model, attribute)
+        yield select(column.label('name')).where(column.is_not(None))
+
+
+def _blob_members(totals):
+    names = db.session.execute(
+        union(*_stored_blobs()).order_by('name').execution_options(yield_per=ROWS_PER_MEMBER)
+    ).scalars()
+    storage = get_storage()
+    last = None
+    for name in names:
+        sha256 = blob_hash(name)
+        # Several names (extensions) can share one blob; the union is sorted, so they are adjacent.
+        if sha256 is None or sha256 == last:
+            continue
+        stored = blob_stat(sha256)
+        if stored is None:
+            continue
+        last = sha256
+        totals['files'] += 1
+        yield from _file_member(f'files/{sha256}', storage, stored)
+
+
+def _legacy_members(totals):
+    storage = get_storage()
+    for subdir, columns in LEGACY_FILE_COLUMNS.items():
+        selects = [select(column.label('name')).where(column.is_not(None)) for column in columns]
+        for name in db.session.execute(union(*selects)).scalars():
+            if blob_hash(name):
+                continue
+            key = f'{subdir}/{name}' if subdir else name
+            stored = storage.stat(key) if is_safe_key(key) else None
+            if stored is None:
+                continue
+            totals['files'] += 1
+            yield from _file_member(f'uploads/{key}', storage, stored)
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _row_members(model, parents, bounds, totals, mtime):
+    table = model.__table__.name
+    columns = archive_columns(model)
+    names = [column.key for column in columns]
+    query = select(*columns).where(model.id <= bounds[model])
+    for foreign_key, parent in parents.items():
+        query = query.where(getattr(model, foreign_key) <= bounds[parent])
+    result = db.session.execute(query.order_by(model.id).execution_options(yield_per=ROWS_PER_MEMBER))
+
+    totals['rows'][table] = 0
+    for number, rows in enumerate(result.partitions(), 1):
+        lines = [
+            json.dumps({name: _json_value(value) for name, value in zip(names, row)}, ensure_ascii=False)
+            for row in rows
+        ]
+        body = ('\n'.join(lines) + '\n').encode()
+        totals['rows'][table] += len(rows)
+        yield from _member(f'data/{table}/{number:06d}.jsonl', len(body), [body], mtime)
+
+
+def export_archive():
+    """Yield the archive as tar bytes. Must be consumed inside an app context."""
+    now = datetime.now(timezone.utc)
+    mtime = int(now.timestamp())
+    bounds = {model: db.session.scalar(select(func.max(model.id))) or 0 for model, _ in ARCHIVE_MODELS}
+    totals = {'rows': {}, 'files': 0}
+
+    yield from _json_member(MANIFEST_NAME, {
+        'format': ARCHIVE_FORMAT,
+        'version': ARCHIVE_VERSION,
+        'created_at': now.isoformat(),
+        'tables': [model.__table__.name for model, _ in ARCHIVE_MODELS],
+    }, mtime)
+    yield from _blob_members(totals)
+    yield from _legacy_members(totals)
+    for model, parents in ARCHIVE_MODELS:
+        yield from _row_members(model, parents, bounds, totals, mtime)
+    yield from _json_member(TOTALS_NAME, totals, mtime)
+    # End-of-archive marker: two zero blocks.
+    yield b'\0' * (2 * _TAR_BLOCK)
+
+
+# ── Import ──
+
+class _RowImporter:
+    """Insert archived rows in batches, remapping ids and counting blob references."""
+
+    def __init__(self):
+        self.models = {model.__table__.name: (model, parents) for model, parents in ARCHIVE_MODELS}
+        self.new_ids = {model: {} for model, _ in ARCHIVE_MODELS if model in (Song, Member)}
+        # Ids of inserted rows with derived files, for the media jobs.
+        self.derived_ids = {model: [] for model in DERIVED_COLUMNS}
+        self.counts = {}
+        self.blob_references = {}
+        self._reference_columns = {}
+        for model, attribute in REFERENCE_COLUMNS:
+            self._reference_columns.setdefault(model, []).append(attribute)
+
+    def _convert(self, model, parents, row):
+        values = {}
+        for column in archive_columns(model):
+            if column.key == 'id' or column.key not in row:
+                continue
+            value = row[column.key]
+            if value is not None and isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            values[column.key] = value
+        for foreign_key, parent in parents.items():
+            try:
+                values[foreign_key] = self.new_ids[parent][values[foreign_key]]
+            except KeyError:
+                raise ValidationError(f'{model.__table__.name} row {row.get("id")} refers to a missing '
+                                      f'{parent.__table__.name}')
+        for attribute in self._reference_columns.get(model, ()):
+            sha256 = blob_hash(values.get(attribute))
+            if sha256:
+                self.blob_references[sha256] = self.blob_references.get(sha256, 0) + 1
+        return values
+
+    def _insert(self, model, old_ids, batch):
+        if model in self.new_ids:
+            statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+            new_ids = db.session.execute(statement, batch).scalars().all()
+            self.new_ids[model].update(zip(old_ids, new_ids))
+        elif model in self.derived_ids:
+            self.derived_ids[model].extend(db.session.execute(insert(model).returning(model.id), batch).scalars())
+        else:
+            db.session.execute(insert(model), batch)
+
+    def load(self, table, fileobj):
+        if table not in self.models:
+            raise ValidationError(f'Unknown table in archive: {table}')
+        model, parents = self.models[table]
+        old_ids, batch = [], []
+        for line in fileobj:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            old_ids.append(row.get('id'))
+            batch.append(self._convert(model, parents, row))
+            self.counts[table] = self.counts.get(table, 0) + 1
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                self._insert(model, old_ids, batch)
+                old_ids, batch = [], []
+        if batch:
+            self._insert(model, old_ids, batch)
+
+
+def _import_blob(name, fileobj, summary, staged):
+    """Stage one ``files/`` member; ``staged`` maps its sha256 to the temp file, or None if stored."""
+    sha256 = name[len('files/'):]
+    if blob_hash(sha256) != sha256:
+        raise ValidationError(f'Invalid file name in archive: {name}')
+    if sha256 in staged or blob_exists(sha256):
+        staged.setdefault(sha256, None)
+        summary['files_skipped'] += 1
+        return
+    tmp_path, stored, _ = stage_stream(fileobj)
+    staged[sha256] = tmp_path
+    if stored != sha256:
+        raise ValidationError(f'Checksum mismatch for {name}')
+    summary['files_stored'] += 1
+
+
+def _store_staged(staged):
+    """Move the staged files into the store under the lock, held until the import commits."""
+    hold_blob_lock()
+    for sha256, tmp_path in staged.items():
+        if tmp_path is not None:
+            store_file(tmp_path, sha256)
+        elif not blob_exists(sha256):
+            raise ValidationError(f'Stored file {sha256} was removed during the import; import again',
+                                  status_code=409)
+
+
+def _discard_staged(staged):
+    for tmp_path in staged.values():
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _import_legacy_file(name, fileobj, summary):
+    key = name[len('uploads/'):]
+    if not is_safe_key(key):
+        raise ValidationError(f'Invalid file name in archive: {name}')
+    storage = get_storage()
+    if storage.exists(key):
+        summary['files_skipped'] += 1
+        return
+    storage.put_stream(key, fileobj)
+    summary['files_stored'] += 1
+
+
+def _read_json(tar, member):
+    try:
+        return json.load(tar.extractfile(member))
+    except ValueError:
+        raise ValidationError(f'{member.name} is not valid JSON')
+
+
+def _check_manifest(manifest):
+    if not isinstance(manifest, dict) or manifest.get('format') != ARCHIVE_FORMAT:
+        raise ValidationError('Not a band archive')
+    if manifest.get('version') != ARCHIVE_VERSION:
+        raise ValidationError(f"Unsupported archive version {manifest.get('version')}")
+
+
+def _import_members(tar, importer, summary, staged):
+    members = iter(tar)
+    first = next(members, None)
+    if first is None or first.name != MANIFEST_NAME:
+        raise ValidationError(f'Not a band archive: {MANIFEST_NAME} must come first')
+    _check_manifest(_read_json(tar, first))
+
+    totals = None
+    for member in members:
+        if not member.isfile():
+            continue
+        if member.name.startswith('files/'):
+            _import_blob(member.name, tar.extractfile(member), summary, staged)
+        elif member.name.startswith('uploads/'):
+            _import_legacy_file(member.name, tar.extractfile(member), summary)
+        elif member.name.startswith('data/'):
+            importer.load(member.name.split('/')[1], tar.extractfile(member))
+        elif member.name == TOTALS_NAME:
+            totals = _read_json(tar, member)
+    return totals
+
+
+def import_archive(fileobj):
+    """Import a bundle from a readable binary stream; returns a summary dict.
+
+    Rows are committed only when the whole bundle was read and its totals
+    match; on any error nothing is committed and the staged files are
+    removed. Legacy files already written stay in the store unreferenced.
+    """
+    importer = _RowImporter()
+    summary = {'rows': importer.counts, 'files_stored': 0, 'files_skipped': 0}
+    staged = {}
+    try:
+        with tarfile.open(fileobj=fileobj, mode='r|') as tar:
+            totals = _import_members(tar, importer, summary, staged)
+        if totals is None:
+            raise ValidationError(f'Archive is truncated: {TOTALS_NAME} missing')
+        expected = {table: count for table, count in totals.get('rows', {}).items() if count}
+        files = summary['files_stored'] + summary['files_skipped']
+        if importer.counts != expected or files != totals.get('files'):
+            raise ValidationError('Archive is incomplete: contents do not match its totals')
+        _store_staged(staged)
+        add_references(db.session.connection(), importer.blob_references)
+        db.session.commit()
+    except tarfile.TarError:
+        db.session.rollback()
+        raise ValidationError('Archive is truncated or not a tar file')
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        _discard_staged(staged)
+
+    # Bulk inserts skip the mapper events that keep these up to date.
+    get_stats_cache().invalidate()
+    enqueue_missing_jobs(importer.derived_ids)
+    return summary
+
+
+archive_cli = AppGroup('archive', help='Export or import the whole archive.')
+
+
+@archive_cli.command('export')
+@click.argument('output', type=click.File('wb'))
+def export_command(output):
+    """Write the archive bundle to OUTPUT ('-' for stdout)."""
+    for chunk in export_archive():
+        output.write(chunk)
+
+
+@archive_cli.command('import')
+@click.argument('source', type=click.File('rb'))
+def import_command(source):
+    """Append the rows and files of the bundle at SOURCE ('-' for stdin)."""
+    started = time.monotonic()
+    try:
+        summary = import_archive(source)
+    except ValidationError as e:
+        raise click.ClickException(e.message)
+    rows = ', '.join(f'{count} {table}' for table, count in summary['rows'].items())
+    click.echo(f"Imported {rows or 'no rows'}; stored {summary['files_stored']} file(s), "
+               f"skipped {summary['files_skipped']} already present "
+               f"({time.monotonic() - started:.1f}s).")
+
+
+def init_archive(app):
+    app.cli.add_command(archive_cli)
@@ -0,0 +1,241 @@
+"""Many song, practice-log and member writes in one request and one commit.
+
+``POST /batch`` takes ``{"operations": [...]}``, at most
+``BATCH_MAX_OPERATIONS`` of them, each like
+
+    {"op": "create", "type": "practice_log", "data": {"song_id": 3, "content": "Set run"}}
+    {"op": "update", "type": "song", "id": 3, "data": {"status": "Completed"}}
+    {"op": "delete", "type": "member", "id": 7}
+
+``type`` is ``song``, ``practice_log`` or ``member`` and ``data`` is the
+body the single-row route takes (a new practice log also names its song).
+
+Every operation is checked before anything is written, with the
+validators.py rules of those routes and one id lookup per type. If any is
+invalid nothing is written: each result carries its error, or 424 for the
+valid operations that were held back. Otherwise the batch is written in one
+transaction, in bulk:
+
+* creates: one executemany INSERT ... RETURNING per type (SQLAlchemy sends
+  it to SQLite a row at a time, so each new id is known to be its row's);
+* updates: one executemany UPDATE by primary key per type and set of
+  columns (several updates of one row are merged, later keys winning);
+* deletes: through the session, like the single-row routes, so cascades,
+  tombstones (tombstones.py) and blob reference counts (blob_store.py) are
+  kept. The rows and their cascaded children are loaded with one query per
+  relationship, and the unit of work issues one executemany DELETE per table.
+
+A row deleted in a batch may not be used by its other operations, nor may
+the practice logs of a song it deletes. Bulk statements skip the mapper
+events: the table versions see them anyway (table_versions.py), and the
+dashboard stats are marked dirty here.
+"""
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import selectinload
+
+from errors import NotFoundError, ValidationError
+from extensions import db
+from models import Member, PracticeLog, Song
+from serialization import row_serializer
+from stats_cache import SONG_STATS_COLUMNS, mark_stats_dirty
+from validators import member_values, practice_log_values, song_values
+
+OPERATIONS = ('create', 'update', 'delete')
+
+# ``values(data, partial)`` validates a body; ``cascades`` are the relationships
+# a delete removes with the row.
+BatchType = namedtuple('BatchType', 'name model values cascades')
+
+BATCH_TYPES = {
+    batch_type.name: batch_type for batch_type in (
+        BatchType('song', Song, song_values, ('media_files', 'practice_logs')),
+        BatchType('practice_log', PracticeLog, practice_log_values, ()),
+        BatchType('member', Member, member_values, ('personal_logs',)),
+    )
+}
+
+
+class _Operation:
+    def __init__(self, op, batch_type, row_id, values):
+        self.op = op
+        self.type = batch_type
+        self.id = row_id
+        self.values = values
+
+
+def _integer(value, name):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValidationError(f"{name} must be an integer")
+    return value
+
+
+def _parse(raw):
+    if not isinstance(raw, dict):
+        raise ValidationError("operation must be an object")
+    op = raw.get('op')
+    if op not in OPERATIONS:
+        raise ValidationError(f"op must be one of: {', '.join(OPERATIONS)}")
+    batch_type = BATCH_TYPES.get(raw.get('type'))
+    if batch_type is None:
+        raise ValidationError(f"type must be one of: {', '.join(BATCH_TYPES)}")
+
+    row_id = None if op == 'create' else _integer(raw.get('id'), 'id')
+    values = {}
+    if op != 'delete':
+        data = raw.get('data')
+        if not data or not isinstance(data, dict):
+            raise ValidationError("data is required")
+        values = batch_type.values(data, partial=op == 'update')
+        if op == 'create' and batch_type.model is PracticeLog:
+            values['song_id'] = _integer(data.get('song_id'), 'song_id')
+    return _Operation(op, batch_type, row_id, values)
+
+
+def _row_references(operation):
+    """``(type name, id)`` of every existing row the operation uses."""
+    if operation.op != 'create':
+        yield operation.type.name, operation.id
+    elif operation.type.model is PracticeLog:
+        yield 'song', operation.values['song_id']
+
+
+def _check_references(operations, errors):
+    wanted = {}
+    for operation in operations.values():
+        for name, row_id in _row_references(operation):
+            wanted.setdefault(name, set()).add(row_id)
+    existing = {}
+    for name, ids in wanted.items():
+        model = BATCH_TYPES[name].model
+        existing[name] = set(db.session.scalars(select(model.id).where(model.id.in_(ids))))
+    deleted = {(operation.type.name, operation.id) for operation in operations.values() if operation.op == 'delete'}
+    cascaded = _cascaded_logs(operations, deleted)
+
+    for index, operation in operations.items():
+        for name, row_id in _row_references(operation):
+            label = name.replace('_', ' ')
+            if row_id not in existing[name]:
+                errors[index] = NotFoundError(f"{label.capitalize()} {row_id} not found")
+            elif operation.op != 'delete' and (name, row_id) in deleted:
+                errors[index] = ValidationError(f"{label.capitalize()} {row_id} is deleted in this batch")
+            elif name == 'practice_log' and row_id in cascaded:
+                errors[index] = ValidationError(f"Song {cascaded[row_id]} is deleted in this batch")
+
+
+def _cascaded_logs(operations, deleted):
+    """``{practice log id: song id}`` of the used logs whose song the batch deletes."""
+    song_ids = {row_id for name, row_id in deleted if name == 'song'}
+    log_ids = {operation.id for operation in operations.values()
+               if operation.type.model is PracticeLog and operation.op != 'create'}
+    if not song_ids or not log_ids:
+        return {}
+    statement = select(PracticeLog.id, PracticeLog.song_id).where(
+        PracticeLog.id.in_(log_ids), PracticeLog.song_id.in_(song_ids))
+    return dict(db.session.execute(statement).all())
+
+
+def _stats_affected(operation):
+    if operation.type.model is PracticeLog:
+        return True
+    if operation.type.model is Song:
+        return operation.op == 'create' or any(name in operation.values for name in SONG_STATS_COLUMNS)
+    return False
+
+
+def _create(operations):
+    by_model = {}
+    for operation in operations:
+        by_model.setdefault(operation.type.model, []).append(operation)
+    for model, group in by_model.items():
+        statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+        new_ids = db.session.execute(statement, [operation.values for operation in group]).scalars().all()
+        for operation, new_id in zip(group, new_ids):
+            operation.id = new_id
+
+
+def _update(operations):
+    merged = {}
+    for operation in operations:
+        merged.setdefault((operation.type.model, operation.id), {}).update(operation.values)
+    groups = {}
+    for (model, row_id), values in merged.items():
+        if values:
+            groups.setdefault((model, frozenset(values)), []).append(dict(values, id=row_id))
+    for (model, _), rows in groups.items():
+        db.session.execute(update(model), rows)
+
+
+def _delete(operations):
+    ids = {}
+    for operation in operations:
+        ids.setdefault(operation.type, set()).add(operation.id)
+    for batch_type, row_ids in ids.items():
+        model = batch_type.model
+        options = [selectinload(getattr(model, name)) for name in batch_type.cascades]
+        for row in db.session.scalars(select(model).where(model.id.in_(row_ids)).options(*options)):
+            db.session.delete(row)
+
+
+def _written_rows(operations):
+    ids = {}
+    for operation in operations:
+        if operation.op != 'delete':
+            ids.setdefault(operation.type.model, set()).add(operation.id)
+    rows = {}
+    for model, row_ids in ids.items():
+        serializer = row_serializer(model)
+        for item in serializer.dump(serializer.query().filter(model.id.in_(row_ids)).all()):
+            rows[model, item['id']] = item
+    return rows
+
+
+def run_batch(operations):
+    """Check ``operations`` and, if all are valid, apply them in one commit.
+
+    Returns ``(results, failed)``: one result dict per operation, in order,
+    and how many were invalid (when non-zero, nothing was written).
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValidationError("operations must be a non-empty list")
+    limit = current_app.config['BATCH_MAX_OPERATIONS']
+    if len(operations) > limit:
+        raise ValidationError(f"A batch can hold at most {limit} operations")
+
+    parsed, errors = {}, {}
+    for index, raw in enumerate(operations):
+        try:
+            parsed[index] = _parse(raw)
+        except ValidationError as e:
+            errors[index] = e
+    _check_references(parsed, errors)
+    if errors:
+        results = [
+            {'index': index, 'status': errors[index].status_code, 'error': errors[index].message}
+            if index in errors else {'index': index, 'status': 424}
+            for index in range(len(operations))
+        ]
+        return results, len(errors)
+
+    ordered = list(parsed.values())
+    try:
+        _create([operation for operation in ordered if operation.op == 'create'])
+        _update([operation for operation in ordered if operation.op == 'update'])
+        _delete([operation for operation in ordered if operation.op == 'delete'])
+        if any(_stats_affected(operation) for operation in ordered if operation.op != 'delete'):
+            mark_stats_dirty(db.session())
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+
+    rows = _written_rows(ordered)
+    results = []
+    for index, operation in enumerate(ordered):
+        result = {'index': index, 'status': 201 if operation.op == 'create' else 200, 'id': operation.id}
+        if operation.op != 'delete':
+            result['data'] = rows[operation.type.model, operation.id]
+        results.append(result)
+    return results, 0
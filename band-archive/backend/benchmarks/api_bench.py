@@ -0,0 +1,321 @@
+"""Throughput and latency of the hot API endpoints, in-process and over HTTP.
+
+Usage (from backend/):
+    python benchmarks/api_bench.py --target client --seconds 5
+    python benchmarks/api_bench.py --target gunicorn --workers 2 --concurrency 8
+    python benchmarks/api_bench.py --output after.json --compare before.json
+
+Seeds a synthetic archive (benchmarks/synthetic.py; same ``--seed``, same
+data) into a SQLite file, then runs each scenario for ``--seconds`` after
+``--warmup`` requests:
+
+* ``client``: the Flask test client, one request at a time, in this process;
+* ``gunicorn``: ``gunicorn -w --workers`` on the same file, driven by
+  ``--concurrency`` keep-alive client threads.
+
+Read scenarios run before write scenarios (votes, uploads), so every read
+sees the freshly seeded archive. Prints one JSON object per scenario with
+req/s and p50/p90/p99 latency. ``--output`` also writes them with the run
+settings and git commit to a file; ``--compare`` prints the change of each
+scenario against such a file.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from app import create_app  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from synthetic import SEARCH_WORDS, add_seed_arguments, seed_archive, seed_arguments  # noqa: E402
+
+BOUNDARY = 'bench-boundary-7d3f'
+
+
+class BenchConfig(TestingConfig):
+    """Loaded by the gunicorn workers through FLASK_CONFIG."""
+    TESTING = False
+    PROFILING_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.getenv('BENCH_DB', '')}"
+    UPLOAD_FOLDER = os.getenv('BENCH_UPLOADS', '')
+
+
+# ── Scenarios ──
+#
+# Each returns ``(method, path, body, headers)`` for one request; ``rng`` is
+# per client thread and ``counts`` holds the seeded row counts.
+
+def _json(body):
+    return json.dumps(body).encode(), {'Content-Type': 'application/json'}
+
+
+def _multipart(filename, content):
+    body = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode() + content + f'\r\n--{BOUNDARY}--\r\n'.encode()
+    return body, {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}
+
+
+def songs_list(rng, counts, args):
+    return 'GET', '/songs', None, {}
+
+
+def songs_page(rng, counts, args):
+    return 'GET', '/songs?limit=50&fields=id,title,artist,status', None, {}
+
+
+def songs_search(rng, counts, args):
+    return 'GET', f'/songs?q={quote(rng.choice(SEARCH_WORDS))}', None, {}
+
+
+def song_detail(rng, counts, args):
+    return 'GET', f"/songs/{rng.randint(1, counts['songs'])}", None, {}
+
+
+def dashboard_stats(rng, counts, args):
+    return 'GET', '/dashboard/stats', None, {}
+
+
+def suggestions_list(rng, counts, args):
+    return 'GET', '/suggestions', None, {}
+
+
+def suggestion_vote(rng, counts, args):
+    body, headers = _json({'vote_type': rng.choice(('up', 'down'))})
+    return 'POST', f"/suggestions/{rng.randint(1, counts['suggestions'])}/vote", body, headers
+
+
+def media_upload(rng, counts, args):
+    # Distinct bytes each time, so every upload is stored rather than deduplicated.
+    content = rng.randbytes(32) + b'\0' * (args.upload_kb * 1024 - 32)
+    body, headers = _multipart('take.mp3', content)
+    return 'POST', f"/songs/{rng.randint(1, counts['songs'])}/media", body, headers
+
+
+READ_SCENARIOS = (songs_list, songs_page, songs_search, song_detail, dashboard_stats, suggestions_list)
+WRITE_SCENARIOS = (suggestion_vote, media_upload)
+SCENARIOS = {scenario.__name__: scenario for scenario in READ_SCENARIOS + WRITE_SCENARIOS}
+
+
+# ── Targets ──
+
+class ClientTarget:
+    """The Flask test client in this process; driven by one thread."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def connect(self):
+        client = self.app.test_client()
+
+        def send(method, path, body, headers):
+            resp = client.open(path, method=method, data=body, headers=headers)
+            return resp.status_code, len(resp.get_data())
+        return send
+
+
+class HttpTarget:
+    """A server on ``127.0.0.1:port``; one keep-alive connection per thread."""
+
+    def __init__(self, port):
+        self.port = port
+
+    def connect(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port)
+
+        def send(method, path, body, headers):
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            return resp.status, len(resp.read())
+        return send
+
+
+def _drive(send, scenario, rng, counts, args, deadline, timings, failures, sizes):
+    while time.monotonic() < deadline:
+        request = scenario(rng, counts, args)
+        start = time.perf_counter()
+        status, size = send(*request)
+        timings.append(time.perf_counter() - start)
+        sizes.append(size)
+        if status >= 400:
+            failures.append(status)
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def run_scenario(target, name, counts, args, concurrency):
+    scenario = SCENARIOS[name]
+    warm = target.connect()
+    rng = random.Random(f'{args.seed}-{name}-warmup')
+    for _ in range(args.warmup):
+        warm(*scenario(rng, counts, args))
+
+    timings, failures, sizes = [], [], []
+    deadline = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=_drive, args=(target.connect(), scenario, random.Random(f'{args.seed}-{name}-{i}'),
+                                              counts, args, deadline, timings, failures, sizes))
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'scenario': name,
+        'requests': len(timings),
+        'errors': len(failures),
+        'req_per_s': round(len(timings) / elapsed, 1),
+        'p50_ms': round(_percentile(timings, 0.50) * 1000, 2),
+        'p90_ms': round(_percentile(timings, 0.90) * 1000, 2),
+        'p99_ms': round(_percentile(timings, 0.99) * 1000, 2),
+        'mean_response_bytes': round(sum(sizes) / len(sizes)),
+    }
+
+
+# ── gunicorn ──
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def start_gunicorn(db_path, uploads, workers, env=None):
+    """Serve BenchConfig on a free port; ``env`` adds environment variables (config overrides)."""
+    port = _free_port()
+    env = dict(os.environ, FLASK_CONFIG='api_bench.BenchConfig', BENCH_DB=db_path, BENCH_UPLOADS=uploads, **(env or {}))
+    server = subprocess.Popen(
+        ['gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+         '--chdir', BACKEND_DIR, '--pythonpath', os.path.dirname(os.path.abspath(__file__)),
+         '--log-level', 'warning', 'app:create_app()'],
+        env=env,
+    )
+    try:
+        _wait_for(port)
+    except BaseException:
+        server.terminate()
+        raise
+    return server, port
+
+
+# ── Reporting ──
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {row['scenario']: row for row in json.load(f)['results']}
+    for row in results:
+        before = baseline.get(row['scenario'])
+        if not before:
+            continue
+        print(json.dumps({
+            'compare': row['scenario'],
+            'req_per_s_change_pct': round((row['req_per_s'] / before['req_per_s'] - 1) * 100, 1),
+            'p50_change_pct': round((row['p50_ms'] / before['p50_ms'] - 1) * 100, 1),
+            'p99_change_pct': round((row['p99_ms'] / before['p99_ms'] - 1) * 100, 1),
+        }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_seed_arguments(parser)
+    parser.add_argument('--target', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads against gunicorn.')
+    parser.add_argument('--seconds', type=float, default=5, help='Measured time per scenario.')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario.')
+    parser.add_argument('--upload-kb', type=int, default=256)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}.")
+    parser.add_argument('--output', help='Write settings and results as JSON to this file.')
+    parser.add_argument('--compare', help='A previous --output file to compare with.')
+    args = parser.parse_args()
+
+    names = [name for name in SCENARIOS if name in args.scenarios.split(',')]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        uploads = os.path.join(tmp, 'uploads')
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        BenchConfig.UPLOAD_FOLDER = uploads
+        app = create_app(BenchConfig)
+        with app.app_context():
+            counts = seed_archive(**seed_arguments(args))
+            db.session.remove()
+
+        server = None
+        if args.target == 'gunicorn':
+            with app.app_context():
+                db.engine.dispose()
+            server, port = start_gunicorn(db_path, uploads, args.workers)
+            target, concurrency = HttpTarget(port), args.concurrency
+        else:
+            target, concurrency = ClientTarget(app), 1
+        try:
+            for name in names:
+                row = run_scenario(target, name, counts, args, concurrency)
+                row.update(target=args.target, workers=args.workers if server else None, concurrency=concurrency)
+                results.append(row)
+                print(json.dumps(row), flush=True)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+                'counts': counts,
+                'results': results,
+            }, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""A post-gig change as single-row requests versus one POST /batch.
+
+Usage (from backend/):
+    python benchmarks/batch_bench.py --items 50 --rounds 20
+
+Seeds the synthetic archive (benchmarks/synthetic.py) into a SQLite file
+with the production pragmas, then ``--rounds`` times applies the change the
+frontend makes after a gig: a new status for ``--items`` songs and a
+practice log on each of them. ``single`` sends one ``PUT /songs/<id>`` and
+one ``POST /songs/<id>/practice-logs`` per song; ``batch`` sends the same
+operations as one ``POST /batch``. Requests go through the Flask test client
+in this process, so the network round-trips ``batch`` also saves are not
+counted. Prints one JSON object per mode with the median time per change
+and the requests, SQL statements and commits it took.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import event  # noqa: E402
+
+from api_bench import BenchConfig  # noqa: E402
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from synthetic import STATUSES, add_seed_arguments, seed_archive, seed_arguments  # noqa: E402
+
+
+def _operations(rng, counts, items):
+    song_ids = rng.sample(range(1, counts['songs'] + 1), items)
+    operations = []
+    for song_id in song_ids:
+        operations.append({'op': 'update', 'type': 'song', 'id': song_id,
+                           'data': {'status': rng.choice(STATUSES)}})
+        operations.append({'op': 'create', 'type': 'practice_log',
+                           'data': {'song_id': song_id, 'content': 'Gig', 'feedback': 'Tight ending'}})
+    return operations
+
+
+def send_single(client, operations):
+    for operation in operations:
+        if operation['op'] == 'update':
+            resp = client.put(f"/songs/{operation['id']}", json=operation['data'])
+        else:
+            data = dict(operation['data'])
+            resp = client.post(f"/songs/{data.pop('song_id')}/practice-logs", json=data)
+        assert resp.status_code < 400, resp.get_json()
+    return len(operations)
+
+
+def send_batch(client, operations):
+    resp = client.post('/batch', json={'operations': operations})
+    assert resp.status_code == 200, resp.get_json()
+    return 1
+
+
+MODES = {'single': send_single, 'batch': send_batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_seed_arguments(parser)
+    parser.add_argument('--items', type=int, default=50, help='Songs changed per round.')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        BenchConfig.UPLOAD_FOLDER = os.path.join(tmp, 'uploads')
+        BenchConfig.BATCH_MAX_OPERATIONS = 2 * args.items
+        app = create_app(BenchConfig)
+        with app.app_context():
+            counts = seed_archive(**seed_arguments(args))
+            db.session.remove()
+            engine = db.engine
+
+        statements, commits = [], []
+        event.listen(engine, 'before_cursor_execute', lambda *a: statements.append(1))
+        event.listen(engine, 'commit', lambda conn: commits.append(1))
+        client = app.test_client()
+        for mode, send in MODES.items():
+            rng = random.Random(f'{args.seed}-{mode}')
+            timings, requests = [], 0
+            statements.clear()
+            commits.clear()
+            for _ in range(args.rounds):
+                operations = _operations(rng, counts, args.items)
+                start = time.perf_counter()
+                requests += send(client, operations)
+                timings.append(time.perf_counter() - start)
+            print(json.dumps({
+                'mode': mode, 'items': args.items, 'rounds': args.rounds,
+                'ms_per_change': round(statistics.median(timings) * 1000, 1),
+                'requests_per_change': requests // args.rounds,
+                'statements_per_change': len(statements) // args.rounds,
+                'commits_per_change': len(commits) // args.rounds,
+            }), flush=True)
+
+
+if __name__ == '__main__':
+    main()
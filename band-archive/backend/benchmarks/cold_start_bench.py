@@ -0,0 +1,148 @@
+"""Cold start: importing the app and running create_app() in a fresh interpreter.
+
+Usage (from backend/):
+    python benchmarks/cold_start_bench.py --runs 10 --workers 2
+
+Migrates a file database once with ``flask schema upgrade``'s code path,
+then starts ``--runs`` fresh Python processes per mode with the production
+settings (``SCHEMA_ON_BOOT=check``) and times, inside each:
+
+* ``import_ms``: ``import app``;
+* ``create_app_ms``: ``create_app()``;
+* ``process_ms``: the whole process, interpreter start-up and exit included,
+  timed from outside.
+
+Modes:
+
+* ``check``: what a worker does now, one read of the stored revision;
+* ``upgrade``: what every worker did before: import Flask-Migrate (counted
+  in ``import_ms``) and run Alembic's ``upgrade()`` on the current database
+  (counted in ``create_app_ms``).
+
+Then ``gunicorn -w --workers`` is started with and without ``--preload``
+and timed until its first ``/songs`` response (``first_response_ms``).
+Prints one JSON object per row with medians.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import app
+if MODE == 'upgrade':
+    import flask_migrate
+imported = time.perf_counter()
+flask_app = app.create_app()
+if MODE == 'upgrade':
+    from schema import MIGRATIONS_DIR, init_migrate
+    with flask_app.app_context():
+        init_migrate(flask_app)
+        flask_migrate.upgrade(directory=MIGRATIONS_DIR)
+created = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000}))
+'''
+
+
+def _environ(tmp):
+    return dict(
+        os.environ,
+        FLASK_CONFIG='config.ProductionConfig',
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        UPLOAD_FOLDER=os.path.join(tmp, 'uploads'),
+        SCHEMA_ON_BOOT='check',
+        MEDIA_WORKERS='0',
+    )
+
+
+def migrate(env):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'schema', 'upgrade'],
+                   cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+
+def run_child(mode, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', f'MODE = {mode!r}\n' + CHILD],
+                            cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True)
+    row = json.loads(result.stdout.splitlines()[-1])
+    row['process_ms'] = (time.perf_counter() - started) * 1000
+    return row
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def first_response(env, workers, preload, timeout=30):
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        ['gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--chdir', BACKEND_DIR,
+         '--log-level', 'warning', *(['--preload'] if preload else []), 'app:create_app()'],
+        env=env,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/songs')
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn did not start')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _median(rows, key):
+    return round(statistics.median(row[key] for row in rows), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Fresh processes per mode.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (0 skips gunicorn).')
+    parser.add_argument('--modes', default='check,upgrade')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _environ(tmp)
+        migrate(env)
+        for mode in args.modes.split(','):
+            run_child(mode, env)  # Warm the page cache and the bytecode cache.
+            rows = [run_child(mode, env) for _ in range(args.runs)]
+            print(json.dumps({
+                'mode': mode, 'runs': args.runs,
+                'import_ms': _median(rows, 'import_ms'),
+                'create_app_ms': _median(rows, 'create_app_ms'),
+                'process_ms': _median(rows, 'process_ms'),
+            }), flush=True)
+        if args.workers:
+            for preload in (False, True):
+                timings = [first_response(env, args.workers, preload) for _ in range(max(args.runs // 2, 1))]
+                print(json.dumps({
+                    'mode': 'gunicorn', 'workers': args.workers, 'preload': preload,
+                    'first_response_ms': round(statistics.median(timings), 1),
+                }), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Measure /songs response size and time per encoding, with and without the body cache.
+
+Usage (from backend/):
+    python benchmarks/compression_bench.py --songs 500
+
+Seeds songs with realistic lyrics and chord charts, then for each encoding
+requests ``GET /songs`` through the test client ``--repeat`` times. The
+``cached`` rows reuse compressed bodies keyed by ETag; ``uncached`` rows run
+with the cache disabled, so every request compresses. Prints one JSON object
+per row.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from compression import available_encodings  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Song  # noqa: E402
+
+WORDS = ('love', 'night', 'road', 'heart', 'light', 'rain', 'home', 'fire', 'dream', 'time',
+         'stay', 'run', 'hold', 'fall', 'sky', 'song', '너', '사랑', '밤', '꿈')
+CHORDS = ('C', 'G', 'Am', 'F', 'Dm', 'Em', 'G7', 'Cmaj7')
+
+
+def seed(songs):
+    rng = random.Random(songs)
+    db.session.execute(insert(Song), [
+        {'title': f'Song {i}', 'artist': f'Artist {i % 50}', 'genre': 'Rock',
+         'lyrics': '\n'.join(' '.join(rng.choices(WORDS, k=7)) for _ in range(40)),
+         'chords': '\n'.join(' | '.join(rng.choices(CHORDS, k=4)) for _ in range(24))}
+        for i in range(songs)
+    ])
+    db.session.commit()
+
+
+def measure(client, encoding, repeat):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    client.get('/songs', headers=headers)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get('/songs', headers=headers)
+        timings.append(time.perf_counter() - start)
+    return len(resp.data), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--songs', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(TestingConfig)
+    with app.app_context():
+        seed(args.songs)
+        client = app.test_client()
+        for mode in ('uncached', 'cached'):
+            app.extensions['compressed_bodies'].max_bytes = 0 if mode == 'uncached' else 32 * 2**20
+            for encoding in (None,) + available_encodings():
+                if encoding is None and mode == 'cached':
+                    continue
+                size, median = measure(client, encoding, args.repeat)
+                print(json.dumps({
+                    'mode': mode if encoding else 'identity',
+                    'encoding': encoding or 'identity',
+                    'songs': args.songs,
+                    'body_bytes': size,
+                    'median_ms': round(median * 1000, 2),
+                }))
+
+
+if __name__ == '__main__':
+    main()
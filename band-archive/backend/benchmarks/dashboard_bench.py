@@ -0,0 +1,171 @@
+"""Measure /dashboard/stats under concurrent gunicorn workers, cache on and off.
+
+Usage (from backend/):
+    python benchmarks/dashboard_bench.py --songs 5000 --logs 50000 --workers 4
+
+Seeds a SQLite file, then for each mode starts ``gunicorn -w N`` on it and
+drives ``GET /dashboard/stats`` from ``--concurrency`` keep-alive client
+threads for ``--seconds``. ``--write-interval`` adds a writer that posts a
+practice log every so often, so the cached run also pays for invalidations.
+Prints one JSON object per mode with throughput and latency percentiles.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from models import PracticeLog, Song  # noqa: E402
+
+STATUSES = ['Practice', 'Completed', 'OnHold']
+
+
+class BenchConfig(TestingConfig):
+    """Loaded by the gunicorn workers through FLASK_CONFIG."""
+    TESTING = False
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.getenv('BENCH_DB', '')}"
+    UPLOAD_FOLDER = os.getenv('BENCH_UPLOADS', '')
+
+
+def seed(path, songs, logs):
+    os.environ['BENCH_DB'] = path
+    BenchConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    BenchConfig.UPLOAD_FOLDER = os.path.join(os.path.dirname(path), 'uploads')
+    app = create_app(BenchConfig)
+    rng = random.Random(songs)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    with app.app_context():
+        db.session.execute(insert(Song), [
+            {'title': f'Song {i}', 'artist': f'Artist {i % 200}', 'status': rng.choice(STATUSES),
+             'lyrics': 'la ' * 400}
+            for i in range(songs)
+        ])
+        db.session.execute(insert(PracticeLog), [
+            {'song_id': rng.randint(1, songs), 'content': 'Run-through ' * 20,
+             'date': start + timedelta(minutes=i)}
+            for i in range(logs)
+        ])
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def _client(port, deadline, timings):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        conn.request('GET', '/dashboard/stats')
+        resp = conn.getresponse()
+        resp.read()
+        timings.append(time.perf_counter() - start)
+        assert resp.status == 200
+
+
+def _writer(port, deadline, interval, song_id):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    while time.monotonic() < deadline:
+        conn.request('POST', f'/songs/{song_id}/practice-logs', body=json.dumps({'content': 'bench'}),
+                      headers={'Content-Type': 'application/json'})
+        conn.getresponse().read()
+        time.sleep(interval)
+
+
+def run(mode, db_path, args):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        FLASK_CONFIG='dashboard_bench.BenchConfig',
+        BENCH_DB=db_path,
+        BENCH_UPLOADS=os.path.join(os.path.dirname(db_path), 'uploads'),
+        DASHBOARD_STATS_TTL_SECONDS='60' if mode == 'cached' else '0',
+    )
+    server = subprocess.Popen(
+        ['gunicorn', '-w', str(args.workers), '-b', f'127.0.0.1:{port}',
+         '--chdir', BACKEND_DIR, '--pythonpath', os.path.dirname(os.path.abspath(__file__)),
+         '--log-level', 'warning', 'app:create_app()'],
+        env=env,
+    )
+    try:
+        _wait_for(port)
+        deadline = time.monotonic() + args.seconds
+        timings = []
+        threads = [threading.Thread(target=_client, args=(port, deadline, timings))
+                   for _ in range(args.concurrency)]
+        if args.write_interval:
+            threads.append(threading.Thread(target=_writer, args=(port, deadline, args.write_interval, 1)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    timings.sort()
+    print(json.dumps({
+        'mode': mode,
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'songs': args.songs,
+        'logs': args.logs,
+        'requests': len(timings),
+        'req_per_s': round(len(timings) / args.seconds, 1),
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 2),
+        'p99_ms': round(timings[int(len(timings) * 0.99)] * 1000, 2),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--songs', type=int, default=5000)
+    parser.add_argument('--logs', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-interval', type=float, default=0,
+                        help='Seconds between practice-log writes during the run (0: read-only).')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        seed(db_path, args.songs, args.logs)
+        for mode in ('uncached', 'cached'):
+            run(mode, db_path, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Compare FTS5 song search against the LIKE scan it replaced.
+
+Usage (from backend/):
+    python benchmarks/search_bench.py --songs 10000 100000
+
+Each size seeds a fresh SQLite file with synthetic Korean/English songs and
+times ``GET /songs?q=...`` through the test client with the FTS index on and
+off. Prints one JSON object per (size, mode, query).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Song  # noqa: E402
+
+COMMON_WORDS = ['사랑', '그대', 'love', 'night']
+QUERIES = ['그대', 'zzzz-no-match']  # plus selective words picked from the vocabulary
+
+
+def _vocabulary(rng, size=20000):
+    """Two/three-syllable Hangul words and short Latin words, like real lyrics."""
+    words = set()
+    while len(words) < size:
+        if rng.random() < 0.7:
+            words.add(''.join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.choice((2, 3)))))
+        else:
+            words.add(''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 8))))
+    return sorted(words)
+
+
+def _lyrics(rng, vocabulary, lines=40):
+    return '\n'.join(
+        ' '.join(rng.choice(COMMON_WORDS) if rng.random() < 0.05 else rng.choice(vocabulary) for _ in range(8))
+        for _ in range(lines)
+    )
+
+
+def seed(count, rng, vocabulary):
+    batch = []
+    for i in range(count):
+        batch.append({
+            'title': f"{rng.choice(vocabulary)} {rng.choice(vocabulary)} {i}",
+            'artist': f"Artist {i % 500}",
+            'status': 'Practice',
+            'lyrics': _lyrics(rng, vocabulary),
+            'chords': 'C G Am F\n' * 20,
+            'memo': rng.choice(['', '카포 2프렛', 'moonlight intro', '템포 120']),
+        })
+        if len(batch) == 5000:
+            db.session.execute(insert(Song), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Song), batch)
+    db.session.commit()
+
+
+def timed(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert resp.status_code == 200
+    timings.sort()
+    return timings[len(timings) // 2], len(resp.get_json())
+
+
+def run(count, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            UPLOAD_FOLDER = os.path.join(tmp, 'uploads')
+
+        app = create_app(BenchConfig)
+        client = app.test_client()
+        rng = random.Random(count)
+        vocabulary = _vocabulary(rng)
+        queries = QUERIES + [w for w in rng.sample(vocabulary, 20) if len(w) >= 3][:2]
+        with app.app_context():
+            seed(count, rng, vocabulary)
+            for mode, fts in (('like', False), ('fts5', True)):
+                app.extensions['song_search_fts'] = fts
+                for q in queries:
+                    median, hits = timed(client, f'/songs?q={q}&fields=title,artist&limit=50', repeat)
+                    print(json.dumps({
+                        'songs': count, 'mode': mode, 'query': q,
+                        'median_ms': round(median * 1000, 2), 'hits': hits,
+                    }, ensure_ascii=False))
+            db.session.remove()
+            db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--songs', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    for count in args.songs:
+        run(count, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Compare list serialization paths: ORM + to_dict() vs row tuples, stdlib json vs orjson.
+
+Usage (from backend/):
+    python benchmarks/serialization_bench.py --songs 10000 --media-per-song 1
+
+Seeds an in-memory database, then times each path over ``--repeat`` runs and
+prints one JSON object per path with rows/s and the peak traced memory of one
+run (tracemalloc). ``endpoint`` rows time ``GET /songs`` end to end through
+the test client with each JSON backend.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from app import create_app  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Media, Song  # noqa: E402
+from serialization import FastJSONProvider, orjson, row_serializer  # noqa: E402
+
+
+def seed(songs, media_per_song):
+    db.session.execute(insert(Song), [
+        {'title': f'Song {i}', 'artist': f'Artist {i % 200}', 'genre': 'Rock',
+         'lyrics': 'la ' * 200, 'notes': 'Capo 2'}
+        for i in range(songs)
+    ])
+    db.session.execute(insert(Media), [
+        {'song_id': song_id, 'filename': f'{song_id:064x}.png', 'original_filename': 'cover.png',
+         'file_type': 'image', 'file_size': 1234}
+        for song_id in range(1, songs + 1) for _ in range(media_per_song)
+    ])
+    db.session.commit()
+
+
+def orm_to_dict(provider):
+    songs = Song.query.options(selectinload(Song.media_files)).order_by(Song.id).all()
+    body = provider.response([song.to_dict() for song in songs]).get_data()
+    db.session.expunge_all()
+    return body
+
+
+def row_tuples(provider):
+    serializer = row_serializer(Song)
+    rows = serializer.query().order_by(Song.id).all()
+    return provider.response(serializer.dump(rows)).get_data()
+
+
+def measure(name, fn, repeat, rows):
+    fn()  # warm caches and compiled serializers
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    median = statistics.median(timings)
+    print(json.dumps({
+        'path': name,
+        'rows': rows,
+        'median_ms': round(median * 1000, 1),
+        'rows_per_s': round(rows / median),
+        'peak_mib': round(peak / 2**20, 1),
+        'body_bytes': len(body),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--songs', type=int, default=10000)
+    parser.add_argument('--media-per-song', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(TestingConfig)
+    stdlib = DefaultJSONProvider(app)
+    paths = [
+        ('orm+to_dict+stdlib', lambda: orm_to_dict(stdlib)),
+        ('tuples+compiled+stdlib', lambda: row_tuples(stdlib)),
+    ]
+    if orjson is not None:
+        fast = FastJSONProvider(app)
+        paths.append(('tuples+compiled+orjson', lambda: row_tuples(fast)))
+
+    with app.app_context():
+        seed(args.songs, args.media_per_song)
+        for name, fn in paths:
+            measure(name, fn, args.repeat, args.songs)
+
+        client = app.test_client()
+        providers = [('stdlib', stdlib)] + ([('orjson', fast)] if orjson is not None else [])
+        for name, provider in providers:
+            app.json = provider
+            measure(f'endpoint GET /songs ({name})', lambda: client.get('/songs').get_data(),
+                    args.repeat, args.songs)
+
+
+if __name__ == '__main__':
+    main()
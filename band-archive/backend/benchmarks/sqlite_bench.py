@@ -0,0 +1,175 @@
+"""Mixed read/write traffic from several worker processes on one SQLite file.
+
+Usage (from backend/):
+    python benchmarks/sqlite_bench.py --workers 4 --seconds 10
+
+Runs the same workload twice: with the connection defaults the app used to
+get (rollback journal, no pragmas) and with ``SQLITE_PRAGMAS`` from config.py.
+Each worker process builds its own app, like a gunicorn worker, and loops
+over a mix of list/dashboard reads and log/vote/song writes through the test
+client. ``--bulk-seconds`` adds one more process that repeatedly holds a write
+transaction that long (like an archive import), which is what starves readers
+of a rollback-journal database. Prints one JSON object per mode with
+throughput, p50/p99 latency and the requests that failed with "database is
+locked".
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import got_request_exception  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from config import Config, TestingConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from models import PracticeLog, Song, SongSuggestion  # noqa: E402
+
+SONGS = 2000
+
+
+def _config(tmp, tuned):
+    class BenchConfig(TestingConfig):
+        TESTING = False  # Let errors become 500 responses instead of raising.
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        UPLOAD_FOLDER = os.path.join(tmp, 'uploads')
+        DASHBOARD_STATS_TTL_SECONDS = 0
+        SQLITE_PRAGMAS = Config.SQLITE_PRAGMAS if tuned else {}
+        # The untuned run keeps pysqlite's own 5 s lock timeout, as before.
+        SQLALCHEMY_ENGINE_OPTIONS = {} if tuned else {'pool_size': 5, 'connect_args': {}}
+    return BenchConfig
+
+
+def seed(tmp):
+    app = create_app(_config(tmp, tuned=False))
+    rng = random.Random(0)
+    with app.app_context():
+        db.session.execute(insert(Song), [
+            {'title': f'Song {i}', 'artist': f'Artist {i % 100}', 'lyrics': 'la ' * 300,
+             'status': rng.choice(['Practice', 'Completed', 'OnHold'])}
+            for i in range(SONGS)
+        ])
+        db.session.execute(insert(PracticeLog), [
+            {'song_id': rng.randint(1, SONGS), 'content': 'Run-through'} for _ in range(20000)
+        ])
+        db.session.execute(insert(SongSuggestion), [
+            {'title': f'Idea {i}', 'artist': 'X', 'link': 'https://example.com'} for i in range(50)
+        ])
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _request(client, rng):
+    song_id = rng.randint(1, SONGS)
+    roll = rng.random()
+    if roll < 0.35:
+        return 'read', client.get('/songs?limit=50&fields=id,title,artist,status')
+    if roll < 0.50:
+        return 'read', client.get('/dashboard/stats')
+    if roll < 0.70:
+        return 'read', client.get(f'/songs/{song_id}/practice-logs?limit=20')
+    if roll < 0.85:
+        return 'write', client.post(f'/songs/{song_id}/practice-logs', json={'content': 'Bench run'})
+    if roll < 0.95:
+        return 'write', client.post(f'/suggestions/{rng.randint(1, 50)}/vote', json={'vote_type': 'up'})
+    return 'write', client.put(f'/songs/{song_id}', json={'memo': f'tempo {rng.randint(60, 180)}'})
+
+
+def worker(tmp, tuned, seconds, seed_value, results):
+    app = create_app(_config(tmp, tuned))
+    client = app.test_client()
+    rng = random.Random(seed_value)
+    timings, errors = [], {'locked': 0, 'other': 0}
+    raised = []
+    got_request_exception.connect(lambda sender, exception, **extra: raised.append(exception), app, weak=False)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        raised.clear()
+        kind, resp = _request(client, rng)
+        timings.append((kind, time.perf_counter() - start))
+        if resp.status_code >= 500:
+            # Unhandled errors reach the signal; /songs catches its own and returns str(e).
+            detail = ' '.join(map(str, raised)) + resp.get_data(as_text=True)
+            errors['locked' if 'database is locked' in detail else 'other'] += 1
+    results.put((timings, errors))
+
+
+def bulk_writer(tmp, tuned, seconds, bulk_seconds):
+    app = create_app(_config(tmp, tuned))
+    deadline = time.monotonic() + seconds
+    with app.app_context():
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            while time.monotonic() - started < bulk_seconds:
+                db.session.execute(insert(PracticeLog), [
+                    {'song_id': 1, 'content': 'Imported ' * 50} for _ in range(1000)
+                ])
+            db.session.commit()
+            time.sleep(0.5)
+
+
+def _percentile(values, q):
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2) if values else None
+
+
+def run(tmp, tuned, args):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(tmp, tuned, args.seconds, i, results))
+        for i in range(args.workers)
+    ]
+    if args.bulk_seconds:
+        processes.append(multiprocessing.Process(
+            target=bulk_writer, args=(tmp, tuned, args.seconds, args.bulk_seconds)))
+    for process in processes:
+        process.start()
+    timings, errors = [], {'locked': 0, 'other': 0}
+    for _ in range(args.workers):
+        worker_timings, worker_errors = results.get()
+        timings.extend(worker_timings)
+        for key in errors:
+            errors[key] += worker_errors[key]
+    for process in processes:
+        process.join()
+
+    reads = sorted(t for kind, t in timings if kind == 'read')
+    writes = sorted(t for kind, t in timings if kind == 'write')
+    print(json.dumps({
+        'mode': 'tuned' if tuned else 'default',
+        'workers': args.workers,
+        'bulk_seconds': args.bulk_seconds,
+        'requests': len(timings),
+        'req_per_s': round(len(timings) / args.seconds, 1),
+        'read_p50_ms': _percentile(reads, 0.5),
+        'read_p99_ms': _percentile(reads, 0.99),
+        'write_p50_ms': _percentile(writes, 0.5),
+        'write_p99_ms': _percentile(writes, 0.99),
+        'locked_errors': errors['locked'],
+        'other_errors': errors['other'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--bulk-seconds', type=float, default=0,
+                        help='Length of the long write transactions to run alongside (0: none).')
+    args = parser.parse_args()
+    for tuned in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            seed(tmp)
+            run(tmp, tuned, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Time the orphaned-upload scan over a large upload folder.
+
+Usage (from backend/):
+    python benchmarks/storage_gc_bench.py --files 100000 --orphans 0.05
+
+Creates ``--files`` blob files with one Media row each (bulk insert), plus
+``--orphans`` of that many unreferenced blobs, in a temporary UPLOAD_FOLDER,
+then times a report-only scan and a deleting scan. Prints one JSON object
+per scan.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from blob_store import blob_path  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Blob, Media, Song  # noqa: E402
+from storage_gc import scan_storage  # noqa: E402
+
+
+def seed(files, orphans):
+    song = Song(title='Bench', artist='Bench')
+    db.session.add(song)
+    db.session.commit()
+    old = time.time() - 7 * 24 * 3600
+    rows, blobs = [], []
+    for i in range(files + orphans):
+        sha256 = hashlib.sha256(str(i).encode()).hexdigest()
+        path = blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x')
+        os.utime(path, (old, old))
+        if i < files:
+            rows.append({'song_id': song.id, 'filename': f'{sha256}.mp3', 'file_type': 'audio', 'file_size': 1})
+            blobs.append({'sha256': sha256, 'size': 1, 'ref_count': 1})
+    db.session.execute(insert(Media), rows)
+    db.session.execute(insert(Blob), blobs)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--orphans', type=float, default=0.05, help='Orphans as a fraction of --files.')
+    args = parser.parse_args()
+
+    upload_folder = tempfile.mkdtemp(prefix='storage-gc-bench-')
+
+    class BenchConfig(TestingConfig):
+        UPLOAD_FOLDER = upload_folder
+
+    try:
+        app = create_app(BenchConfig)
+        with app.app_context():
+            orphans = int(args.files * args.orphans)
+            seed(args.files, orphans)
+            for delete in (False, True):
+                start = time.perf_counter()
+                report = scan_storage(delete=delete)
+                print(json.dumps({
+                    'mode': 'delete' if delete else 'report',
+                    'files': report['files'],
+                    'orphans': sum(report['orphans'].values()),
+                    'deleted': report['deleted'],
+                    'seconds': round(time.perf_counter() - start, 3),
+                }))
+    finally:
+        shutil.rmtree(upload_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Seed a synthetic archive for benchmarks.
+
+``seed_archive(...)`` bulk-inserts songs with lyrics and chord charts of
+realistic size (1.5-4 KB and 0.3-1 KB), their media rows, practice logs,
+members with personal logs, and suggestions with votes. Everything comes
+from one ``random.Random(seed)``, so the same arguments give the same
+archive. Media and personal-log rows carry content-addressed names but no
+files; the benchmarks do not serve them.
+
+Run directly to build a database file to poke at:
+    python benchmarks/synthetic.py --db /tmp/archive.db --songs 2000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from models import Media, Member, PersonalLog, PracticeLog, Song, SongSuggestion  # noqa: E402
+
+# Common words, so searches have hits; the rest of the vocabulary is random.
+SEARCH_WORDS = ('사랑', '그대', 'love', 'night', '바다', 'dream')
+CHORDS = ('C', 'G', 'Am', 'F', 'Dm', 'Em', 'G7', 'Cmaj7', 'E7', 'Bb', 'D/F#')
+STATUSES = ('Practice', 'Completed', 'OnHold')
+GENRES = ('Rock', 'Ballad', 'Indie', 'Jazz', 'Pop', None)
+INSTRUMENTS = ('Vocal', 'Guitar', 'Bass', 'Drums', 'Keys')
+MEDIA_TYPES = (('mp3', 'audio'), ('pdf', 'document'), ('png', 'image'), ('mp4', 'video'))
+BATCH_SIZE = 5000
+
+
+def vocabulary(rng, size=5000):
+    """Two/three-syllable Hangul words and short Latin words."""
+    words = set()
+    while len(words) < size:
+        if rng.random() < 0.6:
+            words.add(''.join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.choice((2, 3)))))
+        else:
+            words.add(''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 8))))
+    return sorted(words)
+
+
+def _line(rng, words, length):
+    return ' '.join(rng.choice(SEARCH_WORDS) if rng.random() < 0.03 else rng.choice(words) for _ in range(length))
+
+
+def _lyrics(rng, words):
+    return '\n'.join(_line(rng, words, rng.randint(5, 9)) for _ in range(rng.randint(30, 60)))
+
+
+def _chords(rng):
+    return '\n'.join(' | '.join(rng.choices(CHORDS, k=4)) for _ in range(rng.randint(16, 40)))
+
+
+def _stored_name(rng, ext):
+    return f'{rng.getrandbits(256):064x}.{ext}'
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def seed_archive(songs=1000, media_per_song=3, logs_per_song=10, members=8,
+                 personal_logs_per_member=20, suggestions=200, seed=0):
+    """Insert the archive into the current app's database; returns the row counts."""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(days=730)
+
+    def moment():
+        return start + timedelta(seconds=rng.randrange(730 * 86400))
+
+    _insert(Song, [{
+        'title': f'{rng.choice(words)} {rng.choice(words)}',
+        'artist': f'Artist {rng.randrange(max(songs // 10, 1))}',
+        'status': rng.choice(STATUSES),
+        'genre': rng.choice(GENRES),
+        'difficulty': rng.randint(1, 5),
+        'lyrics': _lyrics(rng, words),
+        'chords': _chords(rng),
+        'memo': rng.choice(('', '카포 2프렛', 'intro x2', 'tempo 120')),
+        'link': f'https://example.com/watch?v={i}',
+        'created_at': moment(),
+        'updated_at': now,
+    } for i in range(songs)])
+
+    media = []
+    for song_id in range(1, songs + 1):
+        for _ in range(rng.randint(0, 2 * media_per_song)):
+            ext, file_type = rng.choice(MEDIA_TYPES)
+            media.append({
+                'song_id': song_id, 'filename': _stored_name(rng, ext),
+                'original_filename': f'{rng.choice(words)}.{ext}', 'file_type': file_type,
+                'file_size': rng.randint(100_000, 20_000_000), 'created_at': moment(), 'updated_at': now,
+            })
+    _insert(Media, media)
+
+    _insert(PracticeLog, [{
+        'song_id': rng.randint(1, songs), 'date': moment(),
+        'content': _line(rng, words, rng.randint(5, 30)),
+        'feedback': _line(rng, words, rng.randint(0, 15)),
+        'created_at': now, 'updated_at': now,
+    } for _ in range(songs * logs_per_song)])
+
+    _insert(Member, [{
+        'name': f'Member {i}', 'instrument': rng.choice(INSTRUMENTS), 'created_at': now, 'updated_at': now,
+    } for i in range(members)])
+    _insert(PersonalLog, [{
+        'member_id': member_id, 'title': _line(rng, words, 3), 'filename': _stored_name(rng, 'mp3'),
+        'original_filename': 'take.mp3', 'file_type': 'audio', 'created_at': moment(), 'updated_at': now,
+    } for member_id in range(1, members + 1) for _ in range(personal_logs_per_member)])
+
+    _insert(SongSuggestion, [{
+        'title': _line(rng, words, 2), 'artist': f'Artist {rng.randrange(100)}',
+        'link': f'https://example.com/s/{i}', 'memo': _line(rng, words, 6),
+        'thumbs_up': rng.randint(0, 20), 'thumbs_down': rng.randint(0, 5), 'created_at': moment(), 'updated_at': now,
+    } for i in range(suggestions)])
+    db.session.commit()
+
+    return {
+        'songs': songs, 'media': len(media), 'practice_logs': songs * logs_per_song, 'members': members,
+        'personal_logs': members * personal_logs_per_member, 'suggestions': suggestions,
+    }
+
+
+def add_seed_arguments(parser):
+    parser.add_argument('--songs', type=int, default=1000)
+    parser.add_argument('--media-per-song', type=int, default=3, help='Average; 0 to twice this per song.')
+    parser.add_argument('--logs-per-song', type=int, default=10)
+    parser.add_argument('--members', type=int, default=8)
+    parser.add_argument('--personal-logs-per-member', type=int, default=20)
+    parser.add_argument('--suggestions', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def seed_arguments(args):
+    return {
+        'songs': args.songs, 'media_per_song': args.media_per_song, 'logs_per_song': args.logs_per_song,
+        'members': args.members, 'personal_logs_per_member': args.personal_logs_per_member,
+        'suggestions': args.suggestions, 'seed': args.seed,
+    }
+
+
+def main():
+    import json
+
+    from app import create_app
+    from config import TestingConfig
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='SQLite file to create.')
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    class SeedConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.abspath(args.db)}'
+        UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(args.db)), 'uploads')
+
+    app = create_app(SeedConfig)
+    with app.app_context():
+        print(json.dumps(seed_archive(**seed_arguments(args))))
+
+
+if __name__ == '__main__':
+    main()
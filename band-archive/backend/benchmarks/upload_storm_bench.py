@@ -0,0 +1,180 @@
+"""Read latency during an upload storm, with and without upload admission.
+
+Usage (from backend/):
+    python benchmarks/upload_storm_bench.py --workers 4 --uploaders 6 --upload-mb 16 --upload-kbps 4096
+
+Seeds the synthetic archive (benchmarks/synthetic.py), then for each mode
+starts ``gunicorn -w --workers`` (sync workers) on it:
+
+* ``off``: UPLOAD_MAX_CONCURRENT and UPLOAD_MAX_INFLIGHT_BYTES are 0, so
+  every upload runs;
+* ``on``: at most ``--max-concurrent`` uploads (default: half the workers).
+
+``--readers`` threads request the song list and the dashboard for
+``--seconds``, first alone (``idle``) and then while ``--uploaders`` threads
+send ``--upload-mb`` uploads paced at ``--upload-kbps`` each (``storm``),
+the way phones on the rehearsal-room Wi-Fi do. An uploader sends the
+headers, gives the server a moment to refuse, and only then streams the
+body; a refused uploader waits ``min(Retry-After, 1)`` seconds and tries
+again. Prints one JSON object per mode and phase.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import select
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from api_bench import BenchConfig, HttpTarget, _multipart, _percentile, start_gunicorn  # noqa: E402
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from synthetic import add_seed_arguments, seed_archive, seed_arguments  # noqa: E402
+
+READ_PATHS = ('/songs?limit=50&fields=id,title,artist,status', '/dashboard/stats')
+# How long an uploader waits after the headers for an early refusal.
+REFUSAL_WAIT_SECONDS = 0.2
+SENDS_PER_SECOND = 20
+
+
+def _read_loop(target, stop, timings, errors):
+    send = target.connect()
+    rng = random.Random()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            status, _ = send('GET', rng.choice(READ_PATHS), None, {})
+        except OSError:
+            status = 599
+            send = target.connect()
+        timings.append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append(status)
+
+
+def _upload_once(port, head, body, kbps, stop):
+    """One paced upload; returns ``(status, retry_after)``, status None if stopped or cut off."""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=120)
+    try:
+        sock.sendall(head)
+        readable, _, _ = select.select([sock], [], [], REFUSAL_WAIT_SECONDS)
+        if not readable:
+            step = max(kbps * 1024 // SENDS_PER_SECOND, 1)
+            for start in range(0, len(body), step):
+                if stop.is_set():
+                    return None, None
+                sock.sendall(body[start:start + step])
+                time.sleep(1 / SENDS_PER_SECOND)
+        response = http.client.HTTPResponse(sock)
+        response.begin()
+        response.read()
+        return response.status, response.getheader('Retry-After')
+    except OSError:
+        return None, None
+    finally:
+        sock.close()
+
+
+def _upload_loop(port, song_id, args, stop, outcomes):
+    content = os.urandom(32) + b'\0' * (args.upload_mb * 1024 * 1024 - 32)
+    body, headers = _multipart('rehearsal.mp4', content)
+    head = (f'POST /songs/{song_id}/media HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+            f"Content-Type: {headers['Content-Type']}\r\nContent-Length: {len(body)}\r\n\r\n").encode()
+    while not stop.is_set():
+        status, retry_after = _upload_once(port, head, body, args.upload_kbps, stop)
+        if status == 503:
+            outcomes['refused'] += 1
+            stop.wait(min(float(retry_after or 1), 1))
+        elif status is not None and status < 400:
+            outcomes['done'] += 1
+        elif not stop.is_set():
+            outcomes['errors'] += 1
+
+
+def run_phase(port, args, uploaders, counts):
+    stop = threading.Event()
+    timings, errors = [], []
+    outcomes = {'done': 0, 'refused': 0, 'errors': 0}
+    target = HttpTarget(port)
+    threads = [threading.Thread(target=_upload_loop, args=(port, random.Random(i).randint(1, counts['songs']),
+                                                           args, stop, outcomes))
+               for i in range(uploaders)]
+    for thread in threads:
+        thread.start()
+    if uploaders:
+        time.sleep(1)  # Let the uploads occupy whatever they can.
+    readers = [threading.Thread(target=_read_loop, args=(target, stop, timings, errors)) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for thread in readers:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in readers + threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'reads': len(timings),
+        'read_errors': len(errors),
+        'read_req_per_s': round(len(timings) / elapsed, 1),
+        'read_p50_ms': round(_percentile(timings, 0.50) * 1000, 1) if timings else None,
+        'read_p99_ms': round(_percentile(timings, 0.99) * 1000, 1) if timings else None,
+        'uploads_done': outcomes['done'],
+        'uploads_refused': outcomes['refused'],
+        'upload_errors': outcomes['errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_seed_arguments(parser)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn sync workers.')
+    parser.add_argument('--max-concurrent', type=int, default=None,
+                        help='UPLOAD_MAX_CONCURRENT in the "on" mode (default: workers // 2).')
+    parser.add_argument('--readers', type=int, default=4, help='Client threads reading.')
+    parser.add_argument('--uploaders', type=int, default=6, help='Client threads uploading.')
+    parser.add_argument('--upload-mb', type=int, default=16)
+    parser.add_argument('--upload-kbps', type=int, default=4096, help='Send rate of each uploader.')
+    parser.add_argument('--seconds', type=float, default=10, help='Measured time per phase.')
+    parser.add_argument('--modes', default='off,on')
+    args = parser.parse_args()
+    max_concurrent = args.max_concurrent or max(args.workers // 2, 1)
+
+    modes = {
+        'off': {'UPLOAD_MAX_CONCURRENT': '0', 'UPLOAD_MAX_INFLIGHT_BYTES': '0'},
+        'on': {'UPLOAD_MAX_CONCURRENT': str(max_concurrent)},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        uploads = os.path.join(tmp, 'uploads')
+        BenchConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        BenchConfig.UPLOAD_FOLDER = uploads
+        app = create_app(BenchConfig)
+        with app.app_context():
+            counts = seed_archive(**seed_arguments(args))
+            db.session.remove()
+            db.engine.dispose()
+
+        for mode in args.modes.split(','):
+            server, port = start_gunicorn(db_path, uploads, args.workers, env=modes[mode])
+            try:
+                for phase, uploaders in (('idle', 0), ('storm', args.uploaders)):
+                    row = {'mode': mode, 'phase': phase, 'workers': args.workers,
+                           'max_concurrent': max_concurrent if mode == 'on' else None}
+                    row.update(run_phase(port, args, uploaders, counts))
+                    print(json.dumps(row), flush=True)
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""Content-addressed storage for uploaded files.
+
+Every upload is hashed while it is written and stored once under the
+key ``blobs/ab/cd/<sha256>`` of the storage backend (storage.py). Rows refer to it by the name
+``<sha256>.<ext>`` (the extension keeps MIME detection working), and the
+``Blob`` table counts those references across ``Media.filename``,
+``PracticeLog.recording`` and ``PersonalLog.filename``. The counts are kept
+by mapper events, so ORM cascades (deleting a song or member) are counted
+too; a blob's file is unlinked after the commit that drops its last
+reference.
+
+Storing a file and unlinking a blob take the store lock, an ``flock`` shared
+by every process using UPLOAD_FOLDER. A session that stores a file keeps it
+until its transaction ends, so the rows referring to the blob are committed
+before any unlink can look at it; the unlink then re-reads the blob's count
+and leaves a blob that was referenced again in the meantime. Store files
+before writing rows, so no session waits for the lock while it holds
+SQLite's write lock.
+
+Files uploaded before the store existed keep their flat random names and
+are left alone here; ``flask storage reshard`` moves them in.
+"""
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, event, insert, inspect, select, update
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+from models import Blob, Media, PersonalLog, PracticeLog
+from stamp_files import stamp_path
+from storage import get_storage, sharded_key
+
+BLOB_SUBDIR = 'blobs'
+BLOB_LOCK_NAME = 'blob-store.lock'
+READ_BLOCK_SIZE = 64 * 1024
+
+_BLOB_NAME = re.compile(r'^([0-9a-f]{64})(?:\.[a-z0-9]+)?$')
+
+# Model attributes that hold a stored file name.
+REFERENCE_COLUMNS = (
+    (Media, 'filename'),
+    (PracticeLog, 'recording'),
+    (PersonalLog, 'filename'),
+)
+
+
+def blob_hash(filename):
+    """Return the sha256 of a content-addressed name, or None for legacy names."""
+    if not filename:
+        return None
+    match = _BLOB_NAME.match(filename)
+    return match.group(1) if match else None
+
+
+def blob_name(sha256, original_filename):
+    ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
+    return f'{sha256}.{ext}' if ext else sha256
+
+
+def blob_root():
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], BLOB_SUBDIR)
+
+
+def blob_relative_path(sha256):
+    """The blob's storage key."""
+    return sharded_key(BLOB_SUBDIR, sha256)
+
+
+def blob_path(sha256):
+    """The blob's path under UPLOAD_FOLDER; only meaningful with local storage."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], *blob_relative_path(sha256).split('/'))
+
+
+def blob_stat(sha256):
+    return get_storage().stat(blob_relative_path(sha256))
+
+
+def blob_exists(sha256):
+    return get_storage().exists(blob_relative_path(sha256))
+
+
+def _hold_blob_lock(session):
+    """Take the store lock for ``session``; it is released when the transaction ends."""
+    if 'blob_lock' not in session.info:
+        path = stamp_path(BLOB_LOCK_NAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock = open(path, 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        session.info['blob_lock'] = lock
+
+
+def _release_blob_lock(session):
+    lock = session.info.pop('blob_lock', None)
+    if lock is not None:
+        lock.close()
+
+
+def hold_blob_lock():
+    """Take the store lock until the current transaction of ``db.session`` ends."""
+    session = db.session()
+    if not session.in_transaction():
+        session.begin()  # So that ending it, even without SQL, releases the lock.
+    _hold_blob_lock(session)
+
+
+def claim_blob(sha256):
+    """Keep a stored blob until the current transaction ends; False if it is gone."""
+    hold_blob_lock()
+    return blob_exists(sha256)
+
+
+def store_file(path, sha256):
+    """Move an already-hashed local file into the store; a duplicate is just discarded."""
+    hold_blob_lock()
+    storage = get_storage()
+    key = blob_relative_path(sha256)
+    if storage.exists(key):
+        os.remove(path)
+    else:
+        storage.put_file(key, path)
+
+
+def stage_stream(stream):
+    """Write ``stream`` to a local temp file, hashing as it goes; no lock is taken.
+
+    Returns ``(path, sha256, size)``; hand the path to ``store_file``.
+    """
+    tmp_dir = os.path.join(blob_root(), '.tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                block = stream.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                f.write(block)
+                hasher.update(block)
+                size += len(block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, hasher.hexdigest(), size
+
+
+def store_stream(stream):
+    """Write ``stream`` into the store, hashing as it goes. Returns ``(sha256, size)``.
+
+    The bytes go to a local temp file first: the key is not known until the
+    last byte is hashed.
+    """
+    tmp_path, sha256, size = stage_stream(stream)
+    try:
+        store_file(tmp_path, sha256)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, size
+
+
+def store_upload(file_storage):
+    """Store a Werkzeug ``FileStorage``; returns ``(stored_name, size)``."""
+    sha256, size = store_stream(file_storage.stream)
+    return blob_name(sha256, file_storage.filename), size
+
+
+# ── Reference counting ──
+
+def _add_reference(connection, target, sha256):
+    session = object_session(target)
+    if session is not None:
+        # The same flush may have dropped the last reference a moment ago.
+        session.info.get('unreferenced_blobs', set()).discard(sha256)
+    updated = connection.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+    ).rowcount
+    if not updated:
+        stored = blob_stat(sha256)
+        size = stored.size if stored else None
+        connection.execute(insert(Blob).values(sha256=sha256, size=size, ref_count=1))
+
+
+def add_references(connection, counts, batch_size=500):
+    """Add ``{sha256: count}`` references for rows inserted without mapper events (bulk imports)."""
+    shas = sorted(counts)
+    for start in range(0, len(shas), batch_size):
+        batch = shas[start:start + batch_size]
+        existing = set(connection.execute(select(Blob.sha256).where(Blob.sha256.in_(batch))).scalars())
+        if existing:
+            connection.execute(
+                update(Blob).where(Blob.sha256 == bindparam('b_sha256'))
+                .values(ref_count=Blob.ref_count + bindparam('b_count')),
+                [{'b_sha256': sha256, 'b_count': counts[sha256]} for sha256 in batch if sha256 in existing],
+            )
+        new = [sha256 for sha256 in batch if sha256 not in existing]
+        if new:
+            sizes = {sha256: blob_stat(sha256) for sha256 in new}
+            connection.execute(insert(Blob), [
+                {'sha256': sha256, 'ref_count': counts[sha256],
+                 'size': sizes[sha256].size if sizes[sha256] else None}
+                for sha256 in new
+            ])
+
+
+def _drop_reference(connection, target, sha256):
+    connection.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count - 1)
+    )
+    remaining = connection.execute(select(Blob.ref_count).where(Blob.sha256 == sha256)).scalar()
+    if remaining is not None and remaining <= 0:
+        connection.execute(delete(Blob).where(Blob.sha256 == sha256))
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('unreferenced_blobs', set()).add(sha256)
+
+
+def _register_reference_events(model, attribute):
+    def after_insert(mapper, connection, target):
+        sha256 = blob_hash(getattr(target, attribute))
+        if sha256:
+            _add_reference(connection, target, sha256)
+
+    def after_update(mapper, connection, target):
+        history = inspect(target).attrs[attribute].history
+        if not history.has_changes():
+            return
+        for old in history.deleted:
+            sha256 = blob_hash(old)
+            if sha256:
+                _drop_reference(connection, target, sha256)
+        for new in history.added:
+            sha256 = blob_hash(new)
+            if sha256:
+                _add_reference(connection, target, sha256)
+
+    def after_delete(mapper, connection, target):
+        sha256 = blob_hash(getattr(target, attribute))
+        if sha256:
+            _drop_reference(connection, target, sha256)
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'after_update', after_update)
+    event.listen(model, 'after_delete', after_delete)
+
+
+for _model, _attribute in REFERENCE_COLUMNS:
+    _register_reference_events(_model, _attribute)
+
+
+@event.listens_for(Session, 'after_commit')
+def _unlink_unreferenced_blobs(session):
+    shas = session.info.pop('unreferenced_blobs', ())
+    try:
+        if shas:
+            _hold_blob_lock(session)
+            # The session cannot run SQL after its commit; re-read the counts
+            # another session may have raised since on a connection of its own.
+            with session.get_bind().connect() as connection:
+                referenced = set(connection.execute(select(Blob.sha256).where(Blob.sha256.in_(shas))).scalars())
+            storage = get_storage()
+            for sha256 in shas:
+                if sha256 not in referenced:
+                    storage.delete(blob_relative_path(sha256))
+    finally:
+        _release_blob_lock(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_unreferenced_blobs(session):
+    session.info.pop('unreferenced_blobs', None)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _release_blob_lock_at_end(session, transaction):
+    if transaction.parent is None:
+        _release_blob_lock(session)
@@ -0,0 +1,191 @@
+"""Zip bundles of a song's (or a setlist's) files for download.
+
+A bundle has one folder per song holding ``lyrics.txt`` and ``chords.txt``,
+the song's media under their original names and its practice-log
+recordings under ``practice/``. Rows are read and files resolved before
+the first byte is sent; the zip itself is written while it streams, a
+READ_BLOCK_SIZE block at a time, with sizes and checksums in data
+descriptors after each entry, so no temporary file is needed. Audio,
+video, images and PDFs are already compressed and are stored as is;
+text and other files are deflated.
+"""
+import re
+import time
+import zipfile
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import select
+
+from blob_store import READ_BLOCK_SIZE
+from extensions import db
+from media_files import media_key
+from models import Media, PracticeLog, Song
+from storage import get_storage
+
+# Stored without compression: deflate gains nothing on these and costs CPU.
+STORED_EXTENSIONS = {
+    'mp3', 'm4a', 'aac', 'ogg', 'flac',
+    'mp4', 'webm', 'mov', 'avi', 'mkv',
+    'png', 'jpg', 'jpeg', 'gif', 'webp',
+    'pdf',
+}
+
+# Zip timestamps start in 1980.
+_ZIP_EPOCH = time.mktime((1980, 1, 1, 0, 0, 0, 0, 0, -1))
+_UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+BundleEntry = namedtuple('BundleEntry', 'name key data mtime size')
+
+
+def safe_entry_name(name, fallback):
+    """One path component for a zip entry: no separators, no leading dots."""
+    name = _UNSAFE_NAME.sub('_', name or '').strip(' .')
+    return name or fallback
+
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+class _UniqueNames:
+    """Suffix ``name (2).ext`` to names already used in a folder."""
+
+    def __init__(self):
+        self._used = set()
+
+    def __call__(self, name):
+        stem, dot, ext = name.rpartition('.')
+        if not dot:
+            stem, ext = name, ''
+        candidate, n = name, 1
+        while candidate.lower() in self._used:
+            n += 1
+            candidate = f'{stem} ({n}).{ext}' if dot else f'{stem} ({n})'
+        self._used.add(candidate.lower())
+        return candidate
+
+
+def _file_entry(name, filename, subdir=None):
+    key = media_key(filename, subdir)
+    stored = get_storage().stat(key) if key else None
+    if stored is None:
+        current_app.logger.warning('Leaving %s out of a bundle: file is missing', filename)
+        return None
+    return BundleEntry(name, key, None, stored.mtime, stored.size)
+
+
+def _song_entries(song, media, logs, folder):
+    unique = _UniqueNames()
+    mtime = song.updated_at.timestamp() if song.updated_at else time.time()
+    for text_name, text in (('lyrics.txt', song.lyrics), ('chords.txt', song.chords)):
+        if text:
+            yield BundleEntry(f'{folder}/{unique(text_name)}', None, text.encode(), mtime, None)
+    for item in media:
+        name = safe_entry_name(item.original_filename, item.filename)
+        entry = _file_entry(f'{folder}/{unique(name)}', item.filename)
+        if entry:
+            yield entry
+    for log in logs:
+        ext = _extension(log.recording)
+        # Older rows may have no date.
+        name = f'{log.date:%Y-%m-%d}-{log.id}' if log.date else str(log.id)
+        if ext:
+            name = f'{name}.{ext}'
+        entry = _file_entry(f'{folder}/practice/{name}', log.recording)
+        if entry:
+            yield entry
+
+
+def bundle_entries(song_ids, numbered=False):
+    """Entries for the songs in ``song_ids``, in that order.
+
+    Returns None when one of the songs does not exist. With ``numbered``
+    the folders are prefixed ``01``, ``02``... to keep the setlist order.
+    """
+    songs = {song.id: song for song in db.session.scalars(select(Song).where(Song.id.in_(song_ids)))}
+    if len(songs) != len(song_ids):
+        return None
+    media, logs = {}, {}
+    for item in db.session.scalars(select(Media).where(Media.song_id.in_(song_ids)).order_by(Media.id)):
+        media.setdefault(item.song_id, []).append(item)
+    for log in db.session.scalars(
+        select(PracticeLog)
+        .where(PracticeLog.song_id.in_(song_ids), PracticeLog.recording.is_not(None))
+        .order_by(PracticeLog.date, PracticeLog.id)
+    ):
+        logs.setdefault(log.song_id, []).append(log)
+
+    entries = []
+    folders = _UniqueNames()
+    for position, song_id in enumerate(song_ids, 1):
+        song = songs[song_id]
+        folder = safe_entry_name(f'{song.title} - {song.artist}', f'song-{song.id}')
+        if numbered:
+            folder = f'{position:02d} {folder}'
+        entries.extend(_song_entries(song, media.get(song_id, ()), logs.get(song_id, ()), folders(folder)))
+    return entries
+
+
+class _ZipSink:
+    """Write-only target for ZipFile; what was written is taken by the generator.
+
+    Having no ``tell``/``seek`` makes ZipFile write data descriptors instead
+    of seeking back to patch each local header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def _zip_info(name, mtime, size):
+    info = zipfile.ZipInfo(name, date_time=time.localtime(max(mtime, _ZIP_EPOCH))[:6])
+    stored = _extension(name) in STORED_EXTENSIONS
+    info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+    # Lets ZipFile choose Zip64 headers up front for files near 4 GB.
+    info.file_size = size
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_zip(entries):
+    """A generator of a zip of ``entries``, in chunks of about READ_BLOCK_SIZE.
+
+    The storage is looked up here: the body is iterated after the request
+    context is gone.
+    """
+    return _zip_chunks(entries, get_storage())
+
+
+def _zip_chunks(entries, storage):
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for entry in entries:
+            if entry.key is None:
+                archive.writestr(_zip_info(entry.name, entry.mtime, len(entry.data)), entry.data)
+            else:
+                with archive.open(_zip_info(entry.name, entry.mtime, entry.size), 'w') as target:
+                    for block in storage.get_range(entry.key):
+                        target.write(block)
+                        # Deflate hands over small pieces; send them a block at a time.
+                        if sink.size >= READ_BLOCK_SIZE:
+                            yield sink.take()
+            if sink.size >= READ_BLOCK_SIZE:
+                yield sink.take()
+    if data := sink.take():
+        yield data
@@ -0,0 +1,122 @@
+"""Negotiated gzip/brotli compression of API responses.
+
+``/songs`` with lyrics and chord charts is mostly repetitive text, so JSON
+(and other text) bodies of at least ``COMPRESS_MIN_SIZE`` bytes are sent
+with the best encoding the client accepts: brotli when the optional
+``brotli`` package is installed, else stdlib gzip.
+
+Left alone:
+
+* file responses from ``/uploads`` (``direct_passthrough``) - audio, video
+  and images are already compressed, and Range requests need the bytes as
+  stored; only the types in ``COMPRESSIBLE_MIMETYPES`` qualify anyway;
+* streamed responses, non-200 responses and bodies that already carry a
+  ``Content-Encoding``.
+
+Responses with an ETag (``@versioned`` views) are compressed once per tag
+and encoding: the compressed bodies are kept in a per-app LRU of at most
+``COMPRESS_CACHE_MAX_BYTES`` so repeated list requests skip recompression.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by ``(etag, encoding)``, bounded in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    # mtime=0 keeps the output identical for identical input.
+    return gzip.compress(data, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or not _compressible(response)):
+        return response
+
+    # The body depends on Accept-Encoding from here on, compressed or not.
+    response.vary.add('Accept-Encoding')
+    config = current_app.config
+    if response.content_length is not None and response.content_length < config['COMPRESS_MIN_SIZE']:
+        return response
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    cache = current_app.extensions['compressed_bodies']
+    key = (etag, weak, encoding)
+    body = cache.get(key) if etag else None
+    if body is None:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        body = compress(data, encoding, config)
+        if etag:
+            cache.put(key, body)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag and not weak:
+        # A strong tag names exact bytes; the compressed body needs its own.
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def init_compression(app):
+    app.extensions['compressed_bodies'] = CompressedBodyCache(app.config['COMPRESS_CACHE_MAX_BYTES'])
+    if app.config['COMPRESS_RESPONSES']:
+        app.after_request(compress_response)
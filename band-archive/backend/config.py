@@ -5,19 +5,116 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MAX_CONTENT_LENGTH = 200 * 1024 * 1024  # 200MB
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+    # Where uploads are kept (storage.py): 'local' (UPLOAD_FOLDER) or 's3' (S3_BUCKET under
+    # S3_PREFIX; S3_ENDPOINT_URL for MinIO/R2 and other S3-compatible services). boto3 reads
+    # credentials from the AWS_* environment variables. UPLOAD_FOLDER still holds scratch
+    # files (partial uploads, temp files) with 's3'; MEDIA_SENDFILE applies to 'local' only.
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')
+    S3_BUCKET = os.getenv('S3_BUCKET')
+    S3_PREFIX = os.getenv('S3_PREFIX', '')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
+    S3_REGION = os.getenv('S3_REGION') or None
+    # What create_app() does about the schema (schema.py). It reads the revision stored in
+    # alembic_version and, when that is current, nothing else. Otherwise 'check' refuses to
+    # start (deploys run `flask schema upgrade` before the workers), 'migrate' upgrades in
+    # place, and 'create_all' builds the tables from the models without Alembic (tests).
+    SCHEMA_ON_BOOT = os.getenv('SCHEMA_ON_BOOT', 'check')
+    # Run on every new SQLite connection (database.py). WAL lets readers continue while
+    # a writer commits; synchronous=normal is safe with WAL (a power cut can lose the
+    # last commits, never corrupt the file); busy_timeout makes concurrent writers wait
+    # for the lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'busy_timeout': 5000,  # ms
+        'cache_size': -16000,  # negative means KiB: 16MB page cache per connection
+        'mmap_size': 128 * 1024 * 1024,
+        'temp_store': 'memory',
+        'journal_size_limit': 64 * 1024 * 1024,
+    }
+    # Chunked uploads (routes/upload_sessions.py): total file size, size of one PUT,
+    # and how long an abandoned session keeps its partial file.
+    MAX_UPLOAD_SIZE = MAX_CONTENT_LENGTH
+    UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024  # 16MB
+    UPLOAD_SESSION_TTL_HOURS = 24
+    # Upload admission (upload_admission.py): uploads running at once, and their declared
+    # body bytes, across every worker sharing UPLOAD_FOLDER. Keep the count below the
+    # number of gunicorn workers so reads always find a free one. Over a limit an upload
+    # gets 503 with Retry-After. 0 turns a limit off.
+    UPLOAD_MAX_CONCURRENT = int(os.getenv('UPLOAD_MAX_CONCURRENT', '2'))
+    UPLOAD_MAX_INFLIGHT_BYTES = int(os.getenv('UPLOAD_MAX_INFLIGHT_BYTES', str(2 * MAX_CONTENT_LENGTH)))
+    UPLOAD_RETRY_AFTER_SECONDS = 10
+    # /uploads serving (media_files.py). MEDIA_SENDFILE hands the bytes to the front
+    # server: None, 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx, which
+    # must map MEDIA_ACCEL_REDIRECT_PREFIX as an internal location onto UPLOAD_FOLDER).
+    MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+    MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE') or None
+    MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-uploads')
+    # Processes per app process that build thumbnails, previews and waveforms
+    # (media_jobs.py). 0 leaves the queue to `flask media-jobs run`.
+    MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', '2'))
+    # Upper bound on how stale /dashboard/stats can be when a write is not seen by
+    # the write-through invalidation (stats_cache.py). 0 disables the cache.
+    DASHBOARD_STATS_TTL_SECONDS = int(os.getenv('DASHBOARD_STATS_TTL_SECONDS', '60'))
+    # Response encoder (serialization.py): 'auto' uses orjson when installed, 'stdlib' never.
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
+    # /sync (routes/sync.py): rows changed up to this long before a client's token are
+    # sent again, covering transactions that committed after that sync read. Deleted
+    # rows are remembered this long; older tokens get a full snapshot.
+    SYNC_OVERLAP_SECONDS = 10
+    SYNC_TOMBSTONE_RETENTION_DAYS = 90
+    # gzip/brotli for JSON and text responses (compression.py). Turn off when a front
+    # server already compresses. Compressed bodies of ETagged responses are cached.
+    COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', 'true').lower() != 'false'
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 6
+    COMPRESS_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    # Most songs one /songs/bundle?ids= zip may hold (bundles.py).
+    BUNDLE_MAX_SONGS = 50
+    # Most operations one POST /batch may carry (batch.py).
+    BATCH_MAX_OPERATIONS = 100
+    # Orphaned/missing upload scan (storage_gc.py). Files younger than the minimum age
+    # are never judged: an upload is stored before its row commits. A non-zero interval
+    # runs the scan in the background; it only reports unless STORAGE_SCAN_DELETE is set.
+    STORAGE_SCAN_MIN_AGE_SECONDS = 3600
+    STORAGE_SCAN_INTERVAL_HOURS = int(os.getenv('STORAGE_SCAN_INTERVAL_HOURS', '0'))
+    STORAGE_SCAN_DELETE = os.getenv('STORAGE_SCAN_DELETE', 'false').lower() == 'true'
+    # Per-endpoint latency/SQL/size metrics at GET /metrics (metrics.py); with a token set,
+    # scrapers must send it as "Authorization: Bearer <token>". Production requires one.
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+    # GET /archive/export and POST /archive/import (routes/archive.py) dump and restore
+    # everything; with a token set, callers must send "Authorization: Bearer <token>".
+    # Production serves them only with one.
+    ARCHIVE_ENDPOINTS_ENABLED = os.getenv('ARCHIVE_ENDPOINTS_ENABLED', 'true').lower() != 'false'
+    ARCHIVE_TOKEN = os.getenv('ARCHIVE_TOKEN') or None
+    # Requests with "X-Profile: 1" are run under cProfile and dumped into PROFILE_DIR.
+    # Off in production.
+    PROFILING_ENABLED = False
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
 
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    PROFILING_ENABLED = True
+    SCHEMA_ON_BOOT = os.getenv('SCHEMA_ON_BOOT', 'migrate')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///band_archive.db')
 
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SCHEMA_ON_BOOT = 'create_all'
+    MEDIA_WORKERS = 0
+    PROFILING_ENABLED = True
 
 
 class ProductionConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:////data/band_archive.db')
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/data/uploads')
+    # Never serve /metrics to anyone who asks.
+    METRICS_ENABLED = Config.METRICS_ENABLED and Config.METRICS_TOKEN is not None
+    # Nor the whole archive.
+    ARCHIVE_ENDPOINTS_ENABLED = Config.ARCHIVE_ENDPOINTS_ENABLED and Config.ARCHIVE_TOKEN is not None
@@ -0,0 +1,182 @@
+"""Engine setup: pooling per backend and per-connection SQLite pragmas.
+
+``init_db(app)`` replaces a bare ``db.init_app(app)``. Before the engine is
+created it fills in ``SQLALCHEMY_ENGINE_OPTIONS`` defaults for the configured
+backend (anything set in the config wins), and afterwards applies
+``SQLITE_PRAGMAS`` to every new SQLite connection.
+
+With several gunicorn workers on one SQLite file, WAL lets readers run while
+a writer commits, and ``busy_timeout`` makes a second writer wait for the
+lock instead of failing at once with "database is locked".
+
+``init_request_sessions(app)`` sets how views use the session:
+
+* GET and HEAD requests run read-only: autoflush is off, and a flush or a
+  bulk INSERT/UPDATE/DELETE raises, so a read can never write by accident;
+* write views end with ``commit_for_response()`` instead of a plain commit,
+  so serializing what they just wrote does not reload it (see there).
+
+``release_startup_connections(app)`` makes ``gunicorn --preload`` safe: the
+app is built once in the master and the workers are forked from it, so no
+pooled connection may cross a fork (see there).
+"""
+import os
+
+from flask import request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from extensions import db
+
+
+def default_engine_options(uri, config):
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite':
+        return {
+            'pool_size': 5,
+            'max_overflow': 10,
+            # Drop connections the server (or a proxy) closed while idle.
+            'pool_pre_ping': True,
+            'pool_recycle': 300,
+        }
+    if not url.database or url.database == ':memory:':
+        # Flask-SQLAlchemy already shares one connection for in-memory databases.
+        return {}
+    busy_timeout_ms = config['SQLITE_PRAGMAS'].get('busy_timeout', 5000)
+    return {
+        # A few connections per worker; SQLite serializes writers itself.
+        'pool_size': 5,
+        'max_overflow': 5,
+        'connect_args': {'timeout': busy_timeout_ms / 1000},
+    }
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+# ── Forking ──
+
+def _is_in_memory(engine):
+    return engine.dialect.name == 'sqlite' and engine.url.database in (None, '', ':memory:')
+
+
+def _record_pid(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+
+def _refuse_inherited_connection(dbapi_connection, connection_record, connection_proxy):
+    if connection_record.info.get('pid') != os.getpid():
+        # Opened by the parent: drop it without closing, the parent may still use it.
+        connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+        raise exc.DisconnectionError('Connection opened in another process')
+
+
+def init_db(app):
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    options = default_engine_options(uri, app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+    pragmas = app.config['SQLITE_PRAGMAS']
+    if pragmas and engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _apply_pragmas(pragmas))
+    if not _is_in_memory(engine):
+        event.listen(engine, 'connect', _record_pid)
+        event.listen(engine, 'checkout', _refuse_inherited_connection)
+
+
+def release_startup_connections(app):
+    """Close the connections startup used; call at the end of ``create_app()``.
+
+    Under ``gunicorn --preload`` the workers are forked from the process
+    that ran ``create_app()``. Its pooled connections are closed here, and
+    a connection that still reaches a child (the parent used the engine
+    again before forking) is replaced on checkout instead of being shared
+    (``init_db`` sets that up). An in-memory SQLite database lives in its one connection, so it is
+    left alone.
+    """
+    with app.app_context():
+        engine = db.engine
+    if not _is_in_memory(engine):
+        engine.dispose()
+
+
+# ── Request sessions ──
+
+READ_ONLY_METHODS = ('GET', 'HEAD')
+
+
+class ReadOnlySessionError(RuntimeError):
+    """A GET or HEAD request tried to write through the session."""
+
+
+def commit_for_response():
+    """Commit, keeping the session's objects loaded for the response.
+
+    A plain commit expires every instance, so ``to_dict()`` afterwards
+    re-SELECTs the row and lazily reloads its relationships. What is in
+    memory is what was just written: the primary key and Python-side
+    defaults are set at flush, and SQLAlchemy itself expires any column the
+    database computes. One difference remains: the timestamp defaults are
+    still tz-aware in memory while the columns read back naive, so
+    ``to_dict()`` formats datetimes without their offset (``models.isoformat``)
+    and both give the same JSON. The objects are expired when the request ends
+    instead, so nothing loaded here is reused stale by a later request on
+    the same session (the test client shares one).
+    """
+    session = db.session()
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = True
+    session.info['expire_at_teardown'] = True
+
+
+def _begin_request():
+    if request.method in READ_ONLY_METHODS:
+        session = db.session()
+        session.autoflush = False
+        session.info['read_only'] = True
+
+
+def _end_request(exc):
+    if not db.session.registry.has():
+        return
+    session = db.session()
+    if session.info.pop('read_only', False):
+        session.autoflush = True
+    if session.info.pop('expire_at_teardown', False):
+        session.expire_all()
+
+
+@event.listens_for(Session, 'before_flush')
+def _refuse_read_only_flush(session, flush_context, instances):
+    if session.info.get('read_only'):
+        raise ReadOnlySessionError(f'{request.method} {request.path} tried to flush changes')
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _refuse_read_only_statement(orm_execute_state):
+    session = orm_execute_state.session
+    if session.info.get('read_only') and (
+            orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        raise ReadOnlySessionError(f'{request.method} {request.path} tried to write')
+
+
+def init_request_sessions(app):
+    app.before_request(_begin_request)
+    app.teardown_request(_end_request)
@@ -15,6 +15,14 @@ class NotFoundError(Exception):
         self.status_code = status_code
 
 
+class ServiceUnavailableError(Exception):
+    def __init__(self, message, retry_after, status_code=503):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
 def register_error_handlers(app):
     @app.errorhandler(ValidationError)
     def handle_validation_error(e):
@@ -23,3 +31,7 @@ def register_error_handlers(app):
     @app.errorhandler(NotFoundError)
     def handle_not_found_error(e):
         return jsonify({"error": e.message}), e.status_code
+
+    @app.errorhandler(ServiceUnavailableError)
+    def handle_service_unavailable_error(e):
+        return jsonify({"error": e.message}), e.status_code, {"Retry-After": str(e.retry_after)}
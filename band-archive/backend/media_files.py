@@ -0,0 +1,127 @@
+"""Serving stored files (storage.py).
+
+Werkzeug's ``send_file`` already answers Range requests (206) and
+If-None-Match / If-Modified-Since (304). This module adds what it cannot
+infer: stored names never change content, both the content-addressed
+``<sha256>.<ext>`` names (blob_store.py) and the random 32-hex-digit names
+older uploads got, so they get a long ``immutable`` Cache-Control and an
+ETag derived from the name itself, and the bytes can optionally be handed
+to the front web server (``MEDIA_SENDFILE``) so Flask only resolves and
+authorizes.
+
+With a remote storage backend there is no local file: the object is
+streamed through the app, and only the requested range is fetched.
+"""
+import mimetypes
+import os
+import re
+
+from flask import Response, current_app, request, send_from_directory
+from werkzeug.exceptions import NotFound
+
+from blob_store import blob_hash, blob_relative_path
+from storage import get_storage, is_safe_key
+
+# Browsers reject the audio/x-m4a type some platforms register for .m4a.
+MIMETYPE_OVERRIDES = {
+    'm4a': 'audio/mp4',
+}
+
+# Random or content-hash stored names (32 hex chars for uuid4, 64 for sha256),
+# including derived files such as ``<sha256>.thumb.jpg``.
+_IMMUTABLE_NAME = re.compile(r'^(?:[0-9a-f]{32}|[0-9a-f]{64})(?:\.[a-z0-9]+)*$')
+
+
+def is_immutable_name(filename):
+    return bool(_IMMUTABLE_NAME.match(os.path.basename(filename)))
+
+
+def guess_mimetype(filename):
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if ext in MIMETYPE_OVERRIDES:
+        return MIMETYPE_OVERRIDES[ext]
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def _cache_headers(response, filename):
+    if is_immutable_name(filename):
+        max_age = current_app.config['MEDIA_CACHE_MAX_AGE']
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    else:
+        # Renamed media keeps a human name; make clients revalidate it.
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _offload(header, value, filename):
+    # The web server reads the file itself, including Range and conditional handling.
+    response = Response(mimetype=guess_mimetype(filename))
+    response.headers[header] = value
+    return _cache_headers(response, filename)
+
+
+def media_key(filename, subdir=None):
+    """Resolve a stored name to its storage key; None if the name is not a safe one.
+
+    Content-addressed names (``<sha256>.<ext>``) are looked up in the blob store.
+    """
+    sha256 = blob_hash(filename)
+    if sha256:
+        # Content-addressed names resolve to the shared store whatever the URL prefix.
+        return blob_relative_path(sha256)
+    key = f'{subdir}/{filename}' if subdir else filename
+    return key if is_safe_key(key) else None
+
+
+def _stream_stored(storage, key, filename):
+    stored = storage.stat(key)
+    if stored is None:
+        raise NotFound()
+    response = Response(mimetype=guess_mimetype(filename), direct_passthrough=True)
+    if is_immutable_name(filename):
+        response.set_etag(os.path.splitext(filename)[0])
+    else:
+        response.set_etag(f'{stored.size:x}-{int(stored.mtime):x}')
+    response.last_modified = stored.mtime
+    response.content_length = stored.size
+    # Answers 304 and sets a 206's Content-Range; the body is fetched afterwards so
+    # only the requested bytes leave the bucket.
+    response.make_conditional(request, accept_ranges=True, complete_length=stored.size)
+    if response.status_code == 206:
+        content_range = response.content_range
+        response.response = storage.get_range(key, content_range.start, content_range.stop - content_range.start)
+    elif response.status_code == 200:
+        response.response = storage.get_range(key)
+    return _cache_headers(response, filename)
+
+
+def send_media(filename, subdir=None):
+    """Serve the stored file ``[subdir/]filename`` with media-friendly caching."""
+    relative_path = media_key(filename, subdir)
+    if relative_path is None:
+        raise NotFound()
+    storage = get_storage()
+    path = storage.local_path(relative_path)
+    if path is None:
+        return _stream_stored(storage, relative_path, filename)
+    if not os.path.isfile(path):
+        raise NotFound()
+
+    mode = current_app.config['MEDIA_SENDFILE']
+    if mode == 'x-accel-redirect':
+        prefix = current_app.config['MEDIA_ACCEL_REDIRECT_PREFIX'].rstrip('/')
+        return _offload('X-Accel-Redirect', f'{prefix}/{relative_path}', filename)
+    if mode == 'x-sendfile':
+        return _offload('X-Sendfile', os.path.abspath(path), filename)
+
+    immutable = is_immutable_name(filename)
+    response = send_from_directory(
+        current_app.config['UPLOAD_FOLDER'],
+        relative_path,
+        mimetype=guess_mimetype(filename),
+        download_name=filename,
+        # The stored name already identifies the content; skip the stat-based tag.
+        etag=os.path.splitext(filename)[0] if immutable else True,
+        conditional=True,
+    )
+    return _cache_headers(response, filename)
@@ -0,0 +1,338 @@
+"""Background jobs that derive thumbnails, PDF previews and waveform peaks.
+
+Inserting a ``Media`` or ``PersonalLog`` row whose file is in the blob store
+enqueues one ``MediaJob`` per derived file in the same transaction, so the
+upload request only pays for a couple of INSERTs. Jobs are keyed by content
+hash: a re-upload of the same bytes reuses the finished result at once.
+
+Each app process runs a dispatcher thread that claims pending jobs with a
+compare-and-set UPDATE (so several gunicorn workers can share the table) and
+hands them to a ``ProcessPoolExecutor`` of ``MEDIA_WORKERS`` processes. The
+dispatcher is started lazily, by the first request or commit that enqueues,
+so it is created in the serving process rather than a pre-fork parent. With
+``MEDIA_WORKERS = 0`` nothing runs in the background; ``run_pending_jobs()``
+and ``flask media-jobs run`` process the queue in the calling process.
+
+Outputs are stored under the key ``derived/ab/cd/<name>`` (storage.py) and
+served from ``/uploads/derived/<name>``. With a remote storage backend a
+batch downloads its sources into a temp directory, and each output is
+uploaded once its job is done. When a job finishes, every row pointing at that
+blob gets the derived name in its ``thumbnail`` / ``preview`` / ``waveform``
+column.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import and_, event, insert, or_, select, update
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extensions import db
+from models import Media, MediaJob, PersonalLog
+from blob_store import blob_hash, blob_relative_path
+from storage import get_storage
+import media_processing
+
+DERIVED_SUBDIR = 'derived'
+MAX_ATTEMPTS = 3
+# A job left 'running' this long belongs to a worker that died; claim it again.
+STALE_JOB_AFTER = timedelta(minutes=15)
+# Fallback wake-up for jobs enqueued by another process.
+POLL_INTERVAL_SECONDS = 30
+
+# Model -> job kinds whose result it stores (the kind is also the column name).
+DERIVED_COLUMNS = {
+    Media: ('thumbnail', 'preview', 'waveform'),
+    PersonalLog: ('waveform',),
+}
+
+
+def derived_subdir(name):
+    """Directory of a derived file relative to the storage root, sharded like blobs."""
+    return f'{DERIVED_SUBDIR}/{name[:2]}/{name[2:4]}'
+
+
+def derived_key(name):
+    return f'{derived_subdir(name)}/{name}'
+
+
+def derived_path(name):
+    """The derived file's path under UPLOAD_FOLDER; only meaningful with local storage."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], *derived_key(name).split('/'))
+
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+# ── Enqueueing ──
+
+def _enqueue_for(connection, target):
+    """Queue the jobs ``target``'s file needs; returns how many were added."""
+    sha256 = blob_hash(target.filename)
+    if not sha256:
+        return 0
+    kinds = [kind for kind in media_processing.kinds_for_extension(_extension(target.filename))
+             if kind in DERIVED_COLUMNS[type(target)]]
+    if not kinds:
+        return 0
+
+    existing = dict(connection.execute(
+        select(MediaJob.kind, MediaJob.status)
+        .where(MediaJob.sha256 == sha256, MediaJob.kind.in_(kinds))
+    ).all())
+    table = type(target).__table__
+    added = 0
+    for kind in kinds:
+        status = existing.get(kind)
+        if status == 'done':
+            # Only fill an empty column: an UPDATE that changes nothing would
+            # still bump updated_at and send the row to every /sync client.
+            name = media_processing.output_name(sha256, kind)
+            updated = connection.execute(
+                update(table).where(table.c.id == target.id, table.c[kind].is_(None)).values({kind: name})
+            ).rowcount
+            if updated:
+                set_committed_value(target, kind, name)
+        elif status is None:
+            now = datetime.now(timezone.utc)
+            connection.execute(insert(MediaJob).values(
+                sha256=sha256, kind=kind, status='pending', attempts=0, created_at=now, updated_at=now,
+            ))
+            session = object_session(target)
+            if session is not None:
+                session.info['media_jobs_enqueued'] = True
+            added += 1
+    return added
+
+
+def _after_insert(mapper, connection, target):
+    _enqueue_for(connection, target)
+
+
+for _model in DERIVED_COLUMNS:
+    event.listen(_model, 'after_insert', _after_insert)
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatcher(session):
+    if session.info.pop('media_jobs_enqueued', False) and has_app_context():
+        dispatcher = current_app.extensions.get('media_jobs')
+        if dispatcher is not None:
+            dispatcher.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('media_jobs_enqueued', None)
+
+
+def enqueue_missing_jobs(ids=None, batch_size=500):
+    """Enqueue jobs for rows stored without the mapper events; returns how many were added.
+
+    ``ids`` maps a model to the ids of the rows to look at, such as those a
+    bulk import inserted; by default every row is, for rows stored before
+    background processing existed.
+    """
+    connection = db.session.connection()
+    enqueued = 0
+    for model in DERIVED_COLUMNS:
+        if ids is None:
+            batches = [model.query.all()]
+        else:
+            wanted = sorted(ids.get(model, ()))
+            batches = (model.query.filter(model.id.in_(wanted[start:start + batch_size])).all()
+                       for start in range(0, len(wanted), batch_size))
+        for rows in batches:
+            for row in rows:
+                enqueued += _enqueue_for(connection, row)
+    db.session.commit()
+    return enqueued
+
+
+# ── Running ──
+
+def _claim_jobs(limit):
+    """Mark up to ``limit`` jobs as running for this process and return them."""
+    now = datetime.now(timezone.utc)
+    claimable = or_(
+        MediaJob.status == 'pending',
+        and_(MediaJob.status == 'running', MediaJob.updated_at < now - STALE_JOB_AFTER),
+    )
+    candidates = db.session.execute(
+        select(MediaJob.id, MediaJob.status).where(claimable).order_by(MediaJob.id).limit(limit)
+    ).all()
+    claimed = []
+    for job_id, status in candidates:
+        # Compare-and-set: another process may have claimed it since the SELECT.
+        won = db.session.execute(
+            update(MediaJob)
+            .where(MediaJob.id == job_id, MediaJob.status == status)
+            .values(status='running', attempts=MediaJob.attempts + 1, updated_at=now)
+        ).rowcount
+        if won:
+            claimed.append(job_id)
+    db.session.commit()
+    return [db.session.get(MediaJob, job_id) for job_id in claimed]
+
+
+def _finish(job, status, error=None):
+    if status == 'failed' and job.attempts < MAX_ATTEMPTS:
+        status = 'pending'
+    job.status = status
+    job.error = error
+    if status == 'done':
+        name = media_processing.output_name(job.sha256, job.kind)
+        for model, kinds in DERIVED_COLUMNS.items():
+            if job.kind in kinds:
+                model.query.filter(
+                    or_(model.filename == job.sha256, model.filename.like(f'{job.sha256}.%'))
+                ).update({job.kind: name}, synchronize_session=False)
+    db.session.commit()
+
+
+def run_pending_jobs(executor=None, batch_size=1):
+    """Process queued jobs until none are left; returns how many were run.
+
+    Without an ``executor`` the work happens inline in this process.
+    """
+    storage = get_storage()
+    processed = 0
+    while True:
+        jobs = _claim_jobs(batch_size)
+        if not jobs:
+            return processed
+        with tempfile.TemporaryDirectory(prefix='media-jobs-') as scratch:
+            work = []
+            for job in jobs:
+                output_key = derived_key(media_processing.output_name(job.sha256, job.kind))
+                files = _job_files(storage, job.sha256, output_key, scratch)
+                if files is None:
+                    _finish(job, 'skipped', 'source file no longer stored')
+                    continue
+                args = (job.kind, *files)
+                if executor is None:
+                    work.append((job, output_key, args, None))
+                else:
+                    work.append((job, output_key, args, executor.submit(media_processing.process, *args)))
+            for job, output_key, args, future in work:
+                try:
+                    status, error = future.result() if future else media_processing.process(*args)
+                    if status == 'done' and storage.local_path(output_key) is None:
+                        storage.put_file(output_key, args[2])
+                except Exception as e:
+                    current_app.logger.warning(f'Media job {job.id} ({job.kind}) failed: {e}')
+                    status, error = 'failed', str(e) or type(e).__name__
+                _finish(job, status, error)
+                processed += 1
+
+
+def _download(storage, key, path):
+    try:
+        with open(path, 'wb') as f:
+            for block in storage.get_range(key):
+                f.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def _job_files(storage, sha256, output_key, scratch):
+    """Local ``(source, output)`` paths for a job; None when its blob is gone.
+
+    With a remote storage the blob is downloaded into ``scratch`` (once for
+    all the jobs of a batch) and the output is written there too.
+    """
+    source_key = blob_relative_path(sha256)
+    source = storage.local_path(source_key)
+    if source is not None:
+        return (source, storage.local_path(output_key)) if os.path.isfile(source) else None
+    source = os.path.join(scratch, sha256)
+    if not os.path.exists(source):
+        try:
+            _download(storage, source_key, source)
+        except FileNotFoundError:
+            return None
+    return source, os.path.join(scratch, output_key.rsplit('/', 1)[-1])
+
+
+class MediaJobDispatcher:
+    """Per-process thread feeding queued jobs to a pool of worker processes."""
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.workers = workers
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Fresh state after a fork: the parent's thread and pool do not exist here.
+            self._pid = os.getpid()
+            self._wakeup = threading.Event()
+            thread = threading.Thread(target=self._run, name='media-jobs', daemon=True)
+            thread.start()
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        # 'spawn' keeps the workers free of this process's threads, locks and DB connections.
+        executor = ProcessPoolExecutor(max_workers=self.workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+        self._wakeup.set()  # Drain whatever is already queued.
+        while True:
+            self._wakeup.wait(POLL_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    run_pending_jobs(executor, self.workers)
+                except Exception:
+                    self.app.logger.exception('Media job dispatcher error')
+                finally:
+                    db.session.remove()
+
+
+media_jobs_cli = AppGroup('media-jobs', help='Background media processing.')
+
+
+@media_jobs_cli.command('run')
+@click.option('--workers', type=int, default=0, help='Worker processes (0 runs jobs inline).')
+def run_command(workers):
+    """Process every pending job, then exit."""
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            processed = run_pending_jobs(executor, workers)
+    else:
+        processed = run_pending_jobs()
+    click.echo(f'Processed {processed} media job(s).')
+
+
+@media_jobs_cli.command('enqueue')
+def enqueue_command():
+    """Queue jobs for media uploaded before background processing existed."""
+    click.echo(f'Enqueued {enqueue_missing_jobs()} media job(s).')
+
+
+def init_media_jobs(app):
+    app.cli.add_command(media_jobs_cli)
+    workers = app.config['MEDIA_WORKERS']
+    if not workers:
+        return
+    dispatcher = MediaJobDispatcher(app, workers)
+    app.extensions['media_jobs'] = dispatcher
+
+    @app.before_request
+    def _start_media_jobs():
+        dispatcher.start()
@@ -0,0 +1,186 @@
+"""Derived files for uploaded media: thumbnails, PDF previews and waveform peaks.
+
+These functions run in worker processes (see media_jobs.py), so they take
+plain paths and never touch Flask or the database. Each one writes its
+output next to a temporary name and renames it into place, so a reader never
+sees a half-written file.
+
+Pillow, pypdfium2, NumPy and soundfile are optional; a processor whose library
+is missing raises ``MissingDependency`` and the job is recorded as skipped.
+"""
+import json
+import math
+import os
+import wave
+
+THUMBNAIL_SIZE = (320, 320)
+PREVIEW_WIDTH = 1200
+WAVEFORM_BUCKETS = 800
+# Frames decoded per read when computing peaks; bounds memory for long recordings.
+WAVEFORM_BLOCK_FRAMES = 1 << 20
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+WAVEFORM_EXTENSIONS = {'wav', 'flac', 'ogg'}
+
+
+class MissingDependency(Exception):
+    pass
+
+
+def kinds_for_extension(ext):
+    """Job kinds to run for a stored file with this extension."""
+    if ext in IMAGE_EXTENSIONS:
+        return ['thumbnail']
+    if ext == 'pdf':
+        return ['preview']
+    if ext in WAVEFORM_EXTENSIONS:
+        return ['waveform']
+    return []
+
+
+def output_name(sha256, kind):
+    return {
+        'thumbnail': f'{sha256}.thumb.jpg',
+        'preview': f'{sha256}.page1.png',
+        'waveform': f'{sha256}.peaks.json',
+    }[kind]
+
+
+def _replace_into(tmp_path, output_path):
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, output_path)
+
+
+def make_thumbnail(source_path, output_path, size=THUMBNAIL_SIZE):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise MissingDependency('Pillow')
+
+    tmp_path = output_path + '.tmp'
+    with Image.open(source_path) as image:
+        image.seek(0)  # First frame of animated GIF/WebP.
+        image.thumbnail(size)
+        image.convert('RGB').save(tmp_path, 'JPEG', quality=85, optimize=True)
+    _replace_into(tmp_path, output_path)
+
+
+def make_pdf_preview(source_path, output_path, width=PREVIEW_WIDTH):
+    try:
+        import pypdfium2
+    except ImportError:
+        raise MissingDependency('pypdfium2')
+
+    tmp_path = output_path + '.tmp'
+    pdf = pypdfium2.PdfDocument(source_path)
+    try:
+        page = pdf[0]
+        scale = width / page.get_width()
+        page.render(scale=scale).to_pil().save(tmp_path, 'PNG', optimize=True)
+    finally:
+        pdf.close()
+    _replace_into(tmp_path, output_path)
+
+
+def _wav_blocks(source_path, np):
+    """Yield ``(frames, channels)`` float blocks from a PCM WAV using the stdlib reader."""
+    with wave.open(source_path, 'rb') as reader:
+        channels = reader.getnchannels()
+        width = reader.getsampwidth()
+        if width not in (1, 2, 3, 4):
+            raise wave.Error(f'unsupported sample width {width}')
+        rate = reader.getframerate()
+        total = reader.getnframes()
+        yield rate, total
+        while True:
+            raw = reader.readframes(WAVEFORM_BLOCK_FRAMES)
+            if not raw:
+                return
+            if width == 1:
+                samples = np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0
+                scale = 128.0
+            elif width == 3:
+                # 24-bit: widen each little-endian triple to int32 in one vectorized step.
+                triples = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+                samples = (triples[:, 0] | (triples[:, 1] << 8) | (triples[:, 2] << 16))
+                samples = np.where(samples & 0x800000, samples - 0x1000000, samples).astype(np.float32)
+                scale = float(1 << 23)
+            else:
+                dtype = np.int16 if width == 2 else np.int32
+                samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+                scale = float(np.iinfo(dtype).max) + 1.0
+            yield (samples / scale).reshape(-1, channels)
+
+
+def _soundfile_blocks(source_path, np):
+    try:
+        import soundfile
+    except ImportError:
+        raise MissingDependency('soundfile')
+    with soundfile.SoundFile(source_path) as reader:
+        yield reader.samplerate, reader.frames
+        for block in reader.blocks(blocksize=WAVEFORM_BLOCK_FRAMES, dtype='float32', always_2d=True):
+            yield block
+
+
+def compute_peaks(source_path, buckets=WAVEFORM_BUCKETS):
+    """Return the waveform summary: per-bucket peak amplitude in [0, 1]."""
+    try:
+        import numpy as np
+    except ImportError:
+        raise MissingDependency('numpy')
+
+    # Stored blobs have no extension, so try the stdlib PCM WAV reader first.
+    try:
+        blocks = _wav_blocks(source_path, np)
+        rate, total = next(blocks)
+    except (wave.Error, EOFError):
+        # FLAC/OGG, or a float/compressed WAV: let libsndfile decode it.
+        blocks = _soundfile_blocks(source_path, np)
+        rate, total = next(blocks)
+
+    buckets = max(1, min(buckets, total or 1))
+    frames_per_bucket = max(1, math.ceil(total / buckets))
+    peaks = np.zeros(buckets, dtype=np.float32)
+    position = 0
+    for block in blocks:
+        amplitude = np.abs(block).max(axis=1)
+        # Bucket index of every frame, then a scatter-max into the bucket array.
+        index = (np.arange(position, position + len(amplitude)) // frames_per_bucket).clip(max=buckets - 1)
+        np.maximum.at(peaks, index, amplitude)
+        position += len(amplitude)
+
+    return {
+        'buckets': buckets,
+        'sample_rate': rate,
+        'duration': round(total / rate, 3) if rate else None,
+        'peaks': np.round(np.clip(peaks, 0.0, 1.0), 4).tolist(),
+    }
+
+
+def make_waveform(source_path, output_path, buckets=WAVEFORM_BUCKETS):
+    summary = compute_peaks(source_path, buckets)
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, separators=(',', ':'))
+    _replace_into(tmp_path, output_path)
+
+
+PROCESSORS = {
+    'thumbnail': make_thumbnail,
+    'preview': make_pdf_preview,
+    'waveform': make_waveform,
+}
+
+
+def process(kind, source_path, output_path):
+    """Entry point for worker processes. Returns ``(status, error)``.
+
+    Decoding errors propagate so the caller can count the attempt as failed.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    try:
+        PROCESSORS[kind](source_path, output_path)
+    except MissingDependency as e:
+        return 'skipped', f'{e} is not installed'
+    return 'done', None
@@ -0,0 +1,283 @@
+"""Per-endpoint request metrics in Prometheus text format, and opt-in profiling.
+
+``init_metrics(app)`` records, per endpoint (the Flask endpoint name, so
+label values stay bounded):
+
+* request latency, from before the first ``before_request`` hook to the
+  response object (a streamed body is not included);
+* SQL statements and SQL time per request, from engine cursor events;
+* response body size, counted as it is sent when the length is not known
+  up front (streamed exports and bundles);
+* request body bytes and upload throughput for requests that send one.
+
+``GET /metrics`` serves them in the Prometheus text exposition format.
+When ``METRICS_TOKEN`` is set the scraper must send it as a bearer token;
+ProductionConfig serves ``/metrics`` only when it is.
+Values live in the process: with several gunicorn workers each reports
+its own, so scrape the workers individually or run one.
+
+With ``PROFILING_ENABLED`` (never in ProductionConfig), a request carrying
+``X-Profile: 1`` runs under cProfile; the stats are written to
+``PROFILE_DIR`` and the file name is returned in ``X-Profile-File``.
+"""
+import bisect
+import cProfile
+import hmac
+import os
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+
+from extensions import db
+
+METRIC_PREFIX = 'band_archive_'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MB
+THROUGHPUT_BUCKETS = tuple(64 * 1024 * 4 ** i for i in range(8))  # 64 KB/s .. 1 GB/s
+
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]; made cumulative when rendered.
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def total(self, labels):
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip([*self.buckets, '+Inf'], series[:-1]):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-1])}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+class RequestMetrics:
+    """The metrics of one app process."""
+
+    def __init__(self):
+        endpoint = ('endpoint',)
+        self.requests = Counter(
+            f'{METRIC_PREFIX}http_requests_total', 'Requests handled.', ('endpoint', 'method', 'status'))
+        self.latency = Histogram(
+            f'{METRIC_PREFIX}http_request_duration_seconds', 'Time to build the response.',
+            ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.sql_statements = Histogram(
+            f'{METRIC_PREFIX}http_request_sql_statements', 'SQL statements executed per request.',
+            endpoint, STATEMENT_BUCKETS)
+        self.sql_time = Histogram(
+            f'{METRIC_PREFIX}http_request_sql_seconds', 'Time spent in SQL per request.',
+            endpoint, LATENCY_BUCKETS)
+        self.response_size = Histogram(
+            f'{METRIC_PREFIX}http_response_size_bytes', 'Response body size.', endpoint, SIZE_BUCKETS)
+        self.request_bytes = Counter(
+            f'{METRIC_PREFIX}http_request_body_bytes_total', 'Request body bytes received.', endpoint)
+        self.upload_throughput = Histogram(
+            f'{METRIC_PREFIX}http_upload_bytes_per_second', 'Request body bytes per second of handling.',
+            endpoint, THROUGHPUT_BUCKETS)
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.latency, self.sql_statements, self.sql_time,
+                       self.response_size, self.request_bytes, self.upload_throughput):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# ── Per-request accounting ──
+
+# [started, SQL statements, SQL seconds] of the request running in this context.
+_current = ContextVar('request_metrics', default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    usage = _current.get()
+    if usage is not None:
+        usage[1] += 1
+        started = getattr(context, 'metrics_started', None)
+        if started is not None:
+            usage[2] += time.perf_counter() - started
+
+
+def _start_request():
+    _current.set([time.perf_counter(), 0, 0.0])
+
+
+def _counted_body(body, observe):
+    sent = 0
+    try:
+        for chunk in body:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        observe(sent)
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def _record_request(response):
+    usage = _current.get()
+    _current.set(None)
+    endpoint = request.endpoint or UNMATCHED_ENDPOINT
+    if usage is None or endpoint == 'metrics':
+        return response
+    started, statements, sql_seconds = usage
+    elapsed = time.perf_counter() - started
+    metrics = current_app.extensions['metrics']
+    method = request.method
+    labels = (endpoint,)
+
+    metrics.requests.inc((endpoint, method, str(response.status_code)))
+    metrics.latency.observe((endpoint, method), elapsed)
+    metrics.sql_statements.observe(labels, statements)
+    metrics.sql_time.observe(labels, sql_seconds)
+
+    if response.is_streamed:
+        response.response = _counted_body(
+            response.response, lambda sent: metrics.response_size.observe(labels, sent))
+    elif response.content_length is not None:
+        metrics.response_size.observe(labels, response.content_length)
+
+    received = request.content_length
+    if received:
+        metrics.request_bytes.inc(labels, received)
+        metrics.upload_throughput.observe(labels, received / max(elapsed, 1e-6))
+    return response
+
+
+# ── Profiling ──
+
+def _start_profile():
+    if request.headers.get('X-Profile') != '1':
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another request's profiler is active (one per interpreter on newer Pythons).
+        return
+    g.profiler = profiler
+
+
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    profile_dir = current_app.config['PROFILE_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')
+    filename = f'{stamp}-{request.endpoint or UNMATCHED_ENDPOINT}.prof'
+    profiler.dump_stats(os.path.join(profile_dir, filename))
+    response.headers['X-Profile-File'] = filename
+    return response
+
+
+# ── Endpoint ──
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    body = current_app.extensions['metrics'].render()
+    return Response(body, mimetype='text/plain', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_metrics(app):
+    """Register the hooks; call before other ``before_request``/``after_request`` users.
+
+    ``after_request`` hooks run in reverse order, so registering first means
+    the sizes recorded are the ones sent (after compression) and a profile
+    covers every other hook.
+    """
+    profiling = app.config['PROFILING_ENABLED']
+    if profiling:
+        app.before_request(_start_profile)
+        app.after_request(_finish_profile)
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.extensions['metrics'] = RequestMetrics()
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
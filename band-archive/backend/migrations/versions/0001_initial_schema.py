@@ -0,0 +1,120 @@
+"""initial schema
+
+Schema as it was before migrations existed. Databases created earlier by
+db.create_all() already have these tables, so each table is only created
+when missing, and media.original_filename (previously added by the
+startup PRAGMA check in app.py) is added when absent.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 12:17:11.407341
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+
+    if 'song' not in existing:
+        op.create_table(
+            'song',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=100), nullable=False),
+            sa.Column('artist', sa.String(length=100), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('lyrics', sa.Text(), nullable=True),
+            sa.Column('chords', sa.Text(), nullable=True),
+            sa.Column('link', sa.String(length=200), nullable=True),
+            sa.Column('memo', sa.Text(), nullable=True),
+            sa.Column('genre', sa.String(length=50), nullable=True),
+            sa.Column('difficulty', sa.Integer(), nullable=True),
+            sa.Column('sheet_music', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'member' not in existing:
+        op.create_table(
+            'member',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('instrument', sa.String(length=100), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'song_suggestion' not in existing:
+        op.create_table(
+            'song_suggestion',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=100), nullable=False),
+            sa.Column('artist', sa.String(length=100), nullable=False),
+            sa.Column('link', sa.String(length=500), nullable=False),
+            sa.Column('memo', sa.Text(), nullable=True),
+            sa.Column('thumbs_up', sa.Integer(), nullable=True),
+            sa.Column('thumbs_down', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'media' not in existing:
+        op.create_table(
+            'media',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('song_id', sa.Integer(), nullable=False),
+            sa.Column('filename', sa.String(length=200), nullable=False),
+            sa.Column('original_filename', sa.String(length=200), nullable=True),
+            sa.Column('file_type', sa.String(length=20), nullable=True),
+            sa.Column('file_size', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['song_id'], ['song.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    else:
+        columns = {c['name'] for c in sa.inspect(bind).get_columns('media')}
+        if 'original_filename' not in columns:
+            op.add_column('media', sa.Column('original_filename', sa.String(length=200), nullable=True))
+    if 'personal_log' not in existing:
+        op.create_table(
+            'personal_log',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('member_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('filename', sa.String(length=200), nullable=False),
+            sa.Column('original_filename', sa.String(length=200), nullable=True),
+            sa.Column('file_type', sa.String(length=20), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['member_id'], ['member.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'practice_log' not in existing:
+        op.create_table(
+            'practice_log',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('song_id', sa.Integer(), nullable=False),
+            sa.Column('date', sa.DateTime(), nullable=True),
+            sa.Column('content', sa.Text(), nullable=True),
+            sa.Column('feedback', sa.Text(), nullable=True),
+            sa.Column('recording', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['song_id'], ['song.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('practice_log')
+    op.drop_table('personal_log')
+    op.drop_table('media')
+    op.drop_table('song_suggestion')
+    op.drop_table('member')
+    op.drop_table('song')
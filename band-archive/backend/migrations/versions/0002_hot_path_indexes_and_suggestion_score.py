@@ -0,0 +1,45 @@
+"""hot path indexes and suggestion score
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:17:12.397870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_song_status_id', 'song', ['status', 'id'])
+    op.create_index('ix_song_genre_id', 'song', ['genre', 'id'])
+    op.create_index('ix_media_song_id', 'media', ['song_id'])
+    op.create_index('ix_practice_log_song_id_date', 'practice_log', ['song_id', 'date', 'id'])
+    op.create_index('ix_practice_log_date', 'practice_log', ['date'])
+    op.create_index('ix_personal_log_member_id_created_at', 'personal_log', ['member_id', 'created_at', 'id'])
+
+    # SQLite cannot ALTER TABLE ADD a STORED generated column, so rebuild the table.
+    with op.batch_alter_table('song_suggestion', recreate='always') as batch_op:
+        batch_op.add_column(sa.Column(
+            'score', sa.Integer(), sa.Computed('thumbs_up - thumbs_down', persisted=True), nullable=True,
+        ))
+    op.create_index('ix_song_suggestion_score_id', 'song_suggestion', ['score', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_song_suggestion_score_id', table_name='song_suggestion')
+    with op.batch_alter_table('song_suggestion', recreate='always') as batch_op:
+        batch_op.drop_column('score')
+
+    op.drop_index('ix_personal_log_member_id_created_at', table_name='personal_log')
+    op.drop_index('ix_practice_log_date', table_name='practice_log')
+    op.drop_index('ix_practice_log_song_id_date', table_name='practice_log')
+    op.drop_index('ix_media_song_id', table_name='media')
+    op.drop_index('ix_song_genre_id', table_name='song')
+    op.drop_index('ix_song_status_id', table_name='song')
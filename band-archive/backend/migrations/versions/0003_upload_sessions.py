@@ -0,0 +1,36 @@
+"""upload sessions
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:19:15.962293
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_session',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('target', sa.String(length=20), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('original_filename', sa.String(length=200), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('received', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('upload_session')
@@ -0,0 +1,35 @@
+"""content addressed blobs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:22:38.560337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'blob',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    with op.batch_alter_table('upload_session') as batch_op:
+        batch_op.add_column(sa.Column('existing_sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('upload_session') as batch_op:
+        batch_op.drop_column('existing_sha256')
+    op.drop_table('blob')
@@ -0,0 +1,50 @@
+"""media jobs
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:27:31.228783
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'media_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256', 'kind', name='uq_media_job_sha256_kind'),
+    )
+    op.create_index('ix_media_job_status_id', 'media_job', ['status', 'id'])
+    with op.batch_alter_table('media') as batch_op:
+        batch_op.add_column(sa.Column('thumbnail', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('preview', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('waveform', sa.String(length=200), nullable=True))
+    with op.batch_alter_table('personal_log') as batch_op:
+        batch_op.add_column(sa.Column('waveform', sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('personal_log') as batch_op:
+        batch_op.drop_column('waveform')
+    with op.batch_alter_table('media') as batch_op:
+        batch_op.drop_column('waveform')
+        batch_op.drop_column('preview')
+        batch_op.drop_column('thumbnail')
+    op.drop_index('ix_media_job_status_id', table_name='media_job')
+    op.drop_table('media_job')
@@ -0,0 +1,48 @@
+"""sync updated_at and tombstones
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:06:52.114903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+NEW_UPDATED_AT = ('media', 'song_suggestion', 'member', 'personal_log')
+SYNCED_TABLES = ('song', 'media', 'practice_log', 'member', 'personal_log', 'song_suggestion')
+
+
+def upgrade():
+    for table in NEW_UPDATED_AT:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = created_at')
+    for table in SYNCED_TABLES:
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+
+    op.create_table(
+        'tombstone',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(length=50), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_tombstone_deleted_at', 'tombstone', ['deleted_at'])
+
+
+def downgrade():
+    op.drop_index('ix_tombstone_deleted_at', table_name='tombstone')
+    op.drop_table('tombstone')
+    for table in SYNCED_TABLES:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+    for table in NEW_UPDATED_AT:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -1,9 +1,72 @@
-
 from datetime import datetime, timezone
 from extensions import db
 
 
-class Song(db.Model):
+def isoformat(value):
+    """Format a datetime the way the ``DateTime`` columns read it back.
+
+    The columns store naive UTC, but objects a write view just committed
+    still hold the tz-aware defaults; without the offset a response matches
+    a later GET of the same row.
+    """
+    if value is None:
+        return None
+    return value.replace(tzinfo=None).isoformat()
+
+
+class SerializableMixin:
+    """Build the JSON dict for a model, optionally limited to some fields.
+
+    ``FIELDS`` lists the output keys in order. Keys that are not plain columns
+    declare the columns they read in ``FIELD_COLUMNS`` so list endpoints can
+    select exactly those, and say how they are produced:
+
+    * ``DERIVED_FIELDS``: ``name -> function`` called with the values of
+      ``FIELD_COLUMNS[name]``, in that order;
+    * ``RELATED_FIELDS``: ``name -> (relationship, attribute)`` for a value
+      read through a many-to-one relationship, or ``(relationship, None)`` for
+      a one-to-many list of the related rows' own dicts.
+
+    The same declarations drive the column-tuple serializers in serialization.py.
+    """
+
+    FIELDS = ()
+    FIELD_COLUMNS = {}
+    DERIVED_FIELDS = {}
+    RELATED_FIELDS = {}
+
+    @classmethod
+    def columns_for(cls, fields):
+        names = {'id'}
+        for field in fields:
+            names.update(cls.FIELD_COLUMNS.get(field, (field,)))
+        return [getattr(cls, name) for name in names if name in cls.__table__.columns]
+
+    def _field_value(self, name):
+        derive = self.DERIVED_FIELDS.get(name)
+        if derive is not None:
+            return derive(*(getattr(self, column) for column in self.FIELD_COLUMNS[name]))
+        related = self.RELATED_FIELDS.get(name)
+        if related is not None:
+            relationship, attribute = related
+            target = getattr(self, relationship)
+            if attribute is None:
+                return [row.to_dict() for row in target]
+            return getattr(target, attribute) if target is not None else None
+        value = getattr(self, name)
+        if isinstance(value, datetime):
+            return isoformat(value)
+        return value
+
+    def to_dict(self, fields=None):
+        return {name: self._field_value(name) for name in (fields or self.FIELDS)}
+
+
+def derived_url(name):
+    return f'/uploads/derived/{name}' if name else None
+
+
+class Song(SerializableMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     artist = db.Column(db.String(100), nullable=False)
@@ -19,49 +82,61 @@ class Song(db.Model):
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
                            onupdate=lambda: datetime.now(timezone.utc))
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'artist': self.artist,
-            'status': self.status,
-            'lyrics': self.lyrics,
-            'chords': self.chords,
-            'link': self.link,
-            'memo': self.memo,
-            'genre': self.genre,
-            'difficulty': self.difficulty,
-            'sheet_music': self.sheet_music,
-            'media': [media.to_dict() for media in self.media_files],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-        }
+    __table_args__ = (
+        # /songs filters on status or genre and pages by id.
+        db.Index('ix_song_status_id', 'status', 'id'),
+        db.Index('ix_song_genre_id', 'genre', 'id'),
+        # /sync picks up rows changed since the client's token.
+        db.Index('ix_song_updated_at', 'updated_at'),
+    )
 
+    FIELDS = ('id', 'title', 'artist', 'status', 'lyrics', 'chords', 'link', 'memo', 'genre',
+              'difficulty', 'sheet_music', 'media', 'created_at', 'updated_at')
+    FIELD_COLUMNS = {'media': ()}
+    RELATED_FIELDS = {'media': ('media_files', None)}
 
-class Media(db.Model):
+
+class Media(SerializableMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     song_id = db.Column(db.Integer, db.ForeignKey('song.id'), nullable=False)
     filename = db.Column(db.String(200), nullable=False)
     original_filename = db.Column(db.String(200), nullable=True)
     file_type = db.Column(db.String(20), nullable=True)
     file_size = db.Column(db.Integer, nullable=True)
+    # Derived files written by the background media jobs (media_jobs.py).
+    thumbnail = db.Column(db.String(200), nullable=True)
+    preview = db.Column(db.String(200), nullable=True)
+    waveform = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
 
     song = db.relationship('Song', backref=db.backref('media_files', lazy=True, cascade='all, delete-orphan'))
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'song_id': self.song_id,
-            'filename': self.original_filename or self.filename,
-            'file_type': self.file_type,
-            'file_size': self.file_size,
-            'url': f'/uploads/{self.filename}',
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-        }
+    __table_args__ = (
+        db.Index('ix_media_song_id', 'song_id'),
+        db.Index('ix_media_updated_at', 'updated_at'),
+    )
 
+    FIELDS = ('id', 'song_id', 'filename', 'file_type', 'file_size', 'url',
+              'thumbnail_url', 'preview_url', 'waveform_url', 'created_at', 'updated_at')
+    FIELD_COLUMNS = {
+        'filename': ('filename', 'original_filename'),
+        'url': ('filename',),
+        'thumbnail_url': ('thumbnail',),
+        'preview_url': ('preview',),
+        'waveform_url': ('waveform',),
+    }
+    DERIVED_FIELDS = {
+        'filename': lambda filename, original_filename: original_filename or filename,
+        'url': lambda filename: f'/uploads/{filename}',
+        'thumbnail_url': derived_url,
+        'preview_url': derived_url,
+        'waveform_url': derived_url,
+    }
 
-class SongSuggestion(db.Model):
+
+class SongSuggestion(SerializableMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     artist = db.Column(db.String(100), nullable=False)
@@ -69,61 +144,71 @@ class SongSuggestion(db.Model):
     memo = db.Column(db.Text, nullable=True)
     thumbs_up = db.Column(db.Integer, default=0)
     thumbs_down = db.Column(db.Integer, default=0)
+    score = db.Column(db.Integer, db.Computed('thumbs_up - thumbs_down', persisted=True))
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'artist': self.artist,
-            'link': self.link,
-            'memo': self.memo,
-            'thumbs_up': self.thumbs_up,
-            'thumbs_down': self.thumbs_down,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-        }
+    __table_args__ = (
+        db.Index('ix_song_suggestion_score_id', 'score', 'id'),
+        db.Index('ix_song_suggestion_updated_at', 'updated_at'),
+    )
 
+    FIELDS = ('id', 'title', 'artist', 'link', 'memo', 'thumbs_up', 'thumbs_down', 'created_at',
+              'updated_at')
 
-class Member(db.Model):
+
+class Member(SerializableMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     instrument = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'instrument': self.instrument,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-        }
+    __table_args__ = (
+        db.Index('ix_member_updated_at', 'updated_at'),
+    )
 
+    FIELDS = ('id', 'name', 'instrument', 'created_at', 'updated_at')
 
-class PersonalLog(db.Model):
+
+class PersonalLog(SerializableMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     member_id = db.Column(db.Integer, db.ForeignKey('member.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     filename = db.Column(db.String(200), nullable=False)
     original_filename = db.Column(db.String(200), nullable=True)
     file_type = db.Column(db.String(20), nullable=False)
+    waveform = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
 
     member = db.relationship('Member', backref=db.backref('personal_logs', lazy=True, cascade='all, delete-orphan'))
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'member_id': self.member_id,
-            'member_name': self.member.name if self.member else None,
-            'title': self.title,
-            'filename': self.original_filename or self.filename,
-            'file_type': self.file_type,
-            'url': f'/uploads/personal_logs/{self.filename}',
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-        }
+    __table_args__ = (
+        db.Index('ix_personal_log_member_id_created_at', 'member_id', 'created_at', 'id'),
+        db.Index('ix_personal_log_updated_at', 'updated_at'),
+    )
+
+    FIELDS = ('id', 'member_id', 'member_name', 'title', 'filename', 'file_type', 'url',
+              'waveform_url', 'created_at', 'updated_at')
+    FIELD_COLUMNS = {
+        'member_name': ('member_id',),
+        'filename': ('filename', 'original_filename'),
+        'url': ('filename',),
+        'waveform_url': ('waveform',),
+    }
+    DERIVED_FIELDS = {
+        'filename': lambda filename, original_filename: original_filename or filename,
+        'url': lambda filename: f'/uploads/personal_logs/{filename}',
+        'waveform_url': derived_url,
+    }
+    RELATED_FIELDS = {'member_name': ('member', 'name')}
 
 
-class PracticeLog(db.Model):
+class PracticeLog(SerializableMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     song_id = db.Column(db.Integer, db.ForeignKey('song.id'), nullable=False)
     date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
@@ -136,15 +221,86 @@ class PracticeLog(db.Model):
 
     song = db.relationship('Song', backref=db.backref('practice_logs', lazy=True, cascade='all, delete-orphan'))
 
+    __table_args__ = (
+        # Per-song log list (newest first) and the dashboard's recent logs.
+        db.Index('ix_practice_log_song_id_date', 'song_id', 'date', 'id'),
+        db.Index('ix_practice_log_date', 'date'),
+        db.Index('ix_practice_log_updated_at', 'updated_at'),
+    )
+
+    FIELDS = ('id', 'song_id', 'song_title', 'date', 'content', 'feedback', 'recording',
+              'created_at', 'updated_at')
+    FIELD_COLUMNS = {'song_title': ('song_id',)}
+    RELATED_FIELDS = {'song_title': ('song', 'title')}
+
+
+class Blob(db.Model):
+    """One stored file in the content-addressed store (see blob_store.py)."""
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class UploadSession(db.Model):
+    """A resumable upload in progress; bytes live in ``UPLOAD_FOLDER/.partial/<id>``."""
+
+    id = db.Column(db.String(32), primary_key=True)
+    target = db.Column(db.String(20), nullable=False)  # media, sheet_music, recording, personal_log
+    target_id = db.Column(db.Integer, nullable=False)
+    original_filename = db.Column(db.String(200), nullable=False)
+    title = db.Column(db.String(200), nullable=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    # Set when the client's declared sha256 is already stored; no bytes are uploaded.
+    existing_sha256 = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
     def to_dict(self):
         return {
             'id': self.id,
-            'song_id': self.song_id,
-            'song_title': self.song.title if self.song else None,
-            'date': self.date.isoformat() if self.date else None,
-            'content': self.content,
-            'feedback': self.feedback,
-            'recording': self.recording,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'target': self.target,
+            'target_id': self.target_id,
+            'filename': self.original_filename,
+            'size': self.size,
+            'offset': self.received,
+            'deduplicated': self.existing_sha256 is not None,
+            'created_at': isoformat(self.created_at),
         }
+
+
+class MediaJob(db.Model):
+    """Derived-file work for one stored blob (see media_jobs.py)."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # thumbnail, preview, waveform
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed, skipped
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # One job per content and kind: duplicate uploads reuse the result.
+        db.UniqueConstraint('sha256', 'kind', name='uq_media_job_sha256_kind'),
+        # Workers claim the oldest pending jobs.
+        db.Index('ix_media_job_status_id', 'status', 'id'),
+    )
+
+
+class Tombstone(db.Model):
+    """A deleted row, kept so /sync can tell clients to drop it (see tombstones.py)."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.Index('ix_tombstone_deleted_at', 'deleted_at'),
+    )
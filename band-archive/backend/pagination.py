@@ -0,0 +1,162 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import jsonify, request
+from sqlalchemy import DateTime, and_, or_
+
+from errors import ValidationError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class SortKey:
+    """One column of a keyset ordering.
+
+    ``expression`` is what goes into ORDER BY / WHERE, ``getter`` reads the
+    same value back from a loaded row so the next cursor can be built. The
+    last key of an ordering must be unique (normally the primary key).
+    """
+
+    def __init__(self, expression, getter, descending=False):
+        self.expression = expression
+        self.getter = getter
+        self.descending = descending
+
+    def order_clause(self):
+        return self.expression.desc() if self.descending else self.expression.asc()
+
+    def after(self, value):
+        return self.expression < value if self.descending else self.expression > value
+
+    def decode(self, value):
+        if value is not None and isinstance(self.expression.type, DateTime):
+            return datetime.fromisoformat(value)
+        return value
+
+
+def column_key(column, descending=False):
+    return SortKey(column, lambda row: getattr(row, column.key), descending)
+
+
+def encode_cursor(values):
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _cursor_values(cursor, count):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        raise ValidationError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != count:
+        raise ValidationError("Invalid cursor")
+    return values
+
+
+def decode_cursor(cursor, sort_keys):
+    values = _cursor_values(cursor, len(sort_keys))
+    try:
+        return [key.decode(value) for key, value in zip(sort_keys, values)]
+    except (ValueError, TypeError):
+        raise ValidationError("Invalid cursor")
+
+
+def parse_limit():
+    """Return the requested page size, or None when the client wants everything."""
+    limit = request.args.get('limit')
+    if limit is None and 'cursor' not in request.args:
+        return None
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValidationError("limit must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValidationError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def parse_fields(model):
+    """Return the ``fields=`` selection as a tuple in the model's own key order."""
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = requested - set(model.FIELDS)
+    if unknown:
+        raise ValidationError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add('id')
+    return tuple(name for name in model.FIELDS if name in requested)
+
+
+def _keyset_filter(sort_keys, values):
+    clauses = []
+    for i, key in enumerate(sort_keys):
+        equal = [k.expression == v for k, v in zip(sort_keys[:i], values[:i])]
+        clauses.append(and_(*equal, key.after(values[i])))
+    return or_(*clauses)
+
+
+def paginate(query, sort_keys):
+    """Order ``query`` by ``sort_keys`` and apply ``limit``/``cursor`` from the request.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page
+    or when the request did not ask for pagination.
+    """
+    query = query.order_by(*(key.order_clause() for key in sort_keys))
+
+    limit = parse_limit()
+    if limit is None:
+        return query.all(), None
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(_keyset_filter(sort_keys, decode_cursor(cursor, sort_keys)))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([key.getter(rows[-1]) for key in sort_keys])
+
+
+def paginate_by_position(query, order_by):
+    """Like ``paginate`` but the cursor is the position of the next row.
+
+    For orderings whose values change between requests, such as relevance
+    scores, where a keyset cursor would skip or repeat whole runs of rows.
+    A row moving across a page boundary can still be missed or seen twice.
+    """
+    query = query.order_by(*order_by)
+
+    limit = parse_limit()
+    if limit is None:
+        return query.all(), None
+
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        offset, = _cursor_values(cursor, 1)
+        if type(offset) is not int or offset < 0:
+            raise ValidationError("Invalid cursor")
+
+    rows = query.offset(offset).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], encode_cursor([offset + limit])
+
+
+def paginated_response(items, next_cursor):
+    response = jsonify(items)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
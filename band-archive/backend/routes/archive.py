@@ -0,0 +1,45 @@
+"""Whole-archive export and import over HTTP (archive.py does the work).
+
+Both hand out or overwrite everything, so they are only registered with
+``ARCHIVE_ENDPOINTS_ENABLED`` and, when ``ARCHIVE_TOKEN`` is set, need it
+as a bearer token.
+"""
+import hmac
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from archive import export_archive, import_archive
+from upload_admission import admit_upload
+
+archive_bp = Blueprint('archive', __name__)
+
+
+@archive_bp.before_request
+def _check_token():
+    # Before the views' decorators, so a refused import never takes an upload slot.
+    token = current_app.config['ARCHIVE_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+
+@archive_bp.route('/archive/export', methods=['GET'])
+def export_bundle():
+    filename = f'band-archive-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.tar'
+    return Response(
+        stream_with_context(export_archive()),
+        mimetype='application/x-tar',
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
+
+
+@archive_bp.route('/archive/import', methods=['POST'])
+@admit_upload
+def import_bundle():
+    """Import a bundle sent as the raw request body or as a ``file`` form upload.
+
+    Bundles larger than MAX_CONTENT_LENGTH have to go through ``flask archive import``.
+    """
+    upload = request.files.get('file')
+    summary = import_archive(upload.stream if upload else request.stream)
+    return jsonify(summary), 201
@@ -0,0 +1,22 @@
+from flask import Blueprint, jsonify, request
+
+from batch import run_batch
+from errors import ValidationError
+
+batch_bp = Blueprint('batch', __name__)
+
+
+@batch_bp.route('/batch', methods=['POST'])
+def apply_batch():
+    """Create, update and delete songs, practice logs and members in one transaction."""
+    data = request.json
+    if not data or not isinstance(data, dict):
+        raise ValidationError("Request body is required")
+
+    results, failed = run_batch(data.get('operations'))
+    if failed:
+        return jsonify({
+            "error": f"{failed} of {len(results)} operations are invalid; nothing was applied",
+            "results": results,
+        }), 400
+    return jsonify({"results": results}), 200
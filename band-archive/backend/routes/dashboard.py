@@ -1,14 +1,15 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, current_app
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 from extensions import db
 from models import Song, PracticeLog
+from stats_cache import get_stats_cache
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 
-@dashboard_bp.route('/dashboard/stats', methods=['GET'])
-def get_stats():
+def _compute_stats():
     total_songs = db.session.query(func.count(Song.id)).scalar()
 
     status_rows = db.session.query(Song.status, func.count(Song.id)).group_by(Song.status).all()
@@ -18,14 +19,21 @@ def get_stats():
 
     recent_logs = (
         PracticeLog.query
+        .options(joinedload(PracticeLog.song).load_only(Song.id, Song.title))
         .order_by(PracticeLog.date.desc())
         .limit(5)
         .all()
     )
 
-    return jsonify({
+    return current_app.json.dumps({
         "total_songs": total_songs,
         "status_counts": status_counts,
         "recent_practice_logs": [log.to_dict() for log in recent_logs],
         "total_practice_logs": total_practice_logs,
     })
+
+
+@dashboard_bp.route('/dashboard/stats', methods=['GET'])
+def get_stats():
+    # Served from memory until a song or practice log write invalidates it (stats_cache.py).
+    return Response(get_stats_cache().get_or_compute(_compute_stats), mimetype='application/json')
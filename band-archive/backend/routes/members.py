@@ -1,9 +1,13 @@
 from flask import Blueprint, jsonify, request
 
 from extensions import db
+from database import commit_for_response
 from models import Member
 from errors import NotFoundError, ValidationError
-from validators import validate_required_string, validate_string_length
+from validators import member_values
+from pagination import column_key, paginate, paginated_response, parse_fields
+from serialization import row_serializer
+from table_versions import versioned
 
 members_bp = Blueprint('members', __name__)
 
@@ -16,9 +20,11 @@ def _get_member_or_404(id):
 
 
 @members_bp.route('/members', methods=['GET'])
+@versioned(Member)
 def get_members():
-    members = Member.query.all()
-    return jsonify([m.to_dict() for m in members])
+    serializer = row_serializer(Member, parse_fields(Member))
+    members, next_cursor = paginate(serializer.query(), [column_key(Member.id)])
+    return paginated_response(serializer.dump(members), next_cursor)
 
 
 @members_bp.route('/members', methods=['POST'])
@@ -27,21 +33,14 @@ def create_member():
     if not data:
         raise ValidationError("Request body is required")
 
-    validate_required_string(data.get('name'), 'name')
-    validate_string_length(data.get('name'), 'name', 100)
-    validate_required_string(data.get('instrument'), 'instrument')
-    validate_string_length(data.get('instrument'), 'instrument', 100)
-
-    member = Member(
-        name=data['name'].strip(),
-        instrument=data['instrument'].strip(),
-    )
+    member = Member(**member_values(data))
     db.session.add(member)
-    db.session.commit()
+    commit_for_response()
     return jsonify(member.to_dict()), 201
 
 
 @members_bp.route('/members/<int:id>', methods=['GET'])
+@versioned(Member)
 def get_member(id):
     member = _get_member_or_404(id)
     return jsonify(member.to_dict())
@@ -55,17 +54,10 @@ def update_member(id):
     if not data:
         raise ValidationError("Request body is required")
 
-    if 'name' in data:
-        validate_required_string(data['name'], 'name')
-        validate_string_length(data['name'], 'name', 100)
-        member.name = data['name'].strip()
+    for field, value in member_values(data, partial=True).items():
+        setattr(member, field, value)
 
-    if 'instrument' in data:
-        validate_required_string(data['instrument'], 'instrument')
-        validate_string_length(data['instrument'], 'instrument', 100)
-        member.instrument = data['instrument'].strip()
-
-    db.session.commit()
+    commit_for_response()
     return jsonify(member.to_dict())
 
 
@@ -1,17 +1,17 @@
-import os
-
-from flask import Blueprint, jsonify, request, current_app, send_from_directory
+from flask import Blueprint, jsonify, request
 
 from extensions import db
+from database import commit_for_response
 from models import Member, PersonalLog
 from errors import NotFoundError, ValidationError
-from validators import (
-    validate_required_string,
-    validate_string_length,
-    allowed_file,
-    generate_secure_filename,
-    ALLOWED_EXTENSIONS,
-)
+from upload_admission import admit_upload
+from validators import validate_required_string, validate_string_length
+from blob_store import blob_hash, store_upload
+from media_files import media_key, send_media
+from pagination import column_key, paginate, paginated_response, parse_fields
+from serialization import row_serializer
+from storage import get_storage
+from table_versions import versioned
 
 personal_logs_bp = Blueprint('personal_logs', __name__)
 
@@ -29,12 +29,6 @@ def _get_member_or_404(member_id):
     return member
 
 
-def _get_upload_dir():
-    upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], PERSONAL_LOGS_SUBDIR)
-    os.makedirs(upload_dir, exist_ok=True)
-    return upload_dir
-
-
 def _detect_file_type(filename):
     ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
     if ext in VIDEO_EXTENSIONS:
@@ -42,16 +36,35 @@ def _detect_file_type(filename):
     return 'audio'
 
 
+def add_personal_log_record(member, title, filename, original_filename):
+    """Add a PersonalLog row for a file already stored in the personal_logs folder."""
+    log = PersonalLog(
+        member=member,
+        title=title,
+        filename=filename,
+        original_filename=original_filename,
+        file_type=_detect_file_type(original_filename),
+    )
+    db.session.add(log)
+    return log
+
+
 @personal_logs_bp.route('/members/<int:member_id>/logs', methods=['GET'])
+@versioned(Member, PersonalLog)
 def get_logs(member_id):
     _get_member_or_404(member_id)
-    logs = PersonalLog.query.filter_by(member_id=member_id).order_by(PersonalLog.created_at.desc()).all()
-    return jsonify([log.to_dict() for log in logs])
+    serializer = row_serializer(PersonalLog, parse_fields(PersonalLog))
+    logs, next_cursor = paginate(serializer.query(PersonalLog.created_at).filter(PersonalLog.member_id == member_id), [
+        column_key(PersonalLog.created_at, descending=True),
+        column_key(PersonalLog.id, descending=True),
+    ])
+    return paginated_response(serializer.dump(logs), next_cursor)
 
 
 @personal_logs_bp.route('/members/<int:member_id>/logs', methods=['POST'])
+@admit_upload
 def create_log(member_id):
-    _get_member_or_404(member_id)
+    member = _get_member_or_404(member_id)
 
     title = request.form.get('title', '').strip()
     validate_required_string(title, 'title')
@@ -68,21 +81,9 @@ def create_log(member_id):
     if ext not in ALLOWED_LOG_EXTENSIONS:
         raise ValidationError(f"File type not allowed. Allowed: {', '.join(sorted(ALLOWED_LOG_EXTENSIONS))}")
 
-    filename = generate_secure_filename(file.filename)
-    upload_dir = _get_upload_dir()
-    file_path = os.path.join(upload_dir, filename)
-    file.save(file_path)
-    os.chmod(file_path, 0o644)
-
-    log = PersonalLog(
-        member_id=member_id,
-        title=title,
-        filename=filename,
-        original_filename=file.filename,
-        file_type=_detect_file_type(file.filename),
-    )
-    db.session.add(log)
-    db.session.commit()
+    filename, _ = store_upload(file)
+    log = add_personal_log_record(member, title, filename, file.filename)
+    commit_for_response()
     return jsonify(log.to_dict()), 201
 
 
@@ -92,10 +93,11 @@ def delete_log(log_id):
     if not log:
         raise NotFoundError("Personal log not found")
 
-    upload_dir = _get_upload_dir()
-    file_path = os.path.join(upload_dir, log.filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Content-addressed files are released by reference counting (blob_store.py).
+    if not blob_hash(log.filename):
+        key = media_key(log.filename, PERSONAL_LOGS_SUBDIR)
+        if key:
+            get_storage().delete(key)
 
     db.session.delete(log)
     db.session.commit()
@@ -104,5 +106,4 @@ def delete_log(log_id):
 
 @personal_logs_bp.route('/uploads/personal_logs/<filename>')
 def serve_personal_log_file(filename):
-    upload_dir = _get_upload_dir()
-    return send_from_directory(upload_dir, filename)
+    return send_media(filename, subdir=PERSONAL_LOGS_SUBDIR)
@@ -1,12 +1,17 @@
-import os
-
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
 
 from extensions import db
+from database import commit_for_response
 from models import Song, PracticeLog
 from errors import NotFoundError, ValidationError
-from validators import allowed_file, generate_secure_filename, ALLOWED_EXTENSIONS
+from validators import allowed_file, practice_log_values, ALLOWED_EXTENSIONS
+from blob_store import store_upload
+from pagination import column_key, paginate, paginated_response, parse_fields
+from serialization import row_serializer
+from table_versions import versioned
+from upload_admission import admit_upload
 
 practice_logs_bp = Blueprint('practice_logs', __name__)
 
@@ -19,38 +24,41 @@ def _get_song_or_404(song_id):
 
 
 def _get_practice_log_or_404(id):
-    log = db.session.get(PracticeLog, id)
+    # Responses include song_title; load it with the log rather than lazily after.
+    log = db.session.get(PracticeLog, id, options=[joinedload(PracticeLog.song).load_only(Song.id, Song.title)])
     if not log:
         raise NotFoundError("Practice log not found")
     return log
 
 
 @practice_logs_bp.route('/songs/<int:song_id>/practice-logs', methods=['GET'])
+@versioned(Song, PracticeLog)
 def get_practice_logs(song_id):
     _get_song_or_404(song_id)
-    logs = PracticeLog.query.filter_by(song_id=song_id).order_by(PracticeLog.date.desc()).all()
-    return jsonify([log.to_dict() for log in logs])
+    serializer = row_serializer(PracticeLog, parse_fields(PracticeLog))
+    logs, next_cursor = paginate(serializer.query(PracticeLog.date).filter(PracticeLog.song_id == song_id), [
+        column_key(PracticeLog.date, descending=True),
+        column_key(PracticeLog.id, descending=True),
+    ])
+    return paginated_response(serializer.dump(logs), next_cursor)
 
 
 @practice_logs_bp.route('/songs/<int:song_id>/practice-logs', methods=['POST'])
 def create_practice_log(song_id):
-    _get_song_or_404(song_id)
+    song = _get_song_or_404(song_id)
 
     data = request.json
     if not data:
         raise ValidationError("Request body is required")
 
-    log = PracticeLog(
-        song_id=song_id,
-        content=data.get('content'),
-        feedback=data.get('feedback'),
-    )
+    log = PracticeLog(song=song, **practice_log_values(data))
     db.session.add(log)
-    db.session.commit()
+    commit_for_response()
     return jsonify(log.to_dict()), 201
 
 
 @practice_logs_bp.route('/practice-logs/<int:id>', methods=['GET'])
+@versioned(Song, PracticeLog)
 def get_practice_log(id):
     log = _get_practice_log_or_404(id)
     return jsonify(log.to_dict())
@@ -64,12 +72,10 @@ def update_practice_log(id):
     if not data:
         raise ValidationError("Request body is required")
 
-    if 'content' in data:
-        log.content = data['content']
-    if 'feedback' in data:
-        log.feedback = data['feedback']
+    for field, value in practice_log_values(data, partial=True).items():
+        setattr(log, field, value)
 
-    db.session.commit()
+    commit_for_response()
     return jsonify(log.to_dict())
 
 
@@ -82,6 +88,7 @@ def delete_practice_log(id):
 
 
 @practice_logs_bp.route('/practice-logs/<int:id>/upload', methods=['POST'])
+@admit_upload
 def upload_recording(id):
     log = _get_practice_log_or_404(id)
 
@@ -95,11 +102,7 @@ def upload_recording(id):
     if not allowed_file(file.filename):
         raise ValidationError(f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
 
-    filename = generate_secure_filename(file.filename)
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
-    os.chmod(file_path, 0o644)
-
+    filename, _ = store_upload(file)
     log.recording = filename
-    db.session.commit()
+    commit_for_response()
     return jsonify(log.to_dict()), 200
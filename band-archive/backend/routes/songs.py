@@ -1,22 +1,25 @@
-import os
 from datetime import datetime, timezone
 
-from flask import Blueprint, jsonify, request, send_from_directory, current_app
+from urllib.parse import quote
+
+from flask import Blueprint, Response, jsonify, request, current_app
 from werkzeug.utils import secure_filename
 
 from extensions import db
+from database import commit_for_response
 from models import Song, Media
 from errors import ValidationError, NotFoundError
-from validators import (
-    validate_status,
-    validate_difficulty,
-    validate_required_string,
-    validate_non_empty_string,
-    validate_string_length,
-    allowed_file,
-    generate_secure_filename,
-    ALLOWED_EXTENSIONS,
-)
+from pagination import column_key, paginate, paginate_by_position, paginated_response, parse_fields
+from serialization import row_serializer
+from table_versions import versioned
+from blob_store import blob_hash, store_upload
+from bundles import bundle_entries, safe_entry_name, stream_zip
+from media_files import is_immutable_name, media_key, send_media
+from media_jobs import derived_subdir
+from storage import get_storage
+from search import fts_matches, fts_snippets, like_filter, like_snippet, use_fts
+from upload_admission import admit_upload
+from validators import allowed_file, song_values, ALLOWED_EXTENSIONS
 
 songs_bp = Blueprint('songs', __name__)
 
@@ -39,21 +42,30 @@ def _detect_file_type(filename):
     return 'document'
 
 
+def add_media_record(song_id, filename, original_filename, file_size):
+    """Add a Media row for a file already stored under UPLOAD_FOLDER."""
+    media = Media(
+        song_id=song_id,
+        filename=filename,
+        original_filename=original_filename,
+        file_type=_detect_file_type(filename),
+        file_size=file_size,
+    )
+    db.session.add(media)
+    return media
+
+
 @songs_bp.route('/')
 def home():
     return jsonify({"message": "Band Archive API is running!"})
 
 
 @songs_bp.route('/songs', methods=['GET'])
+@versioned(Song, Media)
 def get_songs():
     try:
-        query = Song.query
-
-        q = request.args.get('q')
-        if q:
-            query = query.filter(
-                Song.title.ilike(f'%{q}%') | Song.artist.ilike(f'%{q}%')
-            )
+        serializer = row_serializer(Song, parse_fields(Song))
+        query = serializer.query()
 
         status = request.args.get('status')
         if status:
@@ -63,14 +75,36 @@ def get_songs():
         if genre:
             query = query.filter(Song.genre == genre)
 
-        songs = query.all()
-        return jsonify([song.to_dict() for song in songs])
+        q = request.args.get('q', '').strip()
+        if q and use_fts(q):
+            # Ranked search: best bm25 score first, snippet highlighted by FTS5.
+            matches = fts_matches(q)
+            query = query.join(matches, matches.c.song_id == Song.id).add_columns(matches.c.score)
+            # Every write changes the scores, so pages are by position, not keyset.
+            rows, next_cursor = paginate_by_position(query, [matches.c.score, Song.id])
+            snippets = fts_snippets(q, [row.id for row in rows])
+            items = serializer.dump(rows)
+            for item, row in zip(items, rows):
+                item['snippet'] = snippets.get(row.id)
+            return paginated_response(items, next_cursor)
+
+        if q:
+            query = query.filter(like_filter(q))
+        songs, next_cursor = paginate(query, [column_key(Song.id)])
+        items = serializer.dump(songs)
+        if q:
+            for item, song in zip(items, songs):
+                item['snippet'] = like_snippet(song, q)
+        return paginated_response(items, next_cursor)
+    except ValidationError:
+        raise
     except Exception as e:
         current_app.logger.error(f"Error fetching songs: {str(e)}")
         return jsonify({"error": str(e), "message": "Internal Server Error in get_songs"}), 500
 
 
 @songs_bp.route('/songs/<int:id>', methods=['GET'])
+@versioned(Song, Media)
 def get_song(id):
     song = _get_song_or_404(id)
     return jsonify(song.to_dict())
@@ -82,32 +116,13 @@ def add_song():
     if not data:
         raise ValidationError("Request body is required")
 
-    validate_required_string(data.get('title'), 'title')
-    validate_string_length(data.get('title'), 'title', 100)
-    validate_required_string(data.get('artist'), 'artist')
-    validate_string_length(data.get('artist'), 'artist', 100)
-    validate_string_length(data.get('link'), 'link', 200)
-    validate_string_length(data.get('genre'), 'genre', 50)
-
-    status = data.get('status', 'Practice')
-    validate_status(status)
-
-    difficulty = data.get('difficulty', 3)
-    validate_difficulty(difficulty)
-
     new_song = Song(
-        title=data['title'],
-        artist=data['artist'],
-        status=status,
-        lyrics=data.get('lyrics'),
-        chords=data.get('chords'),
-        link=data.get('link'),
-        memo=data.get('memo'),
-        genre=data.get('genre'),
-        difficulty=difficulty,
+        **song_values(data),
+        # Nothing to lazy-load for a new song.
+        media_files=[],
     )
     db.session.add(new_song)
-    db.session.commit()
+    commit_for_response()
     return jsonify(new_song.to_dict()), 201
 
 
@@ -119,38 +134,10 @@ def update_song(id):
     if not data:
         raise ValidationError("Request body is required")
 
-    if 'title' in data:
-        validate_non_empty_string(data['title'], 'title')
-        validate_string_length(data['title'], 'title', 100)
-        song.title = data['title']
-
-    if 'artist' in data:
-        validate_non_empty_string(data['artist'], 'artist')
-        validate_string_length(data['artist'], 'artist', 100)
-        song.artist = data['artist']
-
-    if 'status' in data:
-        validate_status(data['status'])
-        song.status = data['status']
-
-    if 'difficulty' in data:
-        validate_difficulty(data['difficulty'])
-        song.difficulty = data['difficulty']
-
-    if 'lyrics' in data:
-        song.lyrics = data['lyrics']
-    if 'chords' in data:
-        song.chords = data['chords']
-    if 'link' in data:
-        validate_string_length(data['link'], 'link', 200)
-        song.link = data['link']
-    if 'memo' in data:
-        song.memo = data['memo']
-    if 'genre' in data:
-        validate_string_length(data['genre'], 'genre', 50)
-        song.genre = data['genre']
+    for field, value in song_values(data, partial=True).items():
+        setattr(song, field, value)
 
-    db.session.commit()
+    commit_for_response()
     return jsonify(song.to_dict())
 
 
@@ -170,6 +157,7 @@ def _safe_filename(filename):
     return re.sub(r'[^a-zA-Z0-9가-힣._-]', '_', filename)
 
 @songs_bp.route('/songs/<int:id>/upload', methods=['POST'])
+@admit_upload
 def upload_sheet_music(id):
     song = _get_song_or_404(id)
 
@@ -183,32 +171,63 @@ def upload_sheet_music(id):
     if not allowed_file(file.filename):
         raise ValidationError(f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
 
-    filename = generate_secure_filename(file.filename)
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
-    os.chmod(file_path, 0o644)
-
-    media = Media(
-        song_id=id,
-        filename=filename,
-        original_filename=file.filename,
-        file_type=_detect_file_type(filename),
-        file_size=os.path.getsize(file_path),
-    )
-    db.session.add(media)
+    filename, file_size = store_upload(file)
+    add_media_record(id, filename, file.filename, file_size)
 
     song.sheet_music = filename
-    db.session.commit()
+    commit_for_response()
     return jsonify(song.to_dict()), 200
 
 
 @songs_bp.route('/songs/<int:id>/media', methods=['GET'])
+@versioned(Song, Media)
 def get_media_list(id):
-    song = _get_song_or_404(id)
-    return jsonify([media.to_dict() for media in song.media_files])
+    _get_song_or_404(id)
+    serializer = row_serializer(Media)
+    media = serializer.query().filter(Media.song_id == id).order_by(Media.id).all()
+    return jsonify(serializer.dump(media))
+
+
+def _zip_response(entries, filename):
+    ascii_name = filename.encode('ascii', 'replace').decode().replace('?', '_').replace('"', '_')
+    disposition = f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(filename)}'
+    return Response(stream_zip(entries), mimetype='application/zip',
+                    headers={'Content-Disposition': disposition})
+
+
+@songs_bp.route('/songs/<int:id>/bundle', methods=['GET'])
+def get_song_bundle(id):
+    """Zip of the song's lyrics, chords, media and practice recordings."""
+    entries = bundle_entries([id])
+    if entries is None:
+        raise NotFoundError("Song not found")
+    song = db.session.get(Song, id)
+    return _zip_response(entries, safe_entry_name(f'{song.title} - {song.artist}', f'song-{id}') + '.zip')
+
+
+@songs_bp.route('/songs/bundle', methods=['GET'])
+def get_setlist_bundle():
+    """Zip of several songs, one numbered folder each in the order of ``ids=3,1,2``."""
+    raw = request.args.get('ids', '')
+    try:
+        song_ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    except ValueError:
+        raise ValidationError("ids must be a comma-separated list of song ids")
+    if not song_ids:
+        raise ValidationError("ids is required")
+    limit = current_app.config['BUNDLE_MAX_SONGS']
+    if len(song_ids) > limit:
+        raise ValidationError(f"A bundle can hold at most {limit} songs")
+
+    entries = bundle_entries(song_ids, numbered=True)
+    if entries is None:
+        raise NotFoundError("Song not found")
+    name = safe_entry_name(request.args.get('name'), 'setlist')
+    return _zip_response(entries, f'{name}.zip')
 
 
 @songs_bp.route('/songs/<int:id>/media', methods=['POST'])
+@admit_upload
 def add_media(id):
     song = _get_song_or_404(id)
 
@@ -222,20 +241,9 @@ def add_media(id):
     if not allowed_file(file.filename):
         raise ValidationError(f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
 
-    filename = generate_secure_filename(file.filename)
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
-    os.chmod(file_path, 0o644)
-
-    media = Media(
-        song_id=id,
-        filename=filename,
-        original_filename=file.filename,
-        file_type=_detect_file_type(filename),
-        file_size=os.path.getsize(file_path),
-    )
-    db.session.add(media)
-    db.session.commit()
+    filename, file_size = store_upload(file)
+    media = add_media_record(id, filename, file.filename, file_size)
+    commit_for_response()
     return jsonify(media.to_dict()), 201
 
 
@@ -260,6 +268,12 @@ def rename_media(media_id):
             
     # Allow safe filename characters
     safe_name = _safe_filename(new_name)
+
+    if blob_hash(media.filename):
+        # Stored content is shared by hash; renaming only changes the display name.
+        media.original_filename = safe_name
+        commit_for_response()
+        return jsonify(media.to_dict()), 200
     
     # Try to preserve the ID_TIMESTAMP prefix structure
     parts = media.filename.split('_', 2)
@@ -272,17 +286,17 @@ def rename_media(media_id):
         
     new_filename = f"{prefix}{safe_name}"
     
-    old_path = os.path.join(current_app.config['UPLOAD_FOLDER'], media.filename)
-    new_path = os.path.join(current_app.config['UPLOAD_FOLDER'], new_filename)
-    
-    if os.path.exists(new_path):
+    old_key, new_key = media_key(media.filename), media_key(new_filename)
+    storage = get_storage()
+
+    if new_key is None or storage.exists(new_key):
         raise ValidationError("File with this name already exists")
         
-    if os.path.exists(old_path):
-        os.rename(old_path, new_path)
+    if old_key and storage.exists(old_key):
+        storage.move(old_key, new_key)
         
     media.filename = new_filename
-    db.session.commit()
+    commit_for_response()
     
     return jsonify(media.to_dict()), 200
 
@@ -293,9 +307,11 @@ def delete_media(media_id):
     if not media:
         raise NotFoundError("Media not found")
 
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], media.filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Content-addressed files are released by reference counting (blob_store.py).
+    if not blob_hash(media.filename):
+        key = media_key(media.filename)
+        if key:
+            get_storage().delete(key)
 
     db.session.delete(media)
     db.session.commit()
@@ -304,8 +320,11 @@ def delete_media(media_id):
 
 @songs_bp.route('/uploads/<filename>')
 def uploaded_file(filename):
-    response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
-    # Explicitly set MIME type for .m4a files for browser compatibility
-    if filename.lower().endswith('.m4a'):
-        response.headers['Content-Type'] = 'audio/mp4'
-    return response
+    return send_media(filename)
+
+
+@songs_bp.route('/uploads/derived/<filename>')
+def derived_file(filename):
+    if not is_immutable_name(filename):
+        raise NotFoundError("File not found")
+    return send_media(filename, subdir=derived_subdir(filename))
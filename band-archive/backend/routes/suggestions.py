@@ -1,12 +1,20 @@
 from flask import Blueprint, jsonify, request
+from sqlalchemy import func, update
 
 from extensions import db
+from database import commit_for_response
 from models import SongSuggestion
 from errors import NotFoundError, ValidationError
 from validators import validate_string_length
+from pagination import column_key, paginate, paginated_response, parse_fields
+from serialization import row_serializer
+from table_versions import versioned
 
 suggestions_bp = Blueprint('suggestions', __name__)
 
+VOTE_COLUMNS = {'up': 'thumbs_up', 'down': 'thumbs_down'}
+MAX_BATCH_VOTES = 1000
+
 
 def _get_suggestion_or_404(id):
     suggestion = db.session.get(SongSuggestion, id)
@@ -16,11 +24,14 @@ def _get_suggestion_or_404(id):
 
 
 @suggestions_bp.route('/suggestions', methods=['GET'])
+@versioned(SongSuggestion)
 def get_suggestions():
-    suggestions = SongSuggestion.query.order_by(
-        (SongSuggestion.thumbs_up - SongSuggestion.thumbs_down).desc()
-    ).all()
-    return jsonify([s.to_dict() for s in suggestions])
+    serializer = row_serializer(SongSuggestion, parse_fields(SongSuggestion))
+    suggestions, next_cursor = paginate(serializer.query(SongSuggestion.score), [
+        column_key(SongSuggestion.score, descending=True),
+        column_key(SongSuggestion.id, descending=True),
+    ])
+    return paginated_response(serializer.dump(suggestions), next_cursor)
 
 
 @suggestions_bp.route('/suggestions', methods=['POST'])
@@ -46,7 +57,7 @@ def create_suggestion():
     memo = data.get('memo', '').strip() or None
     suggestion = SongSuggestion(title=title, artist=artist, link=link, memo=memo)
     db.session.add(suggestion)
-    db.session.commit()
+    commit_for_response()
     return jsonify(suggestion.to_dict()), 201
 
 
@@ -63,21 +74,79 @@ def delete_suggestion(id):
     return jsonify({"message": "Suggestion deleted"}), 200
 
 
+def _validate_vote_type(vote_type):
+    if vote_type not in VOTE_COLUMNS:
+        raise ValidationError("vote_type must be 'up' or 'down'")
+
+
+def _apply_votes(suggestion_id, up=0, down=0):
+    """Add votes with one UPDATE ... RETURNING, so concurrent votes never overwrite each other.
+
+    Returns the updated suggestion, or None if it does not exist.
+    """
+    values = {}
+    if up:
+        values['thumbs_up'] = func.coalesce(SongSuggestion.thumbs_up, 0) + up
+    if down:
+        values['thumbs_down'] = func.coalesce(SongSuggestion.thumbs_down, 0) + down
+    return db.session.execute(
+        update(SongSuggestion)
+        .where(SongSuggestion.id == suggestion_id)
+        .values(values)
+        .returning(SongSuggestion)
+    ).scalar_one_or_none()
+
+
 @suggestions_bp.route('/suggestions/<int:id>/vote', methods=['POST'])
 def vote_suggestion(id):
-    suggestion = _get_suggestion_or_404(id)
-
     data = request.json
     if not data:
         raise ValidationError("Request body is required")
 
     vote_type = data.get('vote_type')
-    if vote_type == 'up':
-        suggestion.thumbs_up += 1
-    elif vote_type == 'down':
-        suggestion.thumbs_down += 1
-    else:
-        raise ValidationError("vote_type must be 'up' or 'down'")
+    _validate_vote_type(vote_type)
+
+    suggestion = _apply_votes(id, **{vote_type: 1})
+    if suggestion is None:
+        raise NotFoundError("Suggestion not found")
+    # Serialize from the RETURNING row; after commit it would be reloaded.
+    result = suggestion.to_dict()
+    db.session.commit()
+    return jsonify(result)
+
+
+@suggestions_bp.route('/suggestions/votes', methods=['POST'])
+def vote_suggestions_batch():
+    """Apply votes a client queued while offline: ``{"votes": [{"id", "vote_type"}, ...]}``.
+
+    All votes are applied in one transaction, one UPDATE per suggestion.
+    Votes for suggestions that have since been deleted are reported in
+    ``not_found`` instead of failing the batch.
+    """
+    data = request.json
+    if not data:
+        raise ValidationError("Request body is required")
 
+    votes = data.get('votes')
+    if not isinstance(votes, list) or not votes:
+        raise ValidationError("votes must be a non-empty list")
+    if len(votes) > MAX_BATCH_VOTES:
+        raise ValidationError(f"At most {MAX_BATCH_VOTES} votes per request")
+
+    totals = {}
+    for vote in votes:
+        if not isinstance(vote, dict) or not isinstance(vote.get('id'), int):
+            raise ValidationError("Each vote needs an integer id")
+        _validate_vote_type(vote.get('vote_type'))
+        counts = totals.setdefault(vote['id'], {'up': 0, 'down': 0})
+        counts[vote['vote_type']] += 1
+
+    updated, not_found = [], []
+    for suggestion_id, counts in totals.items():
+        suggestion = _apply_votes(suggestion_id, **counts)
+        if suggestion is None:
+            not_found.append(suggestion_id)
+        else:
+            updated.append(suggestion.to_dict())
     db.session.commit()
-    return jsonify(suggestion.to_dict())
+    return jsonify({"suggestions": updated, "not_found": not_found})
@@ -0,0 +1,88 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, current_app, jsonify, request
+
+from extensions import db
+from models import Tombstone
+from errors import ValidationError
+from serialization import row_serializer
+from table_versions import versioned
+from tombstones import SYNCED_MODELS
+
+sync_bp = Blueprint('sync', __name__)
+
+_COLLECTION_BY_TABLE = {model.__table__.name: name for name, model in SYNCED_MODELS.items()}
+
+
+def _encode_token(moment):
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode().rstrip('=')
+
+
+def _decode_token(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        moment = datetime.fromisoformat(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValidationError("Invalid sync token")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def _sync_fields(model):
+    # Nested lists (Song.media) are sent as their own collection.
+    return tuple(
+        name for name in model.FIELDS
+        if name not in model.RELATED_FIELDS or model.RELATED_FIELDS[name][1] is not None
+    )
+
+
+@sync_bp.route('/sync', methods=['GET'])
+@versioned(*SYNCED_MODELS.values())
+def get_sync():
+    """Rows created, updated or deleted since ``since`` (a token from a previous sync).
+
+    Without a token, or with one older than the tombstone retention, every
+    row is returned and ``full`` is true: the client replaces its copy.
+    Otherwise it applies ``deleted`` first, then upserts ``changes`` by id;
+    rows near the token's edge may be sent twice.
+    """
+    # Taken before reading, so nothing committed after this point is skipped next time.
+    now = datetime.now(timezone.utc)
+
+    since = request.args.get('since')
+    since = _decode_token(since) if since else None
+    retention = timedelta(days=current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'])
+    full = since is None or since < now - retention
+    if not full:
+        since -= timedelta(seconds=current_app.config['SYNC_OVERLAP_SECONDS'])
+
+    changes = {}
+    for name, model in SYNCED_MODELS.items():
+        serializer = row_serializer(model, _sync_fields(model))
+        query = serializer.query()
+        if not full:
+            query = query.filter(model.updated_at > since)
+        # In index order, so the updated_at index serves both the range and the sort.
+        changes[name] = serializer.dump(query.order_by(model.updated_at, model.id).all())
+
+    deleted = {name: [] for name in SYNCED_MODELS}
+    if not full:
+        tombstones = (
+            db.session.query(Tombstone.table_name, Tombstone.row_id)
+            .filter(Tombstone.deleted_at > since)
+            .order_by(Tombstone.deleted_at, Tombstone.id)
+        )
+        for table_name, row_id in tombstones:
+            collection = _COLLECTION_BY_TABLE.get(table_name)
+            if collection is not None:
+                deleted[collection].append(row_id)
+
+    return jsonify({
+        'token': _encode_token(now),
+        'full': full,
+        'changes': changes,
+        'deleted': deleted,
+    })
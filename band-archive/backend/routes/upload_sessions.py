@@ -0,0 +1,348 @@
+"""Chunked, resumable uploads.
+
+Protocol:
+    POST   /upload-sessions                      start: {target, target_id, filename, size[, title, sha256]}
+    PUT    /upload-sessions/<id>?offset=N        raw bytes for [N, N + len); N must equal the current offset
+    GET    /upload-sessions/<id>                 current offset, for resuming after a disconnect
+    POST   /upload-sessions/<id>/complete        finalize: {sha256?}; creates the Media/PersonalLog row
+    DELETE /upload-sessions/<id>                 abort
+
+Chunk bodies are streamed from ``request.stream`` straight into a partial file
+under ``UPLOAD_FOLDER/.partial``; nothing is buffered in memory beyond one
+read block. On completion the file is moved into the content-addressed store
+(blob_store.py). When the ``sha256`` declared at start is already stored, the
+session starts complete (``deduplicated: true``) and the client can call
+``complete`` straight away without sending any bytes.
+
+A chunk is written under an exclusive ``flock`` on the partial file, and the
+offset is checked against the database once the lock is held, so of two PUTs
+racing for the same offset only the one that gets the lock first writes.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, jsonify, request, current_app
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.exceptions import ClientDisconnected
+
+from extensions import db
+from database import commit_for_response
+from models import Member, PracticeLog, Song, UploadSession
+from errors import NotFoundError, ValidationError
+from upload_admission import admit_upload
+from validators import (
+    validate_required_string,
+    validate_string_length,
+    allowed_file,
+    ALLOWED_EXTENSIONS,
+)
+from blob_store import blob_hash, blob_name, blob_stat, claim_blob, store_file
+from routes.songs import add_media_record
+from routes.personal_logs import ALLOWED_LOG_EXTENSIONS, add_personal_log_record
+
+upload_sessions_bp = Blueprint('upload_sessions', __name__)
+
+PARTIAL_SUBDIR = '.partial'
+READ_BLOCK_SIZE = 64 * 1024
+
+# Parent model per target; the session's target_id refers to its primary key.
+TARGET_MODELS = {
+    'media': Song,
+    'sheet_music': Song,
+    'recording': PracticeLog,
+    'personal_log': Member,
+}
+
+# Sessions whose running checksum one worker keeps in memory.
+HASHER_CACHE_SIZE = 256
+
+# session id -> (bytes hashed, sha256 object), least recently used first. An
+# entry is only used while its byte count equals the session's offset, which
+# never moves back; a worker that did not see the latest chunks (restart,
+# another gunicorn worker) rebuilds the checksum from disk once. Entries for
+# sessions finished by another worker are evicted by newer ones.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def _cached_hasher(session_id, received):
+    with _hashers_lock:
+        cached = _hashers.get(session_id)
+        if cached is None or cached[0] != received:
+            return None
+        _hashers.move_to_end(session_id)
+        return cached[1]
+
+
+def _cache_hasher(session_id, received, hasher):
+    with _hashers_lock:
+        _hashers[session_id] = (received, hasher)
+        _hashers.move_to_end(session_id)
+        while len(_hashers) > HASHER_CACHE_SIZE:
+            _hashers.popitem(last=False)
+
+
+def _forget_hasher(session_id):
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+
+
+def _partial_path(session_id):
+    partial_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_SUBDIR)
+    os.makedirs(partial_dir, exist_ok=True)
+    return os.path.join(partial_dir, session_id)
+
+
+def _get_session_or_404(session_id):
+    session = db.session.get(UploadSession, session_id)
+    if not session:
+        raise NotFoundError("Upload session not found")
+    return session
+
+
+def _discard(session):
+    _forget_hasher(session.id)
+    path = _partial_path(session.id)
+    if os.path.exists(path):
+        os.remove(path)
+    db.session.delete(session)
+
+
+def _expire_stale_sessions():
+    ttl = timedelta(hours=current_app.config['UPLOAD_SESSION_TTL_HOURS'])
+    cutoff = datetime.now(timezone.utc) - ttl
+    for session in UploadSession.query.filter(UploadSession.updated_at < cutoff).all():
+        _discard(session)
+
+
+def _hasher_for(session):
+    cached = _cached_hasher(session.id, session.received)
+    if cached is not None:
+        return cached
+    hasher = hashlib.sha256()
+    remaining = session.received
+    with open(_partial_path(session.id), 'rb') as f:
+        while remaining:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _validate_filename(target, filename):
+    if target == 'personal_log':
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        if ext not in ALLOWED_LOG_EXTENSIONS:
+            raise ValidationError(f"File type not allowed. Allowed: {', '.join(sorted(ALLOWED_LOG_EXTENSIONS))}")
+    elif not allowed_file(filename):
+        raise ValidationError(f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
+
+
+@upload_sessions_bp.route('/upload-sessions', methods=['POST'])
+def create_upload_session():
+    data = request.json
+    if not data:
+        raise ValidationError("Request body is required")
+
+    target = data.get('target')
+    if target not in TARGET_MODELS:
+        raise ValidationError(f"target must be one of: {', '.join(TARGET_MODELS)}")
+
+    target_id = data.get('target_id')
+    if not isinstance(target_id, int) or not db.session.get(TARGET_MODELS[target], target_id):
+        raise NotFoundError(f"{TARGET_MODELS[target].__name__} not found")
+
+    filename = data.get('filename')
+    validate_required_string(filename, 'filename')
+    validate_string_length(filename, 'filename', 200)
+    _validate_filename(target, filename)
+
+    size = data.get('size')
+    max_size = current_app.config['MAX_UPLOAD_SIZE']
+    if not isinstance(size, int) or size < 1:
+        raise ValidationError("size must be a positive integer")
+    if size > max_size:
+        raise ValidationError(f"File too large. Maximum size is {max_size} bytes", status_code=413)
+
+    title = None
+    if target == 'personal_log':
+        title = (data.get('title') or '').strip()
+        validate_required_string(title, 'title')
+        validate_string_length(title, 'title', 200)
+
+    existing_sha256 = None
+    sha256 = (data.get('sha256') or '').lower()
+    if blob_hash(sha256):
+        stored = blob_stat(sha256)
+        if stored and stored.size == size:
+            existing_sha256 = sha256
+
+    _expire_stale_sessions()
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        target=target,
+        target_id=target_id,
+        original_filename=filename,
+        title=title,
+        size=size,
+        received=size if existing_sha256 else 0,
+        existing_sha256=existing_sha256,
+    )
+    open(_partial_path(session.id), 'wb').close()
+    db.session.add(session)
+    commit_for_response()
+    return jsonify(session.to_dict()), 201
+
+
+@upload_sessions_bp.route('/upload-sessions/<session_id>', methods=['GET'])
+def get_upload_session(session_id):
+    return jsonify(_get_session_or_404(session_id).to_dict())
+
+
+@upload_sessions_bp.route('/upload-sessions/<session_id>', methods=['PUT'])
+@admit_upload
+def upload_chunk(session_id):
+    session = _get_session_or_404(session_id)
+
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        raise ValidationError("offset is required")
+    if offset != session.received:
+        return jsonify({"error": "offset does not match upload progress", "offset": session.received}), 409
+
+    length = request.content_length
+    if length is None:
+        raise ValidationError("Content-Length is required", status_code=411)
+    if length > current_app.config['UPLOAD_CHUNK_SIZE']:
+        raise ValidationError(
+            f"Chunk too large. Maximum chunk size is {current_app.config['UPLOAD_CHUNK_SIZE']} bytes",
+            status_code=413,
+        )
+    if offset + length > session.size:
+        raise ValidationError("Chunk extends past the declared file size")
+
+    written = 0
+    try:
+        with open(_partial_path(session.id), 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # Another worker may have taken this offset while we waited for the lock.
+            received = db.session.query(UploadSession.received).filter_by(id=session.id).scalar()
+            if received != offset:
+                _forget_hasher(session.id)
+                if received is None:
+                    raise NotFoundError("Upload session not found")
+                return jsonify({"error": "offset does not match upload progress", "offset": received}), 409
+
+            # Hash into a copy: the cached hasher must keep matching the partial
+            # file until the UPDATE below has accepted this chunk.
+            hasher = _hasher_for(session).copy()
+            f.seek(offset)
+            try:
+                while written < length:
+                    block = request.stream.read(min(READ_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    hasher.update(block)
+                    written += len(block)
+            except ClientDisconnected:
+                # Keep what arrived; the client resumes from the offset it reads back.
+                pass
+            f.truncate(offset + written)
+            f.flush()
+            os.fsync(f.fileno())
+
+            # Still conditional on the offset, in case the row was changed without the lock.
+            now = datetime.now(timezone.utc)
+            updated = UploadSession.query.filter_by(id=session.id, received=offset).update(
+                {'received': offset + written, 'updated_at': now},
+                synchronize_session=False,
+            )
+            # Commit before the lock is released, so the next holder reads the new offset.
+            commit_for_response()
+    except BaseException:
+        _forget_hasher(session.id)
+        raise
+    if not updated:
+        _forget_hasher(session.id)
+        db.session.refresh(session)
+        return jsonify({"error": "offset does not match upload progress", "offset": session.received}), 409
+
+    _cache_hasher(session.id, offset + written, hasher)
+    # The row now holds exactly what the UPDATE wrote; no need to read it back.
+    set_committed_value(session, 'received', offset + written)
+    set_committed_value(session, 'updated_at', now)
+    return jsonify(session.to_dict())
+
+
+@upload_sessions_bp.route('/upload-sessions/<session_id>/complete', methods=['POST'])
+def complete_upload_session(session_id):
+    session = _get_session_or_404(session_id)
+    if session.received != session.size:
+        raise ValidationError(f"Upload incomplete: received {session.received} of {session.size} bytes")
+
+    partial_path = _partial_path(session.id)
+    if session.existing_sha256:
+        checksum = session.existing_sha256
+    else:
+        if os.path.getsize(partial_path) != session.size:
+            raise ValidationError("Partial file size does not match upload progress")
+        checksum = _hasher_for(session).hexdigest()
+    expected = (request.get_json(silent=True) or {}).get('sha256')
+    if expected and expected.lower() != checksum:
+        _discard(session)
+        db.session.commit()
+        raise ValidationError("Checksum mismatch; upload discarded")
+
+    parent = db.session.get(TARGET_MODELS[session.target], session.target_id)
+    if not parent:
+        _discard(session)
+        db.session.commit()
+        raise NotFoundError(f"{TARGET_MODELS[session.target].__name__} not found")
+
+    if session.existing_sha256:
+        if not claim_blob(checksum):
+            _discard(session)
+            db.session.commit()
+            raise ValidationError("The stored copy is gone; upload the file again", status_code=409)
+        os.remove(partial_path)
+    else:
+        store_file(partial_path, checksum)
+    filename = blob_name(checksum, session.original_filename)
+
+    if session.target == 'media':
+        result = add_media_record(parent.id, filename, session.original_filename, session.size)
+        status = 201
+    elif session.target == 'sheet_music':
+        add_media_record(parent.id, filename, session.original_filename, session.size)
+        parent.sheet_music = filename
+        result, status = parent, 200
+    elif session.target == 'recording':
+        parent.recording = filename
+        result, status = parent, 200
+    else:
+        result = add_personal_log_record(parent, session.title, filename, session.original_filename)
+        status = 201
+
+    _forget_hasher(session.id)
+    db.session.delete(session)
+    commit_for_response()
+    response = jsonify(result.to_dict())
+    response.headers['X-Content-SHA256'] = checksum
+    return response, status
+
+
+@upload_sessions_bp.route('/upload-sessions/<session_id>', methods=['DELETE'])
+def abort_upload_session(session_id):
+    session = _get_session_or_404(session_id)
+    _discard(session)
+    db.session.commit()
+    return jsonify({"message": "Upload session deleted"}), 200
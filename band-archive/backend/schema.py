@@ -0,0 +1,131 @@
+"""Schema version check at startup, and the explicit upgrade step.
+
+``create_app()`` used to run Alembic's ``upgrade()`` in every process it
+built: importing Alembic, loading every revision script and reflecting the
+version table on each gunicorn worker boot. Now startup reads the one
+revision stored in ``alembic_version`` and compares it with
+``SCHEMA_VERSION``; when they match no DDL runs and Alembic is never
+imported. ``SCHEMA_ON_BOOT`` decides what happens otherwise:
+
+* ``'check'``: refuse to start. Migrating is a deploy step,
+  ``flask schema upgrade``, run once before the workers start;
+* ``'migrate'``: upgrade in place (development);
+* ``'create_all'``: build the tables from the models, without Alembic (tests).
+
+Under the ``flask`` command a stale schema is only a warning, so that
+``flask schema upgrade`` can load the app it is about to fix.
+
+Bump ``SCHEMA_VERSION`` with every new revision in migrations/versions;
+a test checks it against the scripts.
+"""
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, ScriptInfo
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from extensions import db
+from search import init_search_index
+
+SCHEMA_VERSION = '0006'
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+SCHEMA_ON_BOOT_MODES = ('check', 'migrate', 'create_all')
+
+
+def stored_schema_version():
+    """The Alembic revision the database is at, or None before the first migration."""
+    try:
+        with db.engine.connect() as conn:
+            return conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+    except DBAPIError:  # No version table yet.
+        return None
+
+
+def init_migrate(app):
+    """Set up Flask-Migrate on first use; importing Alembic is most of its cost."""
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+
+
+def _upgrade(app):
+    init_migrate(app)
+    from flask_migrate import upgrade
+    upgrade(directory=MIGRATIONS_DIR)
+
+
+def upgrade_schema(app):
+    """Apply pending migrations and create the search index; returns the previous revision."""
+    previous = stored_schema_version()
+    if previous != SCHEMA_VERSION:
+        _upgrade(app)
+    init_search_index(app)
+    return previous
+
+
+def check_schema(app):
+    """Bring up the schema as ``SCHEMA_ON_BOOT`` says; inside an app context.
+
+    Returns False when the schema is left stale for ``flask schema upgrade``.
+    """
+    mode = app.config['SCHEMA_ON_BOOT']
+    if mode not in SCHEMA_ON_BOOT_MODES:
+        raise RuntimeError(f'Unknown SCHEMA_ON_BOOT {mode!r}')
+    if mode == 'create_all':
+        db.create_all()
+        return True
+    version = stored_schema_version()
+    if version == SCHEMA_VERSION:
+        return True
+    if mode == 'migrate':
+        _upgrade(app)
+        return True
+    message = (f'Database schema is at revision {version or "none"} but this code needs '
+               f'{SCHEMA_VERSION}; run `flask schema upgrade`')
+    if not os.environ.get('FLASK_RUN_FROM_CLI'):
+        raise RuntimeError(message)
+    app.logger.warning(message)
+    return False
+
+
+class LazyMigrateGroup(click.Group):
+    """Flask-Migrate's ``flask db`` group, imported only when it runs.
+
+    Only the name and help are known up front. Once ``flask db ...`` is
+    parsed the context is built by the real group, so its own options and
+    callback run as Flask-Migrate defines them.
+    """
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        init_migrate(parent.ensure_object(ScriptInfo).load_app())
+        from flask_migrate.cli import db as migrate_cli
+        return migrate_cli.make_context(info_name, args, parent=parent, **extra)
+
+
+schema_cli = AppGroup('schema', help='Check and upgrade the database schema.')
+
+
+@schema_cli.command('upgrade')
+def upgrade_command():
+    """Apply pending migrations; run once per deploy, before the workers start."""
+    previous = upgrade_schema(current_app)
+    if previous == SCHEMA_VERSION:
+        click.echo(f'Schema is current ({SCHEMA_VERSION}).')
+    else:
+        click.echo(f'Upgraded schema from {previous or "empty"} to {SCHEMA_VERSION}.')
+
+
+@schema_cli.command('check')
+def check_command():
+    """Exit 1 unless the database is at SCHEMA_VERSION."""
+    version = stored_schema_version()
+    click.echo(f'Database: {version or "none"}, code: {SCHEMA_VERSION}.')
+    if version != SCHEMA_VERSION:
+        raise click.exceptions.Exit(1)
+
+
+def init_schema(app):
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(LazyMigrateGroup('db', help='Perform database migrations.'))
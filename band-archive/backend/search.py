@@ -0,0 +1,166 @@
+"""Full-text search over songs.
+
+On SQLite the ``song_fts`` FTS5 table indexes title, artist, lyrics and memo
+with the trigram tokenizer, so any substring of three or more characters
+matches, Hangul included. Triggers on ``song`` keep it in sync, so every
+write path (ORM, bulk SQL, raw SQL) updates the index.
+
+Queries shorter than a trigram, and databases without FTS5, fall back to a
+LIKE scan over the same columns. That includes two-syllable Hangul words,
+which the trigram index cannot match.
+
+Ranked results are paged by position: bm25 depends on corpus statistics,
+so any write between two pages changes every score and a cursor holding a
+score would skip or repeat songs.
+
+Snippets are HTML: the song text in them is escaped and only the
+``<mark>`` tags around matches are markup.
+"""
+import re
+
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import Float, Integer, bindparam, or_, text
+
+from extensions import db
+from models import Song
+
+FTS_TABLE = 'song_fts'
+MIN_FTS_QUERY_LENGTH = 3
+SNIPPET_TOKENS = 16
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+# Snippets are built with these around matches, then escaped and given the tags.
+_MATCH_OPEN = '\x02'
+_MATCH_CLOSE = '\x03'
+
+# bm25 weights for title, artist, lyrics, memo: a title hit outranks a lyric hit.
+_BM25_WEIGHTS = '10.0, 5.0, 1.0, 1.0'
+
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, artist, lyrics, memo,
+        content='song', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER song_fts_ai AFTER INSERT ON song BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, artist, lyrics, memo)
+        VALUES (new.id, new.title, new.artist, new.lyrics, new.memo);
+    END""",
+    f"""CREATE TRIGGER song_fts_ad AFTER DELETE ON song BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, artist, lyrics, memo)
+        VALUES ('delete', old.id, old.title, old.artist, old.lyrics, old.memo);
+    END""",
+    f"""CREATE TRIGGER song_fts_au AFTER UPDATE OF title, artist, lyrics, memo ON song BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, artist, lyrics, memo)
+        VALUES ('delete', old.id, old.title, old.artist, old.lyrics, old.memo);
+        INSERT INTO {FTS_TABLE}(rowid, title, artist, lyrics, memo)
+        VALUES (new.id, new.title, new.artist, new.lyrics, new.memo);
+    END""",
+]
+
+
+def init_search_index(app):
+    """Create and backfill the FTS index if the database supports it.
+
+    Must run inside an app context after the ``song`` table exists. Records
+    the outcome in ``app.extensions['song_search_fts']``.
+    """
+    enabled = False
+    if db.engine.dialect.name == 'sqlite':
+        try:
+            with db.engine.begin() as conn:
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}
+                ).first()
+                if not exists:
+                    for statement in _FTS_DDL:
+                        conn.execute(text(statement))
+                    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+            enabled = True
+        except Exception as e:
+            app.logger.warning(f'FTS5 search index unavailable, using LIKE search: {e}')
+    app.extensions['song_search_fts'] = enabled
+
+
+def rebuild_search_index():
+    with db.engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def fts_enabled():
+    return current_app.extensions.get('song_search_fts', False)
+
+
+def _fts_phrase(q):
+    # Quote the input as one phrase so FTS5 operators typed by users are literal.
+    return '"' + q.replace('"', '""') + '"'
+
+
+def _highlight(snippet):
+    """Escape ``snippet`` as HTML and turn its match markers into highlight tags."""
+    return str(escape(snippet)).replace(_MATCH_OPEN, HIGHLIGHT_OPEN).replace(_MATCH_CLOSE, HIGHLIGHT_CLOSE)
+
+
+def fts_matches(q):
+    """Subquery of ``(song_id, score)`` for songs matching ``q``; lower score ranks higher."""
+    return (
+        text(
+            f"SELECT rowid AS song_id, bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query"
+        )
+        .bindparams(fts_query=_fts_phrase(q))
+        .columns(song_id=Integer, score=Float)
+        .subquery('fts')
+    )
+
+
+def fts_snippets(q, song_ids):
+    """Highlighted snippets for one page of results, keyed by song id.
+
+    Kept out of ``fts_matches`` so snippets are only built for the rows that
+    are returned, not for every match before ranking.
+    """
+    if not song_ids:
+        return {}
+    rows = db.session.execute(
+        text(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, :hl_open, :hl_close, '…', {SNIPPET_TOKENS}) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query AND rowid IN :ids"
+        ).bindparams(bindparam('ids', expanding=True)),
+        {'fts_query': _fts_phrase(q), 'hl_open': _MATCH_OPEN, 'hl_close': _MATCH_CLOSE,
+         'ids': list(song_ids)},
+    )
+    return {song_id: _highlight(snippet) for song_id, snippet in rows}
+
+
+def use_fts(q):
+    return fts_enabled() and len(q) >= MIN_FTS_QUERY_LENGTH
+
+
+def like_filter(q):
+    pattern = f'%{q}%'
+    return or_(
+        Song.title.ilike(pattern),
+        Song.artist.ilike(pattern),
+        Song.lyrics.ilike(pattern),
+        Song.memo.ilike(pattern),
+    )
+
+
+def like_snippet(row, q):
+    """Python-side equivalent of the FTS5 snippet for a LIKE-matched song row."""
+    pattern = re.compile(re.escape(q), re.IGNORECASE)
+    selected = row._fields
+    for column in ('title', 'artist', 'lyrics', 'memo'):
+        if column not in selected:
+            # Left out by fields=; not worth a query per row.
+            continue
+        value = (getattr(row, column) or '').replace(_MATCH_OPEN, '').replace(_MATCH_CLOSE, '')
+        match = pattern.search(value)
+        if not match:
+            continue
+        start = max(match.start() - 20, 0)
+        end = min(match.end() + 20, len(value))
+        excerpt = pattern.sub(lambda m: f'{_MATCH_OPEN}{m.group(0)}{_MATCH_CLOSE}', value[start:end])
+        return _highlight(('…' if start else '') + excerpt + ('…' if end < len(value) else ''))
+    return None
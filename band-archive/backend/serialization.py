@@ -0,0 +1,160 @@
+"""Fast path for read-only list endpoints.
+
+``Model.to_dict()`` needs ORM instances: every row is hydrated, entered in
+the identity map and then walked field by field. List endpoints instead
+select plain column tuples and turn them into dicts with a serializer
+generated once per ``(model, fields)`` from the model's ``FIELDS``,
+``FIELD_COLUMNS``, ``DERIVED_FIELDS`` and ``RELATED_FIELDS``:
+
+* plain and many-to-one fields become tuple indexes (the related column is
+  selected through an outer join);
+* datetimes are formatted inline, derived fields call the model's function;
+* one-to-many fields (``Song.media``) are filled by one extra tuple query
+  for the whole page.
+
+The output is identical to ``to_dict()``. ``FastJSONProvider`` then encodes
+responses with orjson when it is installed (``JSON_BACKEND``), keeping
+Flask's output conventions; without orjson Flask's own provider is used.
+"""
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import DateTime
+from sqlalchemy.orm import configure_mappers
+
+from extensions import db
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Parent keys per IN (...) when loading one-to-many fields; below SQLite's variable limit.
+IN_CHUNK_SIZE = 900
+
+
+class RowSerializer:
+    """Select list and generated ``row -> dict`` function for one field selection."""
+
+    def __init__(self, model, fields):
+        # Backrefs such as Song.media_files only exist once mappers are configured.
+        configure_mappers()
+        self.model = model
+        self.fields = fields
+        self.joins = []
+        self.collections = []  # (field, child serializer, foreign key column, parent key name)
+
+        columns = {}
+        for column in sorted(model.columns_for(fields), key=lambda c: c.table.columns.keys().index(c.key)):
+            columns[column.key] = column
+        for name in fields:
+            related = model.RELATED_FIELDS.get(name)
+            if related is None:
+                continue
+            relationship, attribute = related
+            prop = getattr(model, relationship).property
+            if attribute is None:
+                (parent_key, foreign_key), = prop.local_remote_pairs
+                columns.setdefault(parent_key.key, getattr(model, parent_key.key))
+                child = row_serializer(prop.mapper.class_, None)
+                self.collections.append((name, child, foreign_key, parent_key.key))
+            else:
+                self.joins.append(getattr(model, relationship))
+                columns[name] = getattr(prop.mapper.class_, attribute).label(name)
+
+        self.columns = list(columns.values())
+        self.serialize = self._compile(list(columns), columns)
+
+    def _compile(self, names, columns):
+        position = {name: i for i, name in enumerate(names)}
+        namespace = {}
+        items = []
+        for name in self.fields:
+            if name in self.model.DERIVED_FIELDS:
+                namespace[f'_derive_{name}'] = self.model.DERIVED_FIELDS[name]
+                args = ', '.join(f'row[{position[c]}]' for c in self.model.FIELD_COLUMNS[name])
+                items.append(f'{name!r}: _derive_{name}({args})')
+            elif name in position:
+                value = f'row[{position[name]}]'
+                if isinstance(getattr(columns[name], 'type', None), DateTime):
+                    value = f'({value}.isoformat() if {value} is not None else None)'
+                items.append(f'{name!r}: {value}')
+            # One-to-many fields are added by dump().
+        source = f"def serialize(row):\n    return {{{', '.join(items)}}}\n"
+        exec(compile(source, f'<serializer {self.model.__name__}>', 'exec'), namespace)
+        return namespace['serialize']
+
+    def query(self, *extra_columns):
+        """Legacy ``Query`` returning this selection as tuples; filter/paginate it as usual.
+
+        ``extra_columns`` (typically the sort keys) are appended when not already selected.
+        """
+        selected = {column.key for column in self.columns}
+        extra = [column for column in extra_columns if column.key not in selected]
+        query = db.session.query(*self.columns, *extra)
+        for relationship in self.joins:
+            query = query.outerjoin(relationship)
+        return query
+
+    def dump(self, rows):
+        serialize = self.serialize
+        items = [serialize(row) for row in rows]
+        for name, child, foreign_key, parent_key in self.collections:
+            keys = [getattr(row, parent_key) for row in rows]
+            grouped = {key: [] for key in keys}
+            for start in range(0, len(keys), IN_CHUNK_SIZE):
+                children = (
+                    child.query()
+                    .add_columns(foreign_key.label('_parent_key'))
+                    .filter(foreign_key.in_(keys[start:start + IN_CHUNK_SIZE]))
+                    .order_by(child.model.id)
+                )
+                for row in children:
+                    grouped[row._parent_key].append(child.serialize(row))
+            for item, key in zip(items, keys):
+                item[name] = grouped[key]
+        return items
+
+
+@lru_cache(maxsize=None)
+def row_serializer(model, fields=None):
+    """Return the cached serializer for ``model`` and a ``parse_fields`` selection."""
+    return RowSerializer(model, tuple(fields or model.FIELDS))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON output (sorted keys, compact unless debugging), encoded by orjson.
+
+    Types orjson would format differently (datetimes, dataclasses, str
+    subclasses) are passed through to Flask's ``default`` so the bytes match
+    the stdlib provider apart from non-ASCII text being sent as UTF-8.
+    """
+
+    def _orjson_options(self, indent):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME \
+            | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options(False)).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app):
+    backend = app.config['JSON_BACKEND']
+    if backend == 'stdlib' or (backend == 'auto' and orjson is None):
+        return
+    if orjson is None:
+        raise RuntimeError("JSON_BACKEND = 'orjson' but orjson is not installed")
+    app.json = FastJSONProvider(app)
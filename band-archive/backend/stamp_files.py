@@ -0,0 +1,40 @@
+"""Stamp files: cheap change markers shared by every worker using UPLOAD_FOLDER.
+
+A writer replaces the stamp with a fresh file holding a random token after
+committing; readers compare ``read_stamp()`` results, which cost one small
+read. Inode and mtime alone are not enough: an inode freed by the previous
+replace can be reused within one mtime tick, giving back the same pair.
+"""
+import os
+import tempfile
+
+from flask import current_app
+
+CACHE_SUBDIR = '.cache'
+STAMP_TOKEN_BYTES = 8
+
+
+def stamp_path(*parts):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], CACHE_SUBDIR, *parts)
+
+
+def read_stamp(path):
+    """Return ``(inode, mtime_ns, token)`` for the stamp, or None when there is none."""
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            token = f.read(STAMP_TOKEN_BYTES * 2).decode('ascii', 'replace')
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, token
+
+
+def touch_stamp(path, logger):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            f.write(os.urandom(STAMP_TOKEN_BYTES).hex())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f'Could not update stamp {path}: {e}')
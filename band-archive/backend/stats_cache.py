@@ -0,0 +1,130 @@
+"""In-memory cache of the dashboard stats response.
+
+``/dashboard/stats`` runs four queries that only change when songs or
+practice logs are written. Its encoded JSON body is kept in memory and reused
+until one of these happens:
+
+* a commit inserts or deletes a song, changes a song's status or title, or
+  writes a practice log (mapper events below). The committing process drops
+  its copy and touches a stamp file under ``UPLOAD_FOLDER/.cache``; other
+  gunicorn workers see the stamp change with one stamp read per request;
+* ``DASHBOARD_STATS_TTL_SECONDS`` passes, for writes that bypass the ORM or
+  a stamp file that is not shared between hosts.
+
+A TTL of 0 turns the cache off.
+"""
+import os
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import PracticeLog, Song
+from stamp_files import CACHE_SUBDIR, read_stamp, touch_stamp
+
+STAMP_FILENAME = 'dashboard-stats.stamp'
+
+# Song columns shown on the dashboard (status counts, recent log titles).
+SONG_STATS_COLUMNS = ('status', 'title')
+
+
+class StatsCache:
+    """Per-app cached body plus the versions it was computed at."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._cached = None  # (generation, stamp, expires_at, body)
+
+    def _stamp_path(self):
+        return os.path.join(self.app.config['UPLOAD_FOLDER'], CACHE_SUBDIR, STAMP_FILENAME)
+
+    def _touch_stamp(self):
+        touch_stamp(self._stamp_path(), self.app.logger)
+
+    def _fresh(self, cached, stamp):
+        return (cached is not None and cached[0] == self._generation and cached[1] == stamp
+                and cached[2] > time.monotonic())
+
+    def invalidate(self):
+        """Drop the cached stats here and in every worker sharing UPLOAD_FOLDER."""
+        with self._lock:
+            self._generation += 1
+            self._cached = None
+        self._touch_stamp()
+
+    def get_or_compute(self, compute):
+        """Return the cached body, calling ``compute()`` for a fresh one when stale."""
+        ttl = self.app.config['DASHBOARD_STATS_TTL_SECONDS']
+        if not ttl:
+            return compute()
+
+        stamp = read_stamp(self._stamp_path())
+        cached = self._cached
+        if self._fresh(cached, stamp):
+            return cached[3]
+
+        # One request per process recomputes; the others wait for its result.
+        with self._lock:
+            if self._fresh(self._cached, stamp):
+                return self._cached[3]
+            # Take the versions before querying: a write committed meanwhile
+            # bumps them again, so this result is never served as newer than it is.
+            generation = self._generation
+            body = compute()
+            self._cached = (generation, stamp, time.monotonic() + ttl, body)
+            return body
+
+
+def init_stats_cache(app):
+    app.extensions['dashboard_stats'] = StatsCache(app)
+
+
+def get_stats_cache():
+    return current_app.extensions['dashboard_stats']
+
+
+# ── Write-path invalidation ──
+
+def mark_stats_dirty(session):
+    """Invalidate the stats when ``session`` commits; for writes that skip the mapper events."""
+    session.info['dashboard_stats_dirty'] = True
+
+
+def _mark(target):
+    session = inspect(target).session
+    if session is not None:
+        mark_stats_dirty(session)
+
+
+def _song_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in SONG_STATS_COLUMNS):
+        _mark(target)
+
+
+def _row_written(mapper, connection, target):
+    _mark(target)
+
+
+event.listen(Song, 'after_insert', _row_written)
+event.listen(Song, 'after_update', _song_changed)
+event.listen(Song, 'after_delete', _row_written)
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(PracticeLog, _event, _row_written)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('dashboard_stats_dirty', False) and has_app_context():
+        cache = current_app.extensions.get('dashboard_stats')
+        if cache is not None:
+            cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_dirty(session):
+    session.info.pop('dashboard_stats_dirty', None)
@@ -0,0 +1,332 @@
+"""Where uploaded files live: the local upload folder or an S3-compatible bucket.
+
+Files are addressed by keys, ``/``-separated paths relative to the storage
+root:
+
+* ``blobs/ab/cd/<sha256>``: content-addressed uploads (blob_store.py);
+* ``derived/ab/cd/<name>``: thumbnails, previews and waveforms (media_jobs.py);
+* ``<name>`` and ``personal_logs/<name>``: flat uploads stored before the
+  blob store; ``flask storage reshard`` moves them into it (storage_gc.py).
+
+``sharded_key()`` spreads names over two levels of 256 directories, so a
+directory holds a few hundred entries even with millions of files.
+
+``STORAGE_BACKEND`` picks the driver:
+
+* ``local``: ``LocalStorage`` rooted at UPLOAD_FOLDER. It also hands out
+  real paths (``local_path``), so media is sent with ``sendfile`` or the
+  front server's X-Accel-Redirect and processed in place.
+* ``s3``: ``S3Storage`` in ``S3_BUCKET`` under ``S3_PREFIX``, at
+  ``S3_ENDPOINT_URL`` for services other than AWS (MinIO, R2, Tigris).
+  Needs boto3; credentials come from its usual environment and config
+  files. Media is streamed through the app, Range requests included.
+
+Partial uploads (``.partial``), temp files (``blobs/.tmp``) and stamp files
+(``.cache``) stay in UPLOAD_FOLDER with either driver: they are scratch
+space and coordinate the processes on one machine.
+"""
+import os
+import shutil
+import stat
+import tempfile
+from collections import namedtuple
+
+from flask import current_app
+from werkzeug.security import safe_join
+
+READ_BLOCK_SIZE = 64 * 1024
+
+StoredObject = namedtuple('StoredObject', 'key size mtime')
+
+
+def sharded_key(area, name):
+    """``area/ab/cd/name``, fanned out by the first four characters of ``name``."""
+    return f'{area}/{name[:2]}/{name[2:4]}/{name}'
+
+
+def is_safe_key(key):
+    """Relative, no ``..`` components: safe to join to a root or prefix."""
+    return bool(key) and safe_join('/', key) is not None
+
+
+def _check_key(key):
+    if not is_safe_key(key):
+        raise ValueError(f'Invalid storage key: {key!r}')
+
+
+class LocalStorage:
+    """Files under ``root``; a key is a path relative to it."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, key):
+        _check_key(key)
+        return os.path.join(self.root, *key.split('/'))
+
+    def stat(self, key):
+        try:
+            st = os.stat(self.local_path(key))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return StoredObject(key, st.st_size, st.st_mtime)
+
+    def exists(self, key):
+        return os.path.isfile(self.local_path(key))
+
+    def get_range(self, key, start=0, length=None):
+        """Yield the bytes of ``key`` from ``start``, ``length`` of them or up to the end."""
+        path = self.local_path(key)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                block = f.read(READ_BLOCK_SIZE if remaining is None else min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                if remaining is not None:
+                    remaining -= len(block)
+                yield block
+
+    def put_stream(self, key, stream):
+        """Store the rest of a readable binary stream; returns its size."""
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.', suffix='.tmp')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while block := stream.read(READ_BLOCK_SIZE):
+                    f.write(block)
+                    size += len(block)
+            self.put_file(key, tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def put_file(self, key, path):
+        """Move the local file at ``path`` to ``key``."""
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(path, 0o644)
+        os.replace(path, target)
+
+    def copy(self, source_key, key):
+        """Copy ``source_key`` to ``key``; a hard link when the filesystem allows one."""
+        source, target = self.local_path(source_key), self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            os.remove(target)
+            os.link(source, target)
+        except OSError:
+            if not os.path.isfile(source):
+                raise FileNotFoundError(source_key)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.', suffix='.tmp')
+            os.close(fd)
+            shutil.copyfile(source, tmp_path)
+            self.put_file(key, tmp_path)
+
+    def move(self, source_key, key):
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.local_path(source_key), target)
+
+    def delete(self, key):
+        """Remove ``key``; returns False if it was not there."""
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def walk(self, prefix, depth):
+        """Yield ``StorageEntry`` for files under ``prefix``, at most ``depth`` directories down.
+
+        Dot files directly under ``prefix`` are skipped. Entries are not
+        ``stat()``-ed until asked.
+        """
+        top = self.local_path(prefix) if prefix else self.root
+        stack = [(top, prefix, 0)]
+        while stack:
+            path, key_prefix, level = stack.pop()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        key = f'{key_prefix}/{entry.name}' if key_prefix else entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            if level < depth:
+                                stack.append((entry.path, key, level + 1))
+                        elif entry.is_file(follow_symlinks=False) and not (level == 0 and entry.name.startswith('.')):
+                            yield _LocalEntry(key, entry)
+            except FileNotFoundError:
+                continue
+
+
+class _LocalEntry:
+    __slots__ = ('key', 'name', '_entry')
+
+    def __init__(self, key, entry):
+        self.key = key
+        self.name = entry.name
+        self._entry = entry
+
+    def stat(self):
+        st = self._entry.stat(follow_symlinks=False)
+        return StoredObject(self.key, st.st_size, st.st_mtime)
+
+
+class _ListedEntry:
+    __slots__ = ('key', 'name', '_object')
+
+    def __init__(self, stored):
+        self.key = stored.key
+        self.name = stored.key.rsplit('/', 1)[-1]
+        self._object = stored
+
+    def stat(self):
+        return self._object
+
+
+class S3Storage:
+    """Objects in ``bucket`` under ``prefix``; a key is appended to the prefix."""
+
+    def __init__(self, client, bucket, prefix=''):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+
+    @classmethod
+    def from_config(cls, config):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND = 's3' but boto3 is not installed")
+        if not config['S3_BUCKET']:
+            raise RuntimeError("STORAGE_BACKEND = 's3' needs S3_BUCKET")
+        client = boto3.client('s3', endpoint_url=config['S3_ENDPOINT_URL'], region_name=config['S3_REGION'])
+        return cls(client, config['S3_BUCKET'], config['S3_PREFIX'])
+
+    def _object_key(self, key):
+        _check_key(key)
+        return self.prefix + key
+
+    @staticmethod
+    def _is_missing(error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def local_path(self, key):
+        return None
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return StoredObject(key, head['ContentLength'], head['LastModified'].timestamp())
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    def get_range(self, key, start=0, length=None):
+        from botocore.exceptions import ClientError
+        if length == 0:
+            return
+        request = {'Bucket': self.bucket, 'Key': self._object_key(key)}
+        if start or length is not None:
+            end = '' if length is None else start + length - 1
+            request['Range'] = f'bytes={start}-{end}'
+        try:
+            body = self.client.get_object(**request)['Body']
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+        try:
+            yield from body.iter_chunks(READ_BLOCK_SIZE)
+        finally:
+            body.close()
+
+    def put_stream(self, key, stream):
+        counted = _CountingReader(stream)
+        # Multipart for large streams, so memory stays at a few parts.
+        self.client.upload_fileobj(counted, self.bucket, self._object_key(key))
+        return counted.size
+
+    def put_file(self, key, path):
+        self.client.upload_file(path, self.bucket, self._object_key(key))
+        os.remove(path)
+
+    def copy(self, source_key, key):
+        from botocore.exceptions import ClientError
+        try:
+            # Server-side; multipart for objects over 5 GB.
+            self.client.copy({'Bucket': self.bucket, 'Key': self._object_key(source_key)},
+                             self.bucket, self._object_key(key))
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(source_key)
+            raise
+
+    def move(self, source_key, key):
+        self.copy(source_key, key)
+        self.delete(source_key)
+
+    def delete(self, key):
+        # S3 does not say whether the object existed.
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def walk(self, prefix, depth):
+        """Yield ``StorageEntry`` for objects under ``prefix``.
+
+        ``depth`` 0 lists only objects directly under it; anything else lists
+        the whole prefix. Dot names directly under ``prefix`` are skipped.
+        """
+        list_prefix = self.prefix + (f'{prefix}/' if prefix else '')
+        options = {'Bucket': self.bucket, 'Prefix': list_prefix}
+        if depth == 0:
+            options['Delimiter'] = '/'
+        for page in self.client.get_paginator('list_objects_v2').paginate(**options):
+            for item in page.get('Contents', ()):
+                key = item['Key'][len(self.prefix):]
+                relative = key[len(prefix) + 1:] if prefix else key
+                if relative.startswith('.'):
+                    continue
+                yield _ListedEntry(StoredObject(key, item['Size'], item['LastModified'].timestamp()))
+
+
+class _CountingReader:
+    def __init__(self, stream):
+        self._stream = stream
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.size += len(data)
+        return data
+
+
+def get_storage():
+    """The current app's storage backend."""
+    storage = current_app.extensions.get('storage')
+    if storage is None:
+        # Only a root path: built per call, so changes to UPLOAD_FOLDER (tests) apply.
+        return LocalStorage(current_app.config['UPLOAD_FOLDER'])
+    return storage
+
+
+def init_storage(app):
+    backend = app.config['STORAGE_BACKEND']
+    if backend == 's3':
+        app.extensions['storage'] = S3Storage.from_config(app.config)
+    elif backend != 'local':
+        raise RuntimeError(f'Unknown STORAGE_BACKEND {backend!r}')
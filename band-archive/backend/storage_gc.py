@@ -0,0 +1,478 @@
+"""Find stored files no row refers to, and rows whose file is gone.
+
+Content-addressed uploads are reference counted (blob_store.py), but files
+still leak: legacy flat uploads are left behind when a song, member or
+media row is deleted or a file is replaced, derived thumbnails and
+waveforms outlive their blob, failed imports leave unreferenced blobs,
+and crashed writes leave ``.tmp`` and ``.partial`` files.
+
+``scan_storage()`` loads every stored name the database refers to into
+sets (one single-column query per column), then walks the storage
+(storage.py: ``os.scandir`` on local disk, a bucket listing on S3) and
+looks each file up, so the cost is one pass over the tree plus one over
+the tables; only orphans are ``stat()``-ed. Orphans are
+handled in batches of SCAN_BATCH_SIZE: with ``delete`` each batch is
+checked against the database again just before unlinking, so rows
+committed since the index was built keep their files. Blobs and derived
+files are rechecked and unlinked under the blob-store lock, which an upload
+holds from storing its file until its row commits. Files younger
+than ``min_age`` seconds are never touched (an upload in flight is stored
+before its row commits). Referenced names not found on disk are reported
+as missing with the rows that refer to them.
+
+``.cache`` (stamp files) is not scanned; unknown directories are left alone.
+
+The scan runs from ``flask storage scan`` and, with
+``STORAGE_SCAN_INTERVAL_HOURS``, from a background thread in each app
+process; a lock file under ``.cache`` lets one process per interval do it.
+
+``flask storage reshard`` moves legacy flat uploads into the sharded blob
+store (``reshard_legacy_files()``).
+"""
+import fcntl
+import hashlib
+import os
+import re
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, select, update
+
+from archive import LEGACY_FILE_COLUMNS
+from blob_store import (
+    BLOB_SUBDIR,
+    REFERENCE_COLUMNS,
+    add_references,
+    blob_hash,
+    blob_name,
+    blob_relative_path,
+    claim_blob,
+    hold_blob_lock,
+)
+from extensions import db
+from media_jobs import DERIVED_COLUMNS, DERIVED_SUBDIR, enqueue_missing_jobs
+from models import Blob, MediaJob, UploadSession
+from routes.upload_sessions import PARTIAL_SUBDIR
+from stamp_files import read_stamp, stamp_path, touch_stamp
+from stats_cache import get_stats_cache
+from storage import LocalStorage, get_storage, is_safe_key
+
+SCAN_BATCH_SIZE = 1000
+INDEX_BATCH_SIZE = 5000
+RESHARD_BATCH_SIZE = 200
+
+SCAN_LOCK_NAME = 'storage-scan.lock'
+SCAN_STAMP_NAME = 'storage-scan.stamp'
+
+_DERIVED_NAME = re.compile(r'^([0-9a-f]{64})\.')
+
+
+def _names(column):
+    result = db.session.execute(
+        select(column).where(column.is_not(None)).execution_options(yield_per=INDEX_BATCH_SIZE)
+    )
+    return result.scalars()
+
+
+def _derived_columns():
+    return [getattr(model, kind) for model, kinds in DERIVED_COLUMNS.items() for kind in kinds]
+
+
+class StorageIndex:
+    """Everything the database refers to, as sets for O(1) lookups during the walk."""
+
+    def __init__(self):
+        self.blobs = set()      # sha256 of content-addressed names in file columns
+        self.live_blobs = set()  # ... plus Blob rows and upload sessions reusing a blob
+        self.legacy = {subdir: set() for subdir in LEGACY_FILE_COLUMNS}
+        self.derived = set()
+        self.partial = set()
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        for subdir, columns in LEGACY_FILE_COLUMNS.items():
+            for column in columns:
+                for name in _names(column):
+                    sha256 = blob_hash(name)
+                    if sha256:
+                        index.blobs.add(sha256)
+                    else:
+                        index.legacy[subdir].add(name)
+        for column in _derived_columns():
+            index.derived.update(_names(column))
+        index.live_blobs.update(index.blobs)
+        index.live_blobs.update(_names(Blob.sha256))
+        index.live_blobs.update(_names(UploadSession.existing_sha256))
+        index.partial.update(_names(UploadSession.id))
+        return index
+
+
+# ── Storage areas ──
+#
+# Each area is a directory of the storage. ``kept(name)`` says whether
+# the index keeps a file and ``recheck(names)`` returns the names of a batch
+# the database refers to right now.
+
+def _derived_blob(name):
+    """The blob a finished derived output was made from; None for temp files."""
+    match = _DERIVED_NAME.match(name)
+    return match.group(1) if match and not name.endswith('.tmp') else None
+
+
+def _blob_recheck(keys):
+    keys = list(keys)
+    return set(db.session.scalars(select(Blob.sha256).where(Blob.sha256.in_(keys)))) | set(
+        db.session.scalars(select(UploadSession.existing_sha256).where(UploadSession.existing_sha256.in_(keys)))
+    )
+
+
+def _derived_recheck(keys):
+    keys = list(keys)
+    referenced = set()
+    for column in _derived_columns():
+        referenced.update(db.session.scalars(select(column).where(column.in_(keys))))
+    sources = {name: _derived_blob(name) for name in keys if _derived_blob(name)}
+    live = _blob_recheck(set(sources.values()))
+    return referenced | {name for name, sha256 in sources.items() if sha256 in live}
+
+
+def _legacy_recheck(subdir):
+    def recheck(keys):
+        keys = list(keys)
+        referenced = set()
+        for column in LEGACY_FILE_COLUMNS[subdir]:
+            referenced.update(db.session.scalars(select(column).where(column.in_(keys))))
+        return referenced
+    return recheck
+
+
+def _partial_recheck(keys):
+    return set(db.session.scalars(select(UploadSession.id).where(UploadSession.id.in_(list(keys)))))
+
+
+def _derived_kept(index, name):
+    # Outputs are reused by later uploads of the same bytes while the blob lives.
+    return name in index.derived or _derived_blob(name) in index.live_blobs
+
+
+def _areas(index):
+    """``(area, storage, relative_dir, depth, kept, recheck)`` for every scanned directory."""
+    storage = get_storage()
+    # Partial uploads are scratch files, always on local disk.
+    scratch = LocalStorage(current_app.config['UPLOAD_FOLDER'])
+    areas = [
+        ('blobs', storage, BLOB_SUBDIR, 2, lambda name: name in index.live_blobs, _blob_recheck),
+        ('derived', storage, DERIVED_SUBDIR, 2, lambda name: _derived_kept(index, name), _derived_recheck),
+        ('partial', scratch, PARTIAL_SUBDIR, 0, lambda name: name in index.partial, _partial_recheck),
+    ]
+    for subdir in LEGACY_FILE_COLUMNS:
+        legacy = index.legacy[subdir]
+        areas.append((subdir or 'uploads', storage, subdir, 0, lambda name, legacy=legacy: name in legacy,
+                      _legacy_recheck(subdir)))
+    return areas
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ── Scanning ──
+
+def _missing_rows(index, seen):
+    """Rows whose stored name has no file, as ``{table, column, id, name}`` dicts."""
+    missing = []
+
+    def rows(column, condition):
+        model = column.class_
+        for row_id, name in db.session.execute(select(model.id, column).where(condition).order_by(model.id)):
+            missing.append({'table': model.__table__.name, 'column': column.key, 'id': row_id, 'name': name})
+
+    missing_blobs = sorted(index.blobs - seen['blobs'])
+    for subdir, columns in LEGACY_FILE_COLUMNS.items():
+        missing_legacy = sorted(index.legacy[subdir] - seen[subdir or 'uploads'])
+        for column in columns:
+            for batch in _batches(missing_blobs, SCAN_BATCH_SIZE):
+                rows(column, func.substr(column, 1, 64).in_(batch))
+            for batch in _batches(missing_legacy, SCAN_BATCH_SIZE):
+                rows(column, column.in_(batch))
+    missing_derived = sorted(index.derived - seen['derived'])
+    for column in _derived_columns():
+        for batch in _batches(missing_derived, SCAN_BATCH_SIZE):
+            rows(column, column.in_(batch))
+    return missing
+
+
+def _delete_batch(storage, orphans, recheck, report):
+    still_referenced = recheck({entry.name for entry, _ in orphans})
+    for entry, size in orphans:
+        if entry.name in still_referenced:
+            continue
+        if not storage.delete(entry.key):
+            continue
+        report['deleted'] += 1
+        report['deleted_bytes'] += size
+
+
+def scan_storage(delete=False, min_age=None):
+    """Compare the stored files with the database and return a report dict.
+
+    With ``delete`` orphans older than ``min_age`` seconds (default
+    ``STORAGE_SCAN_MIN_AGE_SECONDS``) are removed; younger ones are only counted.
+    """
+    if min_age is None:
+        min_age = current_app.config['STORAGE_SCAN_MIN_AGE_SECONDS']
+    cutoff = time.time() - min_age
+    index = StorageIndex.build()
+    report = {
+        'files': 0, 'orphans': {}, 'orphan_bytes': 0, 'orphan_files': [], 'recent': 0,
+        'missing': [], 'deleted': 0, 'deleted_bytes': 0,
+    }
+    seen = {}
+    dead_blobs = set()
+
+    for area, storage, subdir, depth, kept, recheck in _areas(index):
+        seen[area] = set()
+        report['orphans'][area] = 0
+        for batch in _batches(storage.walk(subdir, depth), SCAN_BATCH_SIZE):
+            orphans = []
+            for entry in batch:
+                report['files'] += 1
+                if kept(entry.name):
+                    seen[area].add(entry.name)
+                    continue
+                try:
+                    stored = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if stored.mtime > cutoff:
+                    report['recent'] += 1
+                    continue
+                report['orphans'][area] += 1
+                report['orphan_bytes'] += stored.size
+                report['orphan_files'].append(entry.key)
+                orphans.append((entry, stored.size))
+                if area == 'blobs' and blob_hash(entry.name):
+                    dead_blobs.add(entry.name)
+                elif area == 'derived' and _derived_blob(entry.name):
+                    dead_blobs.add(_derived_blob(entry.name))
+            if delete and orphans:
+                if area in ('blobs', 'derived'):
+                    # An upload deduplicating onto an old orphan holds the lock
+                    # until its row commits; the recheck then sees that row.
+                    hold_blob_lock()
+                _delete_batch(storage, orphans, recheck, report)
+                db.session.commit()
+
+    report['missing'] = _missing_rows(index, seen)
+    if delete and dead_blobs:
+        # Finished jobs of deleted content would point a re-upload at removed outputs.
+        hold_blob_lock()
+        for batch in _batches(sorted(dead_blobs - _blob_recheck(dead_blobs)), SCAN_BATCH_SIZE):
+            MediaJob.query.filter(MediaJob.sha256.in_(batch)).delete(synchronize_session=False)
+        db.session.commit()
+    return report
+
+
+# ── Re-sharding ──
+
+def _hash_stored(storage, key):
+    hasher = hashlib.sha256()
+    for block in storage.get_range(key):
+        hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _rename_rows(columns, renamed, summary, derived_ids):
+    """Point the rows naming each legacy file at its blob; returns ``{sha256: references}``.
+
+    The ids of renamed rows with derived files are added to ``derived_ids``.
+    """
+    counts = {}
+    for column in columns:
+        model = column.class_
+        counted = (model, column.key) in REFERENCE_COLUMNS
+        for name, (_, sha256, new_name) in renamed.items():
+            ids = db.session.execute(
+                update(model).where(column == name).values({column.key: new_name}).returning(model.id),
+                execution_options={'synchronize_session': False},
+            ).scalars().all()
+            summary['rows'] += len(ids)
+            if counted and ids:
+                counts[sha256] = counts.get(sha256, 0) + len(ids)
+            if model in DERIVED_COLUMNS:
+                derived_ids.setdefault(model, set()).update(ids)
+    return counts
+
+
+def reshard_legacy_files(batch_size=RESHARD_BATCH_SIZE):
+    """Move legacy flat uploads into the sharded blob store; returns a summary dict.
+
+    Each file is hashed where it is stored and copied to its blob key (a
+    hard link on local disk, a server-side copy on S3); the rows naming it
+    are renamed to ``<sha256>.<ext>`` with their references counted, and the
+    flat file is removed after that batch commits. The blobs are claimed or
+    copied under the blob-store lock, held until that commit. Until then the old name
+    keeps working, so the app can stay up, and an interrupted run is
+    finished by running it again.
+    """
+    storage = get_storage()
+    summary = {'moved': 0, 'deduplicated': 0, 'missing': 0, 'skipped': 0, 'rows': 0}
+    derived_ids = {}
+    for subdir, columns in LEGACY_FILE_COLUMNS.items():
+        names = set()
+        for column in columns:
+            names.update(name for name in _names(column) if not blob_hash(name))
+        for batch in _batches(sorted(names), batch_size):
+            renamed = {}
+            for name in batch:
+                key = f'{subdir}/{name}' if subdir else name
+                if not is_safe_key(key) or not storage.exists(key):
+                    summary['missing'] += 1
+                    continue
+                sha256 = _hash_stored(storage, key)
+                new_name = blob_name(sha256, name)
+                if blob_hash(new_name) != sha256:
+                    # An extension blob names cannot carry; keep the flat file.
+                    summary['skipped'] += 1
+                    continue
+                renamed[name] = (key, sha256, new_name)
+            if not renamed:
+                continue
+            # Held until the batch commits: an unlink in another process
+            # would see no references to the blobs yet and remove them.
+            for key, sha256, _ in renamed.values():
+                if claim_blob(sha256):
+                    summary['deduplicated'] += 1
+                    continue
+                blob_key = blob_relative_path(sha256)
+                storage.copy(key, blob_key)
+                path = storage.local_path(blob_key)
+                if path:
+                    # A link keeps the old mtime; look new to the orphan scan until the rows commit.
+                    os.utime(path)
+            add_references(db.session.connection(), _rename_rows(columns, renamed, summary, derived_ids))
+            db.session.commit()
+            for key, _, _ in renamed.values():
+                storage.delete(key)
+            summary['moved'] += len(renamed)
+    if summary['moved']:
+        get_stats_cache().invalidate()
+        enqueue_missing_jobs(derived_ids)
+    return summary
+
+
+# ── Scheduling ──
+
+def run_scheduled_scan(app):
+    """Scan if no process did within the interval; returns the report or None."""
+    interval = app.config['STORAGE_SCAN_INTERVAL_HOURS'] * 3600
+    lock_path = stamp_path(SCAN_LOCK_NAME)
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None  # Another process is scanning.
+        stamp = read_stamp(stamp_path(SCAN_STAMP_NAME))
+        if stamp is not None and stamp[1] / 1e9 > time.time() - interval:
+            return None
+        report = scan_storage(delete=app.config['STORAGE_SCAN_DELETE'])
+        touch_stamp(stamp_path(SCAN_STAMP_NAME), app.logger)
+    app.logger.info(
+        f"Storage scan: {report['files']} files, {sum(report['orphans'].values())} orphaned "
+        f"({report['orphan_bytes']} bytes), {report['deleted']} deleted, {len(report['missing'])} missing"
+    )
+    return report
+
+
+class StorageScanScheduler:
+    """Per-process thread that runs ``run_scheduled_scan`` about once an interval."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name='storage-scan', daemon=True)
+            thread.start()
+
+    def _run(self):
+        # Wake often enough that some process picks the scan up soon after it is due.
+        wait = min(self.app.config['STORAGE_SCAN_INTERVAL_HOURS'] * 3600, 600)
+        while True:
+            time.sleep(wait)
+            with self.app.app_context():
+                try:
+                    run_scheduled_scan(self.app)
+                except Exception:
+                    self.app.logger.exception('Storage scan failed')
+                finally:
+                    db.session.remove()
+
+
+storage_cli = AppGroup('storage', help='Check and maintain stored uploads.')
+
+
+@storage_cli.command('scan')
+@click.option('--delete', is_flag=True, help='Remove orphaned files.')
+@click.option('--min-age', type=int, default=None,
+              help='Leave orphans younger than this many seconds (default STORAGE_SCAN_MIN_AGE_SECONDS).')
+@click.option('--verbose', '-v', is_flag=True, help='List every orphaned and missing file.')
+def scan_command(delete, min_age, verbose):
+    """Report orphaned and missing files; with --delete, remove the orphans."""
+    started = time.monotonic()
+    report = scan_storage(delete=delete, min_age=min_age)
+    if verbose:
+        for path in report['orphan_files']:
+            click.echo(f'orphan  {path}')
+        for row in report['missing']:
+            click.echo(f"missing {row['name']} ({row['table']}.{row['column']} id={row['id']})")
+    areas = ', '.join(f'{count} {area}' for area, count in report['orphans'].items() if count)
+    click.echo(f"Scanned {report['files']} file(s) in {time.monotonic() - started:.1f}s: "
+               f"{sum(report['orphans'].values())} orphaned ({areas or 'none'}; "
+               f"{report['orphan_bytes']} bytes), {report['recent']} too recent to judge, "
+               f"{len(report['missing'])} missing.")
+    if delete:
+        click.echo(f"Deleted {report['deleted']} file(s), {report['deleted_bytes']} bytes.")
+    if report['missing']:
+        raise click.exceptions.Exit(1)
+
+
+@storage_cli.command('reshard')
+@click.option('--batch-size', type=int, default=RESHARD_BATCH_SIZE, show_default=True,
+              help='Files per transaction.')
+def reshard_command(batch_size):
+    """Move legacy flat uploads into the sharded, content-addressed blob store."""
+    started = time.monotonic()
+    summary = reshard_legacy_files(batch_size)
+    click.echo(f"Moved {summary['moved']} file(s) into the blob store in {time.monotonic() - started:.1f}s "
+               f"({summary['deduplicated']} already stored, {summary['rows']} row(s) renamed); "
+               f"{summary['missing']} missing, {summary['skipped']} skipped.")
+
+
+def init_storage_gc(app):
+    app.cli.add_command(storage_cli)
+    if not app.config['STORAGE_SCAN_INTERVAL_HOURS']:
+        return
+    scheduler = StorageScanScheduler(app)
+    app.extensions['storage_scan'] = scheduler
+
+    @app.before_request
+    def _start_storage_scan():
+        scheduler.start()
@@ -0,0 +1,108 @@
+"""Per-table version tokens and conditional GETs.
+
+Each versioned table has a stamp file under ``UPLOAD_FOLDER/.cache/versions``
+(see stamp_files.py). A commit that inserts, updates or deletes rows of the
+table - through the ORM or a bulk ``update(Model)`` statement - replaces the
+stamp, so what ``read_stamp()`` returns is a version token shared by every worker.
+
+``@versioned(Song, Media)`` on a GET view derives a weak ETag from the
+request URL and the tokens of the tables the response is built from. When
+the client's ``If-None-Match`` still matches, the view is not called and
+``304 Not Modified`` is returned after one stamp read per table, without a
+database query.
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, has_app_context, make_response, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Media, Member, PersonalLog, PracticeLog, Song, SongSuggestion
+from stamp_files import read_stamp, stamp_path, touch_stamp
+
+VERSIONS_SUBDIR = 'versions'
+
+VERSIONED_MODELS = (Song, Media, PracticeLog, Member, PersonalLog, SongSuggestion)
+VERSIONED_TABLES = {model.__table__.name for model in VERSIONED_MODELS}
+
+
+def _version_path(table):
+    return stamp_path(VERSIONS_SUBDIR, f'{table}.stamp')
+
+
+def current_versions(models):
+    return [read_stamp(_version_path(model.__table__.name)) for model in models]
+
+
+def bump_versions(tables):
+    for table in sorted(tables):
+        touch_stamp(_version_path(table), current_app.logger)
+
+
+def versioned(*models):
+    """Answer GETs with a version-based ETag and ``304`` when it still matches."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Read the versions before the data: a write landing in between
+            # leaves an older tag on newer data, which only costs a refetch.
+            key = f'{request.full_path}|{current_versions(models)}'
+            etag = hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # Browsers may keep the body but must revalidate before reusing it.
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+# ── Write-path bookkeeping ──
+
+def _mark(session, table):
+    if session is not None:
+        session.info.setdefault('changed_tables', set()).add(table)
+
+
+def _row_written(mapper, connection, target):
+    _mark(inspect(target).session, mapper.local_table.name)
+
+
+def _row_updated(mapper, connection, target):
+    # Called for every dirty instance, even without net column changes.
+    if any(attr.history.has_changes() for attr in inspect(target).attrs):
+        _mark(inspect(target).session, mapper.local_table.name)
+
+
+for _model in VERSIONED_MODELS:
+    event.listen(_model, 'after_insert', _row_written)
+    event.listen(_model, 'after_update', _row_updated)
+    event.listen(_model, 'after_delete', _row_written)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_statement(orm_execute_state):
+    # Bulk update(Model)/insert(Model)/delete(Model) statements skip the mapper events.
+    if orm_execute_state.is_update or orm_execute_state.is_insert or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.local_table.name in VERSIONED_TABLES:
+            _mark(orm_execute_state.session, mapper.local_table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables and has_app_context():
+        bump_versions(tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed(session):
+    session.info.pop('changed_tables', None)
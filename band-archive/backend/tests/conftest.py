@@ -2,6 +2,7 @@ import os
 import sys
 
 import pytest
+from sqlalchemy import event
 
 # Add backend directory to path so imports work
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -40,3 +41,17 @@ def sample_song(client):
         'status': 'Practice',
     })
     return resp.get_json()
+
+
+@pytest.fixture
+def query_counter(app):
+    """Record SQL statements issued while the returned list is being filled."""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = _db.engine
+    event.listen(engine, 'before_cursor_execute', _record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', _record)
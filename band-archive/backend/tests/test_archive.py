@@ -0,0 +1,312 @@
+import fcntl
+import importlib.util
+import io
+import os
+import tarfile
+import tracemalloc
+
+import pytest
+
+import archive
+import config
+from app import create_app
+from archive import export_archive, import_archive
+from blob_store import BLOB_LOCK_NAME, blob_path
+from config import TestingConfig
+from errors import ValidationError
+from extensions import db
+from models import Blob, Media, MediaJob, Song
+from stamp_files import stamp_path
+
+
+@pytest.fixture
+def target_app(tmp_path):
+    """A second, empty instance to import into."""
+    class TargetConfig(TestingConfig):
+        UPLOAD_FOLDER = str(tmp_path / 'target-uploads')
+    return create_app(TargetConfig)
+
+
+def _upload(client, song_id, name, content):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    ).get_json()
+
+
+def _seed(client):
+    song = client.post('/songs', json={'title': '밤편지', 'artist': 'IU', 'lyrics': '이 밤 그날의'}).get_json()
+    _upload(client, song['id'], 'take.mp3', b'mp3' * 1000)
+    _upload(client, song['id'], 'cover.png', b'png' * 100)
+    client.post(f"/songs/{song['id']}/practice-logs", json={'content': 'Bridge'})
+    member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+    client.post(
+        f"/members/{member['id']}/logs",
+        data={'title': 'warmup', 'file': (io.BytesIO(b'wav' * 50), 'warmup.wav')},
+        content_type='multipart/form-data',
+    )
+    client.post('/suggestions', json={'title': 'Creep', 'artist': 'Radiohead', 'link': 'https://example.com'})
+    return song
+
+
+def _export(client):
+    resp = client.get('/archive/export')
+    assert resp.status_code == 200
+    return resp.get_data()
+
+
+def _import(app, data):
+    with app.app_context():
+        return app.test_client().post('/archive/import', data=data, content_type='application/x-tar')
+
+
+def _without_ids(rows, *keys):
+    return [{k: v for k, v in row.items() if k not in ('id', 'url', *keys)} for row in rows]
+
+
+class TestExport:
+    def test_layout(self, client):
+        _seed(client)
+        names = [m.name for m in tarfile.open(fileobj=io.BytesIO(_export(client)))]
+        assert names[0] == 'manifest.json'
+        assert names[-1] == 'totals.json'
+        assert sum(name.startswith('files/') for name in names) == 3
+        assert names.index('data/song/000001.jsonl') < names.index('data/media/000001.jsonl')
+        assert max(i for i, n in enumerate(names) if n.startswith('files/')) < names.index('data/member/000001.jsonl')
+
+    def test_rows_are_split_into_members(self, client, monkeypatch):
+        monkeypatch.setattr(archive, 'ROWS_PER_MEMBER', 2)
+        for i in range(5):
+            client.post('/songs', json={'title': f'Song {i}', 'artist': 'A'})
+        names = [m.name for m in tarfile.open(fileobj=io.BytesIO(_export(client)))]
+        assert [n for n in names if n.startswith('data/song/')] == [
+            'data/song/000001.jsonl', 'data/song/000002.jsonl', 'data/song/000003.jsonl',
+        ]
+
+    def test_large_file_is_streamed_in_blocks(self, client, sample_song):
+        _upload(client, sample_song['id'], 'long.wav', os.urandom(4 * 1024 * 1024))
+        tracemalloc.start()
+        try:
+            largest = max(len(chunk) for chunk in export_archive())
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert largest <= 64 * 1024
+        assert peak < 1024 * 1024
+
+    def test_legacy_files_are_included(self, app, client, sample_song):
+        with open(os.path.join(app.config['UPLOAD_FOLDER'], '1_20240101_intro.mp3'), 'wb') as f:
+            f.write(b'old upload')
+        db.session.add(Media(song_id=sample_song['id'], filename='1_20240101_intro.mp3', file_type='audio'))
+        db.session.commit()
+        bundle = tarfile.open(fileobj=io.BytesIO(_export(client)))
+        assert bundle.extractfile('uploads/1_20240101_intro.mp3').read() == b'old upload'
+
+
+class TestImport:
+    def test_round_trip(self, client, target_app):
+        _seed(client)
+        data = _export(client)
+        source = {url: client.get(url).get_json() for url in ('/songs', '/members', '/suggestions')}
+
+        resp = _import(target_app, data)
+
+        assert resp.status_code == 201
+        assert resp.get_json()['files_stored'] == 3
+        with target_app.app_context():
+            target = target_app.test_client()
+            for url, rows in source.items():
+                assert target.get(url).get_json() == rows
+            assert target.get('/songs?q=밤편지').get_json()[0]['title'] == '밤편지'
+            assert target.get('/songs/1/media').get_json()[0]['filename'] == 'take.mp3'
+            assert sorted(b.ref_count for b in Blob.query) == [1, 1, 1]
+            assert open(blob_path(Blob.query.first().sha256), 'rb').read() in (b'mp3' * 1000, b'png' * 100, b'wav' * 50)
+            # Thumbnails and waveforms are rebuilt by the media jobs.
+            assert {job.kind for job in MediaJob.query} == {'thumbnail', 'waveform'}
+
+    def test_appends_with_new_ids_and_skips_stored_files(self, client, target_app):
+        _seed(client)
+        data = _export(client)
+        with target_app.app_context():
+            target_app.test_client().post('/songs', json={'title': 'Existing', 'artist': 'A'})
+        _import(target_app, data)
+
+        summary = _import(target_app, data).get_json()
+
+        assert summary['files_stored'] == 0 and summary['files_skipped'] == 3
+        with target_app.app_context():
+            songs = target_app.test_client().get('/songs').get_json()
+            assert [song['id'] for song in songs] == [1, 2, 3]
+            assert [len(song['media']) for song in songs] == [0, 2, 2]
+            assert _without_ids(songs[1]['media'], 'song_id', 'created_at', 'updated_at') == \
+                _without_ids(songs[2]['media'], 'song_id', 'created_at', 'updated_at')
+            assert sorted(b.ref_count for b in Blob.query) == [2, 2, 2]
+
+    def test_rows_already_there_are_not_touched(self, client, target_app):
+        _seed(client)
+        data = _export(client)
+        _import(target_app, data)
+        with target_app.app_context():
+            MediaJob.query.update({'status': 'done'})
+            db.session.commit()
+            before = {media.id: media.updated_at for media in Media.query}
+
+        _import(target_app, data)
+
+        with target_app.app_context():
+            assert {media.id: media.updated_at for media in Media.query if media.id in before} == before
+
+    def test_legacy_file_round_trip(self, app, client, sample_song, target_app):
+        with open(os.path.join(app.config['UPLOAD_FOLDER'], '1_20240101_intro.mp3'), 'wb') as f:
+            f.write(b'old upload')
+        db.session.add(Media(song_id=sample_song['id'], filename='1_20240101_intro.mp3', file_type='audio'))
+        db.session.commit()
+
+        _import(target_app, _export(client))
+
+        with target_app.app_context():
+            assert target_app.test_client().get('/uploads/1_20240101_intro.mp3').data == b'old upload'
+
+    def test_store_lock_is_not_held_while_streaming(self, client, target_app, monkeypatch):
+        _seed(client)
+        data = _export(client)
+        load = archive._RowImporter.load
+        held = []
+
+        def checking_lock(importer, table, fileobj):
+            # Every file has been read by now; they must not have taken the lock.
+            with open(stamp_path(BLOB_LOCK_NAME), 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    held.append(False)
+                except BlockingIOError:
+                    held.append(True)
+            return load(importer, table, fileobj)
+        monkeypatch.setattr(archive._RowImporter, 'load', checking_lock)
+
+        assert _import(target_app, data).status_code == 201
+        assert held and not any(held)
+
+    def test_stored_file_removed_during_the_import(self, client, sample_song, target_app, monkeypatch):
+        _upload(client, sample_song['id'], 'take.mp3', b'take')
+        data = _export(client)
+        _import(target_app, data)
+        with target_app.app_context():
+            path = blob_path(Blob.query.one().sha256)
+        hold_blob_lock = archive.hold_blob_lock
+
+        def unlinked_meanwhile():
+            # Another process dropped the last reference while the bundle streamed.
+            os.remove(path)
+            hold_blob_lock()
+        monkeypatch.setattr(archive, 'hold_blob_lock', unlinked_meanwhile)
+
+        resp = _import(target_app, data)
+
+        assert resp.status_code == 409
+        with target_app.app_context():
+            assert Song.query.count() == 1
+
+    def test_cli_round_trip(self, app, client, target_app, tmp_path):
+        _seed(client)
+        path = str(tmp_path / 'bundle.tar')
+        assert app.test_cli_runner().invoke(args=['archive', 'export', path]).exit_code == 0
+
+        # The runner reuses the current app context, so push the target's.
+        with target_app.app_context():
+            result = target_app.test_cli_runner().invoke(args=['archive', 'import', path])
+
+            assert result.exit_code == 0, result.output
+            assert 'stored 3 file(s)' in result.output
+            assert Song.query.count() == 1
+
+
+class TestInvalidBundles:
+    def test_truncated_bundle_commits_nothing(self, client, target_app):
+        _seed(client)
+        data = _export(client)
+        resp = _import(target_app, data[:len(data) - 4096])
+        assert resp.status_code == 400
+        with target_app.app_context():
+            assert Song.query.count() == 0
+        # Staged files are removed and nothing reached the store.
+        blobs = os.path.join(target_app.config['UPLOAD_FOLDER'], 'blobs')
+        assert [files for _, _, files in os.walk(blobs) if files] == []
+
+    def test_not_a_tar_file(self, target_app):
+        assert _import(target_app, b'not a tar file' * 100).status_code == 400
+
+    def test_manifest_required(self, target_app):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode='w') as tar:
+            info = tarfile.TarInfo('data/song/000001.jsonl')
+            tar.addfile(info, io.BytesIO(b''))
+        resp = _import(target_app, buf.getvalue())
+        assert resp.status_code == 400
+        assert 'manifest.json' in resp.get_json()['error']
+
+    def test_checksum_mismatch(self, client, sample_song, target_app):
+        _upload(client, sample_song['id'], 'take.mp3', b'audio')
+        data = bytearray(_export(client))
+        offset = data.index(b'audio')
+        data[offset:offset + 5] = b'AUDIO'
+        resp = _import(target_app, bytes(data))
+        assert resp.status_code == 400
+        assert 'Checksum mismatch' in resp.get_json()['error']
+
+    def test_missing_parent(self, target_app):
+        with target_app.app_context():
+            empty = tarfile.open(fileobj=io.BytesIO(b''.join(export_archive())))
+            manifest = empty.getmember('manifest.json')
+            row = b'{"id": 1, "song_id": 7, "filename": "a.mp3"}\n'
+            info = tarfile.TarInfo('data/media/000001.jsonl')
+            info.size = len(row)
+            out = io.BytesIO()
+            with tarfile.open(fileobj=out, mode='w') as tar:
+                tar.addfile(manifest, empty.extractfile(manifest))
+                tar.addfile(info, io.BytesIO(row))
+            out.seek(0)
+
+            with pytest.raises(ValidationError, match='missing song'):
+                import_archive(out)
+            assert Media.query.count() == 0
+
+
+class TestAccess:
+    def test_token(self, app, client, target_app):
+        app.config['ARCHIVE_TOKEN'] = 'secret'
+        assert client.get('/archive/export').status_code == 401
+        assert client.get('/archive/export', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        resp = client.get('/archive/export', headers={'Authorization': 'Bearer secret'})
+        assert resp.status_code == 200
+
+        target_app.config['ARCHIVE_TOKEN'] = 'secret'
+        assert _import(target_app, resp.get_data()).status_code == 401
+        with target_app.app_context():
+            assert target_app.test_client().post(
+                '/archive/import', data=resp.get_data(), content_type='application/x-tar',
+                headers={'Authorization': 'Bearer secret'},
+            ).status_code == 201
+
+    def test_disabled(self):
+        class NoArchiveEndpoints(TestingConfig):
+            ARCHIVE_ENDPOINTS_ENABLED = False
+        app = create_app(NoArchiveEndpoints)
+        with app.app_context():
+            assert app.test_client().get('/archive/export').status_code == 404
+
+    @pytest.mark.parametrize('token, enabled', [(None, False), ('secret', True)])
+    def test_production_needs_a_token(self, monkeypatch, token, enabled):
+        monkeypatch.delenv('ARCHIVE_ENDPOINTS_ENABLED', raising=False)
+        if token:
+            monkeypatch.setenv('ARCHIVE_TOKEN', token)
+        else:
+            monkeypatch.delenv('ARCHIVE_TOKEN', raising=False)
+        # Config values are read from the environment when the module is imported.
+        spec = importlib.util.spec_from_file_location('fresh_config', config.__file__)
+        fresh = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(fresh)
+
+        assert fresh.ProductionConfig.ARCHIVE_ENDPOINTS_ENABLED is enabled
+        assert fresh.DevelopmentConfig.ARCHIVE_ENDPOINTS_ENABLED is True
@@ -0,0 +1,233 @@
+import hashlib
+import io
+import os
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import Blob, Member, PersonalLog, PracticeLog, Song, Tombstone
+
+CONTENT = b'setlist take'
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def _batch(client, *operations):
+    return client.post('/batch', json={'operations': list(operations)})
+
+
+def _add_song(client, title):
+    return client.post('/songs', json={'title': title, 'artist': 'A'}).get_json()
+
+
+def _upload_recording(client, log_id):
+    return client.post(
+        f'/practice-logs/{log_id}/upload',
+        data={'file': (io.BytesIO(CONTENT), 'take.mp3')},
+        content_type='multipart/form-data',
+    )
+
+
+@pytest.fixture
+def commits(app):
+    recorded = []
+    engine = db.engine
+    listener = lambda conn: recorded.append(conn)  # noqa: E731
+    event.listen(engine, 'commit', listener)
+    yield recorded
+    event.remove(engine, 'commit', listener)
+
+
+class TestApply:
+    def test_mixed_operations_in_one_commit(self, client, sample_song, commits):
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        commits.clear()
+
+        resp = _batch(
+            client,
+            {'op': 'create', 'type': 'song', 'data': {'title': 'Yesterday', 'artist': 'The Beatles'}},
+            {'op': 'update', 'type': 'song', 'id': sample_song['id'], 'data': {'status': 'Completed'}},
+            {'op': 'create', 'type': 'practice_log', 'data': {'song_id': sample_song['id'], 'content': 'Gig'}},
+            {'op': 'update', 'type': 'member', 'id': member['id'], 'data': {'instrument': ' Keys '}},
+        )
+
+        assert resp.status_code == 200
+        assert len(commits) == 1
+        results = resp.get_json()['results']
+        assert [r['status'] for r in results] == [201, 200, 201, 200]
+        assert results[0]['data']['title'] == 'Yesterday'
+        assert results[0]['data']['status'] == 'Practice'
+        assert results[0]['data']['media'] == []
+        assert results[1]['data']['status'] == 'Completed'
+        assert results[2]['data']['song_title'] == 'Bohemian Rhapsody'
+        assert results[3]['data']['instrument'] == 'Keys'
+        assert client.get(f"/songs/{results[0]['id']}").get_json()['artist'] == 'The Beatles'
+        assert client.get(f"/practice-logs/{results[2]['id']}").get_json()['content'] == 'Gig'
+
+    def test_updates_are_bulk(self, client, query_counter):
+        songs = [_add_song(client, f'Song {i}') for i in range(20)]
+        query_counter.clear()
+
+        resp = _batch(client, *[
+            {'op': 'update', 'type': 'song', 'id': song['id'], 'data': {'status': 'Completed'}}
+            for song in songs
+        ])
+
+        assert resp.status_code == 200
+        updates = [s for s in query_counter if s.startswith('UPDATE song')]
+        assert len(updates) == 1
+        statuses = {song.status for song in Song.query.all()}
+        assert statuses == {'Completed'}
+
+    def test_updates_of_one_row_are_merged(self, client, sample_song):
+        resp = _batch(
+            client,
+            {'op': 'update', 'type': 'song', 'id': sample_song['id'], 'data': {'status': 'OnHold', 'memo': 'a'}},
+            {'op': 'update', 'type': 'song', 'id': sample_song['id'], 'data': {'status': 'Completed'}},
+        )
+
+        assert resp.status_code == 200
+        song = client.get(f"/songs/{sample_song['id']}").get_json()
+        assert (song['status'], song['memo']) == ('Completed', 'a')
+
+    def test_update_sets_updated_at(self, client, sample_song):
+        resp = _batch(client, {'op': 'update', 'type': 'song', 'id': sample_song['id'],
+                               'data': {'memo': 'Encore'}})
+
+        assert resp.get_json()['results'][0]['data']['updated_at'] > sample_song['updated_at']
+
+    def test_invalidates_dashboard_and_etags(self, client, sample_song):
+        stats = client.get('/dashboard/stats').get_json()
+        etag = client.get('/songs').headers['ETag']
+
+        _batch(client, {'op': 'update', 'type': 'song', 'id': sample_song['id'], 'data': {'status': 'Completed'}})
+
+        assert client.get('/dashboard/stats').get_json()['status_counts'] != stats['status_counts']
+        assert client.get('/songs', headers={'If-None-Match': etag}).status_code == 200
+
+
+class TestDelete:
+    def test_delete_keeps_tombstones_and_cascades(self, client, sample_song):
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'run'}).get_json()
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        db.session.add(PersonalLog(member_id=member['id'], title='t', filename='x.mp3', file_type='audio'))
+        db.session.commit()
+
+        resp = _batch(
+            client,
+            {'op': 'delete', 'type': 'song', 'id': sample_song['id']},
+            {'op': 'delete', 'type': 'member', 'id': member['id']},
+        )
+
+        assert resp.status_code == 200
+        assert [r['status'] for r in resp.get_json()['results']] == [200, 200]
+        assert (Song.query.count(), PracticeLog.query.count(), Member.query.count(), PersonalLog.query.count()) \
+            == (0, 0, 0, 0)
+        tombstones = {(t.table_name, t.row_id) for t in Tombstone.query.all()}
+        assert {('song', sample_song['id']), ('practice_log', log['id']), ('member', member['id'])} <= tombstones
+        assert len(tombstones) == 4
+
+    def test_delete_releases_blobs(self, app, client, sample_song):
+        logs = [client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': str(i)}).get_json()
+                for i in range(2)]
+        for log in logs:
+            assert _upload_recording(client, log['id']).status_code == 200
+        assert db.session.get(Blob, SHA256).ref_count == 2
+        db.session.expire_all()
+
+        _batch(client, {'op': 'delete', 'type': 'practice_log', 'id': logs[0]['id']})
+        assert db.session.get(Blob, SHA256).ref_count == 1
+        db.session.expire_all()
+
+        _batch(client, {'op': 'delete', 'type': 'song', 'id': sample_song['id']})
+        assert db.session.get(Blob, SHA256) is None
+        blob_file = os.path.join(app.config['UPLOAD_FOLDER'], 'blobs', SHA256[:2], SHA256[2:4], SHA256)
+        assert not os.path.exists(blob_file)
+
+
+class TestValidation:
+    def test_invalid_operation_applies_nothing(self, client, sample_song):
+        resp = _batch(
+            client,
+            {'op': 'create', 'type': 'song', 'data': {'title': 'Yesterday', 'artist': 'The Beatles'}},
+            {'op': 'update', 'type': 'song', 'id': sample_song['id'], 'data': {'difficulty': 9}},
+            {'op': 'update', 'type': 'song', 'id': 9999, 'data': {'status': 'Completed'}},
+            {'op': 'create', 'type': 'member', 'data': {'name': 'Kim'}},
+            {'op': 'create', 'type': 'practice_log', 'data': {'content': 'no song'}},
+            {'op': 'rename', 'type': 'song', 'id': 1},
+            {'op': 'delete', 'type': 'suggestion', 'id': 1},
+        )
+
+        assert resp.status_code == 400
+        body = resp.get_json()
+        assert body['error'] == '6 of 7 operations are invalid; nothing was applied'
+        assert [r['status'] for r in body['results']] == [424, 400, 404, 400, 400, 400, 400]
+        assert 'difficulty' in body['results'][1]['error']
+        assert body['results'][2]['error'] == 'Song 9999 not found'
+        assert body['results'][3]['error'] == 'instrument is required'
+        assert body['results'][4]['error'] == 'song_id must be an integer'
+        assert Song.query.count() == 1
+        assert db.session.get(Song, sample_song['id']).difficulty == 4
+
+    def test_practice_log_needs_an_existing_song(self, client):
+        resp = _batch(client, {'op': 'create', 'type': 'practice_log', 'data': {'song_id': 5, 'content': 'x'}})
+
+        assert resp.get_json()['results'][0] == {'index': 0, 'status': 404, 'error': 'Song 5 not found'}
+
+    def test_deleted_row_cannot_be_used(self, client, sample_song):
+        resp = _batch(
+            client,
+            {'op': 'delete', 'type': 'song', 'id': sample_song['id']},
+            {'op': 'create', 'type': 'practice_log', 'data': {'song_id': sample_song['id'], 'content': 'x'}},
+        )
+
+        assert resp.status_code == 400
+        assert resp.get_json()['results'][1]['error'] == f"Song {sample_song['id']} is deleted in this batch"
+
+    @pytest.mark.parametrize('type_, data, error', [
+        ('song', {'title': 5, 'artist': 'A'}, 'title must be a string'),
+        ('song', {'title': 'T', 'artist': 'A', 'status': ['Completed']}, 'Invalid status'),
+        ('member', {'name': 'Kim', 'instrument': 7}, 'instrument must be a string'),
+        ('practice_log', {'song_id': 1, 'content': {'a': 1}}, 'content must be a string'),
+    ])
+    def test_wrongly_typed_values_fail_their_operation(self, client, sample_song, type_, data, error):
+        resp = _batch(
+            client,
+            {'op': 'create', 'type': type_, 'data': data},
+            {'op': 'update', 'type': 'song', 'id': sample_song['id'], 'data': {'memo': 'x'}},
+        )
+
+        assert resp.status_code == 400
+        results = resp.get_json()['results']
+        assert results[0]['status'] == 400 and error in results[0]['error']
+        assert results[1] == {'index': 1, 'status': 424}
+
+    @pytest.mark.parametrize('op', ['update', 'delete'])
+    def test_logs_of_a_deleted_song_cannot_be_used(self, client, sample_song, op):
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'run'}).get_json()
+
+        resp = _batch(
+            client,
+            {'op': op, 'type': 'practice_log', 'id': log['id'], 'data': {'feedback': 'Tight'}},
+            {'op': 'delete', 'type': 'song', 'id': sample_song['id']},
+        )
+
+        assert resp.status_code == 400
+        assert resp.get_json()['results'] == [
+            {'index': 0, 'status': 400, 'error': f"Song {sample_song['id']} is deleted in this batch"},
+            {'index': 1, 'status': 424},
+        ]
+        assert PracticeLog.query.count() == 1
+
+    @pytest.mark.parametrize('body', [{}, {'operations': []}, {'operations': 'all'}, [1]])
+    def test_bad_body(self, client, body):
+        assert client.post('/batch', json=body).status_code == 400
+
+    def test_limit(self, app, client):
+        app.config['BATCH_MAX_OPERATIONS'] = 2
+        ops = [{'op': 'create', 'type': 'member', 'data': {'name': 'Kim', 'instrument': 'Bass'}}] * 3
+
+        resp = _batch(client, *ops)
+
+        assert resp.status_code == 400
+        assert 'at most 2' in resp.get_json()['error']
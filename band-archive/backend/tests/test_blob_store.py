@@ -0,0 +1,182 @@
+import fcntl
+import hashlib
+import io
+import os
+
+import pytest
+from sqlalchemy import insert
+
+from blob_store import BLOB_LOCK_NAME, store_upload
+from extensions import db
+from models import Blob, Media
+from stamp_files import stamp_path
+
+CONTENT = b'backing track bytes'
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def _blob_file(app, sha256=SHA256):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'blobs', sha256[:2], sha256[2:4], sha256)
+
+
+def _ref_count(sha256=SHA256):
+    blob = db.session.get(Blob, sha256)
+    db.session.expire_all()
+    return blob.ref_count if blob else 0
+
+
+def _add_song(client, title):
+    return client.post('/songs', json={'title': title, 'artist': 'A'}).get_json()
+
+
+def _add_media(client, song_id, name='track.mp3', content=CONTENT):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    ).get_json()
+
+
+class TestDeduplication:
+    def test_same_content_is_stored_once(self, client, app):
+        first = _add_media(client, _add_song(client, 'One')['id'])
+        second = _add_media(client, _add_song(client, 'Two')['id'], name='copy.MP3')
+
+        assert first['url'] == second['url'] == f'/uploads/{SHA256}.mp3'
+        assert second['filename'] == 'copy.MP3'
+        assert os.path.isfile(_blob_file(app))
+        assert _ref_count() == 2
+        assert client.get(first['url']).data == CONTENT
+
+    def test_blob_removed_with_last_reference(self, client, app):
+        first = _add_media(client, _add_song(client, 'One')['id'])
+        second = _add_media(client, _add_song(client, 'Two')['id'])
+
+        client.delete(f"/media/{first['id']}")
+        assert os.path.isfile(_blob_file(app))
+        assert _ref_count() == 1
+
+        client.delete(f"/media/{second['id']}")
+        assert not os.path.exists(_blob_file(app))
+        assert _ref_count() == 0
+
+    def test_song_delete_cascade_releases_blob(self, client, app):
+        song = _add_song(client, 'One')
+        _add_media(client, song['id'])
+        client.delete(f"/songs/{song['id']}")
+        assert not os.path.exists(_blob_file(app))
+
+    def test_shared_between_media_recordings_and_personal_logs(self, client, app):
+        song = _add_song(client, 'One')
+        _add_media(client, song['id'])
+        log = client.post(f"/songs/{song['id']}/practice-logs", json={'content': 'x'}).get_json()
+        client.post(f"/practice-logs/{log['id']}/upload",
+                    data={'file': (io.BytesIO(CONTENT), 'take.mp3')}, content_type='multipart/form-data')
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        client.post(f"/members/{member['id']}/logs",
+                    data={'title': 't', 'file': (io.BytesIO(CONTENT), 'take.mp3')},
+                    content_type='multipart/form-data')
+        assert _ref_count() == 3
+
+        client.delete(f"/members/{member['id']}")
+        client.delete(f"/songs/{song['id']}")
+        assert _ref_count() == 0
+        assert not os.path.exists(_blob_file(app))
+
+    def test_replacing_recording_releases_old_blob(self, client, app):
+        song = _add_song(client, 'One')
+        log = client.post(f"/songs/{song['id']}/practice-logs", json={'content': 'x'}).get_json()
+        for content in (CONTENT, b'second take'):
+            client.post(f"/practice-logs/{log['id']}/upload",
+                        data={'file': (io.BytesIO(content), 'take.wav')}, content_type='multipart/form-data')
+
+        assert not os.path.exists(_blob_file(app))
+        assert os.path.isfile(_blob_file(app, hashlib.sha256(b'second take').hexdigest()))
+
+    def test_rename_changes_display_name_only(self, client, app):
+        media = _add_media(client, _add_song(client, 'One')['id'])
+        resp = client.put(f"/media/{media['id']}/rename", json={'filename': 'Intro take'})
+        assert resp.status_code == 200
+        renamed = resp.get_json()
+        assert renamed['filename'] == 'Intro_take.mp3'
+        assert renamed['url'] == media['url']
+        assert os.path.isfile(_blob_file(app))
+
+    def test_known_hash_skips_upload(self, client, app):
+        _add_media(client, _add_song(client, 'One')['id'])
+        song = _add_song(client, 'Two')
+
+        session = client.post('/upload-sessions', json={
+            'target': 'media', 'target_id': song['id'], 'filename': 'track.mp3',
+            'size': len(CONTENT), 'sha256': SHA256,
+        }).get_json()
+        assert session['deduplicated'] is True
+        assert session['offset'] == len(CONTENT)
+
+        resp = client.post(f"/upload-sessions/{session['id']}/complete")
+        assert resp.status_code == 201
+        assert resp.get_json()['url'] == f'/uploads/{SHA256}.mp3'
+        assert _ref_count() == 2
+
+    def test_known_hash_gone_before_complete(self, client, app):
+        media = _add_media(client, _add_song(client, 'One')['id'])
+        song = _add_song(client, 'Two')
+        session = client.post('/upload-sessions', json={
+            'target': 'media', 'target_id': song['id'], 'filename': 'track.mp3',
+            'size': len(CONTENT), 'sha256': SHA256,
+        }).get_json()
+        client.delete(f"/media/{media['id']}")
+
+        resp = client.post(f"/upload-sessions/{session['id']}/complete")
+
+        assert resp.status_code == 409
+        assert client.get(f"/upload-sessions/{session['id']}").status_code == 404
+        assert _ref_count() == 0
+
+    def test_unknown_hash_uploads_normally(self, client):
+        song = _add_song(client, 'One')
+        session = client.post('/upload-sessions', json={
+            'target': 'media', 'target_id': song['id'], 'filename': 'track.mp3',
+            'size': len(CONTENT), 'sha256': SHA256,
+        }).get_json()
+        assert session['deduplicated'] is False
+        assert session['offset'] == 0
+
+
+class TestStoreLock:
+    def _locked(self):
+        with open(stamp_path(BLOB_LOCK_NAME), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            return False
+
+    def test_held_from_store_until_commit(self, app):
+        from werkzeug.datastructures import FileStorage
+
+        with app.test_request_context():
+            store_upload(FileStorage(io.BytesIO(CONTENT), 'track.mp3'))
+            assert self._locked()
+            db.session.commit()
+            assert not self._locked()
+
+    @pytest.mark.parametrize('end', ['commit', 'rollback'])
+    def test_released_when_nothing_is_unlinked(self, app, end):
+        from werkzeug.datastructures import FileStorage
+
+        with app.test_request_context():
+            store_upload(FileStorage(io.BytesIO(CONTENT), 'track.mp3'))
+            getattr(db.session, end)()
+            assert not self._locked()
+
+    def test_unlink_skips_blob_referenced_again(self, client, app):
+        media = _add_media(client, _add_song(client, 'One')['id'])
+
+        db.session.delete(db.session.get(Media, media['id']))
+        db.session.flush()
+        # Another session's reference, committed before the unlink runs.
+        db.session.execute(insert(Blob).values(sha256=SHA256, size=len(CONTENT), ref_count=1))
+        db.session.commit()
+
+        assert os.path.isfile(_blob_file(app))
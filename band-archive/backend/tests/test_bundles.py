@@ -0,0 +1,135 @@
+import io
+import os
+import zipfile
+
+from extensions import db
+from models import Media, PracticeLog
+
+
+def _upload(client, song_id, name, content):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    ).get_json()
+
+
+def _zip(resp):
+    assert resp.status_code == 200
+    assert resp.mimetype == 'application/zip'
+    return zipfile.ZipFile(io.BytesIO(resp.get_data()))
+
+
+def _song(client, title, **fields):
+    return client.post('/songs', json={'title': title, 'artist': 'Band', **fields}).get_json()
+
+
+class TestSongBundle:
+    def test_contents(self, client):
+        song = _song(client, 'Yellow', lyrics='Look at the stars', chords='B F# E')
+        _upload(client, song['id'], 'take.mp3', b'mp3' * 1000)
+        _upload(client, song['id'], 'chart.pdf', b'chart')
+        log = client.post(f"/songs/{song['id']}/practice-logs", json={'content': 'run'}).get_json()
+        client.post(f"/practice-logs/{log['id']}/upload",
+                    data={'file': (io.BytesIO(b'wav' * 100), 'run.wav')},
+                    content_type='multipart/form-data')
+
+        resp = client.get(f"/songs/{song['id']}/bundle")
+
+        bundle = _zip(resp)
+        assert bundle.testzip() is None
+        assert bundle.namelist() == [
+            'Yellow - Band/lyrics.txt',
+            'Yellow - Band/chords.txt',
+            'Yellow - Band/take.mp3',
+            'Yellow - Band/chart.pdf',
+            f"Yellow - Band/practice/{log['date'][:10]}-{log['id']}.wav",
+        ]
+        assert bundle.read('Yellow - Band/lyrics.txt') == b'Look at the stars'
+        assert bundle.read('Yellow - Band/take.mp3') == b'mp3' * 1000
+        assert 'filename="Yellow - Band.zip"' in resp.headers['Content-Disposition']
+
+    def test_log_without_a_date(self, client, sample_song):
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'run'}).get_json()
+        client.post(f"/practice-logs/{log['id']}/upload",
+                    data={'file': (io.BytesIO(b'wav'), 'run.wav')},
+                    content_type='multipart/form-data')
+        db.session.get(PracticeLog, log['id']).date = None
+        db.session.commit()
+
+        bundle = _zip(client.get(f"/songs/{sample_song['id']}/bundle"))
+
+        assert bundle.namelist() == [f"Bohemian Rhapsody - Queen/practice/{log['id']}.wav"]
+
+    def test_compressed_media_is_stored(self, client, sample_song):
+        _upload(client, sample_song['id'], 'take.mp3', b'a' * 10000)
+        _upload(client, sample_song['id'], 'take.wav', b'a' * 10000)
+        bundle = _zip(client.get(f"/songs/{sample_song['id']}/bundle"))
+        types = {info.filename.rsplit('/', 1)[1]: info.compress_type for info in bundle.infolist()}
+        assert types == {'take.mp3': zipfile.ZIP_STORED, 'take.wav': zipfile.ZIP_DEFLATED}
+
+    def test_response_is_streamed(self, client, sample_song):
+        _upload(client, sample_song['id'], 'long.wav', os.urandom(1024 * 1024))
+        resp = client.get(f"/songs/{sample_song['id']}/bundle")
+        assert resp.is_streamed
+        assert 'Content-Length' not in resp.headers
+        chunks = list(resp.response)
+        assert max(len(chunk) for chunk in chunks) <= 128 * 1024
+        assert min(len(chunk) for chunk in chunks[:-1]) >= 64 * 1024
+        assert zipfile.ZipFile(io.BytesIO(b''.join(chunks))).testzip() is None
+
+    def test_duplicate_and_unsafe_names(self, client):
+        song = _song(client, '밤편지/acoustic')
+        _upload(client, song['id'], 'take.mp3', b'one')
+        _upload(client, song['id'], 'take.mp3', b'two')
+        media = _upload(client, song['id'], 'x.mp3', b'three')
+        db.session.get(Media, media['id']).original_filename = '../../etc.mp3'
+        db.session.commit()
+
+        resp = client.get(f"/songs/{song['id']}/bundle")
+
+        assert _zip(resp).namelist() == [
+            '밤편지_acoustic - Band/take.mp3',
+            '밤편지_acoustic - Band/take (2).mp3',
+            '밤편지_acoustic - Band/_.._etc.mp3',
+        ]
+        assert "filename*=UTF-8''%EB%B0%A4" in resp.headers['Content-Disposition']
+
+    def test_missing_file_is_left_out(self, app, client, sample_song):
+        db.session.add(Media(song_id=sample_song['id'], filename='gone.mp3', file_type='audio'))
+        db.session.commit()
+        assert _zip(client.get(f"/songs/{sample_song['id']}/bundle")).namelist() == []
+
+    def test_unknown_song(self, client):
+        assert client.get('/songs/999/bundle').status_code == 404
+
+
+class TestSetlistBundle:
+    def test_songs_in_requested_order(self, client):
+        first = _song(client, 'First', lyrics='one')
+        second = _song(client, 'Second', lyrics='two')
+        _upload(client, first['id'], 'take.mp3', b'first take')
+
+        resp = client.get(f"/songs/bundle?ids={second['id']},{first['id']}&name=Friday gig")
+
+        assert _zip(resp).namelist() == [
+            '01 Second - Band/lyrics.txt',
+            '02 First - Band/lyrics.txt',
+            '02 First - Band/take.mp3',
+        ]
+        assert 'filename="Friday gig.zip"' in resp.headers['Content-Disposition']
+
+    def test_query_count_does_not_grow_with_songs(self, client, query_counter):
+        ids = [_song(client, f'Song {i}')['id'] for i in range(5)]
+        query_counter.clear()
+        client.get(f"/songs/bundle?ids={','.join(map(str, ids))}").get_data()
+        assert len(query_counter) == 3
+
+    def test_invalid_ids(self, client, sample_song):
+        assert client.get('/songs/bundle').status_code == 400
+        assert client.get('/songs/bundle?ids=1,x').status_code == 400
+        assert client.get(f"/songs/bundle?ids={sample_song['id']},999").status_code == 404
+
+    def test_song_limit(self, app, client, sample_song):
+        app.config['BUNDLE_MAX_SONGS'] = 2
+        assert client.get('/songs/bundle?ids=1,2,3').status_code == 400
@@ -0,0 +1,117 @@
+import gzip
+import io
+
+import pytest
+
+import compression
+from app import create_app
+from compression import CompressedBodyCache
+from config import TestingConfig
+
+LYRICS = 'Is this the real life? Is this just fantasy?\n' * 200
+
+
+@pytest.fixture
+def long_song(client):
+    return client.post('/songs', json={'title': 'Bohemian Rhapsody', 'artist': 'Queen',
+                                       'lyrics': LYRICS}).get_json()
+
+
+def _get(client, url, accept):
+    return client.get(url, headers={'Accept-Encoding': accept} if accept else {})
+
+
+class TestNegotiation:
+    def test_gzip(self, client, long_song):
+        plain = _get(client, '/songs', None)
+        resp = _get(client, '/songs', 'gzip')
+
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in resp.headers['Vary']
+        assert gzip.decompress(resp.data) == plain.data
+        assert int(resp.headers['Content-Length']) == len(resp.data) < len(plain.data) // 10
+
+    def test_brotli_preferred(self, client, long_song):
+        brotli = pytest.importorskip('brotli')
+        resp = _get(client, '/songs', 'gzip, deflate, br')
+        assert resp.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(resp.data) == _get(client, '/songs', None).data
+
+    def test_gzip_without_brotli(self, client, long_song, monkeypatch):
+        monkeypatch.setattr(compression, 'brotli', None)
+        assert _get(client, '/songs', 'br, gzip').headers['Content-Encoding'] == 'gzip'
+
+    def test_refused_encoding(self, client, long_song):
+        assert _get(client, '/songs', 'gzip, br;q=0').headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Encoding' not in _get(client, '/songs', 'deflate').headers
+
+    def test_identity_without_accept_encoding(self, client, long_song):
+        resp = _get(client, '/songs', None)
+        assert 'Content-Encoding' not in resp.headers
+        assert resp.get_json()[0]['lyrics'] == LYRICS
+
+
+class TestSkipped:
+    def test_small_body(self, client, sample_song):
+        resp = _get(client, f"/songs/{sample_song['id']}", 'gzip')
+        assert 'Content-Encoding' not in resp.headers
+
+    def test_uploaded_media(self, client, sample_song):
+        media = client.post(
+            f"/songs/{sample_song['id']}/media",
+            data={'file': (io.BytesIO(b'\0' * 10000), 'take.mp3')},
+            content_type='multipart/form-data',
+        ).get_json()
+        resp = _get(client, media['url'], 'gzip')
+        assert 'Content-Encoding' not in resp.headers
+        assert resp.data == b'\0' * 10000
+
+    def test_not_modified(self, client, long_song):
+        etag = _get(client, '/songs', 'gzip').headers['ETag']
+        resp = client.get('/songs', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert resp.status_code == 304
+        assert resp.data == b''
+
+    def test_disabled(self, tmp_path):
+        class UncompressedConfig(TestingConfig):
+            COMPRESS_RESPONSES = False
+            UPLOAD_FOLDER = str(tmp_path)
+        app = create_app(UncompressedConfig)
+        with app.app_context():
+            client = app.test_client()
+            client.post('/songs', json={'title': 'T', 'artist': 'A', 'lyrics': LYRICS})
+            assert 'Content-Encoding' not in _get(client, '/songs', 'gzip').headers
+
+
+class TestCompressedBodyCache:
+    def test_repeat_requests_reuse_compressed_body(self, client, long_song, monkeypatch):
+        calls = []
+        original = compression.compress
+        monkeypatch.setattr(compression, 'compress', lambda *args: calls.append(args) or original(*args))
+
+        first = _get(client, '/songs', 'gzip')
+        second = _get(client, '/songs', 'gzip')
+        _get(client, '/songs?fields=lyrics', 'gzip')
+
+        assert first.data == second.data
+        assert len(calls) == 2
+
+    def test_write_changes_the_key(self, client, long_song):
+        _get(client, '/songs', 'gzip')
+        client.put(f"/songs/{long_song['id']}", json={'lyrics': LYRICS + 'Open your eyes\n'})
+        body = gzip.decompress(_get(client, '/songs', 'gzip').data)
+        assert body.endswith(b'\n') and b'Open your eyes' in body
+
+    def test_evicts_least_recently_used(self):
+        cache = CompressedBodyCache(max_bytes=10)
+        cache.put('a', b'1234')
+        cache.put('b', b'1234')
+        cache.get('a')
+        cache.put('c', b'1234')
+        assert cache.get('b') is None
+        assert cache.get('a') == b'1234' and cache.get('c') == b'1234'
+
+    def test_oversized_body_not_cached(self):
+        cache = CompressedBodyCache(max_bytes=3)
+        cache.put('a', b'1234')
+        assert cache.get('a') is None
@@ -0,0 +1,87 @@
+import os
+
+import stats_cache
+
+
+def _stats(client):
+    resp = client.get('/dashboard/stats')
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def _add_log(client, song_id, content='Run-through'):
+    return client.post(f'/songs/{song_id}/practice-logs', json={'content': content}).get_json()
+
+
+class TestDashboardStatsCache:
+    def test_repeat_request_runs_no_queries(self, client, sample_song, query_counter):
+        first = _stats(client)
+        query_counter.clear()
+        assert _stats(client) == first
+        assert query_counter == []
+
+    def test_new_song_invalidates(self, client, sample_song):
+        assert _stats(client)['total_songs'] == 1
+        client.post('/songs', json={'title': 'Yesterday', 'artist': 'The Beatles'})
+        assert _stats(client)['total_songs'] == 2
+
+    def test_status_change_invalidates(self, client, sample_song):
+        assert _stats(client)['status_counts'] == {'Practice': 1}
+        client.put(f'/songs/{sample_song["id"]}', json={'status': 'Completed'})
+        assert _stats(client)['status_counts'] == {'Completed': 1}
+
+    def test_unrelated_song_edit_keeps_cache(self, client, sample_song, query_counter):
+        _stats(client)
+        client.put(f'/songs/{sample_song["id"]}', json={'lyrics': 'Is this the real life?'})
+        query_counter.clear()
+        _stats(client)
+        assert query_counter == []
+
+    def test_practice_log_writes_invalidate(self, client, sample_song):
+        assert _stats(client)['total_practice_logs'] == 0
+        log = _add_log(client, sample_song['id'])
+        stats = _stats(client)
+        assert stats['total_practice_logs'] == 1
+        assert stats['recent_practice_logs'][0]['song_title'] == 'Bohemian Rhapsody'
+
+        client.put(f'/practice-logs/{log["id"]}', json={'content': 'Tighter outro'})
+        assert _stats(client)['recent_practice_logs'][0]['content'] == 'Tighter outro'
+
+        client.delete(f'/practice-logs/{log["id"]}')
+        assert _stats(client)['total_practice_logs'] == 0
+
+    def test_song_delete_cascades_invalidate(self, client, sample_song):
+        _add_log(client, sample_song['id'])
+        assert _stats(client)['total_practice_logs'] == 1
+        client.delete(f'/songs/{sample_song["id"]}')
+        stats = _stats(client)
+        assert stats['total_songs'] == 0
+        assert stats['total_practice_logs'] == 0
+
+    def test_stamp_from_another_worker_invalidates(self, app, client, sample_song, query_counter):
+        _stats(client)
+        # Another worker process committed a write: only the shared stamp changes.
+        app.extensions['dashboard_stats']._touch_stamp()
+        query_counter.clear()
+        _stats(client)
+        assert query_counter
+
+    def test_ttl_expiry(self, app, client, sample_song, query_counter, monkeypatch):
+        _stats(client)
+        now = stats_cache.time.monotonic()
+        monkeypatch.setattr(stats_cache.time, 'monotonic',
+                            lambda: now + app.config['DASHBOARD_STATS_TTL_SECONDS'] + 1)
+        query_counter.clear()
+        _stats(client)
+        assert query_counter
+
+    def test_zero_ttl_disables_cache(self, app, client, sample_song, query_counter):
+        app.config['DASHBOARD_STATS_TTL_SECONDS'] = 0
+        _stats(client)
+        query_counter.clear()
+        _stats(client)
+        assert query_counter
+
+    def test_stamp_lives_under_upload_folder(self, app, client, sample_song):
+        path = os.path.join(app.config['UPLOAD_FOLDER'], '.cache', 'dashboard-stats.stamp')
+        assert os.path.isfile(path)
@@ -0,0 +1,167 @@
+import os
+
+import pytest
+from sqlalchemy import text, update
+
+from app import create_app
+from config import TestingConfig
+from database import ReadOnlySessionError, default_engine_options
+from extensions import db
+from models import Member, Song
+
+
+def _file_app(tmp_path, **overrides):
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'band.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+    for name, value in overrides.items():
+        setattr(FileConfig, name, value)
+    return create_app(FileConfig)
+
+
+def _pragma(name):
+    return db.session.execute(text(f'PRAGMA {name}')).scalar()
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    app = _file_app(tmp_path)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+class TestSqlitePragmas:
+    def test_applied_to_every_connection(self, file_app):
+        assert _pragma('journal_mode') == 'wal'
+        assert _pragma('synchronous') == 1  # NORMAL
+        assert _pragma('busy_timeout') == 5000
+        assert _pragma('cache_size') == -16000
+        assert _pragma('temp_store') == 2  # MEMORY
+
+        # A second pooled connection is configured too.
+        with db.engine.connect() as other:
+            assert other.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+
+    def test_disabled_with_empty_pragmas(self, tmp_path):
+        app = _file_app(tmp_path, SQLITE_PRAGMAS={})
+        with app.app_context():
+            assert _pragma('journal_mode') == 'delete'
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_reader_not_blocked_by_open_write_transaction(self, file_app):
+        db.session.execute(text("INSERT INTO member (name, instrument) VALUES ('Kim', 'Bass')"))
+        db.session.commit()
+        with db.engine.connect() as writer:
+            writer.execute(text("UPDATE member SET instrument = 'Drums'"))
+            # Uncommitted write holds the lock; WAL still lets this reader in.
+            with db.engine.connect() as reader:
+                assert reader.execute(text('SELECT instrument FROM member')).scalar() == 'Bass'
+            writer.rollback()
+
+
+class TestEngineOptions:
+    def test_sqlite_file(self):
+        options = default_engine_options('sqlite:////data/band_archive.db',
+                                         {'SQLITE_PRAGMAS': {'busy_timeout': 3000}})
+        assert options['connect_args'] == {'timeout': 3.0}
+        assert 'pool_pre_ping' not in options
+
+    def test_sqlite_memory_left_to_flask_sqlalchemy(self):
+        assert default_engine_options('sqlite:///:memory:', {'SQLITE_PRAGMAS': {}}) == {}
+
+    def test_server_backend(self):
+        options = default_engine_options('postgresql://u:p@db/band', {'SQLITE_PRAGMAS': {}})
+        assert options['pool_pre_ping'] is True
+        assert options['pool_recycle'] == 300
+
+    def test_config_overrides_defaults(self, tmp_path):
+        app = _file_app(tmp_path, SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 2})
+        assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] == 2
+        assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['max_overflow'] == 5
+        with app.app_context():
+            db.engine.dispose()
+
+
+class TestForking:
+    def test_create_app_leaves_no_pooled_connection(self, tmp_path):
+        app = _file_app(tmp_path)
+        with app.app_context():
+            assert db.engine.pool.checkedin() == 0
+            db.engine.dispose()
+
+    def test_forked_child_opens_its_own_connection(self, file_app):
+        with db.engine.connect() as conn:
+            parent_connection = conn.connection.dbapi_connection
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                with db.engine.connect() as conn:
+                    if (conn.connection.dbapi_connection is not parent_connection
+                            and conn.execute(text('SELECT count(*) FROM song')).scalar() == 0):
+                        code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+
+        assert os.waitstatus_to_exitcode(status) == 0
+        # The child left the parent's connection open.
+        with db.engine.connect() as conn:
+            assert conn.connection.dbapi_connection is parent_connection
+            assert conn.execute(text('SELECT 1')).scalar() == 1
+
+
+class TestRequestSessions:
+    def test_get_cannot_write(self, app, client):
+        def writes_on_get():
+            db.session.add(Member(name='Kim', instrument='Bass'))
+            db.session.commit()
+            return 'ok'
+        app.add_url_rule('/test-writes', 'test_writes', writes_on_get)
+
+        with pytest.raises(ReadOnlySessionError):
+            client.get('/test-writes')
+        db.session.rollback()
+        assert Member.query.count() == 0
+
+    def test_get_cannot_run_bulk_update(self, app, client):
+        def updates_on_get():
+            db.session.execute(update(Member).values(name='Changed'))
+            return 'ok'
+        app.add_url_rule('/test-updates', 'test_updates', updates_on_get)
+        db.session.add(Member(name='Kim', instrument='Bass'))
+        db.session.commit()
+
+        with pytest.raises(ReadOnlySessionError):
+            client.get('/test-updates')
+        db.session.rollback()
+        assert Member.query.one().name == 'Kim'
+
+    def test_session_writable_again_after_get(self, client, sample_song):
+        client.get(f"/songs/{sample_song['id']}")
+
+        assert db.session.autoflush
+        db.session.add(Member(name='Kim', instrument='Bass'))
+        db.session.commit()
+        assert client.post('/members', json={'name': 'Lee', 'instrument': 'Drums'}).status_code == 201
+
+    def test_objects_kept_by_commit_are_expired_after_the_request(self, client, sample_song):
+        song = db.session.get(Song, sample_song['id'])
+        client.put(f"/songs/{sample_song['id']}", json={'title': 'New Title'})
+
+        # Changed behind the session's back; the next access must reload.
+        db.session.execute(text("UPDATE song SET title = 'Direct'"))
+        assert song.title == 'Direct'
+
+    def test_write_responses_match_a_later_get(self, client, sample_song):
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'Run-through'}).get_json()
+
+        # Timestamps are written tz-aware but read back naive; both must format alike.
+        assert '+' not in sample_song['created_at']
+        assert client.get(f"/songs/{sample_song['id']}").get_json() == sample_song
+        assert client.get(f"/members/{member['id']}").get_json() == member
+        assert client.get(f"/practice-logs/{log['id']}").get_json() == log
@@ -0,0 +1,110 @@
+import io
+
+from extensions import db
+from models import Member
+from table_versions import bump_versions
+
+
+def _etag(resp):
+    return resp.headers['ETag']
+
+
+def _revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+class TestConditionalGet:
+    def test_list_carries_weak_etag(self, client, sample_song):
+        resp = client.get('/songs')
+        assert resp.status_code == 200
+        assert _etag(resp).startswith('W/"')
+        assert resp.headers['Cache-Control'] == 'no-cache'
+
+    def test_matching_etag_returns_304_without_queries(self, client, sample_song, query_counter):
+        etag = _etag(client.get('/songs'))
+        query_counter.clear()
+
+        resp = _revalidate(client, '/songs', etag)
+
+        assert resp.status_code == 304
+        assert resp.get_data() == b''
+        assert _etag(resp) == etag
+        assert query_counter == []
+
+    def test_item_and_nested_resources(self, client, sample_song):
+        for url in (f"/songs/{sample_song['id']}", f"/songs/{sample_song['id']}/media",
+                    f"/songs/{sample_song['id']}/practice-logs", '/members', '/suggestions'):
+            etag = _etag(client.get(url))
+            assert _revalidate(client, url, etag).status_code == 304, url
+
+    def test_query_string_is_part_of_the_tag(self, client, sample_song):
+        assert _etag(client.get('/songs')) != _etag(client.get('/songs?fields=title'))
+
+    def test_errors_are_not_tagged(self, client):
+        resp = client.get('/songs/999')
+        assert resp.status_code == 404
+        assert 'ETag' not in resp.headers
+
+    def test_stale_etag_gets_full_response(self, client, sample_song):
+        etag = _etag(client.get('/songs'))
+        client.put(f"/songs/{sample_song['id']}", json={'title': 'Another One Bites the Dust'})
+        resp = _revalidate(client, '/songs', etag)
+        assert resp.status_code == 200
+        assert resp.get_json()[0]['title'] == 'Another One Bites the Dust'
+
+
+class TestVersionBumps:
+    def test_write_only_changes_its_tables(self, client, sample_song):
+        songs, members = _etag(client.get('/songs')), _etag(client.get('/members'))
+        client.post(
+            f"/songs/{sample_song['id']}/media",
+            data={'file': (io.BytesIO(b'data'), 'take.mp3')},
+            content_type='multipart/form-data',
+        )
+        assert _revalidate(client, '/songs', songs).status_code == 200
+        assert _revalidate(client, '/members', members).status_code == 304
+
+    def test_update_without_changes_keeps_version(self, client, sample_song):
+        etag = _etag(client.get('/songs'))
+        client.put(f"/songs/{sample_song['id']}", json={'title': sample_song['title']})
+        assert _revalidate(client, '/songs', etag).status_code == 304
+
+    def test_bulk_update_statement_bumps(self, client):
+        suggestion = client.post('/suggestions', json={
+            'title': 'Karma Police', 'artist': 'Radiohead', 'link': 'https://example.com',
+        }).get_json()
+        etag = _etag(client.get('/suggestions'))
+        client.post(f"/suggestions/{suggestion['id']}/vote", json={'vote_type': 'up'})
+        assert _revalidate(client, '/suggestions', etag).status_code == 200
+
+    def test_cascade_delete_bumps_children(self, client, sample_song):
+        client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'Verse'})
+        etag = _etag(client.get(f"/songs/{sample_song['id']}/practice-logs"))
+        client.delete(f"/songs/{sample_song['id']}")
+        resp = _revalidate(client, f"/songs/{sample_song['id']}/practice-logs", etag)
+        assert resp.status_code == 404
+
+    def test_rollback_does_not_bump(self, app, client):
+        etag = _etag(client.get('/members'))
+        db.session.add(Member(name='Kim', instrument='Bass'))
+        db.session.flush()
+        db.session.rollback()
+        assert _revalidate(client, '/members', etag).status_code == 304
+
+    def test_bump_from_another_worker(self, client):
+        etag = _etag(client.get('/members'))
+        # Another worker committed a write: only the shared stamp changes.
+        bump_versions({'member'})
+        assert _revalidate(client, '/members', etag).status_code == 200
+
+    def test_version_token_does_not_rely_on_inode_and_mtime(self, app):
+        from stamp_files import read_stamp, stamp_path
+
+        path = stamp_path('versions', 'member.stamp')
+        bump_versions({'member'})
+        before = read_stamp(path)
+        bump_versions({'member'})
+        after = read_stamp(path)
+        # Replace, unlink, replace within one mtime tick can give back the same
+        # inode and mtime; the token written into the stamp still differs.
+        assert before[2] != after[2]
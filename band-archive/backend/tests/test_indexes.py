@@ -0,0 +1,150 @@
+import sqlite3
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import event, inspect
+
+from app import create_app
+from config import TestingConfig
+from extensions import db as _db
+
+
+def _plans_for(client, url, table):
+    """Run ``url`` and return the EXPLAIN QUERY PLAN text of each SELECT on ``table``."""
+    captured = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and f'FROM {table}' in statement:
+            captured.append((statement, parameters))
+
+    event.listen(_db.engine, 'before_cursor_execute', _record)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', _record)
+
+    assert captured, f'no SELECT on {table} for {url}'
+    raw = _db.engine.raw_connection()
+    try:
+        return [
+            ' | '.join(row[-1] for row in raw.execute(f'EXPLAIN QUERY PLAN {stmt}', params).fetchall())
+            for stmt, params in captured
+        ]
+    finally:
+        raw.close()
+
+
+class TestQueryPlans:
+    def test_song_status_filter_uses_index(self, client, sample_song):
+        plans = _plans_for(client, '/songs?status=Practice&fields=title', 'song')
+        assert 'ix_song_status_id' in plans[0]
+
+    def test_song_genre_filter_uses_index(self, client, sample_song):
+        plans = _plans_for(client, '/songs?genre=Rock&fields=title', 'song')
+        assert 'ix_song_genre_id' in plans[0]
+
+    def test_dashboard_status_counts_use_index(self, client, sample_song):
+        plans = _plans_for(client, '/dashboard/stats', 'song GROUP BY')
+        assert 'ix_song_status_id' in plans[0]
+
+    def test_media_lookup_uses_index(self, client, sample_song):
+        plans = _plans_for(client, '/songs', 'media')
+        assert 'ix_media_song_id' in plans[0]
+
+    def test_practice_logs_use_index(self, client, sample_song):
+        plans = _plans_for(client, f"/songs/{sample_song['id']}/practice-logs", 'practice_log')
+        assert 'ix_practice_log_song_id_date' in plans[0]
+        assert 'TEMP B-TREE' not in plans[0]
+
+    def test_recent_practice_logs_use_index(self, client, sample_song):
+        plans = _plans_for(client, '/dashboard/stats', 'practice_log LEFT OUTER JOIN')
+        assert 'ix_practice_log_date' in plans[0]
+        assert 'TEMP B-TREE' not in plans[0]
+
+    def test_personal_logs_use_index(self, client):
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        plans = _plans_for(client, f"/members/{member['id']}/logs", 'personal_log')
+        assert 'ix_personal_log_member_id_created_at' in plans[0]
+        assert 'TEMP B-TREE' not in plans[0]
+
+    def test_suggestions_order_uses_score_index(self, client):
+        client.post('/suggestions', json={'title': 'T', 'artist': 'A', 'link': 'http://x'})
+        plans = _plans_for(client, '/suggestions?limit=10', 'song_suggestion')
+        assert 'ix_song_suggestion_score_id' in plans[0]
+        assert 'TEMP B-TREE' not in plans[0]
+
+    @pytest.mark.parametrize('table, index', [
+        ('song \nWHERE', 'ix_song_updated_at'),
+        ('media', 'ix_media_updated_at'),
+        ('practice_log', 'ix_practice_log_updated_at'),
+        ('member \nWHERE', 'ix_member_updated_at'),
+        ('personal_log', 'ix_personal_log_updated_at'),
+        ('song_suggestion', 'ix_song_suggestion_updated_at'),
+        ('tombstone', 'ix_tombstone_deleted_at'),
+    ])
+    def test_delta_sync_uses_updated_at_indexes(self, client, sample_song, table, index):
+        token = client.get('/sync').get_json()['token']
+        plans = _plans_for(client, f'/sync?since={token}', table)
+        assert index in plans[0]
+        assert 'TEMP B-TREE' not in plans[0]
+
+
+@pytest.fixture
+def migrated_app_factory(tmp_path):
+    def _factory():
+        class MigratedConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'band_archive.db'}"
+            UPLOAD_FOLDER = str(tmp_path / 'uploads')
+            SCHEMA_ON_BOOT = 'migrate'
+
+        return create_app(MigratedConfig)
+    return _factory
+
+
+class TestMigrations:
+    def test_migrations_match_models(self, migrated_app_factory):
+        app = migrated_app_factory()
+        with app.app_context():
+            with _db.engine.connect() as conn:
+                context = MigrationContext.configure(conn, opts={
+                    'include_name': lambda name, type_, parents: not (
+                        type_ == 'table' and (name.startswith('song_fts') or name == 'alembic_version')
+                    ),
+                })
+                assert compare_metadata(context, _db.metadata) == []
+            _db.engine.dispose()
+
+    def test_upgrade_from_pre_migration_database(self, tmp_path, migrated_app_factory):
+        conn = sqlite3.connect(tmp_path / 'band_archive.db')
+        conn.executescript("""
+            CREATE TABLE song (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL,
+                artist VARCHAR(100) NOT NULL, status VARCHAR(20), lyrics TEXT, chords TEXT,
+                link VARCHAR(200), memo TEXT, genre VARCHAR(50), difficulty INTEGER,
+                sheet_music VARCHAR(200), created_at DATETIME, updated_at DATETIME);
+            CREATE TABLE media (id INTEGER PRIMARY KEY, song_id INTEGER NOT NULL REFERENCES song(id),
+                filename VARCHAR(200) NOT NULL, file_type VARCHAR(20), file_size INTEGER,
+                created_at DATETIME);
+            CREATE TABLE song_suggestion (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL,
+                artist VARCHAR(100) NOT NULL, link VARCHAR(500) NOT NULL, memo TEXT,
+                thumbs_up INTEGER, thumbs_down INTEGER, created_at DATETIME);
+            INSERT INTO song (id, title, artist, status) VALUES (1, '밤편지', 'IU', 'Practice');
+            INSERT INTO media (song_id, filename) VALUES (1, 'a.mp3');
+            INSERT INTO song_suggestion (title, artist, link, thumbs_up, thumbs_down)
+                VALUES ('S', 'A', 'http://x', 5, 2);
+        """)
+        conn.commit()
+        conn.close()
+
+        app = migrated_app_factory()
+        client = app.test_client()
+        with app.app_context():
+            columns = {c['name'] for c in inspect(_db.engine).get_columns('media')}
+            assert 'original_filename' in columns
+            assert 'member' in inspect(_db.engine).get_table_names()
+
+            assert client.get('/songs').get_json()[0]['media'][0]['filename'] == 'a.mp3'
+            assert client.get('/songs?q=밤편지').get_json()[0]['title'] == '밤편지'
+            suggestion = client.get('/suggestions').get_json()[0]
+            assert (suggestion['thumbs_up'], suggestion['thumbs_down']) == (5, 2)
+            _db.engine.dispose()
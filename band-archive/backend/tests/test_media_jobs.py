@@ -0,0 +1,231 @@
+import io
+import json
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from extensions import db
+from models import Media, MediaJob
+import media_processing
+from media_jobs import enqueue_missing_jobs, run_pending_jobs
+
+
+def _png(size=(800, 600), color=(200, 30, 30)):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new('RGB', size, color).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def _pdf():
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new('RGB', (595, 842), (255, 255, 255)).save(buf, 'PDF')
+    return buf.getvalue()
+
+
+def _wav(frames, rate=8000, width=2):
+    """Mono WAV: silence for the first half, a square wave at half scale after."""
+    import numpy as np
+    half = frames // 2
+    signal = np.concatenate([np.zeros(half), np.tile([0.5, -0.5], (frames - half) // 2)])
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(width)
+        writer.setframerate(rate)
+        if width == 2:
+            writer.writeframes((signal * 32767).astype('<i2').tobytes())
+        else:
+            ints = (signal * (2 ** 23 - 1)).astype('<i4')
+            writer.writeframes(ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes())
+    return buf.getvalue()
+
+
+def _upload_media(client, song_id, name, content):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    )
+
+
+def _jobs():
+    db.session.expire_all()
+    return MediaJob.query.order_by(MediaJob.id).all()
+
+
+class TestEnqueue:
+    def test_upload_queues_job_without_processing(self, client, sample_song):
+        pytest.importorskip('PIL')
+        resp = _upload_media(client, sample_song['id'], 'cover.png', _png())
+        assert resp.status_code == 201
+        media = resp.get_json()
+        assert media['thumbnail_url'] is None
+        assert media['preview_url'] is None
+        assert media['waveform_url'] is None
+
+        jobs = _jobs()
+        assert [(job.kind, job.status) for job in jobs] == [('thumbnail', 'pending')]
+
+    def test_unprocessed_types_queue_nothing(self, client, sample_song):
+        _upload_media(client, sample_song['id'], 'take.mp3', b'ID3 not really audio')
+        assert _jobs() == []
+
+    def test_same_content_queues_one_job(self, client, sample_song):
+        pytest.importorskip('PIL')
+        content = _png()
+        _upload_media(client, sample_song['id'], 'a.png', content)
+        _upload_media(client, sample_song['id'], 'b.PNG', content)
+        assert len(_jobs()) == 1
+
+    def test_enqueue_missing_jobs_is_idempotent(self, client, sample_song):
+        pytest.importorskip('PIL')
+        _upload_media(client, sample_song['id'], 'cover.png', _png())
+        MediaJob.query.delete()
+        db.session.commit()
+
+        assert enqueue_missing_jobs() == 1
+        assert enqueue_missing_jobs() == 0
+
+    def test_enqueue_missing_jobs_leaves_processed_rows_alone(self, client, sample_song):
+        pytest.importorskip('PIL')
+        _upload_media(client, sample_song['id'], 'cover.png', _png())
+        run_pending_jobs()
+        media = Media.query.one()
+        updated_at = media.updated_at
+
+        assert enqueue_missing_jobs() == 0
+        db.session.expire_all()
+        assert Media.query.one().updated_at == updated_at
+
+    def test_enqueue_missing_jobs_for_given_rows(self, client, sample_song):
+        pytest.importorskip('PIL')
+        media = _upload_media(client, sample_song['id'], 'cover.png', _png()).get_json()
+        MediaJob.query.delete()
+        db.session.commit()
+
+        assert enqueue_missing_jobs({Media: []}) == 0
+        assert enqueue_missing_jobs({Media: [media['id']]}) == 1
+
+
+class TestProcessing:
+    def test_thumbnail(self, client, sample_song):
+        PIL = pytest.importorskip('PIL.Image')
+        _upload_media(client, sample_song['id'], 'cover.png', _png())
+
+        assert run_pending_jobs() == 1
+        media = client.get(f'/songs/{sample_song["id"]}/media').get_json()[0]
+        assert media['thumbnail_url'].endswith('.thumb.jpg')
+        assert _jobs()[0].status == 'done'
+
+        resp = client.get(media['thumbnail_url'])
+        assert resp.status_code == 200
+        assert resp.mimetype == 'image/jpeg'
+        assert 'immutable' in resp.headers['Cache-Control']
+        image = PIL.open(io.BytesIO(resp.data))
+        assert max(image.size) <= media_processing.THUMBNAIL_SIZE[0]
+
+    def test_pdf_preview(self, client, sample_song):
+        pytest.importorskip('pypdfium2')
+        PIL = pytest.importorskip('PIL.Image')
+        _upload_media(client, sample_song['id'], 'chart.pdf', _pdf())
+
+        run_pending_jobs()
+        media = client.get(f'/songs/{sample_song["id"]}/media').get_json()[0]
+        resp = client.get(media['preview_url'])
+        assert resp.mimetype == 'image/png'
+        assert PIL.open(io.BytesIO(resp.data)).size[0] == media_processing.PREVIEW_WIDTH
+
+    def test_wav_waveform(self, client, sample_song):
+        pytest.importorskip('numpy')
+        _upload_media(client, sample_song['id'], 'take.wav', _wav(16000))
+
+        run_pending_jobs()
+        media = client.get(f'/songs/{sample_song["id"]}/media').get_json()[0]
+        summary = json.loads(client.get(media['waveform_url']).data)
+        assert summary['buckets'] == len(summary['peaks']) == media_processing.WAVEFORM_BUCKETS
+        assert summary['duration'] == 2.0
+        half = summary['buckets'] // 2
+        assert max(summary['peaks'][:half]) == 0
+        assert min(summary['peaks'][half:]) == pytest.approx(0.5, abs=1e-3)
+
+    def test_flac_waveform_for_personal_log(self, client):
+        np = pytest.importorskip('numpy')
+        soundfile = pytest.importorskip('soundfile')
+        buf = io.BytesIO()
+        soundfile.write(buf, np.full(4000, 0.25), 4000, format='FLAC')
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        client.post(
+            f'/members/{member["id"]}/logs',
+            data={'title': 'Warmup', 'file': (io.BytesIO(buf.getvalue()), 'warmup.flac')},
+            content_type='multipart/form-data',
+        )
+
+        run_pending_jobs()
+        log = client.get(f'/members/{member["id"]}/logs').get_json()[0]
+        summary = json.loads(client.get(log['waveform_url']).data)
+        assert summary['duration'] == 1.0
+        assert max(summary['peaks']) == pytest.approx(0.25, abs=1e-3)
+
+    def test_reupload_reuses_finished_result(self, client, sample_song):
+        pytest.importorskip('PIL')
+        content = _png()
+        first = _upload_media(client, sample_song['id'], 'a.png', content).get_json()
+        run_pending_jobs()
+
+        second = _upload_media(client, sample_song['id'], 'b.png', content).get_json()
+        assert second['thumbnail_url'] is not None
+        assert second['thumbnail_url'] == client.get(
+            f'/songs/{sample_song["id"]}/media').get_json()[0]['thumbnail_url']
+        assert first['id'] != second['id']
+        assert run_pending_jobs() == 0
+
+    def test_undecodable_file_fails_after_retries(self, client, sample_song):
+        pytest.importorskip('PIL')
+        _upload_media(client, sample_song['id'], 'broken.png', b'not an image')
+
+        run_pending_jobs()
+        job = _jobs()[0]
+        assert job.status == 'failed'
+        assert job.attempts == 3
+        assert job.error
+
+    def test_missing_library_skips_job(self, client, sample_song, monkeypatch):
+        def missing(source_path, output_path):
+            raise media_processing.MissingDependency('Pillow')
+        monkeypatch.setitem(media_processing.PROCESSORS, 'thumbnail', missing)
+        _upload_media(client, sample_song['id'], 'cover.png', b'png bytes')
+
+        run_pending_jobs()
+        job = _jobs()[0]
+        assert job.status == 'skipped'
+        assert job.error == 'Pillow is not installed'
+
+    def test_process_pool(self, client, sample_song):
+        pytest.importorskip('PIL')
+        _upload_media(client, sample_song['id'], 'a.png', _png(color=(0, 0, 0)))
+        _upload_media(client, sample_song['id'], 'b.png', _png(color=(255, 255, 255)))
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            assert run_pending_jobs(executor, batch_size=2) == 2
+        assert [job.status for job in _jobs()] == ['done', 'done']
+
+
+class TestPeaks:
+    def test_24_bit_wav(self, tmp_path):
+        pytest.importorskip('numpy')
+        path = tmp_path / 'take.wav'
+        path.write_bytes(_wav(8000, width=3))
+
+        summary = media_processing.compute_peaks(str(path), buckets=10)
+        assert summary['peaks'][:5] == [0.0] * 5
+        assert summary['peaks'][5:] == pytest.approx([0.5] * 5, abs=1e-3)
+
+    def test_fewer_frames_than_buckets(self, tmp_path):
+        pytest.importorskip('numpy')
+        path = tmp_path / 'blip.wav'
+        path.write_bytes(_wav(4))
+
+        assert media_processing.compute_peaks(str(path))['buckets'] == 4
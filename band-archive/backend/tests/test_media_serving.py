@@ -0,0 +1,90 @@
+import io
+import os
+
+
+def _upload(client, song_id, name, content):
+    resp = client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    )
+    return resp.get_json()['url']
+
+
+class TestMediaServing:
+    def test_range_request_returns_partial_content(self, client, sample_song):
+        url = _upload(client, sample_song['id'], 'rehearsal.mp3', bytes(range(256)) * 40)
+
+        resp = client.get(url, headers={'Range': 'bytes=1000-1099'})
+
+        assert resp.status_code == 206
+        assert resp.headers['Content-Range'] == 'bytes 1000-1099/10240'
+        assert resp.data == (bytes(range(256)) * 40)[1000:1100]
+
+    def test_uuid_names_are_immutable_with_stable_etag(self, client, sample_song):
+        url = _upload(client, sample_song['id'], 'take.mp3', b'audio')
+        stem = os.path.splitext(os.path.basename(url))[0]
+
+        resp = client.get(url)
+
+        assert 'immutable' in resp.headers['Cache-Control']
+        assert resp.headers['ETag'] == f'"{stem}"'
+
+    def test_if_none_match_returns_304(self, client, sample_song):
+        url = _upload(client, sample_song['id'], 'take.mp3', b'audio')
+        etag = client.get(url).headers['ETag']
+
+        resp = client.get(url, headers={'If-None-Match': etag})
+
+        assert resp.status_code == 304
+        assert resp.data == b''
+
+    def test_legacy_flat_file_is_served(self, client, app):
+        with open(os.path.join(app.config['UPLOAD_FOLDER'], '0123456789abcdef0123456789abcdef.mp3'), 'wb') as f:
+            f.write(b'old upload')
+        resp = client.get('/uploads/0123456789abcdef0123456789abcdef.mp3')
+        assert resp.data == b'old upload'
+        assert 'immutable' in resp.headers['Cache-Control']
+
+    def test_renamed_media_is_revalidated(self, client, sample_song, app):
+        with open(os.path.join(app.config['UPLOAD_FOLDER'], '1_20240101_intro.mp3'), 'wb') as f:
+            f.write(b'audio')
+        resp = client.get('/uploads/1_20240101_intro.mp3')
+        assert resp.headers['Cache-Control'] == 'no-cache'
+
+    def test_m4a_mimetype(self, client, sample_song):
+        url = _upload(client, sample_song['id'], 'memo.m4a', b'aac')
+        assert client.get(url).headers['Content-Type'] == 'audio/mp4'
+
+    def test_missing_file_and_traversal(self, client):
+        assert client.get('/uploads/nope.mp3').status_code == 404
+        assert client.get('/uploads/..%2Fapp.py').status_code == 404
+
+    def test_accel_redirect_mode(self, client, sample_song, app):
+        url = _upload(client, sample_song['id'], 'take.mp3', b'audio')
+        app.config['MEDIA_SENDFILE'] = 'x-accel-redirect'
+
+        resp = client.get(url)
+
+        assert resp.status_code == 200
+        assert resp.data == b''
+        sha256 = os.path.splitext(os.path.basename(url))[0]
+        assert resp.headers['X-Accel-Redirect'] == f'/protected-uploads/blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+        assert resp.headers['Content-Type'] == 'audio/mpeg'
+        assert client.get('/uploads/nope.mp3').status_code == 404
+
+    def test_sendfile_mode_for_personal_logs(self, client, app):
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        log = client.post(
+            f"/members/{member['id']}/logs",
+            data={'title': 't', 'file': (io.BytesIO(b'video'), 'solo.mp4')},
+            content_type='multipart/form-data',
+        ).get_json()
+        app.config['MEDIA_SENDFILE'] = 'x-sendfile'
+
+        resp = client.get(log['url'])
+
+        sha256 = os.path.splitext(os.path.basename(log['url']))[0]
+        expected = os.path.join(app.config['UPLOAD_FOLDER'], 'blobs', sha256[:2], sha256[2:4], sha256)
+        assert resp.headers['X-Sendfile'] == os.path.abspath(expected)
+        assert resp.data == b''
@@ -0,0 +1,149 @@
+import importlib.util
+import io
+import os
+import pstats
+import re
+
+import pytest
+
+import config
+from app import create_app
+from config import ProductionConfig, TestingConfig
+
+
+def _metrics(client):
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.content_type.startswith('text/plain; version=0.0.4')
+    return resp.get_data(as_text=True)
+
+
+def _sample(text, name, **labels):
+    wanted = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf'^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else None
+
+
+class TestMetrics:
+    def test_requests_and_latency(self, client, sample_song):
+        client.get('/songs')
+        client.get('/songs')
+        client.get('/songs/999')
+
+        text = _metrics(client)
+
+        assert _sample(text, 'band_archive_http_requests_total',
+                       endpoint='songs.get_songs', method='GET', status='200') == 2
+        assert _sample(text, 'band_archive_http_requests_total',
+                       endpoint='songs.get_song', method='GET', status='404') == 1
+        assert _sample(text, 'band_archive_http_request_duration_seconds_count',
+                       endpoint='songs.get_songs', method='GET') == 2
+        assert _sample(text, 'band_archive_http_request_duration_seconds_bucket',
+                       endpoint='songs.get_songs', method='GET', le='+Inf') == 2
+        assert '# TYPE band_archive_http_request_duration_seconds histogram' in text
+
+    def test_unmatched_and_metrics_requests(self, client):
+        client.get('/no-such-route')
+        _metrics(client)
+        text = _metrics(client)
+        assert _sample(text, 'band_archive_http_requests_total',
+                       endpoint='<unmatched>', method='GET', status='404') == 1
+        assert 'endpoint="metrics"' not in text
+
+    def test_sql_statements_per_request(self, app, client, sample_song, query_counter):
+        query_counter.clear()
+        client.get(f"/songs/{sample_song['id']}/practice-logs")
+        statements = len(query_counter)
+
+        metrics = app.extensions['metrics']
+        labels = ('practice_logs.get_practice_logs',)
+        assert statements > 0
+        assert metrics.sql_statements.total(labels) == statements
+        assert metrics.sql_time.count(labels) == 1
+
+    def test_response_size_is_what_was_sent(self, app, client):
+        for i in range(30):
+            client.post('/songs', json={'title': f'Song {i}', 'artist': 'Band', 'lyrics': 'la ' * 200})
+        resp = client.get('/songs', headers={'Accept-Encoding': 'gzip'})
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert app.extensions['metrics'].response_size.total(('songs.get_songs',)) == len(resp.data)
+
+    def test_streamed_response_size(self, app, client, sample_song):
+        client.post(f"/songs/{sample_song['id']}/media",
+                    data={'file': (io.BytesIO(b'x' * 5000), 'take.mp3')},
+                    content_type='multipart/form-data')
+        resp = client.get(f"/songs/{sample_song['id']}/bundle")
+        size = len(resp.get_data())
+        resp.close()
+        assert app.extensions['metrics'].response_size.total(('songs.get_song_bundle',)) == size
+
+    def test_upload_bytes_and_throughput(self, app, client, sample_song):
+        resp = client.post(f"/songs/{sample_song['id']}/media",
+                           data={'file': (io.BytesIO(b'x' * 100000), 'take.mp3')},
+                           content_type='multipart/form-data')
+        assert resp.status_code == 201
+
+        metrics = app.extensions['metrics']
+        labels = ('songs.add_media',)
+        assert metrics.request_bytes.value(labels) > 100000
+        assert metrics.upload_throughput.count(labels) == 1
+        assert metrics.upload_throughput.total(labels) > 0
+
+    def test_token(self, app, client):
+        app.config['METRICS_TOKEN'] = 'secret'
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+    def test_disabled(self):
+        class NoMetrics(TestingConfig):
+            METRICS_ENABLED = False
+        app = create_app(NoMetrics)
+        with app.app_context():
+            assert app.test_client().get('/metrics').status_code == 404
+            assert 'metrics' not in app.extensions
+
+
+    @pytest.mark.parametrize('token, enabled', [(None, False), ('secret', True)])
+    def test_production_needs_a_token(self, monkeypatch, token, enabled):
+        monkeypatch.delenv('METRICS_ENABLED', raising=False)
+        if token:
+            monkeypatch.setenv('METRICS_TOKEN', token)
+        else:
+            monkeypatch.delenv('METRICS_TOKEN', raising=False)
+        # Config values are read from the environment when the module is imported.
+        spec = importlib.util.spec_from_file_location('fresh_config', config.__file__)
+        fresh = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(fresh)
+
+        assert fresh.ProductionConfig.METRICS_ENABLED is enabled
+        assert fresh.DevelopmentConfig.METRICS_ENABLED is True
+
+
+class TestProfiling:
+    def test_profile_dump(self, app, client, sample_song, tmp_path):
+        app.config['PROFILE_DIR'] = str(tmp_path / 'profiles')
+
+        resp = client.get('/songs', headers={'X-Profile': '1'})
+
+        filename = resp.headers['X-Profile-File']
+        assert filename.endswith('-songs.get_songs.prof')
+        stats = pstats.Stats(os.path.join(app.config['PROFILE_DIR'], filename))
+        assert any(func[2] == 'get_songs' for func in stats.stats)
+
+    def test_only_on_request(self, app, client, tmp_path):
+        app.config['PROFILE_DIR'] = str(tmp_path / 'profiles')
+        resp = client.get('/songs')
+        assert 'X-Profile-File' not in resp.headers
+        assert not os.path.exists(app.config['PROFILE_DIR'])
+
+    def test_ignored_when_disabled(self, tmp_path):
+        class NoProfiling(TestingConfig):
+            PROFILING_ENABLED = False
+            PROFILE_DIR = str(tmp_path / 'profiles')
+        app = create_app(NoProfiling)
+        with app.app_context():
+            resp = app.test_client().get('/songs', headers={'X-Profile': '1'})
+        assert 'X-Profile-File' not in resp.headers
+        assert not os.path.exists(NoProfiling.PROFILE_DIR)
+        assert ProductionConfig.PROFILING_ENABLED is False
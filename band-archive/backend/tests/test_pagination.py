@@ -0,0 +1,120 @@
+from pagination import NEXT_CURSOR_HEADER
+
+
+def _collect(client, url):
+    """Follow X-Next-Cursor until the last page and return every page."""
+    pages = []
+    cursor = None
+    while True:
+        sep = '&' if '?' in url else '?'
+        resp = client.get(f'{url}{sep}cursor={cursor}' if cursor else url)
+        assert resp.status_code == 200
+        pages.append(resp.get_json())
+        cursor = resp.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+class TestCursorPagination:
+    def test_unpaginated_list_is_unchanged(self, client):
+        for i in range(3):
+            client.post('/songs', json={'title': f'Song {i}', 'artist': 'A'})
+        resp = client.get('/songs')
+        assert len(resp.get_json()) == 3
+        assert NEXT_CURSOR_HEADER not in resp.headers
+
+    def test_songs_pages_cover_every_row_once(self, client):
+        for i in range(7):
+            client.post('/songs', json={'title': f'Song {i}', 'artist': 'A'})
+
+        pages = _collect(client, '/songs?limit=3')
+
+        assert [len(p) for p in pages] == [3, 3, 1]
+        ids = [s['id'] for page in pages for s in page]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == 7
+
+    def test_filters_apply_across_pages(self, client):
+        for i in range(6):
+            status = 'Completed' if i % 2 else 'Practice'
+            client.post('/songs', json={'title': f'Song {i}', 'artist': 'A', 'status': status})
+
+        pages = _collect(client, '/songs?status=Completed&limit=2')
+
+        songs = [s for page in pages for s in page]
+        assert len(songs) == 3
+        assert all(s['status'] == 'Completed' for s in songs)
+
+    def test_suggestions_page_by_score_with_ties(self, client):
+        ids = []
+        for i in range(5):
+            resp = client.post('/suggestions', json={'title': f'S{i}', 'artist': 'A', 'link': 'http://x'})
+            ids.append(resp.get_json()['id'])
+        client.post(f'/suggestions/{ids[3]}/vote', json={'vote_type': 'up'})
+        client.post(f'/suggestions/{ids[3]}/vote', json={'vote_type': 'up'})
+        client.post(f'/suggestions/{ids[1]}/vote', json={'vote_type': 'up'})
+        client.post(f'/suggestions/{ids[0]}/vote', json={'vote_type': 'down'})
+
+        pages = _collect(client, '/suggestions?limit=2')
+
+        ordered = [s['id'] for page in pages for s in page]
+        assert ordered == [ids[3], ids[1], ids[4], ids[2], ids[0]]
+
+    def test_practice_logs_page_newest_first(self, client, sample_song):
+        for i in range(5):
+            client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': f'log {i}'})
+
+        pages = _collect(client, f"/songs/{sample_song['id']}/practice-logs?limit=2")
+
+        contents = [log['content'] for page in pages for log in page]
+        assert contents == [f'log {i}' for i in reversed(range(5))]
+
+    def test_members_paginate(self, client):
+        for i in range(4):
+            client.post('/members', json={'name': f'M{i}', 'instrument': 'Drums'})
+
+        pages = _collect(client, '/members?limit=3')
+
+        assert [len(p) for p in pages] == [3, 1]
+
+    def test_invalid_limit(self, client):
+        assert client.get('/songs?limit=0').status_code == 400
+        assert client.get('/songs?limit=abc').status_code == 400
+        assert client.get('/members?limit=1000').status_code == 400
+
+    def test_invalid_cursor(self, client):
+        resp = client.get('/songs?cursor=not-a-cursor')
+        assert resp.status_code == 400
+        assert 'cursor' in resp.get_json()['error']
+
+
+class TestFieldSelection:
+    def test_songs_fields_limits_payload(self, client):
+        client.post('/songs', json={'title': 'T', 'artist': 'A', 'lyrics': 'la' * 1000, 'chords': 'C G'})
+
+        resp = client.get('/songs?fields=title,artist,status')
+
+        assert resp.get_json() == [{'id': 1, 'title': 'T', 'artist': 'A', 'status': 'Practice'}]
+
+    def test_songs_fields_skip_text_columns_in_sql(self, client, query_counter):
+        client.post('/songs', json={'title': 'T', 'artist': 'A', 'lyrics': 'la', 'chords': 'C G'})
+        query_counter.clear()
+
+        client.get('/songs?fields=title,artist')
+
+        # No media SELECT, and the song SELECT does not read the heavy columns.
+        assert len(query_counter) == 1
+        assert 'lyrics' not in query_counter[0]
+        assert 'chords' not in query_counter[0]
+
+    def test_derived_fields(self, client, sample_song):
+        client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'x'})
+
+        resp = client.get(f"/songs/{sample_song['id']}/practice-logs?fields=song_title")
+
+        assert resp.get_json() == [{'id': 1, 'song_title': 'Bohemian Rhapsody'}]
+
+    def test_unknown_field(self, client):
+        resp = client.get('/songs?fields=title,password')
+        assert resp.status_code == 400
+        assert 'password' in resp.get_json()['error']
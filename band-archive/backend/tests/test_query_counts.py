@@ -0,0 +1,346 @@
+import io
+
+
+def _upload(client, song_id, name):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(b'data'), name)},
+        content_type='multipart/form-data',
+    )
+
+
+class TestSongListQueries:
+    def _seed(self, client, count):
+        for i in range(count):
+            song = client.post('/songs', json={'title': f'Song {i}', 'artist': 'A'}).get_json()
+            _upload(client, song['id'], f'track{i}.mp3')
+            _upload(client, song['id'], f'sheet{i}.pdf')
+
+    def test_song_list_query_count_is_constant(self, client, query_counter):
+        self._seed(client, 10)
+        query_counter.clear()
+
+        resp = client.get('/songs')
+
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert len(data) == 10
+        assert all(len(song['media']) == 2 for song in data)
+        # One SELECT for songs, one SELECT ... IN for their media.
+        assert len(query_counter) == 2
+
+    def test_song_list_query_count_with_filters(self, client, query_counter):
+        self._seed(client, 5)
+        query_counter.clear()
+
+        resp = client.get('/songs?q=Song&status=Practice')
+
+        assert len(resp.get_json()) == 5
+        # Ranked FTS match, snippets for the returned page, media.
+        assert len(query_counter) == 3
+
+
+class TestLogListQueries:
+    def test_practice_logs_do_not_lazy_load_song(self, client, sample_song, query_counter):
+        for i in range(5):
+            client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': f'log {i}'})
+        query_counter.clear()
+
+        resp = client.get(f"/songs/{sample_song['id']}/practice-logs")
+
+        assert all(log['song_title'] == 'Bohemian Rhapsody' for log in resp.get_json())
+        # Song lookup + logs joined with their song.
+        assert len(query_counter) == 2
+
+    def test_dashboard_recent_logs_do_not_lazy_load_song(self, client, query_counter):
+        for i in range(5):
+            song = client.post('/songs', json={'title': f'Song {i}', 'artist': 'A'}).get_json()
+            client.post(f"/songs/{song['id']}/practice-logs", json={'content': 'log'})
+        query_counter.clear()
+
+        resp = client.get('/dashboard/stats')
+
+        logs = resp.get_json()['recent_practice_logs']
+        assert len(logs) == 5
+        assert all(log['song_title'].startswith('Song') for log in logs)
+        # Song count, status group-by, log count, recent logs joined with songs.
+        assert len(query_counter) == 4
+
+    def test_personal_logs_do_not_lazy_load_member(self, client, query_counter):
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        for i in range(3):
+            client.post(
+                f"/members/{member['id']}/logs",
+                data={'title': f'take {i}', 'file': (io.BytesIO(b'data'), f'take{i}.mp3')},
+                content_type='multipart/form-data',
+            )
+        query_counter.clear()
+
+        resp = client.get(f"/members/{member['id']}/logs")
+
+        assert all(log['member_name'] == 'Kim' for log in resp.get_json())
+        # Member lookup + logs joined with their member.
+        assert len(query_counter) == 2
+
+
+# Exact statements per route (transaction BEGIN/COMMIT are not counted).
+# GET routes run on a read-only session; write routes build their response
+# from what they just committed (database.commit_for_response), so neither
+# reloads a row it already holds.
+
+def _member_log(client, member_id, name='take.mp3', content=b'data'):
+    return client.post(
+        f'/members/{member_id}/logs',
+        data={'title': 'take', 'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    )
+
+
+class TestSongRouteQueries:
+    def test_get_song(self, client, sample_song, query_counter):
+        query_counter.clear()
+        assert client.get(f"/songs/{sample_song['id']}").status_code == 200
+        # Song, its media.
+        assert len(query_counter) == 2
+
+    def test_add_song(self, client, query_counter):
+        resp = client.post('/songs', json={'title': 'New', 'artist': 'A'})
+        assert resp.status_code == 201
+        assert resp.get_json()['media'] == []
+        # INSERT only: no reload, and a new song has no media to look up.
+        assert len(query_counter) == 1
+
+    def test_update_song(self, client, sample_song, query_counter):
+        query_counter.clear()
+        resp = client.put(f"/songs/{sample_song['id']}", json={'title': 'Renamed'})
+        assert resp.get_json()['title'] == 'Renamed'
+        # Song, UPDATE, its media for the response.
+        assert len(query_counter) == 3
+
+    def test_delete_song(self, client, sample_song, query_counter):
+        _upload(client, sample_song['id'], 'track.mp3')
+        client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'log'})
+        query_counter.clear()
+        assert client.delete(f"/songs/{sample_song['id']}").status_code == 200
+        # Song, media and logs for the cascade, DELETE media, blob UPDATE/SELECT/DELETE,
+        # DELETE log, DELETE song, tombstone INSERT and cleanup, then the blob
+        # re-read before its file is unlinked.
+        assert len(query_counter) == 12
+
+
+class TestMediaRouteQueries:
+    def test_get_media_list(self, client, sample_song, query_counter):
+        _upload(client, sample_song['id'], 'track.mp3')
+        query_counter.clear()
+        assert len(client.get(f"/songs/{sample_song['id']}/media").get_json()) == 1
+        # Song lookup, media.
+        assert len(query_counter) == 2
+
+    def test_add_media(self, client, sample_song, query_counter):
+        query_counter.clear()
+        assert _upload(client, sample_song['id'], 'track.mp3').status_code == 201
+        # Song, INSERT media, blob UPDATE then INSERT (first reference).
+        assert len(query_counter) == 4
+
+    def test_add_media_duplicate_content(self, client, sample_song, query_counter):
+        _upload(client, sample_song['id'], 'track.mp3')
+        query_counter.clear()
+        assert _upload(client, sample_song['id'], 'copy.mp3').status_code == 201
+        # Song, INSERT media, blob UPDATE (already stored).
+        assert len(query_counter) == 3
+
+    def test_upload_sheet_music(self, client, sample_song, query_counter):
+        query_counter.clear()
+        resp = client.post(
+            f"/songs/{sample_song['id']}/upload",
+            data={'file': (io.BytesIO(b'%PDF'), 'sheet.pdf')},
+            content_type='multipart/form-data',
+        )
+        assert len(resp.get_json()['media']) == 1
+        # Song, UPDATE song, INSERT media, blob UPDATE + INSERT, media job
+        # lookup + INSERT (PDF preview), the song's media for the response.
+        assert len(query_counter) == 8
+
+    def test_rename_media(self, client, sample_song, query_counter):
+        media = _upload(client, sample_song['id'], 'track.mp3').get_json()
+        query_counter.clear()
+        resp = client.put(f"/media/{media['id']}/rename", json={'filename': 'live'})
+        assert resp.get_json()['filename'] == 'live.mp3'
+        # Media, UPDATE.
+        assert len(query_counter) == 2
+
+    def test_delete_media(self, client, sample_song, query_counter):
+        media = _upload(client, sample_song['id'], 'track.mp3').get_json()
+        query_counter.clear()
+        assert client.delete(f"/media/{media['id']}").status_code == 200
+        # Media, DELETE, blob UPDATE/SELECT/DELETE, tombstone INSERT and cleanup,
+        # blob re-read before unlinking.
+        assert len(query_counter) == 8
+
+
+class TestPracticeLogRouteQueries:
+    def _log(self, client, song_id):
+        return client.post(f'/songs/{song_id}/practice-logs', json={'content': 'log'}).get_json()
+
+    def test_get_practice_log(self, client, sample_song, query_counter):
+        log = self._log(client, sample_song['id'])
+        query_counter.clear()
+        assert client.get(f"/practice-logs/{log['id']}").get_json()['song_title'] == 'Bohemian Rhapsody'
+        # Log joined with its song's title.
+        assert len(query_counter) == 1
+
+    def test_create_practice_log(self, client, sample_song, query_counter):
+        query_counter.clear()
+        log = self._log(client, sample_song['id'])
+        assert log['song_title'] == 'Bohemian Rhapsody'
+        # Song, INSERT; song_title comes from the song already loaded.
+        assert len(query_counter) == 2
+
+    def test_update_practice_log(self, client, sample_song, query_counter):
+        log = self._log(client, sample_song['id'])
+        query_counter.clear()
+        resp = client.put(f"/practice-logs/{log['id']}", json={'feedback': 'tighter'})
+        assert resp.get_json()['feedback'] == 'tighter'
+        # Log with song title, UPDATE.
+        assert len(query_counter) == 2
+
+    def test_upload_recording(self, client, sample_song, query_counter):
+        log = self._log(client, sample_song['id'])
+        query_counter.clear()
+        resp = client.post(
+            f"/practice-logs/{log['id']}/upload",
+            data={'file': (io.BytesIO(b'take'), 'take.wav')},
+            content_type='multipart/form-data',
+        )
+        assert resp.get_json()['recording']
+        # Log with song title, UPDATE log, blob UPDATE + INSERT.
+        assert len(query_counter) == 4
+
+    def test_delete_practice_log(self, client, sample_song, query_counter):
+        log = self._log(client, sample_song['id'])
+        query_counter.clear()
+        assert client.delete(f"/practice-logs/{log['id']}").status_code == 200
+        # Log, DELETE, tombstone INSERT and cleanup.
+        assert len(query_counter) == 4
+
+
+class TestMemberRouteQueries:
+    def _member(self, client):
+        return client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+
+    def test_get_members(self, client, query_counter):
+        self._member(client)
+        query_counter.clear()
+        assert len(client.get('/members').get_json()) == 1
+        assert len(query_counter) == 1
+
+    def test_get_member(self, client, query_counter):
+        member = self._member(client)
+        query_counter.clear()
+        assert client.get(f"/members/{member['id']}").status_code == 200
+        assert len(query_counter) == 1
+
+    def test_create_member(self, client, query_counter):
+        assert self._member(client)['name'] == 'Kim'
+        # INSERT only.
+        assert len(query_counter) == 1
+
+    def test_update_member(self, client, query_counter):
+        member = self._member(client)
+        query_counter.clear()
+        assert client.put(f"/members/{member['id']}", json={'instrument': 'Drums'}).status_code == 200
+        # Member, UPDATE.
+        assert len(query_counter) == 2
+
+    def test_delete_member(self, client, query_counter):
+        member = self._member(client)
+        query_counter.clear()
+        assert client.delete(f"/members/{member['id']}").status_code == 200
+        # Member, personal logs for the cascade, DELETE, tombstone INSERT and cleanup.
+        assert len(query_counter) == 5
+
+    def test_create_personal_log(self, client, query_counter):
+        member = self._member(client)
+        query_counter.clear()
+        assert _member_log(client, member['id']).get_json()['member_name'] == 'Kim'
+        # Member, INSERT log, blob UPDATE + INSERT; member_name from the loaded member.
+        assert len(query_counter) == 4
+
+    def test_delete_personal_log(self, client, query_counter):
+        member = self._member(client)
+        log = _member_log(client, member['id']).get_json()
+        query_counter.clear()
+        assert client.delete(f"/personal-logs/{log['id']}").status_code == 200
+        # Log, DELETE, blob UPDATE/SELECT/DELETE, tombstone INSERT and cleanup,
+        # blob re-read before unlinking.
+        assert len(query_counter) == 8
+
+
+class TestSuggestionRouteQueries:
+    def _suggestion(self, client):
+        return client.post('/suggestions', json={
+            'title': 'Song', 'artist': 'A', 'link': 'https://example.com',
+        }).get_json()
+
+    def test_get_suggestions(self, client, query_counter):
+        self._suggestion(client)
+        query_counter.clear()
+        assert len(client.get('/suggestions').get_json()) == 1
+        assert len(query_counter) == 1
+
+    def test_create_suggestion(self, client, query_counter):
+        assert self._suggestion(client)['thumbs_up'] == 0
+        # INSERT only.
+        assert len(query_counter) == 1
+
+    def test_vote(self, client, query_counter):
+        suggestion = self._suggestion(client)
+        query_counter.clear()
+        resp = client.post(f"/suggestions/{suggestion['id']}/vote", json={'vote_type': 'up'})
+        assert resp.get_json()['thumbs_up'] == 1
+        # UPDATE ... RETURNING.
+        assert len(query_counter) == 1
+
+    def test_delete_suggestion(self, client, query_counter):
+        suggestion = self._suggestion(client)
+        query_counter.clear()
+        resp = client.delete(f"/suggestions/{suggestion['id']}", json={'password': 'admin'})
+        assert resp.status_code == 200
+        # Suggestion, DELETE, tombstone INSERT and cleanup.
+        assert len(query_counter) == 4
+
+
+class TestUploadSessionRouteQueries:
+    def _session(self, client, song_id):
+        return client.post('/upload-sessions', json={
+            'target': 'media', 'target_id': song_id, 'filename': 'take.mp3', 'size': 4,
+        }).get_json()
+
+    def test_create_session(self, client, sample_song, query_counter):
+        query_counter.clear()
+        assert self._session(client, sample_song['id'])['offset'] == 0
+        # Song, stale sessions, INSERT.
+        assert len(query_counter) == 3
+
+    def test_upload_chunk(self, client, sample_song, query_counter):
+        session = self._session(client, sample_song['id'])
+        query_counter.clear()
+        resp = client.put(f"/upload-sessions/{session['id']}?offset=0", data=b'take')
+        assert resp.get_json()['offset'] == 4
+        # Session, offset under the file lock, compare-and-set UPDATE; the
+        # response does not read it back.
+        assert len(query_counter) == 3
+
+    def test_get_session(self, client, sample_song, query_counter):
+        session = self._session(client, sample_song['id'])
+        query_counter.clear()
+        assert client.get(f"/upload-sessions/{session['id']}").status_code == 200
+        assert len(query_counter) == 1
+
+    def test_complete_session(self, client, sample_song, query_counter):
+        session = self._session(client, sample_song['id'])
+        client.put(f"/upload-sessions/{session['id']}?offset=0", data=b'take')
+        query_counter.clear()
+        assert client.post(f"/upload-sessions/{session['id']}/complete").status_code == 201
+        # Session, song, INSERT media, blob UPDATE + INSERT, DELETE session.
+        assert len(query_counter) == 6
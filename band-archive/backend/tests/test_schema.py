@@ -0,0 +1,114 @@
+import pytest
+from alembic.config import Config as AlembicConfig
+from alembic.script import ScriptDirectory
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app import create_app
+from config import TestingConfig
+from extensions import db
+from schema import MIGRATIONS_DIR, SCHEMA_VERSION, stored_schema_version, upgrade_schema
+
+
+@pytest.fixture
+def app_factory(tmp_path):
+    apps = []
+
+    def _factory(mode):
+        class FileConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'band.db'}"
+            UPLOAD_FOLDER = str(tmp_path / 'uploads')
+            SCHEMA_ON_BOOT = mode
+        apps.append(create_app(FileConfig))
+        return apps[-1]
+    yield _factory
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def statements():
+    recorded = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', _record)
+    yield recorded
+    event.remove(Engine, 'before_cursor_execute', _record)
+
+
+def test_schema_version_is_the_migration_head():
+    config = AlembicConfig()
+    config.set_main_option('script_location', MIGRATIONS_DIR)
+    assert SCHEMA_VERSION == ScriptDirectory.from_config(config).get_current_head()
+
+
+class TestBoot:
+    def test_current_schema_costs_one_version_read(self, app_factory, statements):
+        app_factory('migrate')
+        statements.clear()
+
+        app = app_factory('check')
+
+        schema_statements = [s for s in statements if not s.startswith('PRAGMA')]
+        assert schema_statements[0] == 'SELECT version_num FROM alembic_version'
+        assert not [s for s in schema_statements if s.lstrip().upper().startswith(('CREATE', 'ALTER', 'DROP'))]
+        assert app.extensions['song_search_fts'] is True
+        assert app.test_client().get('/songs').status_code == 200
+
+    def test_stale_schema_refuses_to_start(self, app_factory, monkeypatch):
+        monkeypatch.delenv('FLASK_RUN_FROM_CLI', raising=False)
+
+        with pytest.raises(RuntimeError, match='flask schema upgrade'):
+            app_factory('check')
+
+    def test_stale_schema_only_warns_under_the_flask_command(self, app_factory, monkeypatch):
+        monkeypatch.setenv('FLASK_RUN_FROM_CLI', 'true')
+
+        app = app_factory('check')
+
+        with app.app_context():
+            assert stored_schema_version() is None
+            assert upgrade_schema(app) is None
+            assert stored_schema_version() == SCHEMA_VERSION
+            assert db.session.execute(text('SELECT count(*) FROM song')).scalar() == 0
+        assert app.extensions['song_search_fts'] is True
+
+    def test_migrate_upgrades_in_place(self, app_factory):
+        app = app_factory('migrate')
+
+        with app.app_context():
+            assert stored_schema_version() == SCHEMA_VERSION
+
+    def test_unknown_mode(self, app_factory):
+        with pytest.raises(RuntimeError, match='SCHEMA_ON_BOOT'):
+            app_factory('sometimes')
+
+
+class TestCommands:
+    def test_upgrade_then_check(self, app_factory, monkeypatch):
+        monkeypatch.setenv('FLASK_RUN_FROM_CLI', 'true')
+        runner = app_factory('check').test_cli_runner()
+
+        result = runner.invoke(args=['schema', 'check'])
+        assert result.exit_code == 1
+        assert 'Database: none' in result.output
+
+        result = runner.invoke(args=['schema', 'upgrade'])
+        assert result.exit_code == 0, result.output
+        assert f'Upgraded schema from empty to {SCHEMA_VERSION}' in result.output
+
+        assert 'Schema is current' in runner.invoke(args=['schema', 'upgrade']).output
+        assert runner.invoke(args=['schema', 'check']).exit_code == 0
+
+    def test_flask_db_commands_load_on_demand(self, app_factory):
+        app_factory('migrate')
+        app = app_factory('check')
+        assert 'migrate' not in app.extensions
+
+        result = app.test_cli_runner().invoke(args=['db', 'current'])
+
+        assert result.exit_code == 0, result.output
+        assert 'migrate' in app.extensions
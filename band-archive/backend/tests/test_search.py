@@ -0,0 +1,98 @@
+import pytest
+
+
+class TestFullTextSearch:
+    def _seed(self, client):
+        songs = [
+            {'title': '사랑을 했다', 'artist': 'iKON', 'lyrics': '우리가 만나 사랑을 했다'},
+            {'title': 'Spring Day', 'artist': 'BTS', 'lyrics': '보고 싶다 이렇게 말하니까 더 보고 싶다'},
+            {'title': '밤편지', 'artist': 'IU', 'lyrics': '이 밤 그날의 반딧불을', 'memo': '카포 2프렛'},
+            {'title': 'Yesterday', 'artist': 'Beatles', 'lyrics': 'all my troubles seemed so far away'},
+        ]
+        return [client.post('/songs', json=s).get_json() for s in songs]
+
+    def test_hangul_substring_matches(self, client):
+        self._seed(client)
+        data = client.get('/songs?q=사랑을').get_json()
+        assert [s['title'] for s in data] == ['사랑을 했다']
+
+    def test_lyrics_and_memo_are_searchable(self, client):
+        self._seed(client)
+        assert [s['title'] for s in client.get('/songs?q=troubles').get_json()] == ['Yesterday']
+        assert [s['title'] for s in client.get('/songs?q=2프렛').get_json()] == ['밤편지']
+
+    def test_snippet_is_highlighted(self, client):
+        self._seed(client)
+        data = client.get('/songs?q=보고 싶').get_json()
+        assert '<mark>보고 싶</mark>' in data[0]['snippet']
+
+    @pytest.mark.parametrize('q', ['alert', 'al'])
+    def test_snippet_escapes_song_text(self, client, q):
+        client.post('/songs', json={'title': 'X', 'artist': 'A', 'lyrics': '<img src=x onerror=alert(1)> & "more"'})
+        snippet = client.get(f'/songs?q={q}').get_json()[0]['snippet']
+        assert '<img' not in snippet
+        assert f'=<mark>{q}</mark>' in snippet
+        assert '(1)&gt; &amp;' in snippet
+
+    def test_title_hit_ranks_above_lyrics_hit(self, client):
+        client.post('/songs', json={'title': 'Other', 'artist': 'A', 'lyrics': 'a long night of moonlight'})
+        client.post('/songs', json={'title': 'Moonlight', 'artist': 'B'})
+        data = client.get('/songs?q=moonlight').get_json()
+        assert [s['title'] for s in data] == ['Moonlight', 'Other']
+
+    def test_index_follows_update_and_delete(self, client):
+        songs = self._seed(client)
+        song_id = songs[3]['id']
+
+        client.put(f'/songs/{song_id}', json={'lyrics': 'let it be'})
+        assert client.get('/songs?q=troubles').get_json() == []
+        assert len(client.get('/songs?q=let it').get_json()) == 1
+
+        client.delete(f'/songs/{song_id}')
+        assert client.get('/songs?q=let it').get_json() == []
+
+    def test_fts_operators_are_literal(self, client):
+        self._seed(client)
+        resp = client.get('/songs?q=" OR *')
+        assert resp.status_code == 200
+        assert resp.get_json() == []
+
+    def test_ranked_results_paginate(self, client):
+        for i in range(5):
+            client.post('/songs', json={'title': f'Rain {i}', 'artist': 'A'})
+        first = client.get('/songs?q=Rain&limit=3')
+        second = client.get(f"/songs?q=Rain&limit=3&cursor={first.headers['X-Next-Cursor']}")
+        titles = [s['title'] for s in first.get_json() + second.get_json()]
+        assert sorted(titles) == [f'Rain {i}' for i in range(5)]
+
+    def test_ranked_pages_do_not_repeat_after_writes(self, client):
+        for i in range(20):
+            client.post('/songs', json={'title': f'Song {i}', 'artist': 'A'})
+        for title in ('Rain', 'Rain Rain', 'Purple Rain', 'Rain on me tonight', 'Rain over the long sea'):
+            client.post('/songs', json={'title': title, 'artist': 'A'})
+        first = client.get('/songs?q=Rain&limit=2')
+        # More matching songs lower the term's weight and so every bm25 score.
+        for i in range(10):
+            client.post('/songs', json={'title': f'Acid rain {i}', 'artist': 'B'})
+        second = client.get(f"/songs?q=Rain&limit=2&cursor={first.headers['X-Next-Cursor']}")
+
+        first_ids = {s['id'] for s in first.get_json()}
+        assert len(second.get_json()) == 2
+        assert first_ids.isdisjoint(s['id'] for s in second.get_json())
+
+    def test_invalid_ranked_cursor(self, client):
+        client.post('/songs', json={'title': 'Rain', 'artist': 'A'})
+        assert client.get('/songs?q=Rain&cursor=WyJ4Il0').status_code == 400
+
+    def test_short_query_uses_like(self, client):
+        self._seed(client)
+        data = client.get('/songs?q=사랑').get_json()
+        assert [s['title'] for s in data] == ['사랑을 했다']
+        assert '<mark>사랑</mark>' in data[0]['snippet']
+
+    def test_like_fallback_without_fts(self, app, client):
+        self._seed(client)
+        app.extensions['song_search_fts'] = False
+        data = client.get('/songs?q=troubles').get_json()
+        assert [s['title'] for s in data] == ['Yesterday']
+        assert '<mark>troubles</mark>' in data[0]['snippet']
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+from app import create_app
+from config import TestingConfig
+from extensions import db
+from models import Media, Member, PersonalLog, PracticeLog, Song, SongSuggestion
+from serialization import FastJSONProvider, row_serializer
+
+
+@pytest.fixture
+def catalog(app):
+    kim = Member(name='Kim', instrument='Bass')
+    song = Song(title='Creep', artist='Radiohead', genre='Rock')
+    bare = Song(title='Yesterday', artist='The Beatles')
+    db.session.add_all([kim, song, bare])
+    db.session.flush()
+    db.session.add_all([
+        Media(song_id=song.id, filename='a' * 64 + '.png', original_filename='cover.png',
+              file_type='image', file_size=10, thumbnail='a' * 64 + '.thumb.jpg'),
+        Media(song_id=song.id, filename='legacy.pdf', file_type='document'),
+        PracticeLog(song_id=song.id, content='Verse', date=datetime(2026, 1, 2, 3, 4, 5)),
+        PracticeLog(song_id=bare.id, content=None),
+        PersonalLog(member_id=kim.id, title='Warmup', filename='b' * 64 + '.wav', file_type='audio'),
+        SongSuggestion(title='Karma Police', artist='Radiohead', link='https://example.com', thumbs_up=2),
+    ])
+    db.session.commit()
+
+
+class TestRowSerializer:
+    @pytest.mark.parametrize('model, fields', [
+        (Song, None),
+        (Song, ('id', 'title', 'media')),
+        (Media, None),
+        (Media, ('id', 'url')),
+        (PracticeLog, None),
+        (PracticeLog, ('id', 'song_title')),
+        (PersonalLog, None),
+        (PersonalLog, ('id', 'filename', 'waveform_url')),
+        (Member, None),
+        (SongSuggestion, None),
+    ])
+    def test_matches_to_dict(self, catalog, model, fields):
+        serializer = row_serializer(model, fields)
+        fast = serializer.dump(serializer.query().order_by(model.id).all())
+        expected = [row.to_dict(fields) for row in model.query.order_by(model.id).all()]
+        assert fast == expected
+
+    def test_rows_are_not_hydrated(self, catalog):
+        db.session.expunge_all()
+        serializer = row_serializer(Song)
+        serializer.dump(serializer.query().all())
+        assert len(db.session.identity_map) == 0
+
+    def test_serializer_is_cached(self):
+        assert row_serializer(Song, ('id', 'title')) is row_serializer(Song, ('id', 'title'))
+
+    def test_sort_key_outside_fields(self, client, catalog):
+        song_id = Song.query.filter_by(title='Creep').one().id
+        client.post(f'/songs/{song_id}/practice-logs', json={'content': 'Chorus'})
+        first = client.get(f'/songs/{song_id}/practice-logs?fields=content&limit=1')
+        assert first.get_json() == [{'id': 3, 'content': 'Chorus'}]
+        cursor = first.headers['X-Next-Cursor']
+        second = client.get(f'/songs/{song_id}/practice-logs?fields=content&limit=1&cursor={cursor}')
+        assert second.get_json() == [{'id': 1, 'content': 'Verse'}]
+
+
+def _stdlib(app):
+    return DefaultJSONProvider(app)
+
+
+class TestJSONProvider:
+    DOC = {
+        'b': [1, 2.5, None, True],
+        'a': {'nested': 'text', 'when': datetime(2026, 10, 18, 12, 0, 0)},
+        None: 'null key',
+    }
+
+    def test_orjson_used_when_installed(self, app):
+        pytest.importorskip('orjson')
+        assert isinstance(app.json, FastJSONProvider)
+
+    def test_same_response_bytes_as_stdlib(self, app):
+        pytest.importorskip('orjson')
+        doc = {k: v for k, v in self.DOC.items() if k is not None}
+        assert app.json.response(doc).get_data() == _stdlib(app).response(doc).get_data()
+        assert json.loads(app.json.dumps(doc)) == json.loads(_stdlib(app).dumps(doc))
+
+    def test_non_str_keys(self, app):
+        pytest.importorskip('orjson')
+        assert json.loads(app.json.dumps(self.DOC))['null'] == 'null key'
+
+    def test_non_ascii_round_trips(self, app):
+        pytest.importorskip('orjson')
+        assert json.loads(app.json.response({'title': '그대에게'}).get_data()) == {'title': '그대에게'}
+
+    def test_stdlib_backend(self):
+        class StdlibConfig(TestingConfig):
+            JSON_BACKEND = 'stdlib'
+        app = create_app(StdlibConfig)
+        assert not isinstance(app.json, FastJSONProvider)
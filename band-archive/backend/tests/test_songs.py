@@ -231,7 +231,9 @@ class TestFileUpload:
         assert resp.status_code == 200
         result = resp.get_json()
         assert result['sheet_music'] is not None
-        assert 'sheet.pdf' in result['sheet_music']
+        # Stored under its content hash; the upload's name is kept on the media row.
+        assert result['sheet_music'].endswith('.pdf')
+        assert result['media'][0]['filename'] == 'sheet.pdf'
 
     def test_upload_image(self, client, sample_song):
         song_id = sample_song['id']
@@ -244,7 +246,9 @@ class TestFileUpload:
             content_type='multipart/form-data',
         )
         assert resp.status_code == 200
-        assert 'score.png' in resp.get_json()['sheet_music']
+        result = resp.get_json()
+        assert result['sheet_music'].endswith('.png')
+        assert result['media'][0]['filename'] == 'score.png'
 
     def test_upload_disallowed_extension(self, client, sample_song):
         song_id = sample_song['id']
@@ -0,0 +1,320 @@
+import fcntl
+import hashlib
+import io
+import os
+
+import pytest
+
+from app import create_app
+import storage_gc
+from blob_store import BLOB_LOCK_NAME, blob_relative_path
+from config import TestingConfig
+from extensions import db
+from media_jobs import run_pending_jobs
+from models import Blob, Media, Member, PersonalLog, Song
+from stamp_files import stamp_path
+from storage import LocalStorage, S3Storage, get_storage, sharded_key
+from storage_gc import reshard_legacy_files
+
+BUCKET = 'band-archive-test'
+
+
+def _png():
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new('RGB', (640, 480), (30, 90, 200)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def _upload(client, song_id, name, content):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    ).get_json()
+
+
+def _read(storage, key, start=0, length=None):
+    return b''.join(storage.get_range(key, start, length))
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    moto = pytest.importorskip('moto')
+    import boto3
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture(params=['local', 's3'])
+def storage(request, tmp_path):
+    if request.param == 'local':
+        return LocalStorage(str(tmp_path / 'store'))
+    return S3Storage(request.getfixturevalue('s3_client'), BUCKET, 'band/')
+
+
+@pytest.fixture
+def s3_app(app, s3_client):
+    """The app with uploads in the mocked bucket; scratch files stay in UPLOAD_FOLDER."""
+    app.extensions['storage'] = S3Storage(s3_client, BUCKET, 'band/')
+    return app
+
+
+def _bucket_keys(s3_client):
+    return sorted(item['Key'] for item in s3_client.list_objects_v2(Bucket=BUCKET).get('Contents', ()))
+
+
+class TestDrivers:
+    def test_put_stat_and_read(self, storage):
+        size = storage.put_stream('blobs/ab/cd/abcd', io.BytesIO(b'0123456789'))
+
+        assert size == 10
+        assert storage.exists('blobs/ab/cd/abcd')
+        assert storage.stat('blobs/ab/cd/abcd').size == 10
+        assert _read(storage, 'blobs/ab/cd/abcd') == b'0123456789'
+
+    def test_get_range(self, storage):
+        storage.put_stream('take.mp3', io.BytesIO(bytes(range(256)) * 1024))
+
+        assert _read(storage, 'take.mp3', 10, 5) == bytes(range(10, 15))
+        assert _read(storage, 'take.mp3', 256 * 1024 - 3) == bytes(range(253, 256))
+        assert _read(storage, 'take.mp3', 0, 0) == b''
+
+    def test_missing(self, storage):
+        assert storage.stat('nope') is None
+        assert not storage.exists('nope')
+        with pytest.raises(FileNotFoundError):
+            _read(storage, 'nope')
+
+    def test_put_file_moves_the_local_file(self, storage, tmp_path):
+        source = tmp_path / 'done.jpg'
+        source.write_bytes(b'jpeg')
+
+        storage.put_file('derived/ab/cd/done.jpg', str(source))
+
+        assert not source.exists()
+        assert _read(storage, 'derived/ab/cd/done.jpg') == b'jpeg'
+
+    def test_copy_move_and_delete(self, storage):
+        storage.put_stream('a', io.BytesIO(b'bytes'))
+
+        storage.copy('a', 'blobs/00/11/b')
+        storage.move('a', 'c')
+        assert not storage.exists('a')
+        assert _read(storage, 'blobs/00/11/b') == _read(storage, 'c') == b'bytes'
+
+        storage.delete('c')
+        assert not storage.exists('c')
+        with pytest.raises(FileNotFoundError):
+            storage.copy('c', 'd')
+
+    def test_walk(self, storage):
+        for key in ('top.mp3', '.hidden', 'personal_logs/log.wav', 'blobs/ab/cd/abcd', 'blobs/ab/ce/abce'):
+            storage.put_stream(key, io.BytesIO(b'x'))
+
+        assert {entry.key for entry in storage.walk('', 0)} == {'top.mp3'}
+        assert {entry.name for entry in storage.walk('personal_logs', 0)} == {'log.wav'}
+        entries = sorted(storage.walk('blobs', 2), key=lambda entry: entry.key)
+        assert [entry.key for entry in entries] == ['blobs/ab/cd/abcd', 'blobs/ab/ce/abce']
+        assert entries[0].stat().size == 1
+
+    def test_unsafe_keys_are_rejected(self, storage):
+        for key in ('../outside', 'a/../../b', ''):
+            with pytest.raises(ValueError):
+                storage.stat(key)
+
+    def test_sharded_key(self):
+        assert sharded_key('blobs', 'abcdef') == 'blobs/ab/cd/abcdef'
+
+
+class TestConfig:
+    def test_local_by_default(self, app):
+        storage = get_storage()
+        assert isinstance(storage, LocalStorage)
+        assert storage.root == app.config['UPLOAD_FOLDER']
+
+    def test_s3_backend(self, s3_client, tmp_path):
+        class S3Config(TestingConfig):
+            STORAGE_BACKEND = 's3'
+            S3_BUCKET = BUCKET
+            S3_PREFIX = 'band'
+            S3_REGION = 'us-east-1'
+            UPLOAD_FOLDER = str(tmp_path / 'uploads')
+
+        app = create_app(S3Config)
+        storage = app.extensions['storage']
+        assert isinstance(storage, S3Storage)
+        assert storage.prefix == 'band/'
+
+    def test_unknown_backend(self, tmp_path):
+        class BadConfig(TestingConfig):
+            STORAGE_BACKEND = 'ftp'
+            UPLOAD_FOLDER = str(tmp_path / 'uploads')
+
+        with pytest.raises(RuntimeError, match='ftp'):
+            create_app(BadConfig)
+
+
+class TestS3Uploads:
+    def test_upload_is_stored_in_the_bucket(self, s3_app, s3_client, client, sample_song):
+        media = _upload(client, sample_song['id'], 'take.mp3', b'take one')
+        sha256 = hashlib.sha256(b'take one').hexdigest()
+
+        assert media['url'] == f'/uploads/{sha256}.mp3'
+        assert _bucket_keys(s3_client) == [f'band/{blob_relative_path(sha256)}']
+        assert not os.path.exists(os.path.join(s3_app.config['UPLOAD_FOLDER'], 'blobs', sha256[:2]))
+        assert db.session.get(Blob, sha256).size == 8
+
+    def test_serving(self, s3_app, client, sample_song):
+        media = _upload(client, sample_song['id'], 'take.mp3', b'0123456789')
+
+        resp = client.get(media['url'])
+        assert resp.status_code == 200
+        assert resp.data == b'0123456789'
+        assert resp.mimetype == 'audio/mpeg'
+        assert 'immutable' in resp.headers['Cache-Control']
+
+        partial = client.get(media['url'], headers={'Range': 'bytes=2-5'})
+        assert partial.status_code == 206
+        assert partial.data == b'2345'
+        assert partial.headers['Content-Range'] == 'bytes 2-5/10'
+
+        cached = client.get(media['url'], headers={'If-None-Match': resp.headers['ETag']})
+        assert cached.status_code == 304
+
+        assert client.get('/uploads/missing.mp3').status_code == 404
+
+    def test_deleting_the_last_reference_deletes_the_object(self, s3_app, s3_client, client, sample_song):
+        media = _upload(client, sample_song['id'], 'take.mp3', b'take')
+
+        client.delete(f"/media/{media['id']}")
+
+        assert _bucket_keys(s3_client) == []
+
+    def test_chunked_upload_reuses_a_stored_blob(self, s3_app, client, sample_song):
+        _upload(client, sample_song['id'], 'take.mp3', b'take')
+
+        resp = client.post('/upload-sessions', json={
+            'target': 'media', 'target_id': sample_song['id'], 'filename': 'again.mp3',
+            'size': 4, 'sha256': hashlib.sha256(b'take').hexdigest(),
+        })
+
+        assert resp.get_json()['deduplicated'] is True
+        assert resp.get_json()['offset'] == 4
+
+    def test_media_jobs_upload_their_outputs(self, s3_app, s3_client, client, sample_song):
+        media = _upload(client, sample_song['id'], 'cover.png', _png())
+
+        assert run_pending_jobs() == 1
+        thumbnail_url = client.get(f"/songs/{sample_song['id']}/media").get_json()[0]['thumbnail_url']
+        name = thumbnail_url.rsplit('/', 1)[1]
+
+        assert f'band/derived/{name[:2]}/{name[2:4]}/{name}' in _bucket_keys(s3_client)
+        resp = client.get(thumbnail_url)
+        assert resp.status_code == 200
+        assert resp.data[:3] == b'\xff\xd8\xff'
+        assert media['url'] == f'/uploads/{name[:64]}.png'
+
+    def test_bundle(self, s3_app, client, sample_song):
+        import zipfile
+        _upload(client, sample_song['id'], 'take.mp3', b'take')
+
+        resp = client.get(f"/songs/{sample_song['id']}/bundle")
+
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as bundle:
+            assert bundle.read('Bohemian Rhapsody - Queen/take.mp3') == b'take'
+
+
+class TestReshard:
+    def _legacy(self, app, name, content, subdir=''):
+        get_storage().put_stream(f'{subdir}/{name}' if subdir else name, io.BytesIO(content))
+
+    def test_moves_legacy_files_into_the_blob_store(self, app, client, sample_song):
+        self._legacy(app, '1_20240101_take.mp3', b'take')
+        self._legacy(app, '1_20240101_score.pdf', b'%PDF score')
+        self._legacy(app, 'log.wav', b'RIFF log', 'personal_logs')
+        song = db.session.get(Song, sample_song['id'])
+        song.sheet_music = '1_20240101_score.pdf'
+        member = Member(name='Kim', instrument='Bass')
+        db.session.add_all([
+            Media(song_id=song.id, filename='1_20240101_take.mp3', file_type='audio'),
+            Media(song_id=song.id, filename='1_20240101_score.pdf', file_type='document'),
+            PersonalLog(member=member, title='Scales', filename='log.wav', file_type='audio'),
+        ])
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=['storage', 'reshard'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Moved 3 file(s)' in result.output
+        db.session.expire_all()
+        take, score = Media.query.order_by(Media.id).all()
+        assert take.filename == f"{hashlib.sha256(b'take').hexdigest()}.mp3"
+        assert song.sheet_music == score.filename == f"{hashlib.sha256(b'%PDF score').hexdigest()}.pdf"
+        log = PersonalLog.query.one()
+        assert log.filename == f"{hashlib.sha256(b'RIFF log').hexdigest()}.wav"
+        assert db.session.get(Blob, take.filename[:64]).ref_count == 1
+        assert db.session.get(Blob, log.filename[:64]).size == 8
+
+        uploads = app.config['UPLOAD_FOLDER']
+        assert sorted(name for name in os.listdir(uploads) if not name.startswith('.')) == ['blobs', 'personal_logs']
+        assert os.listdir(os.path.join(uploads, 'personal_logs')) == []
+        assert client.get(f'/uploads/{take.filename}').data == b'take'
+
+    def test_same_content_shares_one_blob(self, app, sample_song):
+        for name in ('a.mp3', 'b.mp3'):
+            self._legacy(app, name, b'same take')
+            db.session.add(Media(song_id=sample_song['id'], filename=name, file_type='audio'))
+        db.session.commit()
+
+        summary = reshard_legacy_files()
+
+        assert summary['moved'] == 2
+        assert summary['deduplicated'] == 1
+        sha256 = hashlib.sha256(b'same take').hexdigest()
+        assert db.session.get(Blob, sha256).ref_count == 2
+
+    def test_blobs_are_held_under_the_store_lock_until_the_batch_commits(self, app, sample_song, monkeypatch):
+        self._legacy(app, 'take.mp3', b'take')
+        db.session.add(Media(song_id=sample_song['id'], filename='take.mp3', file_type='audio'))
+        db.session.commit()
+        rename_rows = storage_gc._rename_rows
+        held = []
+
+        def checking_lock(*args):
+            with open(stamp_path(BLOB_LOCK_NAME), 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    held.append(False)
+                except BlockingIOError:
+                    held.append(True)
+            return rename_rows(*args)
+        monkeypatch.setattr(storage_gc, '_rename_rows', checking_lock)
+
+        assert reshard_legacy_files()['moved'] == 1
+        assert held == [True]
+
+    def test_missing_files_are_left_alone(self, app, sample_song):
+        db.session.add(Media(song_id=sample_song['id'], filename='gone.mp3', file_type='audio'))
+        db.session.commit()
+
+        summary = reshard_legacy_files()
+
+        assert summary == {'moved': 0, 'deduplicated': 0, 'missing': 1, 'skipped': 0, 'rows': 0}
+        assert Media.query.one().filename == 'gone.mp3'
+
+    def test_in_a_bucket(self, s3_app, s3_client, sample_song):
+        self._legacy(s3_app, '1_20240101_take.mp3', b'take')
+        db.session.add(Media(song_id=sample_song['id'], filename='1_20240101_take.mp3', file_type='audio'))
+        db.session.commit()
+
+        reshard_legacy_files()
+
+        sha256 = hashlib.sha256(b'take').hexdigest()
+        assert _bucket_keys(s3_client) == [f'band/{blob_relative_path(sha256)}']
+        assert Media.query.one().filename == f'{sha256}.mp3'
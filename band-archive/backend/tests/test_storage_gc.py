@@ -0,0 +1,222 @@
+import fcntl
+import io
+import os
+import time
+
+import pytest
+
+import storage_gc
+from blob_store import BLOB_LOCK_NAME, blob_path, store_stream
+from extensions import db
+from media_jobs import derived_path
+from models import Blob, Media, MediaJob, PersonalLog, UploadSession
+from stamp_files import stamp_path
+from storage_gc import run_scheduled_scan, scan_storage
+
+OLD = time.time() - 7 * 24 * 3600
+
+
+def _write(path, content=b'data', mtime=OLD):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _upload(client, song_id, name, content):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    ).get_json()
+
+
+def _sha256(media):
+    return media['url'].rsplit('/', 1)[1][:64]
+
+
+def _age(path):
+    os.utime(path, (OLD, OLD))
+
+
+def _stored_blob(content):
+    sha256, _ = store_stream(io.BytesIO(content))
+    _age(blob_path(sha256))
+    return sha256
+
+
+def _store_locked():
+    with open(stamp_path(BLOB_LOCK_NAME), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        return False
+
+
+@pytest.fixture
+def uploads(app):
+    return app.config['UPLOAD_FOLDER']
+
+
+class TestScan:
+    def test_referenced_files_are_kept(self, app, client, sample_song, uploads):
+        media = _upload(client, sample_song['id'], 'take.mp3', b'take')
+        _age(blob_path(_sha256(media)))
+        _write(os.path.join(uploads, 'legacy.mp3'))
+        db.session.add(Media(song_id=sample_song['id'], filename='legacy.mp3', file_type='audio'))
+        db.session.commit()
+
+        report = scan_storage(delete=True)
+
+        assert report['files'] == 2
+        assert sum(report['orphans'].values()) == 0
+        assert report['missing'] == []
+        assert os.path.exists(os.path.join(uploads, 'legacy.mp3'))
+
+    def test_orphans_are_reported_and_deleted(self, app, client, sample_song, uploads):
+        dead = _stored_blob(b'failed import')
+        paths = [
+            blob_path(dead),
+            _write(os.path.join(uploads, '1_20240101_old.mp3')),
+            _write(os.path.join(uploads, 'personal_logs', 'old.wav')),
+            _write(os.path.join(uploads, '.partial', 'abandoned')),
+            _write(os.path.join(uploads, 'blobs', '.tmp', 'tmpabc')),
+            _write(derived_path(f'{dead}.thumb.jpg')),
+        ]
+        stamp = _write(os.path.join(uploads, '.cache', 'versions', 'song.stamp'))
+
+        report = scan_storage()
+
+        assert report['orphans'] == {'blobs': 2, 'derived': 1, 'partial': 1, 'uploads': 1, 'personal_logs': 1}
+        assert sorted(report['orphan_files']) == sorted(os.path.relpath(p, uploads) for p in paths)
+        assert all(os.path.exists(p) for p in paths)
+
+        report = scan_storage(delete=True)
+
+        assert report['deleted'] == 6
+        assert not any(os.path.exists(p) for p in paths)
+        assert os.path.exists(stamp)
+
+    def test_deleted_blob_takes_its_derived_files_and_jobs(self, app, client, sample_song, uploads):
+        media = _upload(client, sample_song['id'], 'cover.png', b'png')
+        sha256 = _sha256(media)
+        live_output = _write(derived_path(f'{sha256}.thumb.jpg'))
+        dead = _stored_blob(b'gone')
+        dead_output = _write(derived_path(f'{dead}.thumb.jpg'))
+        db.session.add(MediaJob(sha256=dead, kind='thumbnail', status='done'))
+        db.session.commit()
+
+        scan_storage(delete=True)
+
+        # Not referenced by a column yet, but its blob is live: a finished job may still point at it.
+        assert os.path.exists(live_output)
+        assert not os.path.exists(dead_output)
+        assert MediaJob.query.filter_by(sha256=dead).count() == 0
+        assert MediaJob.query.filter_by(sha256=sha256).count() == 1
+
+    def test_recent_orphans_are_left_alone(self, app, uploads):
+        path = _write(os.path.join(uploads, 'in-flight.mp3'), mtime=time.time())
+        report = scan_storage(delete=True)
+        assert report['recent'] == 1
+        assert report['orphans']['uploads'] == 0
+        assert os.path.exists(path)
+
+    def test_blobs_kept_for_upload_sessions_and_blob_rows(self, app, uploads):
+        reused = _stored_blob(b'declared by a client')
+        counted = _stored_blob(b'counted')
+        db.session.add(UploadSession(id='s1', target='media', target_id=1, original_filename='a.mp3',
+                                     size=1, existing_sha256=reused))
+        db.session.add(Blob(sha256=counted, ref_count=1))
+        db.session.commit()
+        _write(os.path.join(uploads, '.partial', 's1'))
+
+        report = scan_storage(delete=True)
+
+        assert report['deleted'] == 0
+        assert os.path.exists(blob_path(reused)) and os.path.exists(blob_path(counted))
+
+    def test_rows_committed_during_the_scan_keep_their_files(self, app, sample_song, uploads, monkeypatch):
+        path = _write(os.path.join(uploads, 'renamed.mp3'))
+        build = storage_gc.StorageIndex.build
+
+        def build_then_commit():
+            index = build()
+            db.session.add(Media(song_id=sample_song['id'], filename='renamed.mp3', file_type='audio'))
+            db.session.commit()
+            return index
+        monkeypatch.setattr(storage_gc.StorageIndex, 'build', build_then_commit)
+
+        report = scan_storage(delete=True)
+
+        assert report['orphans']['uploads'] == 1
+        assert report['deleted'] == 0
+        assert os.path.exists(path)
+
+    def test_blobs_are_rechecked_and_deleted_under_the_store_lock(self, app, uploads, monkeypatch):
+        dead = _stored_blob(b'old orphan')
+        db.session.commit()
+        delete_batch = storage_gc._delete_batch
+        held = []
+
+        def checking_lock(storage, orphans, recheck, report):
+            held.append(_store_locked())
+            delete_batch(storage, orphans, recheck, report)
+        monkeypatch.setattr(storage_gc, '_delete_batch', checking_lock)
+
+        report = scan_storage(delete=True)
+
+        assert held == [True]
+        assert report['deleted'] == 1
+        assert not os.path.exists(blob_path(dead))
+        assert not _store_locked()
+
+    def test_missing_files(self, app, client, sample_song, uploads):
+        media = _upload(client, sample_song['id'], 'take.mp3', b'take')
+        os.remove(blob_path(_sha256(media)))
+        legacy = Media(song_id=sample_song['id'], filename='lost.mp3', file_type='audio')
+        log = PersonalLog(member_id=1, title='t', filename='lost.wav', file_type='audio')
+        db.session.add_all([legacy, log])
+        db.session.commit()
+
+        missing = scan_storage()['missing']
+
+        assert {(row['table'], row['column'], row['id'], row['name']) for row in missing} == {
+            ('media', 'filename', media['id'], media['url'].rsplit('/', 1)[1]),
+            ('media', 'filename', legacy.id, 'lost.mp3'),
+            ('personal_log', 'filename', log.id, 'lost.wav'),
+        }
+
+
+class TestCommand:
+    def test_scan_and_delete(self, app, uploads):
+        path = _write(os.path.join(uploads, 'orphan.mp3'))
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=['storage', 'scan', '-v'])
+        assert result.exit_code == 0
+        assert 'orphan  orphan.mp3' in result.output
+        assert os.path.exists(path)
+
+        result = runner.invoke(args=['storage', 'scan', '--delete'])
+        assert 'Deleted 1 file(s), 4 bytes.' in result.output
+        assert not os.path.exists(path)
+
+    def test_missing_files_fail(self, app, sample_song):
+        db.session.add(Media(song_id=sample_song['id'], filename='lost.mp3', file_type='audio'))
+        db.session.commit()
+        result = app.test_cli_runner().invoke(args=['storage', 'scan'])
+        assert result.exit_code == 1
+        assert '1 missing' in result.output
+
+
+class TestSchedule:
+    def test_runs_once_per_interval(self, app, uploads):
+        app.config['STORAGE_SCAN_INTERVAL_HOURS'] = 24
+        path = _write(os.path.join(uploads, 'orphan.mp3'))
+
+        assert run_scheduled_scan(app) is not None
+        assert run_scheduled_scan(app) is None
+        # Reporting only unless STORAGE_SCAN_DELETE is set.
+        assert os.path.exists(path)
@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+
+from app import create_app
+from config import TestingConfig
+from extensions import db
+
+
+def _add_suggestion(client, title='Creep'):
+    return client.post('/suggestions', json={
+        'title': title, 'artist': 'Radiohead', 'link': 'https://example.com',
+    }).get_json()
+
+
+def _vote(client, suggestion_id, vote_type):
+    return client.post(f'/suggestions/{suggestion_id}/vote', json={'vote_type': vote_type})
+
+
+class TestVote:
+    def test_up_and_down(self, client):
+        suggestion = _add_suggestion(client)
+        _vote(client, suggestion['id'], 'up')
+        data = _vote(client, suggestion['id'], 'down').get_json()
+        assert data['thumbs_up'] == 1
+        assert data['thumbs_down'] == 1
+
+    def test_single_statement(self, client, query_counter):
+        suggestion = _add_suggestion(client)
+        query_counter.clear()
+        assert _vote(client, suggestion['id'], 'up').get_json()['thumbs_up'] == 1
+        assert len(query_counter) == 1
+        assert query_counter[0].startswith('UPDATE')
+
+    def test_invalid_vote_type(self, client):
+        suggestion = _add_suggestion(client)
+        resp = _vote(client, suggestion['id'], 'sideways')
+        assert resp.status_code == 400
+
+    def test_not_found(self, client):
+        assert _vote(client, 999, 'up').status_code == 404
+
+
+class TestBatchVote:
+    def test_aggregates_votes(self, client):
+        first = _add_suggestion(client, 'One')
+        second = _add_suggestion(client, 'Two')
+        resp = client.post('/suggestions/votes', json={'votes': [
+            {'id': first['id'], 'vote_type': 'up'},
+            {'id': first['id'], 'vote_type': 'up'},
+            {'id': second['id'], 'vote_type': 'down'},
+            {'id': first['id'], 'vote_type': 'down'},
+        ]})
+        assert resp.status_code == 200
+        by_id = {s['id']: s for s in resp.get_json()['suggestions']}
+        assert (by_id[first['id']]['thumbs_up'], by_id[first['id']]['thumbs_down']) == (2, 1)
+        assert (by_id[second['id']]['thumbs_up'], by_id[second['id']]['thumbs_down']) == (0, 1)
+
+    def test_deleted_suggestions_are_reported(self, client):
+        suggestion = _add_suggestion(client)
+        resp = client.post('/suggestions/votes', json={'votes': [
+            {'id': suggestion['id'], 'vote_type': 'up'},
+            {'id': 999, 'vote_type': 'up'},
+        ]})
+        data = resp.get_json()
+        assert [s['id'] for s in data['suggestions']] == [suggestion['id']]
+        assert data['not_found'] == [999]
+
+    @pytest.mark.parametrize('body', [
+        {},
+        {'votes': []},
+        {'votes': [{'id': 1, 'vote_type': 'meh'}]},
+        {'votes': [{'id': '1', 'vote_type': 'up'}]},
+        {'votes': [{'id': 1, 'vote_type': 'up'}] * 1001},
+    ])
+    def test_invalid_batch_changes_nothing(self, client, body):
+        suggestion = _add_suggestion(client)
+        body = {'votes': [dict(v, id=suggestion['id']) if v.get('id') == 1 else v
+                          for v in body['votes']]} if 'votes' in body else body
+        assert client.post('/suggestions/votes', json=body).status_code == 400
+        assert client.get('/suggestions').get_json()[0]['thumbs_up'] == 0
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """An app on a SQLite file, so every thread gets its own connection."""
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'votes.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+
+    app = create_app(FileConfig)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+class TestConcurrentVotes:
+    THREADS = 16
+    VOTES_PER_THREAD = 125
+
+    def _hammer(self, app, send, rounds):
+        errors = []
+
+        def worker(index):
+            client = app.test_client()
+            try:
+                for n in range(rounds):
+                    resp = send(client, index, n)
+                    assert resp.status_code == 200, resp.get_data(as_text=True)
+            except Exception as e:  # surfaced below; a thread cannot fail the test itself
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+    def test_no_lost_votes(self, file_app):
+        client = file_app.test_client()
+        suggestion = _add_suggestion(client)
+
+        self._hammer(file_app, lambda c, i, n: _vote(c, suggestion['id'], 'up' if n % 5 else 'down'),
+                     self.VOTES_PER_THREAD)
+
+        data = client.get('/suggestions').get_json()[0]
+        total = self.THREADS * self.VOTES_PER_THREAD
+        assert data['thumbs_up'] + data['thumbs_down'] == total
+        assert data['thumbs_down'] == self.THREADS * len(range(0, self.VOTES_PER_THREAD, 5))
+
+    def test_no_lost_batch_votes(self, file_app):
+        client = file_app.test_client()
+        ids = [_add_suggestion(client, f'Song {i}')['id'] for i in range(3)]
+
+        def send(c, i, n):
+            return c.post('/suggestions/votes', json={'votes': [
+                {'id': suggestion_id, 'vote_type': 'up'} for suggestion_id in ids for _ in range(5)
+            ]})
+        self._hammer(file_app, send, 25)
+
+        totals = {s['id']: s['thumbs_up'] for s in client.get('/suggestions').get_json()}
+        assert totals == {suggestion_id: self.THREADS * 25 * 5 for suggestion_id in ids}
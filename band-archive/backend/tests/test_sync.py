@@ -0,0 +1,140 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from extensions import db
+from models import Song, Tombstone
+from routes.sync import _encode_token
+
+
+@pytest.fixture
+def exact_sync(app):
+    """Tokens without the overlap window, so deltas contain exactly the new writes."""
+    app.config['SYNC_OVERLAP_SECONDS'] = 0
+    return app
+
+
+def _sync(client, token=None):
+    resp = client.get('/sync', query_string={'since': token} if token else {})
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def _ids(data, collection):
+    return [row['id'] for row in data['changes'][collection]]
+
+
+def _upload(client, song_id, name='take.mp3'):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(b'data'), name)},
+        content_type='multipart/form-data',
+    ).get_json()
+
+
+class TestFullSync:
+    def test_without_token_returns_everything(self, client, sample_song):
+        media = _upload(client, sample_song['id'])
+        client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'})
+
+        data = _sync(client)
+
+        assert data['full'] is True
+        assert _ids(data, 'songs') == [sample_song['id']]
+        assert _ids(data, 'media') == [media['id']]
+        assert _ids(data, 'members') == [1]
+        assert data['deleted'] == {name: [] for name in data['changes']}
+
+    def test_songs_do_not_nest_media(self, client, sample_song):
+        _upload(client, sample_song['id'])
+        song = _sync(client)['changes']['songs'][0]
+        assert 'media' not in song
+        assert song['updated_at'] is not None
+
+    def test_expired_token_gets_full_snapshot(self, app, client, sample_song):
+        old = datetime.now(timezone.utc) - timedelta(days=app.config['SYNC_TOMBSTONE_RETENTION_DAYS'] + 1)
+        data = _sync(client, _encode_token(old))
+        assert data['full'] is True
+        assert _ids(data, 'songs') == [sample_song['id']]
+
+    def test_invalid_token(self, client):
+        assert client.get('/sync?since=not-a-token').status_code == 400
+
+
+class TestDeltaSync:
+    def test_only_changed_rows(self, exact_sync, client, sample_song):
+        other = client.post('/songs', json={'title': 'Creep', 'artist': 'Radiohead'}).get_json()
+        token = _sync(client)['token']
+
+        client.put(f"/songs/{other['id']}", json={'status': 'Completed'})
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'Verse'}).get_json()
+        data = _sync(client, token)
+
+        assert data['full'] is False
+        assert _ids(data, 'songs') == [other['id']]
+        assert _ids(data, 'practice_logs') == [log['id']]
+        assert data['changes']['practice_logs'][0]['song_title'] == 'Bohemian Rhapsody'
+        assert _ids(data, 'media') == [] and _ids(data, 'members') == []
+
+    def test_nothing_changed(self, exact_sync, client, sample_song):
+        token = _sync(client)['token']
+        data = _sync(client, token)
+        assert all(rows == [] for rows in data['changes'].values())
+        assert all(ids == [] for ids in data['deleted'].values())
+
+    def test_deletes_are_reported(self, exact_sync, client, sample_song):
+        media = _upload(client, sample_song['id'])
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        token = _sync(client)['token']
+
+        client.delete(f"/media/{media['id']}")
+        client.delete(f"/members/{member['id']}")
+        data = _sync(client, token)
+
+        assert data['deleted']['media'] == [media['id']]
+        assert data['deleted']['members'] == [member['id']]
+        assert data['deleted']['songs'] == []
+
+    def test_cascade_deletes_leave_tombstones(self, exact_sync, client, sample_song):
+        media = _upload(client, sample_song['id'])
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'Verse'}).get_json()
+        token = _sync(client)['token']
+
+        client.delete(f"/songs/{sample_song['id']}")
+        deleted = _sync(client, token)['deleted']
+
+        assert deleted['songs'] == [sample_song['id']]
+        assert deleted['media'] == [media['id']]
+        assert deleted['practice_logs'] == [log['id']]
+
+    def test_votes_update_suggestions(self, exact_sync, client):
+        suggestion = client.post('/suggestions', json={
+            'title': 'Karma Police', 'artist': 'Radiohead', 'link': 'https://example.com',
+        }).get_json()
+        token = _sync(client)['token']
+
+        client.post(f"/suggestions/{suggestion['id']}/vote", json={'vote_type': 'up'})
+        data = _sync(client, token)
+
+        assert data['changes']['suggestions'][0]['thumbs_up'] == 1
+
+    def test_overlap_resends_recent_rows(self, client, sample_song):
+        token = _sync(client)['token']
+        # Written just before the token, possibly by a transaction that committed late.
+        assert _ids(_sync(client, token), 'songs') == [sample_song['id']]
+
+
+class TestTombstones:
+    def test_rollback_leaves_no_tombstone(self, client, sample_song):
+        db.session.delete(db.session.get(Song, sample_song['id']))
+        db.session.flush()
+        db.session.rollback()
+        assert Tombstone.query.count() == 0
+
+    def test_old_tombstones_are_pruned(self, client, sample_song):
+        db.session.add(Tombstone(table_name='song', row_id=99,
+                                 deleted_at=datetime.now(timezone.utc) - timedelta(days=365)))
+        db.session.commit()
+        client.delete(f"/songs/{sample_song['id']}")
+        assert [t.row_id for t in Tombstone.query.all()] == [sample_song['id']]
@@ -0,0 +1,151 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from stamp_files import stamp_path
+from upload_admission import SLOTS_SUBDIR, acquire_upload_slot
+
+
+class ExplodingStream(io.RawIOBase):
+    """A request body of ``length`` bytes that must not be read."""
+
+    def __init__(self, length):
+        super().__init__()
+        self.length = length
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # The test client measures the body by seeking to its end.
+        self.position = self.length + offset if whence == io.SEEK_END else offset
+        return self.position
+
+    def readinto(self, buffer):
+        raise AssertionError('the body was read')
+
+
+def _upload(client, song_id, content=b'take', name='take.mp3'):
+    return client.post(
+        f'/songs/{song_id}/media',
+        data={'file': (io.BytesIO(content), name)},
+        content_type='multipart/form-data',
+    )
+
+
+def _unread_upload(client, song_id, length):
+    return client.post(
+        f'/songs/{song_id}/media',
+        input_stream=ExplodingStream(length),
+        content_type='multipart/form-data; boundary=x',
+    )
+
+
+@pytest.fixture
+def limits(app):
+    app.config.update(UPLOAD_MAX_CONCURRENT=2, UPLOAD_MAX_INFLIGHT_BYTES=10_000)
+    return app.config
+
+
+class TestAdmission:
+    def test_upload_releases_its_slot(self, client, sample_song, limits):
+        for content in (b'one', b'two', b'three'):
+            assert _upload(client, sample_song['id'], content).status_code == 201
+
+        slots = [acquire_upload_slot(1), acquire_upload_slot(1)]
+        assert None not in slots
+        for slot in slots:
+            os.close(slot)
+
+    def test_full_slots_get_503_before_the_body_is_read(self, client, sample_song, limits):
+        slots = [acquire_upload_slot(10), acquire_upload_slot(10)]
+
+        resp = _unread_upload(client, sample_song['id'], 100)
+
+        assert resp.status_code == 503
+        assert resp.headers['Retry-After'] == '10'
+        assert 'uploads' in resp.get_json()['error']
+
+        os.close(slots.pop())
+        assert _upload(client, sample_song['id']).status_code == 201
+        os.close(slots.pop())
+
+    def test_in_flight_bytes(self, client, sample_song, limits):
+        slot = acquire_upload_slot(9_000)
+
+        assert _unread_upload(client, sample_song['id'], 2_000).status_code == 503
+        assert _upload(client, sample_song['id']).status_code == 201
+
+        os.close(slot)
+        # Alone, an upload larger than the whole budget still gets in.
+        assert _upload(client, sample_song['id'], b'x' * 20_000).status_code == 201
+
+    def test_body_over_max_content_length_gets_413_unread(self, app, client, sample_song, limits):
+        resp = _unread_upload(client, sample_song['id'], app.config['MAX_CONTENT_LENGTH'] + 1)
+
+        assert resp.status_code == 413
+
+    def test_slot_released_when_the_view_fails(self, client, limits):
+        for _ in range(3):
+            assert _upload(client, 9999).status_code == 404
+        slots = [acquire_upload_slot(1), acquire_upload_slot(1)]
+        assert None not in slots
+        for slot in slots:
+            os.close(slot)
+
+    def test_every_upload_route_is_admitted(self, client, sample_song, limits):
+        slots = [acquire_upload_slot(10), acquire_upload_slot(10)]
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'run'}).get_json()
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+
+        for method, url in (
+            ('POST', f"/songs/{sample_song['id']}/upload"),
+            ('POST', f"/songs/{sample_song['id']}/media"),
+            ('POST', f"/practice-logs/{log['id']}/upload"),
+            ('POST', f"/members/{member['id']}/logs"),
+            ('PUT', '/upload-sessions/abc?offset=0'),
+            ('POST', '/archive/import'),
+        ):
+            resp = client.open(url, method=method, input_stream=ExplodingStream(10))
+            assert resp.status_code == 503, url
+        for slot in slots:
+            os.close(slot)
+
+    def test_disabled(self, app, client, sample_song):
+        app.config.update(UPLOAD_MAX_CONCURRENT=0, UPLOAD_MAX_INFLIGHT_BYTES=0)
+
+        assert _upload(client, sample_song['id']).status_code == 201
+        assert not os.path.exists(stamp_path(SLOTS_SUBDIR))
+
+
+class TestAcrossProcesses:
+    def test_slot_held_by_another_process(self, app, client, sample_song):
+        app.config.update(UPLOAD_MAX_CONCURRENT=1, UPLOAD_MAX_INFLIGHT_BYTES=0)
+        slot = acquire_upload_slot(1)
+        os.close(slot)
+        slot_path = os.path.join(stamp_path(SLOTS_SUBDIR), os.listdir(stamp_path(SLOTS_SUBDIR))[0])
+        holder = subprocess.Popen(
+            [sys.executable, '-c',
+             'import fcntl, sys; f = open(sys.argv[1], "r+"); fcntl.flock(f, fcntl.LOCK_EX); '
+             'print("held", flush=True); sys.stdin.read()', slot_path],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            assert holder.stdout.readline() == 'held\n'
+            assert _unread_upload(client, sample_song['id'], 10).status_code == 503
+        finally:
+            holder.kill()
+            holder.wait()
+
+        # The kernel released the lock with the process.
+        assert _upload(client, sample_song['id']).status_code == 201
@@ -0,0 +1,196 @@
+import hashlib
+import os
+
+import pytest
+
+
+def _start(client, target, target_id, filename, size, **extra):
+    return client.post('/upload-sessions', json={
+        'target': target, 'target_id': target_id, 'filename': filename, 'size': size, **extra,
+    })
+
+
+def _put(client, session_id, offset, chunk):
+    return client.put(
+        f'/upload-sessions/{session_id}?offset={offset}',
+        data=chunk,
+        content_type='application/octet-stream',
+    )
+
+
+def _upload(client, session_id, content, chunk_size):
+    for offset in range(0, len(content), chunk_size):
+        resp = _put(client, session_id, offset, content[offset:offset + chunk_size])
+        assert resp.status_code == 200
+    return client.post(f'/upload-sessions/{session_id}/complete',
+                       json={'sha256': hashlib.sha256(content).hexdigest()})
+
+
+class TestChunkedUpload:
+    def test_media_upload_in_chunks(self, client, sample_song, app):
+        content = os.urandom(10_000)
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', len(content)).get_json()
+        assert session['offset'] == 0
+
+        resp = _upload(client, session['id'], content, 3_000)
+
+        assert resp.status_code == 201
+        media = resp.get_json()
+        assert media['filename'] == 'take.mp3'
+        assert media['file_size'] == len(content)
+        assert media['file_type'] == 'audio'
+        assert resp.headers['X-Content-SHA256'] == hashlib.sha256(content).hexdigest()
+        assert client.get(media['url']).data == content
+        # Partial file is gone and the session is closed.
+        assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], '.partial')) == []
+        assert client.get(f"/upload-sessions/{session['id']}").status_code == 404
+
+    def test_sheet_music_target_sets_song_field(self, client, sample_song):
+        content = b'%PDF-1.4 sheet'
+        session = _start(client, 'sheet_music', sample_song['id'], 'score.pdf', len(content)).get_json()
+        resp = _upload(client, session['id'], content, 5)
+        assert resp.status_code == 200
+        song = resp.get_json()
+        assert song['sheet_music'].endswith('.pdf')
+        assert len(song['media']) == 1
+
+    def test_recording_target(self, client, sample_song):
+        log = client.post(f"/songs/{sample_song['id']}/practice-logs", json={'content': 'x'}).get_json()
+        content = b'RIFF....WAVE'
+        session = _start(client, 'recording', log['id'], 'rehearsal.wav', len(content)).get_json()
+        resp = _upload(client, session['id'], content, 4)
+        assert resp.status_code == 200
+        assert resp.get_json()['recording'].endswith('.wav')
+
+    def test_personal_log_target(self, client):
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        content = b'video bytes'
+        session = _start(client, 'personal_log', member['id'], 'solo.mp4', len(content), title='Solo').get_json()
+        resp = _upload(client, session['id'], content, 4)
+        assert resp.status_code == 201
+        log = resp.get_json()
+        assert (log['title'], log['file_type']) == ('Solo', 'video')
+        assert client.get(log['url']).data == content
+
+    def test_resume_after_partial_chunk(self, client, sample_song):
+        content = os.urandom(4_000)
+        session = _start(client, 'media', sample_song['id'], 'take.flac', len(content)).get_json()
+        _put(client, session['id'], 0, content[:1_000])
+
+        # A retry of an old offset is rejected with the real progress.
+        resp = _put(client, session['id'], 0, content[:1_000])
+        assert resp.status_code == 409
+        assert resp.get_json()['offset'] == 1_000
+
+        offset = client.get(f"/upload-sessions/{session['id']}").get_json()['offset']
+        _put(client, session['id'], offset, content[offset:])
+        resp = client.post(f"/upload-sessions/{session['id']}/complete")
+        assert resp.status_code == 201
+        assert resp.headers['X-Content-SHA256'] == hashlib.sha256(content).hexdigest()
+
+    def test_checksum_rebuilt_when_worker_lost_state(self, client, sample_song):
+        from routes import upload_sessions
+
+        content = os.urandom(2_000)
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', len(content)).get_json()
+        _put(client, session['id'], 0, content[:1_500])
+        upload_sessions._hashers.clear()
+        _put(client, session['id'], 1_500, content[1_500:])
+
+        resp = client.post(f"/upload-sessions/{session['id']}/complete",
+                           json={'sha256': hashlib.sha256(content).hexdigest()})
+        assert resp.status_code == 201
+
+    def test_failed_chunk_leaves_checksum_intact(self, client, sample_song, monkeypatch):
+        from routes import upload_sessions
+
+        content = os.urandom(2_000)
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', len(content)).get_json()
+        _put(client, session['id'], 0, content[:1_000])
+
+        def fail(fd):
+            raise OSError('disk full')
+        with monkeypatch.context() as m:
+            m.setattr(upload_sessions.os, 'fsync', fail)
+            with pytest.raises(OSError):
+                _put(client, session['id'], 1_000, b'x' * 1_000)
+        assert session['id'] not in upload_sessions._hashers
+
+        assert _put(client, session['id'], 1_000, content[1_000:]).status_code == 200
+        resp = client.post(f"/upload-sessions/{session['id']}/complete",
+                           json={'sha256': hashlib.sha256(content).hexdigest()})
+        assert resp.status_code == 201
+
+    def test_racing_chunk_loses_without_writing(self, client, sample_song, monkeypatch):
+        from routes import upload_sessions
+
+        content = os.urandom(2_000)
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', len(content)).get_json()
+        real_flock = upload_sessions.fcntl.flock
+
+        def flock_after_other_worker(f, operation):
+            # The other PUT for offset 0 got the lock first and committed.
+            monkeypatch.setattr(upload_sessions.fcntl, 'flock', real_flock)
+            assert _put(client, session['id'], 0, content[:1_500]).status_code == 200
+            real_flock(f, operation)
+        monkeypatch.setattr(upload_sessions.fcntl, 'flock', flock_after_other_worker)
+
+        resp = _put(client, session['id'], 0, b'x' * 500)
+        assert resp.status_code == 409
+        assert resp.get_json()['offset'] == 1_500
+
+        _put(client, session['id'], 1_500, content[1_500:])
+        resp = client.post(f"/upload-sessions/{session['id']}/complete",
+                           json={'sha256': hashlib.sha256(content).hexdigest()})
+        assert resp.status_code == 201
+        assert client.get(resp.get_json()['url']).data == content
+
+    def test_checksum_cache_is_bounded(self, client, sample_song, monkeypatch):
+        from routes import upload_sessions
+
+        monkeypatch.setattr(upload_sessions, 'HASHER_CACHE_SIZE', 2)
+        sessions = [_start(client, 'media', sample_song['id'], 'take.mp3', 10).get_json() for _ in range(3)]
+        for session in sessions:
+            _put(client, session['id'], 0, b'01234')
+
+        assert list(upload_sessions._hashers) == [sessions[1]['id'], sessions[2]['id']]
+
+    def test_complete_before_all_bytes(self, client, sample_song):
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', 10).get_json()
+        _put(client, session['id'], 0, b'12345')
+        resp = client.post(f"/upload-sessions/{session['id']}/complete")
+        assert resp.status_code == 400
+        assert 'incomplete' in resp.get_json()['error'].lower()
+
+    def test_checksum_mismatch_discards_upload(self, client, sample_song):
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', 4).get_json()
+        _put(client, session['id'], 0, b'abcd')
+        resp = client.post(f"/upload-sessions/{session['id']}/complete", json={'sha256': '0' * 64})
+        assert resp.status_code == 400
+        assert client.get(f"/upload-sessions/{session['id']}").status_code == 404
+        assert client.get(f"/songs/{sample_song['id']}").get_json()['media'] == []
+
+    def test_chunk_past_declared_size(self, client, sample_song):
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', 4).get_json()
+        assert _put(client, session['id'], 0, b'abcdef').status_code == 400
+
+    def test_chunk_too_large(self, client, sample_song, app):
+        app.config['UPLOAD_CHUNK_SIZE'] = 4
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', 10).get_json()
+        assert _put(client, session['id'], 0, b'abcdef').status_code == 413
+
+    def test_abort_removes_partial_file(self, client, sample_song, app):
+        session = _start(client, 'media', sample_song['id'], 'take.mp3', 10).get_json()
+        _put(client, session['id'], 0, b'12345')
+        assert client.delete(f"/upload-sessions/{session['id']}").status_code == 200
+        assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], '.partial')) == []
+
+    def test_start_validation(self, client, sample_song):
+        assert _start(client, 'media', sample_song['id'], 'virus.exe', 10).status_code == 400
+        assert _start(client, 'media', 999, 'take.mp3', 10).status_code == 404
+        assert _start(client, 'bogus', sample_song['id'], 'take.mp3', 10).status_code == 400
+        assert _start(client, 'media', sample_song['id'], 'take.mp3', 0).status_code == 400
+        assert _start(client, 'media', sample_song['id'], 'take.mp3', 10**12).status_code == 413
+        member = client.post('/members', json={'name': 'Kim', 'instrument': 'Bass'}).get_json()
+        assert _start(client, 'personal_log', member['id'], 'score.pdf', 10, title='t').status_code == 400
+        assert _start(client, 'personal_log', member['id'], 'take.mp3', 10).status_code == 400
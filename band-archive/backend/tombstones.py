@@ -0,0 +1,57 @@
+"""Tombstones for deleted rows, so /sync can tell offline clients what to drop.
+
+Every ORM delete of a synced model - including rows removed by a cascade -
+adds a ``Tombstone`` in the same flush. Tombstones older than
+``SYNC_TOMBSTONE_RETENTION_DAYS`` are pruned whenever new ones are written;
+a client whose token is older than that gets a full snapshot instead.
+
+Bulk ``delete(Model)`` statements bypass the mapper events and leave no
+tombstone, so synced rows must be deleted through the session.
+"""
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, insert, inspect
+from sqlalchemy.orm import Session
+
+from models import Media, Member, PersonalLog, PracticeLog, Song, SongSuggestion, Tombstone
+
+# /sync collection name -> model.
+SYNCED_MODELS = {
+    'songs': Song,
+    'media': Media,
+    'practice_logs': PracticeLog,
+    'members': Member,
+    'personal_logs': PersonalLog,
+    'suggestions': SongSuggestion,
+}
+
+
+def _row_deleted(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault('tombstones', []).append(
+            {'table_name': mapper.local_table.name, 'row_id': target.id}
+        )
+
+
+for _model in SYNCED_MODELS.values():
+    event.listen(_model, 'after_delete', _row_deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_tombstones(session, flush_context):
+    rows = session.info.pop('tombstones', None)
+    if not rows:
+        return
+    now = datetime.now(timezone.utc)
+    connection = session.connection()
+    connection.execute(insert(Tombstone), [dict(row, deleted_at=now) for row in rows])
+    if has_app_context():
+        cutoff = now - timedelta(days=current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'])
+        connection.execute(delete(Tombstone).where(Tombstone.deleted_at < cutoff))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_tombstones(session):
+    session.info.pop('tombstones', None)
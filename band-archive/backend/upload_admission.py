@@ -0,0 +1,106 @@
+"""Admission control for uploads.
+
+An upload holds a worker for as long as the client takes to send the body;
+with sync gunicorn workers a few members sending rehearsal videos at once
+leave none for the song list or the dashboard. Views decorated with
+``@admit_upload`` therefore take an upload slot first, and at most
+
+* ``UPLOAD_MAX_CONCURRENT`` uploads, with
+* ``UPLOAD_MAX_INFLIGHT_BYTES`` of declared bodies between them
+  (``Content-Length``; a body without one counts as MAX_CONTENT_LENGTH),
+
+run at once across every process sharing UPLOAD_FOLDER. The decision is
+made from the headers, before any of the body is read: a body over
+MAX_CONTENT_LENGTH gets 413, and an upload over a limit gets 503 with
+``Retry-After`` instead of waiting in an unbounded queue. One upload is
+always admitted when none is running, so a body larger than the byte
+budget is not refused forever.
+
+Slots are files under ``.cache/upload-slots``: an upload holds an ``flock``
+on one for its duration, with its size written inside. The kernel drops
+the lock when the holder exits, so a crashed worker cannot leak a slot.
+Slots are counted and taken under a short admission lock, so two workers
+cannot both take the last one.
+"""
+import fcntl
+import os
+from functools import wraps
+
+from flask import current_app, request
+
+from errors import ServiceUnavailableError, ValidationError
+from stamp_files import stamp_path
+
+SLOTS_SUBDIR = 'upload-slots'
+ADMISSION_LOCK_NAME = 'upload-admission.lock'
+SLOT_SUFFIX = '.slot'
+
+
+def _slot_size(fd):
+    try:
+        return int(os.pread(fd, 32, 0) or 0)
+    except ValueError:
+        return 0
+
+
+def acquire_upload_slot(size):
+    """Take a slot for an upload of ``size`` bytes.
+
+    Returns the slot's file descriptor (closing it frees the slot), or None
+    when the upload would go over a limit.
+    """
+    max_uploads = current_app.config['UPLOAD_MAX_CONCURRENT']
+    max_bytes = current_app.config['UPLOAD_MAX_INFLIGHT_BYTES']
+    slots_dir = stamp_path(SLOTS_SUBDIR)
+    os.makedirs(slots_dir, exist_ok=True)
+    with open(stamp_path(ADMISSION_LOCK_NAME), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        free, running, inflight = None, 0, 0
+        names = sorted(name for name in os.listdir(slots_dir) if name.endswith(SLOT_SUFFIX))
+        for name in names:
+            fd = os.open(os.path.join(slots_dir, name), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                running += 1
+                inflight += _slot_size(fd)
+                os.close(fd)
+                continue
+            if free is None:
+                free = fd
+            else:
+                os.close(fd)
+
+        if (max_uploads and running >= max_uploads) or (max_bytes and running and inflight + size > max_bytes):
+            if free is not None:
+                os.close(free)
+            return None
+        if free is None:
+            free = os.open(os.path.join(slots_dir, f'{len(names)}{SLOT_SUFFIX}'), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(free, fcntl.LOCK_EX)
+        os.ftruncate(free, 0)
+        os.pwrite(free, str(size).encode(), 0)
+        return free
+
+
+def admit_upload(view):
+    """Run ``view`` holding an upload slot; refuse with 413 or 503 from the headers alone."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        config = current_app.config
+        max_size = config['MAX_CONTENT_LENGTH']
+        size = request.content_length
+        if size is not None and max_size is not None and size > max_size:
+            raise ValidationError(f"File too large. Maximum size is {max_size} bytes", status_code=413)
+        if not (config['UPLOAD_MAX_CONCURRENT'] or config['UPLOAD_MAX_INFLIGHT_BYTES']):
+            return view(*args, **kwargs)
+
+        slot = acquire_upload_slot(size if size is not None else max_size or 0)
+        if slot is None:
+            raise ServiceUnavailableError("Too many uploads in progress, try again shortly",
+                                          retry_after=config['UPLOAD_RETRY_AFTER_SECONDS'])
+        try:
+            return view(*args, **kwargs)
+        finally:
+            os.close(slot)
+    return wrapper
@@ -1,5 +1,3 @@
-import uuid
-
 from errors import ValidationError
 
 ALLOWED_EXTENSIONS = {
@@ -16,7 +14,7 @@ VALID_STATUSES = {'Practice', 'Completed', 'OnHold'}
 
 
 def validate_status(status):
-    if status not in VALID_STATUSES:
+    if not isinstance(status, str) or status not in VALID_STATUSES:
         raise ValidationError(f"Invalid status. Must be one of: {', '.join(VALID_STATUSES)}")
 
 
@@ -35,17 +33,70 @@ def validate_non_empty_string(value, field_name):
         raise ValidationError(f"{field_name} cannot be empty")
 
 
+def validate_string(value, field_name):
+    if value is not None and not isinstance(value, str):
+        raise ValidationError(f"{field_name} must be a string")
+
+
 def validate_string_length(value, field_name, max_length):
     if value and len(value) > max_length:
         raise ValidationError(f"{field_name} must be {max_length} characters or less")
 
 
+# Longest accepted value of the length-checked song fields.
+SONG_STRING_LENGTHS = {'title': 100, 'artist': 100, 'link': 200, 'genre': 50}
+SONG_FIELDS = ('title', 'artist', 'status', 'lyrics', 'chords', 'link', 'memo', 'genre', 'difficulty')
+SONG_STRING_FIELDS = ('title', 'artist', 'lyrics', 'chords', 'link', 'memo', 'genre')
+PRACTICE_LOG_FIELDS = ('content', 'feedback')
+
+
+def song_values(data, partial=False):
+    """Validate a song body and return the column values it sets.
+
+    A new song needs a title and an artist and gets the default status and
+    difficulty; with ``partial`` (an update) only the keys present are set.
+    """
+    if not partial:
+        data = {'status': 'Practice', 'difficulty': 3, **data}
+    for field in ('title', 'artist'):
+        if not partial:
+            validate_required_string(data.get(field), field)
+        elif field in data:
+            validate_non_empty_string(data[field], field)
+    for field in SONG_STRING_FIELDS:
+        if field in data:
+            validate_string(data[field], field)
+    for field, max_length in SONG_STRING_LENGTHS.items():
+        if field in data:
+            validate_string_length(data[field], field, max_length)
+    if 'status' in data:
+        validate_status(data['status'])
+    if 'difficulty' in data:
+        validate_difficulty(data['difficulty'])
+    return {field: data.get(field) for field in SONG_FIELDS if not partial or field in data}
+
+
+def member_values(data, partial=False):
+    """Validate a member body and return the column values it sets (see ``song_values``)."""
+    values = {}
+    for field in ('name', 'instrument'):
+        if partial and field not in data:
+            continue
+        validate_required_string(data.get(field), field)
+        validate_string(data[field], field)
+        validate_string_length(data[field], field, 100)
+        values[field] = data[field].strip()
+    return values
+
+
+def practice_log_values(data, partial=False):
+    """Validate a practice log body and return the column values it sets (see ``song_values``)."""
+    for field in PRACTICE_LOG_FIELDS:
+        if field in data:
+            validate_string(data[field], field)
+    return {field: data.get(field) for field in PRACTICE_LOG_FIELDS if not partial or field in data}
+
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-
-def generate_secure_filename(filename):
-    """Generate a randomized filename preserving the original extension."""
-    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-    random_name = uuid.uuid4().hex
-    return f"{random_name}.{ext}" if ext else random_name